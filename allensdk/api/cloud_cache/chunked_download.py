@@ -0,0 +1,284 @@
+from typing import Union, Dict, List, Tuple
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import hashlib
+import json
+import os
+
+
+def partial_download_paths(local_path: Union[str, Path]) -> Tuple[Path, Path]:
+    """
+    Return the paths used to hold an in-progress download of local_path
+
+    Parameters
+    ----------
+    local_path: Union[str, Path]
+        The path at which the completed file will be stored
+
+    Returns
+    -------
+    Tuple[Path, Path]
+        The path to the partially downloaded data and the path to the
+        JSON file recording which chunks of that data have been
+        successfully written
+    """
+    local_path = Path(local_path)
+    data_path = local_path.with_name(f'{local_path.name}.partial')
+    state_path = local_path.with_name(f'{local_path.name}.partial.json')
+    return data_path, state_path
+
+
+def chunk_ranges(file_size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Split a file of file_size bytes into (start, stop) byte ranges of
+    (at most) chunk_size bytes. stop is inclusive, following the
+    convention of the HTTP Range header.
+
+    Parameters
+    ----------
+    file_size: int
+        Total number of bytes in the file
+
+    chunk_size: int
+        Maximum number of bytes in each chunk
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive; got {chunk_size}")
+    return [(start, min(start + chunk_size, file_size) - 1)
+            for start in range(0, file_size, chunk_size)]
+
+
+def _load_download_state(state_path: Path,
+                         data_path: Path,
+                         expected: dict) -> List[int]:
+    """
+    Read the list of completed chunks from a previous, interrupted
+    download. If the recorded download does not describe the same
+    object (version, size and chunking), return an empty list so that
+    the download starts over.
+    """
+    if not state_path.is_file() or not data_path.is_file():
+        return []
+    try:
+        with open(state_path, 'r') as in_file:
+            state = json.load(in_file)
+    except (ValueError, OSError):
+        return []
+
+    for key, value in expected.items():
+        if state.get(key) != value:
+            return []
+
+    if os.stat(data_path).st_size != expected['size']:
+        return []
+
+    return sorted(int(ii) for ii in state.get('completed', []))
+
+
+def _write_download_state(state_path: Path,
+                          expected: dict,
+                          completed: List[int]) -> None:
+    """
+    Record the chunks that have been written to disk so far. The file is
+    written to a temporary path and then moved into place so that a crash
+    never leaves a truncated state file behind.
+    """
+    state = dict(expected)
+    state['completed'] = sorted(completed)
+    tmp_path = state_path.with_name(f'{state_path.name}.tmp')
+    with open(tmp_path, 'w') as out_file:
+        out_file.write(json.dumps(state))
+    os.replace(tmp_path, state_path)
+
+
+def download_s3_object(s3_client,
+                       bucket_name: str,
+                       obj_key: str,
+                       version_id: str,
+                       file_size: int,
+                       local_path: Union[str, Path],
+                       chunk_size: int = 8 * 1024 * 1024,
+                       max_workers: int = 4,
+                       pbar=None) -> str:
+    """
+    Download an object from S3 with ranged GET requests issued from a
+    pool of threads. The file hash is computed as contiguous chunks
+    become available, so the downloaded file never has to be read back
+    in full to be validated.
+
+    If the download is interrupted, the partially downloaded data and a
+    record of which chunks were completed are left next to local_path
+    (see partial_download_paths). Calling this function again with the
+    same arguments will only request the missing chunks.
+
+    Parameters
+    ----------
+    s3_client:
+        A boto3 S3 client
+
+    bucket_name: str
+        The bucket containing the object
+
+    obj_key: str
+        The key of the object in the bucket
+
+    version_id: str
+        The version of the object to download
+
+    file_size: int
+        The size of the object in bytes
+
+    local_path: Union[str, Path]
+        Where the downloaded file should be written
+
+    chunk_size: int
+        The number of bytes requested in each ranged GET
+        (default 8 MB)
+
+    max_workers: int
+        The number of threads issuing requests concurrently
+
+    pbar: Optional[tqdm.tqdm]
+        Progress bar to update as bytes are written
+
+    Returns
+    -------
+    str
+        The file hash (Blake2b; hexadecimal) of the downloaded file
+
+    Notes
+    -----
+    local_path is only created once every chunk has been downloaded.
+    It is up to the caller to compare the returned hash to the expected
+    hash and remove the file if they do not agree.
+    """
+    # if local_path is a (broken) symlink, write through it the way
+    # open(local_path, 'wb') would
+    local_path = Path(os.path.realpath(local_path))
+    data_path, state_path = partial_download_paths(local_path)
+
+    ranges = chunk_ranges(file_size, chunk_size)
+    expected = {'version_id': version_id,
+                'size': file_size,
+                'chunk_size': chunk_size}
+
+    completed = set(_load_download_state(state_path, data_path, expected))
+    if len(completed) == 0:
+        with open(data_path, 'wb') as out_file:
+            out_file.truncate(file_size)
+        _write_download_state(state_path, expected, [])
+    elif pbar is not None:
+        pbar.update(sum(ranges[ii][1] - ranges[ii][0] + 1
+                        for ii in completed))
+
+    hasher = hashlib.blake2b()
+
+    # chunks that have been downloaded but not yet
+    # fed to the hasher (because an earlier chunk
+    # is still in flight)
+    pending: Dict[int, bytes] = dict()
+    next_to_hash = 0
+
+    def _fetch(chunk_idx: int) -> bytes:
+        start, stop = ranges[chunk_idx]
+        response = s3_client.get_object(Bucket=bucket_name,
+                                        Key=obj_key,
+                                        VersionId=version_id,
+                                        Range=f'bytes={start}-{stop}')
+        data = response['Body'].read()
+        if len(data) != stop - start + 1:
+            raise RuntimeError(f"Expected {stop - start + 1} bytes for "
+                               f"range {start}-{stop} of {obj_key}; "
+                               f"got {len(data)}")
+        return data
+
+    def _advance_hash(in_file) -> int:
+        idx = next_to_hash
+        while idx < len(ranges):
+            if idx in pending:
+                hasher.update(pending.pop(idx))
+            elif idx in completed:
+                # downloaded during an earlier, interrupted attempt
+                start, stop = ranges[idx]
+                in_file.seek(start)
+                hasher.update(in_file.read(stop - start + 1))
+            else:
+                break
+            idx += 1
+        return idx
+
+    to_fetch = [ii for ii in range(len(ranges)) if ii not in completed]
+
+    with open(data_path, 'r+b') as out_file:
+        next_to_hash = _advance_hash(out_file)
+
+        # chunks in flight and chunks waiting in pending to be hashed
+        # together never exceed max_in_flight, so that out-of-order
+        # chunks cannot pile up in memory behind a slow one
+        max_in_flight = 2 * max(1, max_workers)
+        n_workers = max(1, max_workers)
+
+        # the first error raised while fetching a chunk; once an error
+        # has occurred, no new chunks are requested, but the chunks
+        # already in flight are still written to disk so that they
+        # need not be downloaded again
+        error = None
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = dict()
+            fetch_iter = iter(to_fetch)
+
+            def _submit():
+                while len(futures) + len(pending) < max_in_flight:
+                    next_chunk = next(fetch_iter, None)
+                    if next_chunk is None:
+                        break
+                    futures[executor.submit(_fetch,
+                                            next_chunk)] = next_chunk
+
+            _submit()
+            while len(futures) > 0:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_idx = futures.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as err:
+                        if error is None:
+                            error = err
+                        continue
+
+                    out_file.seek(ranges[chunk_idx][0])
+                    out_file.write(data)
+                    completed.add(chunk_idx)
+                    pending[chunk_idx] = data
+                    if pbar is not None:
+                        pbar.update(len(data))
+
+                out_file.flush()
+                _write_download_state(state_path,
+                                      expected,
+                                      list(completed))
+                if error is None:
+                    next_to_hash = _advance_hash(out_file)
+                    _submit()
+
+    if error is not None:
+        raise error
+
+    os.replace(data_path, local_path)
+    state_path.unlink()
+    return hasher.hexdigest()
+
+
+def is_partial_download(file_path: Union[str, Path]) -> bool:
+    """
+    Return True if file_path is one of the files used to keep track of an
+    in-progress download (see partial_download_paths)
+    """
+    name = Path(file_path).name
+    return name.endswith('.partial') or name.endswith('.partial.json')
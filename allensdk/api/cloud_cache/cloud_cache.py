@@ -9,15 +9,23 @@ import semver
 import tqdm
 import re
 import json
+import sqlite3
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from botocore import UNSIGNED
 from botocore.client import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from allensdk.internal.core.lims_utilities import safe_system_path
 from allensdk.api.cloud_cache.manifest import Manifest
+from allensdk.api.cloud_cache.manifest_index import ManifestIndex
+from allensdk.api.cloud_cache.manifest_index import INDEX_FILE_NAME
 from allensdk.api.cloud_cache.file_attributes import CacheFileAttributes
 from allensdk.api.cloud_cache.utils import file_hash_from_path
 from allensdk.api.cloud_cache.utils import bucket_name_from_url
 from allensdk.api.cloud_cache.utils import relative_path_from_url
+from allensdk.api.cloud_cache.chunked_download import download_s3_object
+from allensdk.api.cloud_cache.chunked_download import is_partial_download
 
 
 class OutdatedManifestWarning(UserWarning):
@@ -72,6 +80,9 @@ class BasicLocalCache(ABC):
         self._manifest = None
         self._manifest_name = None
 
+        # an optional ManifestIndex through which manifests are loaded
+        self._manifest_index = None
+
         self._cache_dir = cache_dir
         self._project_name = project_name
 
@@ -212,6 +223,13 @@ class BasicLocalCache(ABC):
         else:
             manifest_path = os.path.join(self._cache_dir, manifest_name)
 
+        if self._manifest_index is not None:
+            return self._manifest_index.load_manifest(
+                manifest_path,
+                cache_dir=self._cache_dir,
+                use_static_project_dir=use_static_project_dir
+            )
+
         with open(manifest_path, "r") as f:
             local_manifest = Manifest(
                 cache_dir=self._cache_dir,
@@ -381,6 +399,10 @@ class CloudCacheBase(BasicLocalCache):
         # can instead be a symlink
         self._downloaded_data_path = c_path / '_downloaded_data.json'
 
+        # guards self._downloaded_data_path when files are
+        # downloaded concurrently (see download_data_many)
+        self._downloaded_data_lock = threading.Lock()
+
         # if the local manifest is missing but there are
         # data files in cache_dir, emit a warning
         # suggesting that the user run
@@ -390,7 +412,9 @@ class CloudCacheBase(BasicLocalCache):
             has_files = False
             for fname in file_list:
                 if fname.is_file():
-                    if 'json' not in fname.name:
+                    if 'json' not in fname.name \
+                            and not fname.name.startswith(INDEX_FILE_NAME) \
+                            and not is_partial_download(fname):
                         has_files = True
                         break
             if has_files:
@@ -412,6 +436,16 @@ class CloudCacheBase(BasicLocalCache):
                 msg += 'cache'
                 warnings.warn(msg, MissingLocalManifestWarning)
 
+        # compiled manifests and the hashes of verified local files, so
+        # that neither manifests nor files need to be parsed/hashed again
+        # until they change (see ManifestIndex)
+        try:
+            self._manifest_index = ManifestIndex(c_path / INDEX_FILE_NAME)
+        except sqlite3.Error as err:
+            warnings.warn(f"Unable to open the manifest index in "
+                          f"{c_path}; manifests will be parsed each time "
+                          f"they are loaded ({err})")
+
     def construct_local_manifest(self) -> None:
         """
         Construct the dict that maps between file_hash and
@@ -423,7 +457,9 @@ class CloudCacheBase(BasicLocalCache):
         file_iterator = c_dir.glob('**/*')
         for file_name in file_iterator:
             if file_name.is_file():
-                if 'json' not in file_name.name:
+                if 'json' not in file_name.name \
+                        and not file_name.name.startswith(INDEX_FILE_NAME) \
+                        and not is_partial_download(file_name):
                     if file_name != self._manifest_last_used:
                         files_to_hash.add(file_name.resolve())
 
@@ -434,6 +470,7 @@ class CloudCacheBase(BasicLocalCache):
             for local_path in pbar:
                 hsh = file_hash_from_path(local_path)
                 lookup[str(local_path.absolute())] = hsh
+                self._record_verified_file(local_path, hsh)
 
         with open(self._downloaded_data_path, 'w') as out_file:
             out_file.write(json.dumps(lookup, indent=2, sort_keys=True))
@@ -634,25 +671,26 @@ class CloudCacheBase(BasicLocalCache):
             # This file does not exist; there is nothing to do
             return None
 
-        if self._downloaded_data_path.exists():
-            with open(self._downloaded_data_path, 'rb') as in_file:
-                downloaded_data = json.load(in_file)
-        else:
-            downloaded_data = {}
-
-        abs_path = str(file_attributes.local_path.resolve())
-        if abs_path in downloaded_data:
-            if downloaded_data[abs_path] == file_attributes.file_hash:
-                # this file has already been logged;
-                # there is nothing to do
-                return None
-
-        downloaded_data[abs_path] = file_attributes.file_hash
-        with open(self._downloaded_data_path, 'w') as out_file:
-            out_file.write(json.dumps(downloaded_data,
-                                      indent=2,
-                                      sort_keys=True))
-        return None
+        with self._downloaded_data_lock:
+            if self._downloaded_data_path.exists():
+                with open(self._downloaded_data_path, 'rb') as in_file:
+                    downloaded_data = json.load(in_file)
+            else:
+                downloaded_data = {}
+
+            abs_path = str(file_attributes.local_path.resolve())
+            if abs_path in downloaded_data:
+                if downloaded_data[abs_path] == file_attributes.file_hash:
+                    # this file has already been logged;
+                    # there is nothing to do
+                    return None
+
+            downloaded_data[abs_path] = file_attributes.file_hash
+            with open(self._downloaded_data_path, 'w') as out_file:
+                out_file.write(json.dumps(downloaded_data,
+                                          indent=2,
+                                          sort_keys=True))
+            return None
 
     def _check_for_identical_copy(self,
                                   file_attributes: CacheFileAttributes
@@ -704,12 +742,27 @@ class CloudCacheBase(BasicLocalCache):
         file_attributes.local_path.symlink_to(matched_path.resolve())
         return True
 
+    def _record_verified_file(self,
+                              local_path: Union[str, pathlib.Path],
+                              file_hash: str) -> None:
+        """
+        Record in the manifest index that the file at local_path has been
+        verified to have file_hash
+        """
+        if self._manifest_index is not None:
+            self._manifest_index.record_file(local_path, file_hash)
+
     def _file_exists(self, file_attributes: CacheFileAttributes) -> bool:
         """
         Given a CacheFileAttributes describing a file, assess whether or
         not that file exists locally and is valid (i.e. has the expected
         file hash)
 
+        Files whose hash has been verified before (because they were
+        downloaded by this cache or hashed by construct_local_manifest)
+        are only hashed again if their size or modification time has
+        changed since.
+
         Parameters
         ----------
         file_attributes: CacheFileAttributes
@@ -736,6 +789,13 @@ class CloudCacheBase(BasicLocalCache):
 
             file_exists = True
 
+            if self._manifest_index is not None:
+                if not self._manifest_index.check_file(
+                        file_attributes.local_path,
+                        file_attributes.file_hash):
+                    # the file has been modified or corrupted
+                    return False
+
         if not file_exists:
             file_exists = self._check_for_identical_copy(file_attributes)
 
@@ -769,6 +829,38 @@ class CloudCacheBase(BasicLocalCache):
             self._update_list_of_downloads(file_attributes)
         return file_attributes.local_path
 
+    def download_data_many(self,
+                           file_ids: List,
+                           max_workers: int = 4) -> Dict:
+        """
+        Return the local paths to many data files, downloading the
+        files concurrently where necessary
+
+        Parameters
+        ----------
+        file_ids: List
+            The unique identifiers of the files to be accessed
+
+        max_workers: int
+            The number of files to download at the same time
+
+        Returns
+        -------
+        Dict
+            Maps each file_id to the pathlib.Path indicating where the
+            file is stored on the local system
+
+        Raises
+        ------
+        RuntimeError
+            If any of the files cannot be downloaded
+        """
+        # preserve order, but do not download the same file twice
+        unique_ids = list(dict.fromkeys(file_ids))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            paths = executor.map(self.download_data, unique_ids)
+            return dict(zip(unique_ids, paths))
+
     def download_metadata(self, fname: str) -> pathlib.Path:
         """
         Return the local path to a metadata file, downloading the
@@ -1030,12 +1122,24 @@ class S3CloudCache(CloudCacheBase):
     ui_class_name: Optional[str]
         Name of the class users are actually using to maniuplate this
         functionality (used to populate helpful error messages)
+
+    download_chunk_size: int
+        Number of bytes requested by each ranged GET when downloading
+        a file (default 8 MB)
+
+    download_max_workers: int
+        Number of threads used to download the chunks of a single
+        file concurrently (default 4)
     """
 
     def __init__(self, cache_dir, bucket_name, project_name,
-                 ui_class_name=None):
+                 ui_class_name=None,
+                 download_chunk_size: int = 8 * 1024 * 1024,
+                 download_max_workers: int = 4):
         self._manifest = None
         self._bucket_name = bucket_name
+        self._download_chunk_size = download_chunk_size
+        self._download_max_workers = download_max_workers
 
         super().__init__(cache_dir=cache_dir, project_name=project_name,
                          ui_class_name=ui_class_name)
@@ -1142,45 +1246,58 @@ class S3CloudCache(CloudCacheBase):
 
         version_id = file_attributes.version_id
 
-        pbar = None
-        if not self._file_exists(file_attributes):
-            response = self.s3_client.list_object_versions(Bucket=bucket_name,
-                                                           Prefix=str(obj_key))
-            object_info = [i for i in response["Versions"]
-                           if i["VersionId"] == version_id][0]
-            pbar = tqdm.tqdm(desc=object_info["Key"].split("/")[-1],
-                             total=object_info["Size"],
-                             unit_scale=True,
-                             unit_divisor=1000.,
-                             unit="MB")
+        if self._file_exists(file_attributes):
+            return was_downloaded
+
+        response = self.s3_client.list_object_versions(Bucket=bucket_name,
+                                                       Prefix=str(obj_key))
+        object_info = [i for i in response["Versions"]
+                       if i["VersionId"] == version_id][0]
+        pbar = tqdm.tqdm(desc=object_info["Key"].split("/")[-1],
+                         total=object_info["Size"],
+                         unit_scale=True,
+                         unit_divisor=1000.,
+                         unit="MB")
 
         while not self._file_exists(file_attributes):
             was_downloaded = True
-            response = self.s3_client.get_object(Bucket=bucket_name,
-                                                 Key=str(obj_key),
-                                                 VersionId=version_id)
-
-            if 'Body' in response:
-                with open(local_path, 'wb') as out_file:
-                    for chunk in response['Body'].iter_chunks():
-                        out_file.write(chunk)
-                        pbar.update(len(chunk))
-
-            # Verify the hash of the downloaded file
-            full_path = file_attributes.local_path.resolve()
-            test_checksum = file_hash_from_path(full_path)
-            if test_checksum != file_attributes.file_hash:
-                file_attributes.local_path.exists()
-                file_attributes.local_path.unlink()
-
             n_iter += 1
             if n_iter > max_iter:
                 pbar.close()
                 raise RuntimeError("Could not download\n"
                                    f"{file_attributes}\n"
-                                   "In {max_iter} iterations")
-        if pbar is not None:
-            pbar.close()
+                                   f"In {max_iter} iterations")
+
+            pbar.reset(total=object_info["Size"])
+            try:
+                # the file hash is accumulated as the chunks
+                # arrive, so the file does not need to be read
+                # again to be validated
+                test_checksum = download_s3_object(
+                        self.s3_client,
+                        bucket_name=bucket_name,
+                        obj_key=str(obj_key),
+                        version_id=version_id,
+                        file_size=object_info["Size"],
+                        local_path=local_path,
+                        chunk_size=self._download_chunk_size,
+                        max_workers=self._download_max_workers,
+                        pbar=pbar)
+            except (BotoCoreError, ClientError, RuntimeError) as err:
+                # chunks that were written before the failure are
+                # kept on disk; the next iteration only requests
+                # the missing ones
+                warnings.warn(f"Error while downloading {obj_key}: {err}; "
+                              "retrying")
+                continue
+
+            if test_checksum != file_attributes.file_hash:
+                file_attributes.local_path.unlink()
+            else:
+                self._record_verified_file(file_attributes.local_path,
+                                           test_checksum)
+
+        pbar.close()
 
         return was_downloaded
 
@@ -0,0 +1,381 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from allensdk.api.cloud_cache.manifest import Manifest
+from allensdk.api.cloud_cache.file_attributes import CacheFileAttributes  # noqa: E501
+from allensdk.api.cloud_cache.utils import file_hash_from_path
+
+
+# bump this whenever the layout of the tables below changes; older indexes
+# are then discarded and rebuilt
+INDEX_VERSION = 1
+
+INDEX_FILE_NAME = '_manifest_index.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifests (
+    manifest_name TEXT NOT NULL,
+    cache_dir TEXT NOT NULL,
+    use_static_project_dir INTEGER NOT NULL,
+    source_path TEXT NOT NULL,
+    source_size INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL,
+    project_name TEXT NOT NULL,
+    manifest_version TEXT NOT NULL,
+    file_id_column TEXT NOT NULL,
+    data_pipeline TEXT NOT NULL,
+    metadata_file_names TEXT NOT NULL,
+    PRIMARY KEY (manifest_name, cache_dir, use_static_project_dir)
+);
+CREATE TABLE IF NOT EXISTS manifest_files (
+    manifest_name TEXT NOT NULL,
+    cache_dir TEXT NOT NULL,
+    use_static_project_dir INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    local_path TEXT NOT NULL,
+    PRIMARY KEY (manifest_name, cache_dir, use_static_project_dir, kind,
+                 name)
+);
+CREATE TABLE IF NOT EXISTS local_files (
+    local_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    file_hash TEXT NOT NULL
+);
+"""
+
+
+def _stat_key(path: Union[str, pathlib.Path]) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ManifestIndex(object):
+    """
+    An SQLite database, stored alongside the data in a cache directory,
+    which holds
+
+    1. every manifest loaded from that directory, compiled into one row per
+       data and metadata file, so that loading a manifest and looking up a
+       file do not require parsing its (potentially very large) JSON
+
+    2. the size, modification time and file hash of local files whose hash
+       has been verified, so that a file only needs to be hashed again
+       once it has changed on disk
+
+    Parameters
+    ----------
+    index_path: str or pathlib.Path
+        Path to the SQLite database (created if it does not exist)
+    """
+
+    def __init__(self, index_path: Union[str, pathlib.Path]):
+        self._index_path = pathlib.Path(index_path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self._index_path),
+                                           timeout=60,
+                                           check_same_thread=False)
+        with self._lock, self._connection as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != INDEX_VERSION:
+                for table in ('manifests', 'manifest_files', 'local_files'):
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+            conn.executescript(_SCHEMA)
+
+    @property
+    def index_path(self) -> pathlib.Path:
+        return self._index_path
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _execute(self, query: str, parameters: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    # ============================ manifests ==================================
+
+    def load_manifest(self,
+                      manifest_path: Union[str, pathlib.Path],
+                      cache_dir: Union[str, pathlib.Path],
+                      use_static_project_dir: bool = False
+                      ) -> 'IndexedManifest':
+        """
+        Return the manifest stored at manifest_path, compiling it into the
+        index first if it is not there already (or has changed on disk
+        since it was compiled).
+
+        Parameters
+        ----------
+        manifest_path: str or pathlib.Path
+            Path to the manifest's JSON file
+        cache_dir: str or pathlib.Path
+            The directory in which local copies of files are stored (see
+            Manifest)
+        use_static_project_dir: bool
+            See Manifest
+
+        Returns
+        -------
+        IndexedManifest
+        """
+        manifest_path = pathlib.Path(manifest_path)
+        key = (manifest_path.name,
+               str(pathlib.Path(cache_dir).resolve()),
+               int(use_static_project_dir))
+        source_stat = _stat_key(manifest_path)
+
+        rows = self._execute(
+            'SELECT source_size, source_mtime_ns FROM manifests '
+            'WHERE manifest_name = ? AND cache_dir = ? '
+            'AND use_static_project_dir = ?', key)
+        if not rows or tuple(rows[0]) != source_stat:
+            with open(manifest_path, 'r') as in_file:
+                manifest = Manifest(cache_dir=cache_dir,
+                                    json_input=in_file,
+                                    use_static_project_dir=use_static_project_dir)  # noqa: E501
+            self._compile(key, manifest_path, source_stat, manifest)
+
+        return IndexedManifest(self, key)
+
+    def _compile(self,
+                 key: Tuple[str, str, int],
+                 manifest_path: pathlib.Path,
+                 source_stat: Tuple[int, int],
+                 manifest: Manifest) -> None:
+        """
+        Write every file described by manifest into the index
+        """
+        files = []
+        for name in manifest.metadata_file_names:
+            files.append(('metadata', name,
+                          manifest.metadata_file_attributes(name)))
+        for file_id in manifest.file_id_values:
+            files.append(('data', file_id,
+                          manifest.data_file_attributes(file_id)))
+
+        with self._lock, self._connection as conn:
+            conn.execute(
+                'DELETE FROM manifest_files WHERE manifest_name = ? '
+                'AND cache_dir = ? AND use_static_project_dir = ?', key)
+            conn.executemany(
+                'INSERT INTO manifest_files VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [key + (kind, name, attr.url, attr.version_id,
+                        attr.file_hash, str(attr.local_path))
+                 for kind, name, attr in files])
+            conn.execute(
+                'INSERT OR REPLACE INTO manifests VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                key + (str(manifest_path.resolve()),) + source_stat +
+                (manifest.project_name, manifest.version,
+                 manifest.file_id_column,
+                 json.dumps(manifest._data_pipeline),
+                 json.dumps(manifest.metadata_file_names)))
+
+    def _manifest_row(self, key: Tuple[str, str, int]) -> tuple:
+        rows = self._execute(
+            'SELECT source_path, project_name, manifest_version, '
+            'file_id_column, data_pipeline, metadata_file_names '
+            'FROM manifests WHERE manifest_name = ? AND cache_dir = ? '
+            'AND use_static_project_dir = ?', key)
+        if not rows:
+            raise RuntimeError(f"manifest {key[0]} is not in the index "
+                               f"{self._index_path}")
+        return rows[0]
+
+    def _file_names(self, key: Tuple[str, str, int], kind: str) -> List[str]:
+        rows = self._execute(
+            'SELECT name FROM manifest_files WHERE manifest_name = ? '
+            'AND cache_dir = ? AND use_static_project_dir = ? AND kind = ?',
+            key + (kind,))
+        return [row[0] for row in rows]
+
+    def _file_attributes(self,
+                         key: Tuple[str, str, int],
+                         kind: str,
+                         name: str) -> Optional[CacheFileAttributes]:
+        rows = self._execute(
+            'SELECT url, version_id, file_hash, local_path '
+            'FROM manifest_files WHERE manifest_name = ? AND cache_dir = ? '
+            'AND use_static_project_dir = ? AND kind = ? AND name = ?',
+            key + (kind, name))
+        if not rows:
+            return None
+        url, version_id, file_hash, local_path = rows[0]
+        return CacheFileAttributes(url, version_id, file_hash,
+                                   pathlib.Path(local_path))
+
+    # ============================ local files ================================
+
+    def record_file(self,
+                    local_path: Union[str, pathlib.Path],
+                    file_hash: str) -> None:
+        """
+        Record that the file currently at local_path has been verified to
+        have file_hash
+        """
+        size, mtime_ns = _stat_key(local_path)
+        with self._lock, self._connection as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO local_files VALUES (?, ?, ?, ?)',
+                (os.path.abspath(local_path), size, mtime_ns, file_hash))
+
+    def forget_file(self, local_path: Union[str, pathlib.Path]) -> None:
+        with self._lock, self._connection as conn:
+            conn.execute('DELETE FROM local_files WHERE local_path = ?',
+                         (os.path.abspath(local_path),))
+
+    def check_file(self,
+                   local_path: Union[str, pathlib.Path],
+                   file_hash: str) -> bool:
+        """
+        Check an existing local file against its expected file hash.
+
+        Files which have never been verified are assumed to be valid. Files
+        which have been verified are hashed again only if their size or
+        modification time has changed since.
+
+        Parameters
+        ----------
+        local_path: str or pathlib.Path
+            Path to an existing file
+        file_hash: str
+            The (hexadecimal) hash the file is expected to have
+
+        Returns
+        -------
+        bool
+            False if the file is known not to have file_hash
+        """
+        abs_path = os.path.abspath(local_path)
+        rows = self._execute(
+            'SELECT size, mtime_ns, file_hash FROM local_files '
+            'WHERE local_path = ?', (abs_path,))
+        if not rows:
+            return True
+
+        size, mtime_ns, recorded_hash = rows[0]
+        if _stat_key(local_path) == (size, mtime_ns):
+            return recorded_hash == file_hash
+
+        # the file has changed since it was verified
+        current_hash = file_hash_from_path(local_path)
+        self.record_file(local_path, current_hash)
+        return current_hash == file_hash
+
+
+class IndexedManifest(Manifest):
+    """
+    A Manifest whose contents are read from a ManifestIndex rather than
+    held in memory. Obtain one from ManifestIndex.load_manifest.
+    """
+
+    def __init__(self, index: ManifestIndex, key: Tuple[str, str, int]):
+        self._index = index
+        self._key = key
+        self._cache_dir = pathlib.Path(key[1])
+        self._use_static_project_dir = bool(key[2])
+
+        (self._source_path,
+         self._project_name,
+         self._version,
+         self._file_id_column,
+         data_pipeline,
+         metadata_file_names) = index._manifest_row(key)
+        self._data_pipeline = json.loads(data_pipeline)
+        self._metadata_file_names: List[str] = json.loads(
+            metadata_file_names)
+        self._file_id_values_list: Optional[List[Any]] = None
+        self._raw_data: Optional[Dict[str, Any]] = None
+
+    @property
+    def _data(self) -> Dict[str, Any]:
+        """
+        The deserialized manifest.json (only loaded if requested)
+        """
+        if self._raw_data is None:
+            with open(self._source_path, 'r') as in_file:
+                self._raw_data = json.load(in_file)
+        return self._raw_data
+
+    @property
+    def file_id_values(self):
+        """
+        List of valid file_id values
+        """
+        if self._file_id_values_list is None:
+            values = self._index._file_names(self._key, 'data')
+            values.sort()
+            self._file_id_values_list = values
+        return self._file_id_values_list
+
+    def metadata_file_attributes(
+        self,
+        metadata_file_name: str
+    ) -> CacheFileAttributes:
+        """
+        Return the CacheFileAttributes associated with a metadata file
+
+        Parameters
+        ----------
+        metadata_file_name: str
+            Name of the metadata file. Must be in self.metadata_file_names
+
+        Return
+        ------
+        CacheFileAttributes
+
+        Raises
+        ------
+        ValueError
+            If the metadata_file_name is not a valid option
+        """
+        attributes = None
+        if isinstance(metadata_file_name, str):
+            attributes = self._index._file_attributes(
+                self._key, 'metadata', metadata_file_name)
+        if attributes is None:
+            raise ValueError(f"{metadata_file_name}\n"
+                             "is not in self.metadata_file_names:\n"
+                             f"{self._metadata_file_names}")
+        return attributes
+
+    def data_file_attributes(self, file_id) -> CacheFileAttributes:
+        """
+        Return the CacheFileAttributes associated with a data file
+
+        Parameters
+        ----------
+        file_id:
+            The identifier of the data file whose attributes are to be
+            returned. Must be one of self.file_id_values
+
+        Return
+        ------
+        CacheFileAttributes
+
+        Raises
+        ------
+        ValueError
+            If the file_id is not a valid option
+        """
+        attributes = None
+        # keys of a JSON object are always str
+        if isinstance(file_id, str):
+            attributes = self._index._file_attributes(
+                self._key, 'data', file_id)
+        if attributes is None:
+            raise ValueError(f"file_id: {file_id}\n"
+                             "Is not a data file listed in manifest:\n"
+                             f"{self.file_id_values}")
+        return attributes
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import xarray as xr
 from pynwb import NWBFile
 
 from allensdk.brain_observatory.behavior.behavior_session import BehaviorSession  # NOQA
@@ -16,6 +17,7 @@ from allensdk.brain_observatory.behavior.data_objects.projections import Project
 from allensdk.brain_observatory.behavior.data_objects.stimuli.util import calculate_monitor_delay  # NOQA
 from allensdk.brain_observatory.behavior.data_objects.timestamps.ophys_timestamps import OphysTimestamps, OphysTimestampsMultiplane  # NOQA
 from allensdk.brain_observatory.behavior.image_api import Image
+from allensdk.core import LazyAttribute, LazyLoader, get_unloaded
 from allensdk.core.auth_config import LIMS_DB_CREDENTIAL_MAP
 from allensdk.deprecated import legacy
 from allensdk.internal.api import db_connection_creator
@@ -26,6 +28,11 @@ class BehaviorOphysExperiment(BehaviorSession):
     Initialize by using class methods `from_lims` or `from_nwb_path`.
     """
 
+    # Data which may be read from NWB on first access (see from_nwb)
+    _projections = LazyAttribute()
+    _cell_specimens = LazyAttribute()
+    _motion_correction = LazyAttribute()
+
     def __init__(self,
                  behavior_session: BehaviorSession,
                  projections: Projections,
@@ -34,23 +41,25 @@ class BehaviorOphysExperiment(BehaviorSession):
                  metadata: BehaviorOphysMetadata,
                  motion_correction: MotionCorrection,
                  date_of_acquisition: DateOfAcquisition):
+        def _get(name):
+            # do not trigger loading of lazily loaded data
+            return get_unloaded(behavior_session, name)
+
         super().__init__(
             behavior_session_id=behavior_session._behavior_session_id,
-            licks=behavior_session._licks,
+            licks=_get('_licks'),
             metadata=behavior_session._metadata,
-            raw_running_speed=behavior_session._raw_running_speed,
-            rewards=behavior_session._rewards,
-            running_speed=behavior_session._running_speed,
-            running_acquisition=behavior_session._running_acquisition,
-            stimuli=behavior_session._stimuli,
-            stimulus_timestamps=behavior_session._stimulus_timestamps,
-            task_parameters=behavior_session._task_parameters,
-            trials=behavior_session._trials,
+            raw_running_speed=_get('_raw_running_speed'),
+            rewards=_get('_rewards'),
+            running_speed=_get('_running_speed'),
+            running_acquisition=_get('_running_acquisition'),
+            stimuli=_get('_stimuli'),
+            stimulus_timestamps=_get('_stimulus_timestamps'),
+            task_parameters=_get('_task_parameters'),
+            trials=_get('_trials'),
             date_of_acquisition=date_of_acquisition,
-            eye_tracking_rig_geometry=(
-                behavior_session._eye_tracking_rig_geometry),
-            eye_tracking_table=behavior_session._eye_tracking
-
+            eye_tracking_rig_geometry=_get('_eye_tracking_rig_geometry'),
+            eye_tracking_table=_get('_eye_tracking')
         )
 
         self._metadata = metadata
@@ -179,7 +188,8 @@ class BehaviorOphysExperiment(BehaviorSession):
                  eye_tracking_dilation_frames: int = 2,
                  events_filter_scale_seconds: float = 2.0/31.0,
                  events_filter_n_time_steps: int = 20,
-                 exclude_invalid_rois=True
+                 exclude_invalid_rois=True,
+                 lazy: bool = False
                  ) -> "BehaviorOphysExperiment":
         """
 
@@ -203,25 +213,48 @@ class BehaviorOphysExperiment(BehaviorSession):
             Number of time steps to use for convolution of ophys events
         exclude_invalid_rois
             Whether to exclude invalid rois
+        lazy : bool, optional
+            If True, only the experiment's metadata and ophys timestamps
+            are read now. Everything else (ie the projections, cell
+            specimens and their traces, motion correction and the
+            behavior data) is read from nwbfile the first time it is
+            accessed, so nwbfile must remain open until then.
+            By default False
         """
+        def _load(func, **kwargs):
+            if lazy:
+                return LazyLoader(lambda: func(**kwargs))
+            return func(**kwargs)
+
+        def _get_cell_specimens(projections: Projections):
+            return CellSpecimens.from_nwb(
+                nwbfile=nwbfile,
+                segmentation_mask_image_spacing=(
+                    projections.max_projection.spacing),
+                events_params=EventsParams(
+                    filter_scale_seconds=events_filter_scale_seconds,
+                    filter_n_time_steps=events_filter_n_time_steps
+                ),
+                exclude_invalid_rois=exclude_invalid_rois,
+                lazy=lazy
+            )
+
         def _is_multi_plane_session():
             imaging_plane_group_meta = ImagingPlaneGroup.from_nwb(
                 nwbfile=nwbfile)
             return cls._is_multi_plane_session(
                 imaging_plane_group_meta=imaging_plane_group_meta)
 
-        behavior_session = BehaviorSession.from_nwb(nwbfile=nwbfile)
-        projections = Projections.from_nwb(nwbfile=nwbfile)
-        cell_specimens = CellSpecimens.from_nwb(
-            nwbfile=nwbfile,
-            segmentation_mask_image_spacing=projections.max_projection.spacing,
-            events_params=EventsParams(
-                filter_scale_seconds=events_filter_scale_seconds,
-                filter_n_time_steps=events_filter_n_time_steps
-            ),
-            exclude_invalid_rois=exclude_invalid_rois
-        )
-        motion_correction = MotionCorrection.from_nwb(nwbfile=nwbfile)
+        behavior_session = BehaviorSession.from_nwb(nwbfile=nwbfile,
+                                                    lazy=lazy)
+        projections = _load(Projections.from_nwb, nwbfile=nwbfile)
+        if lazy:
+            # shares the projections of the experiment, once loaded
+            cell_specimens = LazyLoader(
+                lambda: _get_cell_specimens(experiment._projections))
+        else:
+            cell_specimens = _get_cell_specimens(projections)
+        motion_correction = _load(MotionCorrection.from_nwb, nwbfile=nwbfile)
         is_multiplane_session = _is_multi_plane_session()
         metadata = BehaviorOphysMetadata.from_nwb(
             nwbfile=nwbfile, is_multiplane=is_multiplane_session)
@@ -232,7 +265,7 @@ class BehaviorOphysExperiment(BehaviorSession):
             ophys_timestamps = OphysTimestamps.from_nwb(nwbfile=nwbfile)
         date_of_acquisition = DateOfAcquisitionOphys.from_nwb(nwbfile=nwbfile)
 
-        return BehaviorOphysExperiment(
+        experiment = BehaviorOphysExperiment(
             behavior_session=behavior_session,
             cell_specimens=cell_specimens,
             motion_correction=motion_correction,
@@ -241,6 +274,7 @@ class BehaviorOphysExperiment(BehaviorSession):
             projections=projections,
             date_of_acquisition=date_of_acquisition
         )
+        return experiment
 
     @classmethod
     def from_json(cls,
@@ -346,12 +380,9 @@ class BehaviorOphysExperiment(BehaviorSession):
         if cell_specimen_ids is None:
             cell_specimen_ids = self.get_cell_specimen_ids()
 
-        csid_table = \
-            self.cell_specimen_table.reset_index()[['cell_specimen_id']]
-        csid_subtable = csid_table[csid_table['cell_specimen_id'].isin(
-            cell_specimen_ids)].set_index('cell_specimen_id')
-        dff_table = csid_subtable.join(self.dff_traces, how='left')
-        dff_traces = np.vstack(dff_table['dff'].values)
+        dff = self.get_trace_array('dff_traces')
+        dff_traces = dff.values[np.isin(dff['cell_specimen_id'].values,
+                                        cell_specimen_ids)]
         timestamps = self.ophys_timestamps
 
         assert (len(cell_specimen_ids), len(timestamps)) == dff_traces.shape
@@ -359,15 +390,17 @@ class BehaviorOphysExperiment(BehaviorSession):
 
     @legacy()
     def get_cell_specimen_indices(self, cell_specimen_ids):
-        return [self.cell_specimen_table.index.get_loc(csid)
+        table = self.get_cell_specimen_table(dense_roi_masks=False)
+        return [table.index.get_loc(csid)
                 for csid in cell_specimen_ids]
 
     @legacy("Consider using cell_specimen_table['cell_specimen_id'] instead.")
     def get_cell_specimen_ids(self):
-        cell_specimen_ids = self.cell_specimen_table.index.values
+        cell_specimen_ids = self.get_cell_specimen_table(
+            dense_roi_masks=False).index.values
 
         if np.isnan(cell_specimen_ids.astype(float)).sum() == \
-                len(self.cell_specimen_table):
+                len(cell_specimen_ids):
             raise ValueError("cell_specimen_id values not assigned "
                              f"for {self.ophys_experiment_id}")
         return cell_specimen_ids
@@ -474,6 +507,34 @@ class BehaviorOphysExperiment(BehaviorSession):
         """
         return self._cell_specimens.dff_traces
 
+    def get_trace_array(self, trace_type: str = 'dff_traces'
+                        ) -> xr.DataArray:
+        """Traces of one type for all cells, as a (cell x time) array
+        backed by the same memory as the traces themselves. Use this rather
+        than the trace dataframes (ie dff_traces) to avoid copying the
+        traces, ie `experiment.get_trace_array('dff_traces').values` is a
+        (cell x time) numpy array.
+
+        Parameters
+        ----------
+        trace_type
+            One of 'dff_traces', 'demixed_traces', 'neuropil_traces' or
+            'corrected_fluorescence_traces'
+
+        Returns
+        -------
+        xr.DataArray
+            dims:
+                cell_specimen_id: (int)
+                    in the order of the cell_specimen_table
+                time: (float)
+                    ophys timestamps
+            coords:
+                cell_roi_id: (int) along cell_specimen_id
+            None if the traces are not available
+        """
+        return self._cell_specimens.get_trace_array(trace_type)
+
     @property
     def events(self) -> pd.DataFrame:
         """A dataframe containing spiking events in traces derived
@@ -552,7 +613,27 @@ class BehaviorOphysExperiment(BehaviorSession):
                     y position of ROI in field of view in pixels (top
                     left corner)
         """
-        return self._cell_specimens.table
+        return self._cell_specimens.get_table(dense_roi_masks=True)
+
+    def get_cell_specimen_table(self, dense_roi_masks: bool = True
+                                ) -> pd.DataFrame:
+        """The cell specimen table (see cell_specimen_table)
+
+        Parameters
+        ----------
+        dense_roi_masks
+            If True (as in cell_specimen_table), each roi_mask is a full
+            field of view boolean array. Otherwise, each roi_mask is a
+            allensdk.brain_observatory.roi_masks.SparseMask (the mask's
+            bounding box and packed pixels), which can be converted to a
+            full field of view array with to_dense()
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        return self._cell_specimens.get_table(
+            dense_roi_masks=dense_roi_masks)
 
     @property
     def corrected_fluorescence_traces(self) -> pd.DataFrame:
@@ -654,7 +735,7 @@ class BehaviorOphysExperiment(BehaviorSession):
 
     @property
     def roi_masks(self) -> pd.DataFrame:
-        return self.cell_specimen_table[['cell_roi_id', 'roi_mask']]
+        return self._cell_specimens.roi_masks
 
     def _get_identifier(self) -> str:
         return str(self.ophys_experiment_id)
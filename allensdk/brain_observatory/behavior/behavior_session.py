@@ -71,6 +71,8 @@ from allensdk.brain_observatory.sync_dataset import Dataset as SyncDataset
 from allensdk.core import (
     DataObject,
     JsonReadableInterface,
+    LazyAttribute,
+    LazyLoader,
     LimsReadableInterface,
     NwbReadableInterface,
     NwbWritableInterface,
@@ -91,6 +93,19 @@ class BehaviorSession(
     Initialize by using class methods `from_lims` or `from_nwb_path`.
     """
 
+    # Data which may be read from NWB on first access (see from_nwb)
+    _stimulus_timestamps = LazyAttribute()
+    _running_acquisition = LazyAttribute()
+    _raw_running_speed = LazyAttribute()
+    _running_speed = LazyAttribute()
+    _licks = LazyAttribute()
+    _rewards = LazyAttribute()
+    _stimuli = LazyAttribute()
+    _task_parameters = LazyAttribute()
+    _trials = LazyAttribute()
+    _eye_tracking = LazyAttribute()
+    _eye_tracking_rig_geometry = LazyAttribute()
+
     def __init__(
         self,
         behavior_session_id: BehaviorSessionId,
@@ -127,6 +142,9 @@ class BehaviorSession(
         self._eye_tracking = eye_tracking_table
         self._eye_tracking_rig_geometry = eye_tracking_rig_geometry
 
+        # The open NWB file from which lazily loaded data are read
+        self._nwb_io = None
+
     # ==================== class and utility methods ======================
 
     @classmethod
@@ -507,6 +525,7 @@ class BehaviorSession(
         add_is_change_to_stimulus_presentations_table=True,
         eye_tracking_z_threshold: float = 3.0,
         eye_tracking_dilation_frames: int = 2,
+        lazy: bool = False,
     ) -> "BehaviorSession":
         """
 
@@ -524,49 +543,64 @@ class BehaviorSession(
             Determines the number of adjacent frames that will be marked
             as 'likely_blink' when performing blink detection for
             `eye_tracking` data, by default 2
+        lazy : bool, optional
+            If True, only the session's id, metadata and date of
+            acquisition are read now. Everything else is read from nwbfile
+            the first time it is accessed, so nwbfile must remain open
+            until then. By default False
 
         Returns
         -------
 
         """
+        def _load(func, *args, **kwargs):
+            if lazy:
+                return LazyLoader(lambda: func(*args, **kwargs))
+            return func(*args, **kwargs)
+
+        def _get_eye_tracking_rig_geometry():
+            with warnings.catch_warnings():
+                warnings.filterwarnings(
+                    action="ignore",
+                    message="This nwb file with identifier ",
+                    category=UserWarning,
+                )
+                return EyeTrackingRigGeometry.from_nwb(nwbfile=nwbfile)
+
+        def _get_eye_tracking_table():
+            with warnings.catch_warnings():
+                warnings.filterwarnings(
+                    action="ignore",
+                    message="This nwb file with identifier ",
+                    category=UserWarning,
+                )
+                return EyeTrackingTable.from_nwb(
+                    nwbfile=nwbfile,
+                    z_threshold=eye_tracking_z_threshold,
+                    dilation_frames=eye_tracking_dilation_frames,
+                )
+
         behavior_session_id = BehaviorSessionId.from_nwb(nwbfile)
-        stimulus_timestamps = StimulusTimestamps.from_nwb(nwbfile)
-        running_acquisition = RunningAcquisition.from_nwb(nwbfile)
-        raw_running_speed = RunningSpeed.from_nwb(nwbfile, filtered=False)
-        running_speed = RunningSpeed.from_nwb(nwbfile)
+        stimulus_timestamps = _load(StimulusTimestamps.from_nwb, nwbfile)
+        running_acquisition = _load(RunningAcquisition.from_nwb, nwbfile)
+        raw_running_speed = _load(RunningSpeed.from_nwb, nwbfile,
+                                  filtered=False)
+        running_speed = _load(RunningSpeed.from_nwb, nwbfile)
         metadata = BehaviorMetadata.from_nwb(nwbfile)
-        licks = Licks.from_nwb(nwbfile=nwbfile)
-        rewards = Rewards.from_nwb(nwbfile=nwbfile)
-        stimuli = Stimuli.from_nwb(
+        licks = _load(Licks.from_nwb, nwbfile=nwbfile)
+        rewards = _load(Rewards.from_nwb, nwbfile=nwbfile)
+        stimuli = _load(
+            Stimuli.from_nwb,
             nwbfile=nwbfile,
             add_is_change_to_presentations_table=(
                 add_is_change_to_stimulus_presentations_table
             ),
         )
-        task_parameters = TaskParameters.from_nwb(nwbfile=nwbfile)
-        trials = cls._trials_class().from_nwb(nwbfile=nwbfile)
+        task_parameters = _load(TaskParameters.from_nwb, nwbfile=nwbfile)
+        trials = _load(cls._trials_class().from_nwb, nwbfile=nwbfile)
         date_of_acquisition = DateOfAcquisition.from_nwb(nwbfile=nwbfile)
-
-        with warnings.catch_warnings():
-            warnings.filterwarnings(
-                action="ignore",
-                message="This nwb file with identifier ",
-                category=UserWarning,
-            )
-            eye_tracking_rig_geometry = EyeTrackingRigGeometry.from_nwb(
-                nwbfile=nwbfile
-            )
-        with warnings.catch_warnings():
-            warnings.filterwarnings(
-                action="ignore",
-                message="This nwb file with identifier ",
-                category=UserWarning,
-            )
-            eye_tracking_table = EyeTrackingTable.from_nwb(
-                nwbfile=nwbfile,
-                z_threshold=eye_tracking_z_threshold,
-                dilation_frames=eye_tracking_dilation_frames,
-            )
+        eye_tracking_rig_geometry = _load(_get_eye_tracking_rig_geometry)
+        eye_tracking_table = _load(_get_eye_tracking_table)
 
         return cls(
             behavior_session_id=behavior_session_id,
@@ -594,16 +628,48 @@ class BehaviorSession(
         nwb_path
             Path to nwb file
         kwargs
-            Kwargs to be passed to `from_nwb`
+            Kwargs to be passed to `from_nwb`. If lazy=True, the nwb file
+            is kept open and its data are read as they are first accessed.
+            A lazy session must then be closed (see `close`), e.g. by
+            using it as a context manager:
+
+                with BehaviorSession.from_nwb_path(path, lazy=True) as s:
+                    licks = s.licks
 
         Returns
         -------
         An instantiation of a `BehaviorSession`
         """
         nwb_path = str(nwb_path)
-        with pynwb.NWBHDF5IO(nwb_path, "r", load_namespaces=True) as read_io:
+        if not kwargs.get("lazy", False):
+            with pynwb.NWBHDF5IO(
+                    nwb_path, "r", load_namespaces=True) as read_io:
+                nwbfile = read_io.read()
+                return cls.from_nwb(nwbfile=nwbfile, **kwargs)
+
+        read_io = pynwb.NWBHDF5IO(nwb_path, "r", load_namespaces=True)
+        try:
             nwbfile = read_io.read()
-            return cls.from_nwb(nwbfile=nwbfile, **kwargs)
+            session = cls.from_nwb(nwbfile=nwbfile, **kwargs)
+        except Exception:
+            read_io.close()
+            raise
+        session._nwb_io = read_io
+        return session
+
+    def close(self):
+        """Closes the nwb file from which a session loaded with
+        `from_nwb_path(..., lazy=True)` reads its data. Data which have
+        not been accessed can no longer be read once it is closed."""
+        if self._nwb_io is not None:
+            self._nwb_io.close()
+            self._nwb_io = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def to_nwb(
         self,
@@ -679,6 +745,7 @@ class BehaviorSession(
             to get data.
         """
         attrs_and_methods_to_ignore: set = {
+            "close",
             "from_json",
             "from_lims",
             "from_nwb_path",
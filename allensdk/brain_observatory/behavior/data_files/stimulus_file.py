@@ -1,5 +1,6 @@
 import abc
-from typing import Dict, Union, Tuple
+import os
+from typing import Dict, Optional, Union, Tuple
 from pathlib import Path
 
 from cachetools import cached, LRUCache
@@ -14,6 +15,8 @@ from allensdk.internal.core import DataFile
 from allensdk.core import DataObject
 from allensdk.core.pickle_utils import (
     load_and_sanitize_pickle)
+from allensdk.brain_observatory.behavior.data_files.stimulus_file_cache \
+    import STIMULUS_CACHE_DIR_ENV, load_cached
 
 # Query returns path to StimulusPickle file for given behavior session
 BEHAVIOR_STIMULUS_FILE_QUERY_TEMPLATE = """
@@ -46,6 +49,13 @@ class _StimulusFile(DataFile):
     This file type contains a number of parameters collected during a behavior
     session including information about stimulus presentations, rewards,
     trials, and timing for all of the above.
+
+    Decoding a large pickle is slow, so its contents can be cached in a
+    columnar sidecar store (see stimulus_file_cache) from which later loads
+    only read the entries they use. The cache is kept in cache_dir or, if
+    that is not given, in the directory named by the
+    ALLENSDK_STIMULUS_FILE_CACHE_DIR environment variable. Without either,
+    the pickle is read directly.
     """
 
     @classmethod
@@ -56,8 +66,9 @@ class _StimulusFile(DataFile):
         """
         raise NotImplementedError()
 
-    def __init__(self, filepath: Union[str, Path]):
-        super().__init__(filepath=filepath)
+    def __init__(self, filepath: Union[str, Path],
+                 cache_dir: Optional[Union[str, Path]] = None):
+        super().__init__(filepath=filepath, cache_dir=cache_dir)
 
     @classmethod
     def from_json(cls, dict_repr: dict) -> "_StimulusFile":
@@ -78,9 +89,14 @@ class _StimulusFile(DataFile):
         raise NotImplementedError()
 
     @staticmethod
-    def load_data(filepath: Union[str, Path]) -> dict:
+    def load_data(filepath: Union[str, Path],
+                  cache_dir: Optional[Union[str, Path]] = None) -> dict:
         filepath = safe_system_path(file_name=filepath)
-        return load_and_sanitize_pickle(pickle_path=filepath)
+        if cache_dir is None:
+            cache_dir = os.environ.get(STIMULUS_CACHE_DIR_ENV)
+        if cache_dir is None:
+            return load_and_sanitize_pickle(pickle_path=filepath)
+        return load_cached(pickle_path=filepath, cache_dir=cache_dir)
 
     @property
     def num_frames(self) -> int:
@@ -91,8 +107,9 @@ class _StimulusFile(DataFile):
 
 
 class BehaviorStimulusFile(_StimulusFile):
-    def __init__(self, filepath: Union[str, Path]):
-        super().__init__(filepath=filepath)
+    def __init__(self, filepath: Union[str, Path],
+                 cache_dir: Optional[Union[str, Path]] = None):
+        super().__init__(filepath=filepath, cache_dir=cache_dir)
 
     @classmethod
     def file_path_key(cls) -> str:
@@ -0,0 +1,343 @@
+"""
+Sidecar cache of the sanitized contents of stimulus pickle files.
+
+A stimulus pickle is converted once into a directory holding one pickle per
+entry of the top level dict, of its ``items`` dict and of each
+``items/<name>`` dict (e.g. ``items/behavior/trial_log``), with large
+numeric arrays and lists stored alongside as ``.npy`` files. Reading the
+cache returns dicts which only load an entry when it is first accessed, with
+arrays memory-mapped (copy on write), so that code which reads a few entries
+of a multi-hundred MB pickle does not pay for decoding all of it.
+
+Caches are keyed by the hash of the pickle file, so a changed pickle gets a
+new cache rather than stale data.
+"""
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from collections.abc import ItemsView, ValuesView
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from allensdk.api.cloud_cache.utils import file_hash_from_path
+from allensdk.core.pickle_utils import load_and_sanitize_pickle
+
+# increment when the layout of saved caches changes
+STIMULUS_CACHE_VERSION = 1
+
+# environment variable naming the default cache directory of stimulus files
+STIMULUS_CACHE_DIR_ENV = "ALLENSDK_STIMULUS_FILE_CACHE_DIR"
+
+# arrays and numeric lists with at least this many elements are stored as
+# .npy files rather than pickled
+MIN_ARRAY_SIZE = 1024
+
+MANIFEST_NAME = "manifest.json"
+
+
+def stimulus_cache_path(cache_dir: Union[str, Path],
+                        file_hash: str) -> Path:
+    """ Path of the cache of the stimulus file with hash file_hash """
+    return Path(cache_dir) / f"{file_hash}.stimulus_cache"
+
+
+def load_cached(pickle_path: Union[str, Path],
+                cache_dir: Union[str, Path]) -> Any:
+    """
+    Load the contents of a stimulus pickle through its sidecar cache
+
+    Parameters
+    ----------
+    pickle_path : str or Path
+        Path to the stimulus pickle
+    cache_dir : str or Path
+        Directory in which caches are saved
+
+    Returns
+    -------
+    The contents of the pickle. If they are a dict, entries are loaded
+    lazily (see read_stimulus_cache).
+    """
+    file_hash = file_hash_from_path(pickle_path)
+    cache_path = stimulus_cache_path(cache_dir, file_hash)
+
+    data = read_stimulus_cache(cache_path, file_hash)
+    if data is None:
+        data = load_and_sanitize_pickle(pickle_path=pickle_path)
+        if isinstance(data, dict):
+            write_stimulus_cache(data, cache_path, file_hash)
+    return data
+
+
+def write_stimulus_cache(data: dict, cache_path: Union[str, Path],
+                         file_hash: str):
+    """
+    Write the (sanitized) contents of a stimulus pickle to a cache
+    directory, atomically
+
+    Parameters
+    ----------
+    data : dict
+        Contents of the stimulus pickle
+    cache_path : str or Path
+        Directory to write. If it already exists it is left as is.
+    file_hash : str
+        Hash of the pickle file data was loaded from
+
+    Notes
+    -----
+    Entries are pickled separately, so an object referenced from two
+    entries is loaded as two copies.
+    """
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=cache_path.parent))
+    try:
+        writer = _EntryWriter(tmp_dir)
+        manifest = {
+            "version": STIMULUS_CACHE_VERSION,
+            "file_hash": file_hash,
+            "tree": writer.write_dict(data, depth=0)
+        }
+        with open(tmp_dir / MANIFEST_NAME, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        try:
+            os.replace(tmp_dir, cache_path)
+        except OSError:
+            # written concurrently by another process
+            if not (cache_path / MANIFEST_NAME).exists():
+                raise
+            shutil.rmtree(tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_stimulus_cache(cache_path: Union[str, Path],
+                        file_hash: str) -> Optional[dict]:
+    """
+    Read a cache written by write_stimulus_cache
+
+    Parameters
+    ----------
+    cache_path : str or Path
+        Cache directory
+    file_hash : str
+        Hash of the pickle file the cache should have been written for
+
+    Returns
+    -------
+    LazyStimulusDict, or None if the cache does not exist or was written
+    for another file or by another version
+    """
+    cache_path = Path(cache_path)
+    manifest_path = cache_path / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest["version"] != STIMULUS_CACHE_VERSION or \
+            manifest["file_hash"] != file_hash:
+        return None
+    return _lazy_dict(cache_path, manifest["tree"])
+
+
+class LazyStimulusDict(dict):
+    """
+    A dict whose values are loaded from a stimulus cache on first access.
+
+    All reads (indexing, get, items, values, iteration over items,
+    comparison, copying and pickling) see the loaded values.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, _DeferredEntry):
+            value = value.load()
+            super().__setitem__(key, value)
+        return value
+
+    def __iter__(self):
+        # defined so that dict(self) and {**self} go through __getitem__
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return super().pop(key, *default)
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self.keys()))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyStimulusDict):
+            other = other.copy()
+        return self.copy() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+class _DeferredEntry(object):
+    """ An entry of a stimulus cache, not loaded yet """
+
+    __slots__ = ("cache_path", "name")
+
+    def __init__(self, cache_path: Path, name: str):
+        self.cache_path = cache_path
+        self.name = name
+
+    def load(self) -> Any:
+        with open(self.cache_path / self.name, "rb") as entry_file:
+            return _EntryUnpickler(entry_file, self.cache_path).load()
+
+
+def _lazy_dict(cache_path: Path, tree: list) -> LazyStimulusDict:
+    """ Build the lazy dict described by a node of a cache manifest """
+    data = LazyStimulusDict()
+    for key, node in tree:
+        if isinstance(node, list):
+            data[key] = _lazy_dict(cache_path, node)
+        else:
+            data[key] = _DeferredEntry(cache_path, node)
+    return data
+
+
+def _descend(key: Any, value: Any, depth: int) -> bool:
+    """ Whether the value at key of a dict at depth gets its own node in the
+    manifest, with an entry per key: this is the case for the items dict and
+    each items/<name> dict """
+    if not (depth == 0 and key == "items" or depth == 1):
+        return False
+    return type(value) is dict and all(isinstance(k, str) for k in value)
+
+
+class _EntryWriter(object):
+    """ Writes the entries of a stimulus cache into a directory """
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.n_entries = 0
+        self.n_arrays = 0
+
+    def write_dict(self, data: dict, depth: int) -> list:
+        """ Write the entries of data, returning its manifest node, a list
+        of (key, file name or node) """
+        tree = []
+        for key, value in data.items():
+            if _descend(key, value, depth):
+                tree.append([key, self.write_dict(value, depth + 1)])
+            else:
+                tree.append([key, self.write_entry(value)])
+        return tree
+
+    def write_entry(self, value: Any) -> str:
+        name = f"entry_{self.n_entries}.pkl"
+        self.n_entries += 1
+        with open(self.cache_path / name, "wb") as entry_file:
+            _EntryPickler(entry_file, self).dump(value)
+        return name
+
+    def write_array(self, array: np.ndarray) -> str:
+        name = f"array_{self.n_arrays}.npy"
+        self.n_arrays += 1
+        np.save(self.cache_path / name, array, allow_pickle=False)
+        return name
+
+
+class _EntryPickler(pickle.Pickler):
+    """ Pickles an entry, saving large numeric arrays and lists as .npy
+    files referenced by persistent id """
+
+    def __init__(self, file, writer: _EntryWriter):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.writer = writer
+        self.saved = {}
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray:
+            if obj.size < MIN_ARRAY_SIZE or obj.dtype.hasobject:
+                return None
+            kind = "array"
+        elif type(obj) is list:
+            if len(obj) < MIN_ARRAY_SIZE:
+                return None
+            kind = _numeric_list_kind(obj)
+            if kind is None:
+                return None
+        else:
+            return None
+
+        # objects referenced more than once in an entry are saved once
+        if id(obj) not in self.saved:
+            array = obj if kind == "array" else np.array(obj, dtype=kind)
+            self.saved[id(obj)] = (obj, (kind,
+                                         self.writer.write_array(array)))
+        return self.saved[id(obj)][1]
+
+
+def _numeric_list_kind(values: list) -> Optional[str]:
+    """ The dtype with which a list of python floats or of python ints is
+    stored exactly, or None for other lists """
+    first_type = type(values[0])
+    if first_type is float:
+        if all(type(value) is float for value in values):
+            return "float64"
+    elif first_type is int:
+        if all(type(value) is int for value in values) and \
+                -2 ** 63 <= min(values) and max(values) < 2 ** 63:
+            return "int64"
+    return None
+
+
+class _EntryUnpickler(pickle.Unpickler):
+    """ Unpickles an entry written by _EntryPickler """
+
+    def __init__(self, file, cache_path: Path):
+        super().__init__(file)
+        self.cache_path = cache_path
+        self.loaded: Dict[str, Any] = {}
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if name not in self.loaded:
+            if kind == "array":
+                value = np.load(self.cache_path / name, mmap_mode="c")
+            else:
+                value = np.load(self.cache_path / name).tolist()
+            self.loaded[name] = value
+        return self.loaded[name]
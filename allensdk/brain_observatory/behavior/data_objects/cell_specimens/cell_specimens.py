@@ -2,6 +2,7 @@ from typing import Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import xarray as xr
 from pynwb import NWBFile, ProcessingModule
 from pynwb.ophys import OpticalChannel, ImageSegmentation
 
@@ -18,6 +19,8 @@ from allensdk.brain_observatory.behavior.data_files.event_detection_file \
 from allensdk.core import DataObject
 from allensdk.core import (
     JsonReadableInterface,
+    LazyAttribute,
+    LazyLoader,
     LimsReadableInterface,
     NwbReadableInterface,
 )
@@ -32,6 +35,8 @@ from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
     .neuropil_traces import NeuropilTraces
 from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
     .dff_traces import DFFTraces
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .traces_mixin import TracesMixin
 from allensdk.brain_observatory.behavior.data_objects.metadata\
     .ophys_experiment_metadata.field_of_view_shape import FieldOfViewShape
 from allensdk.brain_observatory.behavior.data_objects.metadata\
@@ -140,6 +145,14 @@ class CellSpecimens(
     NwbReadableInterface,
     NwbWritableInterface,
 ):
+    # Data which may be read from NWB on first access (see from_nwb)
+    _dff_traces = LazyAttribute()
+    _ophys_timestamps = LazyAttribute()
+    _demixed_traces = LazyAttribute()
+    _neuropil_traces = LazyAttribute()
+    _corrected_fluorescence_traces = LazyAttribute()
+    _events = LazyAttribute()
+
     def __init__(
         self,
         cell_specimen_table: pd.DataFrame,
@@ -168,7 +181,7 @@ class CellSpecimens(
                 - max_correction_left
                 - max_correction_right
                 - max_correction_up
-                - roi_mask
+                - roi_mask (full frame array, or roi_masks.SparseMask)
                 - valid_roi
                 - width
                 - x
@@ -184,73 +197,122 @@ class CellSpecimens(
             Spacing to pass to sitk when constructing segmentation mask image
         exclude_invalid_rois
             Whether to exclude invalid rois
+
+        Notes
+        -----
+        Traces and events may be given as LazyLoaders, in which case they
+        are validated and filtered when they are first accessed.
+        ROI masks are stored as roi_masks.SparseMask; full frame arrays
+        are only built when requested (see get_table and roi_masks)
         """
         super().__init__(
             name="cell_specimen_table", value=None, is_value_self=True
         )
 
-        # Validate ophys timestamps, traces
-        ophys_timestamps = ophys_timestamps.validate(
-            number_of_frames=dff_traces.get_number_of_frames()
-        )
-        self._validate_traces(
-            ophys_timestamps=ophys_timestamps,
-            dff_traces=dff_traces,
-            demixed_traces=demixed_traces,
-            neuropil_traces=neuropil_traces,
-            corrected_fluorescence_traces=corrected_fluorescence_traces,
-            cell_roi_ids=cell_specimen_table["cell_roi_id"].values,
-        )
-
+        cell_specimen_table = self._to_sparse_roi_masks(
+            cell_specimen_table=cell_specimen_table)
+        all_cell_roi_ids = cell_specimen_table["cell_roi_id"].values
         if exclude_invalid_rois:
             cell_specimen_table = cell_specimen_table[
                 cell_specimen_table["valid_roi"]
             ]
-
-        # Filter/reorder rois according to cell_specimen_table
-        if dff_traces is not None:
-            dff_traces.filter_and_reorder(
-                roi_ids=cell_specimen_table["cell_roi_id"].values
-            )
-        if demixed_traces is not None:
-            demixed_traces.filter_and_reorder(
-                roi_ids=cell_specimen_table["cell_roi_id"].values
+        cell_roi_ids = cell_specimen_table["cell_roi_id"].values
+
+        def _validate_and_filter(traces, timestamps):
+            # Validate traces, then filter/reorder rois according to
+            # cell_specimen_table
+            self._validate_traces(
+                ophys_timestamps=timestamps,
+                traces=traces,
+                cell_roi_ids=all_cell_roi_ids,
             )
-        if neuropil_traces is not None:
-            neuropil_traces.filter_and_reorder(
-                roi_ids=cell_specimen_table["cell_roi_id"].values
-            )
-        corrected_fluorescence_traces.filter_and_reorder(
-            roi_ids=cell_specimen_table["cell_roi_id"].values
-        )
+            traces.filter_and_reorder(roi_ids=cell_roi_ids)
+            return traces
 
-        # Note: setting raise_if_rois_missing to False for events, since
-        # there seem to be cases where cell_specimen_table contains rois not in
-        # events
-        # See ie https://app.zenhub.com/workspaces/allensdk-10-5c17f74db59cfb36f158db8c/issues/alleninstitute/allensdk/2139     # noqa
-        events.filter_and_reorder(
-            roi_ids=cell_specimen_table["cell_roi_id"].values,
-            raise_if_rois_missing=False,
-        )
+        def _prepare_dff_traces(traces):
+            # dff traces determine the number of ophys timestamps
+            if traces is None:
+                return None
+            ophys_timestamps.validate(
+                number_of_frames=traces.get_number_of_frames())
+            return _validate_and_filter(traces, ophys_timestamps)
+
+        def _prepare_traces(traces):
+            # Other traces are validated against the ophys timestamps once
+            # the dff traces have trimmed them
+            if traces is None:
+                return None
+            return _validate_and_filter(traces, self._ophys_timestamps)
+
+        def _trimmed_ophys_timestamps():
+            # loading the dff traces trims the timestamps
+            self._dff_traces
+            return ophys_timestamps
+
+        def _prepare_events(events):
+            # Note: setting raise_if_rois_missing to False for events, since
+            # there seem to be cases where cell_specimen_table contains rois
+            # not in events
+            # See ie https://app.zenhub.com/workspaces/allensdk-10-5c17f74db59cfb36f158db8c/issues/alleninstitute/allensdk/2139     # noqa
+            events.filter_and_reorder(
+                roi_ids=cell_roi_ids,
+                raise_if_rois_missing=False,
+            )
+            return events
+
+        def _prepare(value, prepare):
+            # Data which are loaded lazily are prepared once loaded
+            if isinstance(value, LazyLoader):
+                return value.then(prepare)
+            return prepare(value)
+
+        self._dff_traces = _prepare(dff_traces, _prepare_dff_traces)
+        # Loading the ophys timestamps loads the dff traces, so that they
+        # are only ever seen trimmed
+        if isinstance(dff_traces, LazyLoader):
+            self._ophys_timestamps = LazyLoader(_trimmed_ophys_timestamps)
+        else:
+            self._ophys_timestamps = ophys_timestamps
+        self._demixed_traces = _prepare(demixed_traces, _prepare_traces)
+        self._neuropil_traces = _prepare(neuropil_traces, _prepare_traces)
+        self._corrected_fluorescence_traces = _prepare(
+            corrected_fluorescence_traces, _prepare_traces)
+        self._events = _prepare(events, _prepare_events)
 
         self._meta = meta
         self._cell_specimen_table = cell_specimen_table
-        self._dff_traces = dff_traces
-        self._demixed_traces = demixed_traces
-        self._neuropil_traces = neuropil_traces
-        self._corrected_fluorescence_traces = corrected_fluorescence_traces
-        self._events = events
         self._segmentation_mask_image = self._get_segmentation_mask_image(
             spacing=segmentation_mask_image_spacing
         )
 
     @property
     def table(self) -> pd.DataFrame:
+        """The cell specimen table, in which each roi_mask is a
+        roi_masks.SparseMask (see get_table for full frame masks)"""
         return self._cell_specimen_table
 
+    def get_table(self, dense_roi_masks: bool = True) -> pd.DataFrame:
+        """The cell specimen table
+
+        Parameters
+        ----------
+        dense_roi_masks
+            If True, each roi_mask is a full frame boolean array, built
+            on request. Otherwise, each roi_mask is a roi_masks.SparseMask,
+            which takes a small fraction of the memory
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        if not dense_roi_masks:
+            return self._cell_specimen_table
+        return self._with_dense_roi_masks(self._cell_specimen_table)
+
     @property
     def roi_masks(self) -> pd.DataFrame:
-        return self._cell_specimen_table[["cell_roi_id", "roi_mask"]]
+        return self._with_dense_roi_masks(
+            self._cell_specimen_table[["cell_roi_id", "roi_mask"]])
 
     @property
     def meta(self) -> CellSpecimenMeta:
@@ -280,7 +342,7 @@ class CellSpecimens(
         """
         if self._dff_traces is None:
             return None
-        df = self.table[["cell_roi_id"]].join(
+        df = self._cell_specimen_table[["cell_roi_id"]].join(
             self._dff_traces.value, on="cell_roi_id"
         )
         return df
@@ -308,7 +370,7 @@ class CellSpecimens(
         """
         if self._demixed_traces is None:
             return None
-        df = self.table[["cell_roi_id"]].join(
+        df = self._cell_specimen_table[["cell_roi_id"]].join(
             self._demixed_traces.value, on="cell_roi_id"
         )
         return df
@@ -337,7 +399,7 @@ class CellSpecimens(
         """
         if self._neuropil_traces is None:
             return None
-        df = self.table[["cell_roi_id"]].join(
+        df = self._cell_specimen_table[["cell_roi_id"]].join(
             self._neuropil_traces.value, on="cell_roi_id"
         )
         return df
@@ -368,14 +430,73 @@ class CellSpecimens(
                 r:
                     r values (arbitrary units)
         """
-        df = self.table[["cell_roi_id"]].join(
+        df = self._cell_specimen_table[["cell_roi_id"]].join(
             self._corrected_fluorescence_traces.value, on="cell_roi_id"
         )
         return df
 
+    def get_trace_array(self, trace_type: str = "dff_traces"
+                        ) -> Optional[xr.DataArray]:
+        """Traces of one type for all cells, as a (cell x time) array.
+        Unlike the trace dataframes, the data are not copied.
+
+        Parameters
+        ----------
+        trace_type
+            One of "dff_traces", "demixed_traces", "neuropil_traces" or
+            "corrected_fluorescence_traces"
+
+        Returns
+        -------
+        xr.DataArray
+            dims:
+                cell_specimen_id: (int)
+                    unified id of segmented cell across experiments
+                    (assigned after cell matching), in the order of
+                    the cell specimen table
+                time: (float)
+                    ophys timestamps
+            coords:
+                cell_roi_id: (int) along cell_specimen_id
+                    experiment specific id of segmented roi
+                    (assigned before cell matching)
+            None if the traces are not available
+        """
+        trace_types = (
+            "dff_traces",
+            "demixed_traces",
+            "neuropil_traces",
+            "corrected_fluorescence_traces",
+        )
+        if trace_type not in trace_types:
+            raise ValueError(f"trace_type must be one of "
+                             f"{sorted(trace_types)}, got {trace_type}")
+        # only the requested traces are loaded
+        traces = getattr(self, f"_{trace_type}")
+        if traces is None:
+            return None
+
+        data = traces.get_trace_array()
+        cell_roi_ids = self._cell_specimen_table["cell_roi_id"].values
+        if not np.array_equal(traces.get_roi_ids(), cell_roi_ids):
+            positions = pd.Index(traces.get_roi_ids()).get_indexer(
+                cell_roi_ids)
+            data = data[positions]
+
+        return xr.DataArray(
+            data=data,
+            dims=("cell_specimen_id", "time"),
+            coords={
+                "cell_specimen_id": self._cell_specimen_table.index.values,
+                "cell_roi_id": ("cell_specimen_id", cell_roi_ids),
+                "time": self._ophys_timestamps.value,
+            },
+            name=trace_type,
+        )
+
     @property
     def events(self) -> pd.DataFrame:
-        df = self.table.reset_index()
+        df = self._cell_specimen_table.reset_index()
         df = df[["cell_roi_id", "cell_specimen_id"]].merge(
             self._events.value, on="cell_roi_id"
         )
@@ -585,15 +706,45 @@ class CellSpecimens(
         segmentation_mask_image_spacing: Tuple,
         events_params: EventsParams,
         exclude_invalid_rois=True,
+        lazy: bool = False,
     ) -> "CellSpecimens":
+        """
+        Parameters
+        ----------
+        nwbfile
+        segmentation_mask_image_spacing
+            Spacing to pass to sitk when constructing segmentation mask image
+        events_params
+        exclude_invalid_rois
+            Whether to exclude invalid rois
+        lazy
+            If True, traces and events are only read from nwbfile when
+            first accessed, so nwbfile must remain open until then
+        """
+        def _load(func, **kwargs):
+            if lazy:
+                return LazyLoader(lambda: func(**kwargs))
+            return func(**kwargs)
+
         # NOTE: ROI masks are stored in full frame width and height arrays
         ophys_module = nwbfile.processing["ophys"]
         image_seg = ophys_module.data_interfaces["image_segmentation"]
         plane_segmentations = image_seg.plane_segmentations
         cell_specimen_table = plane_segmentations["cell_specimen_table"]
 
+        def _read_roi_masks(cell_specimen_table):
+            # Read one full frame mask at a time
+            image_mask = cell_specimen_table["image_mask"].data
+            return [
+                roi.SparseMask.from_dense(np.asarray(image_mask[i]))
+                for i in range(len(image_mask))
+            ]
+
         def _read_table(cell_specimen_table):
-            df = cell_specimen_table.to_dataframe()
+            df = cell_specimen_table.to_dataframe(exclude={"image_mask"})
+            df["image_mask"] = _read_roi_masks(cell_specimen_table)
+            df = df[[c for c in cell_specimen_table.colnames
+                     if c in df.columns]]
 
             # Ensure int64 used instead of int32
             df = df.astype(
@@ -616,11 +767,11 @@ class CellSpecimens(
 
         df = _read_table(cell_specimen_table=cell_specimen_table)
         meta = CellSpecimenMeta.from_nwb(nwbfile=nwbfile)
-        dff_traces = DFFTraces.from_nwb(nwbfile=nwbfile)
-        demixed_traces = DemixedTraces.from_nwb(nwbfile=nwbfile)
-        neuropil_traces = NeuropilTraces.from_nwb(nwbfile=nwbfile)
-        corrected_fluorescence_traces = CorrectedFluorescenceTraces.from_nwb(
-            nwbfile=nwbfile
+        dff_traces = _load(DFFTraces.from_nwb, nwbfile=nwbfile)
+        demixed_traces = _load(DemixedTraces.from_nwb, nwbfile=nwbfile)
+        neuropil_traces = _load(NeuropilTraces.from_nwb, nwbfile=nwbfile)
+        corrected_fluorescence_traces = _load(
+            CorrectedFluorescenceTraces.from_nwb, nwbfile=nwbfile
         )
 
         def _get_events():
@@ -631,7 +782,7 @@ class CellSpecimens(
                 frame_rate_hz=meta.imaging_plane.ophys_frame_rate,
             )
 
-        events = _get_events()
+        events = _load(_get_events)
         ophys_timestamps = OphysTimestamps.from_nwb(nwbfile=nwbfile)
 
         return CellSpecimens(
@@ -657,7 +808,8 @@ class CellSpecimens(
             ophys timestamps
         """
         # 1. Add cell specimen table
-        cell_roi_table = self.table.reset_index().set_index("cell_roi_id")
+        cell_roi_table = self._cell_specimen_table.reset_index().set_index(
+            "cell_roi_id")
         metadata = nwbfile.lab_meta_data["metadata"]
 
         device = nwbfile.get_device()
@@ -739,8 +891,9 @@ class CellSpecimens(
             # get_cell_specimen_table() method. As a result, the ROI is
             # stored in
             # an array that is the same shape as the FULL field of view of the
-            # experiment (e.g. 512 x 512).
-            mask = table_row.pop("roi_mask")
+            # experiment (e.g. 512 x 512). It is kept as a SparseMask
+            # until here.
+            mask = table_row.pop("roi_mask").to_dense()
 
             csid = table_row.pop("cell_specimen_id")
             table_row["cell_specimen_id"] = -1 if csid is None else csid
@@ -787,7 +940,13 @@ class CellSpecimens(
             array-like interface to segmentation_mask image data and
             metadata
         """
-        mask_data = np.sum(self.roi_masks["roi_mask"]).astype(int)
+        roi_masks = self._cell_specimen_table["roi_mask"]
+        if len(roi_masks) == 0:
+            mask_data = np.sum(roi_masks).astype(int)
+        else:
+            mask_data = np.zeros(roi_masks.iloc[0].shape, dtype=int)
+            for roi_mask in roi_masks:
+                roi_mask.add_to(mask_data)
 
         mask_image = Image(data=mask_data, spacing=spacing, unit="mm")
         return mask_image
@@ -805,22 +964,15 @@ class CellSpecimens(
         fov_width = fov_shape.width
         fov_height = fov_shape.height
 
-        # Convert cropped ROI masks to uncropped versions
+        # Convert cropped ROI masks to sparse masks in the full frame
         roi_mask_list = []
         for cell_roi_id, table_row in cell_specimen_table.iterrows():
-            # Deserialize roi data into AllenSDK RoiMask object
-            curr_roi = roi.RoiMask(
-                image_w=fov_width,
-                image_h=fov_height,
-                label=None,
-                mask_group=-1,
-            )
-            curr_roi.x = table_row["x"]
-            curr_roi.y = table_row["y"]
-            curr_roi.width = table_row["width"]
-            curr_roi.height = table_row["height"]
-            curr_roi.mask = np.array(table_row["roi_mask"])
-            roi_mask_list.append(curr_roi.get_mask_plane().astype(np.bool))
+            roi_mask_list.append(roi.SparseMask(
+                shape=(fov_height, fov_width),
+                x=table_row["x"],
+                y=table_row["y"],
+                mask=np.array(table_row["roi_mask"]),
+            ))
 
         cell_specimen_table["roi_mask"] = roi_mask_list
         cell_specimen_table = cell_specimen_table[
@@ -832,55 +984,58 @@ class CellSpecimens(
         cell_specimen_table.set_index("cell_specimen_id", inplace=True)
         return cell_specimen_table
 
+    @staticmethod
+    def _to_sparse_roi_masks(cell_specimen_table: pd.DataFrame
+                             ) -> pd.DataFrame:
+        """Converts any full frame roi_mask to a roi_masks.SparseMask"""
+        roi_masks = cell_specimen_table["roi_mask"]
+        if all(isinstance(m, roi.SparseMask) for m in roi_masks):
+            return cell_specimen_table
+        cell_specimen_table = cell_specimen_table.copy()
+        cell_specimen_table["roi_mask"] = [
+            m if isinstance(m, roi.SparseMask) else
+            roi.SparseMask.from_dense(np.asarray(m))
+            for m in roi_masks
+        ]
+        return cell_specimen_table
+
+    @staticmethod
+    def _with_dense_roi_masks(df: pd.DataFrame) -> pd.DataFrame:
+        """A copy of df in which each roi_mask is a full frame array"""
+        df = df.copy()
+        df["roi_mask"] = [m.to_dense() for m in df["roi_mask"]]
+        return df
+
+    @staticmethod
     def _validate_traces(
-        self,
         ophys_timestamps: OphysTimestamps,
-        dff_traces: DFFTraces,
-        demixed_traces: DemixedTraces,
-        neuropil_traces: NeuropilTraces,
-        corrected_fluorescence_traces: CorrectedFluorescenceTraces,
+        traces: TracesMixin,
         cell_roi_ids: np.ndarray,
     ):
         """validates traces"""
-        trace_col_map = {
-            "dff_traces": "dff",
-            "demixed_traces": "demixed_trace",
-            "neuropil_traces": "neuropil_trace",
-            "corrected_fluorescence_traces": "corrected_fluorescence",
-        }
-        for traces in (
-            dff_traces,
-            demixed_traces,
-            neuropil_traces,
-            corrected_fluorescence_traces,
-        ):
-            if traces is None:
-                continue
-            # validate traces contain expected roi ids
-            if not np.in1d(traces.value.index, cell_roi_ids).all():
-                raise RuntimeError(
-                    f"{traces.name} contains ROI IDs that "
-                    f"are not in "
-                    f"cell_specimen_table.cell_roi_id"
-                )
-            if not np.in1d(cell_roi_ids, traces.value.index).all():
-                raise RuntimeError(
-                    f"cell_specimen_table contains ROI IDs "
-                    f"that are not in {traces.name}"
-                )
+        # validate traces contain expected roi ids
+        if not np.in1d(traces.get_roi_ids(), cell_roi_ids).all():
+            raise RuntimeError(
+                f"{traces.name} contains ROI IDs that "
+                f"are not in "
+                f"cell_specimen_table.cell_roi_id"
+            )
+        if not np.in1d(cell_roi_ids, traces.get_roi_ids()).all():
+            raise RuntimeError(
+                f"cell_specimen_table contains ROI IDs "
+                f"that are not in {traces.name}"
+            )
 
-            # validate traces contain expected timepoints
-            num_trace_timepoints = len(
-                traces.value.iloc[0][trace_col_map[traces.name]]
+        # validate traces contain expected timepoints
+        num_trace_timepoints = traces.get_number_of_frames()
+        num_ophys_timestamps = ophys_timestamps.value.shape[0]
+        if num_trace_timepoints != num_ophys_timestamps:
+            raise RuntimeError(
+                f"{traces.name} contains "
+                f"{num_trace_timepoints} "
+                f"but there are {num_ophys_timestamps} "
+                f"ophys timestamps"
             )
-            num_ophys_timestamps = ophys_timestamps.value.shape[0]
-            if num_trace_timepoints != num_ophys_timestamps:
-                raise RuntimeError(
-                    f"{traces.name} contains "
-                    f"{num_trace_timepoints} "
-                    f"but there are {num_ophys_timestamps} "
-                    f"ophys timestamps"
-                )
 
     @staticmethod
     def _get_events(
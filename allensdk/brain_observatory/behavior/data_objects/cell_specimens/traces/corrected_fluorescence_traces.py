@@ -1,3 +1,5 @@
+from typing import Iterable, Optional, Union
+
 import numpy as np
 import pandas as pd
 from pynwb import NWBFile
@@ -9,12 +11,12 @@ from allensdk.core import DataObject
 from allensdk.core import DataFileReadableInterface, NwbReadableInterface
 from allensdk.core import NwbWritableInterface
 from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
-    .rois_mixin import RoisMixin
+    .traces.traces_mixin import TracesMixin, read_roi_response_series_data
 
 
 class CorrectedFluorescenceTraces(
     DataObject,
-    RoisMixin,
+    TracesMixin,
     DataFileReadableInterface,
     NwbReadableInterface,
     NwbWritableInterface,
@@ -24,22 +26,42 @@ class CorrectedFluorescenceTraces(
     are neuropil corrected and demixed.
     """
 
-    def __init__(self, traces: pd.DataFrame):
+    _trace_column = "corrected_fluorescence"
+
+    def __init__(self, traces: Union[pd.DataFrame, np.ndarray],
+                 roi_ids: Optional[Iterable[int]] = None,
+                 r: Optional[np.ndarray] = None,
+                 rmse: Optional[np.ndarray] = None):
         """
 
         Parameters
         ----------
         traces
-            index cell_roi_id
-            columns:
-                corrected_fluorescence: (list of float)
-                    fluorescence values (arbitrary units)
-                RMSE: (float)
-                    error values (arbitrary units)
-                r:
-                    r values (arbitrary units)
+            Either a dataframe
+                index cell_roi_id
+                columns:
+                    corrected_fluorescence: (list of float)
+                        fluorescence values (arbitrary units)
+                    RMSE: (float)
+                        error values (arbitrary units)
+                    r:
+                        r values (arbitrary units)
+            or a (roi x time) array of corrected fluorescence traces
+        roi_ids
+            cell_roi_id of each row of traces, if traces is an array
+        r
+            r value of each row of traces, if traces is an array
+        rmse
+            RMSE of each row of traces, if traces is an array
         """
-        super().__init__(name="corrected_fluorescence_traces", value=traces)
+        super().__init__(name="corrected_fluorescence_traces", value=None)
+        roi_values = {}
+        if r is not None:
+            roi_values["r"] = r
+        if rmse is not None:
+            roi_values["RMSE"] = rmse
+        self._set_traces(traces=traces, roi_ids=roi_ids,
+                         roi_values=roi_values)
 
     @classmethod
     def from_nwb(cls, nwbfile: NWBFile) -> "CorrectedFluorescenceTraces":
@@ -49,8 +71,8 @@ class CorrectedFluorescenceTraces(
         )
         # f traces stored as timepoints x rois in NWB
         # We want rois x timepoints, hence the transpose
-        f_traces = corr_fluorescence_traces_nwb.roi_response_series["traces"]\
-            .data[:].T.copy()
+        f_traces = read_roi_response_series_data(
+            corr_fluorescence_traces_nwb.roi_response_series["traces"].data)
         roi_ids = corr_fluorescence_traces_nwb.roi_response_series["traces"]\
             .rois.table.id[:].copy()
         # TODO: Remove try/except once VBO released.
@@ -59,18 +81,11 @@ class CorrectedFluorescenceTraces(
                 .data[:].copy()
             rmse = corr_fluorescence_traces_nwb.roi_response_series["RMSE"]\
                 .data[:].copy()
-            data_dict = {
-                "corrected_fluorescence": [x for x in f_traces],
-                "r": r_values,
-                "RMSE": rmse,
-            }
         except KeyError:
-            data_dict = {"corrected_fluorescence": [x for x in f_traces]}
-        df = pd.DataFrame(
-            data=data_dict,
-            index=pd.Index(data=roi_ids, name="cell_roi_id"),
-        )
-        return CorrectedFluorescenceTraces(traces=df)
+            r_values = None
+            rmse = None
+        return CorrectedFluorescenceTraces(
+            traces=f_traces, roi_ids=roi_ids, r=r_values, rmse=rmse)
 
     @classmethod
     def from_data_file(
@@ -82,12 +97,10 @@ class CorrectedFluorescenceTraces(
         return cls(traces=corrected_fluorescence_traces)
 
     def to_nwb(self, nwbfile: NWBFile) -> NWBFile:
-        corrected_fluorescence_traces = self.value["corrected_fluorescence"]
-        rmse = self.value["RMSE"].values
-        r_values = self.value["r"].values
-        # Convert from Series of lists to numpy array
-        # of shape ROIs x timepoints
-        traces = np.stack([x for x in corrected_fluorescence_traces])
+        rmse = self._roi_values["RMSE"].values
+        r_values = self._roi_values["r"].values
+        # numpy array of shape ROIs x timepoints
+        traces = self.get_trace_array()
 
         # Create/Add corrected_fluorescence_traces modules and interfaces:
         ophys_module = nwbfile.processing["ophys"]
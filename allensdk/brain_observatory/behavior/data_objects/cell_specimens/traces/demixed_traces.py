@@ -1,3 +1,5 @@
+from typing import Iterable, Optional, Union
+
 import numpy as np
 import pandas as pd
 from pynwb import NWBFile
@@ -10,13 +12,13 @@ from allensdk.core import \
 from allensdk.core import \
     NwbWritableInterface
 from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
-    .rois_mixin import \
-    RoisMixin
+    .traces.traces_mixin import \
+    TracesMixin, read_roi_response_series_data
 
 
 class DemixedTraces(
     DataObject,
-    RoisMixin,
+    TracesMixin,
     DataFileReadableInterface,
     NwbReadableInterface,
     NwbWritableInterface,
@@ -26,17 +28,25 @@ class DemixedTraces(
     overlapping ROIs.
     """
 
-    def __init__(self, traces: pd.DataFrame):
+    _trace_column = "demixed_trace"
+
+    def __init__(self, traces: Union[pd.DataFrame, np.ndarray],
+                 roi_ids: Optional[Iterable[int]] = None):
         """
         Parameters
         ----------
         traces
-            index cell_roi_id
-            columns:
-            - demixed_traces
-                list of float
+            Either a dataframe
+                index cell_roi_id
+                columns:
+                - demixed_trace
+                    list of float
+            or a (roi x time) array of traces
+        roi_ids
+            cell_roi_id of each row of traces, if traces is an array
         """
-        super().__init__(name="demixed_traces", value=traces)
+        super().__init__(name="demixed_traces", value=None)
+        self._set_traces(traces=traces, roi_ids=roi_ids)
 
     @classmethod
     def from_nwb(cls, nwbfile: NWBFile) -> "DemixedTraces":
@@ -49,13 +59,9 @@ class DemixedTraces(
             )
             # f traces stored as timepoints x rois in NWB
             # We want rois x timepoints, hence the transpose
-            f_traces = demixed_traces_nwb.data[:].T.copy()
+            f_traces = read_roi_response_series_data(demixed_traces_nwb.data)
             roi_ids = demixed_traces_nwb.rois.table.id[:].copy()
-            df = pd.DataFrame(
-                {"demixed_trace": [x for x in f_traces]},
-                index=pd.Index(data=roi_ids, name="cell_roi_id"),
-            )
-            return DemixedTraces(traces=df)
+            return DemixedTraces(traces=f_traces, roi_ids=roi_ids)
         except KeyError:
             return None
 
@@ -65,11 +71,8 @@ class DemixedTraces(
         return cls(traces=demixed_traces)
 
     def to_nwb(self, nwbfile: NWBFile) -> NWBFile:
-        demixed_traces = self.value["demixed_trace"]
-
-        # Convert from Series of lists to numpy array
-        # of shape ROIs x timepoints
-        traces = np.stack([x for x in demixed_traces])
+        # numpy array of shape ROIs x timepoints
+        traces = self.get_trace_array()
 
         # Create/Add demixed_traces modules and interfaces:
         ophys_module = nwbfile.processing["ophys"]
@@ -1,3 +1,5 @@
+from typing import Iterable, Optional, Union
+
 import pandas as pd
 import numpy as np
 from pynwb import NWBFile
@@ -10,45 +12,50 @@ from allensdk.core import \
 from allensdk.core import \
     NwbWritableInterface
 from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
-    .rois_mixin import \
-    RoisMixin
+    .traces.traces_mixin import \
+    TracesMixin, read_roi_response_series_data
 from allensdk.brain_observatory.behavior.data_objects.timestamps\
     .ophys_timestamps import \
     OphysTimestamps
 
 
-class DFFTraces(DataObject, RoisMixin,
+class DFFTraces(DataObject, TracesMixin,
                 DataFileReadableInterface, NwbReadableInterface,
                 NwbWritableInterface):
-    def __init__(self, traces: pd.DataFrame):
+    _trace_column = 'dff'
+
+    def __init__(self, traces: Union[pd.DataFrame, np.ndarray],
+                 roi_ids: Optional[Iterable[int]] = None):
         """
         Parameters
         ----------
         traces
-            index cell_roi_id
-            columns:
-                dff: List of float
+            Either a dataframe
+                index cell_roi_id
+                columns:
+                    dff: List of float
+            or a (roi x time) array of dff traces
+        roi_ids
+            cell_roi_id of each row of traces, if traces is an array
         """
-        super().__init__(name='dff_traces', value=traces)
+        super().__init__(name='dff_traces', value=None)
+        self._set_traces(traces=traces, roi_ids=roi_ids)
 
     def to_nwb(self, nwbfile: NWBFile,
                ophys_timestamps: OphysTimestamps) -> NWBFile:
-        dff_traces = self.value[['dff']]
-
         ophys_module = nwbfile.processing['ophys']
         # trace data in the form of rois x timepoints
-        trace_data = np.array([dff_traces.loc[cell_roi_id].dff
-                               for cell_roi_id in dff_traces.index.values])
+        trace_data = self.get_trace_array()
 
         cell_specimen_table = nwbfile.processing['ophys'].data_interfaces[
             'image_segmentation'].plane_segmentations[
             'cell_specimen_table']  # noqa: E501
         roi_table_region = cell_specimen_table.create_roi_table_region(
             description="segmented cells labeled by cell_specimen_id",
-            region=slice(len(dff_traces)))
+            region=slice(len(trace_data)))
 
         # Create/Add dff modules and interfaces:
-        assert dff_traces.index.name == 'cell_roi_id'
+        assert self._roi_ids.name == 'cell_roi_id'
         dff_interface = DfOverF(name='dff')
         ophys_module.add_data_interface(dff_interface)
 
@@ -68,12 +75,9 @@ class DFFTraces(DataObject, RoisMixin,
                 'ophys'].data_interfaces['dff'].roi_response_series['traces']
             # dff traces stored as timepoints x rois in NWB
             # We want rois x timepoints, hence the transpose
-            dff_traces = dff_nwb.data[:].T
-
-            df = pd.DataFrame({'dff': [x for x in dff_traces]},
-                              index=pd.Index(data=dff_nwb.rois.table.id[:],
-                                             name='cell_roi_id'))
-            return DFFTraces(traces=df)
+            dff_traces = read_roi_response_series_data(dff_nwb.data)
+            return DFFTraces(traces=dff_traces,
+                             roi_ids=dff_nwb.rois.table.id[:])
         except KeyError:
             return None
 
@@ -81,9 +85,3 @@ class DFFTraces(DataObject, RoisMixin,
     def from_data_file(cls, dff_file: DFFFile) -> "DFFTraces":
         dff_traces = dff_file.data
         return DFFTraces(traces=dff_traces)
-
-    def get_number_of_frames(self) -> int:
-        """Returns the number of frames in the movie"""
-        if self.value.empty:
-            raise RuntimeError('Cannot determine number of frames')
-        return len(self.value.iloc[0]['dff'])
@@ -0,0 +1,178 @@
+import warnings
+from typing import Dict, Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
+    .rois_mixin import RoisMixin
+
+# upper bound on the size of the blocks of timepoints transposed at once
+# when reading (time x roi) traces from NWB
+_READ_BLOCK_BYTES = 64 * 1024 ** 2
+
+
+def read_roi_response_series_data(data) -> np.ndarray:
+    """Reads the (time x roi) data of an NWB RoiResponseSeries into a
+    C-contiguous (roi x time) array.
+
+    The data are transposed one block of timepoints at a time, so that a
+    second full copy of the traces is never held in memory.
+
+    Parameters
+    ----------
+    data
+        (time x roi) array-like, ie an h5py.Dataset
+
+    Returns
+    -------
+    np.ndarray
+        (roi x time) array
+    """
+    if not hasattr(data, 'shape'):
+        data = np.asarray(data)
+    n_times, n_rois = data.shape
+    traces = np.empty((n_rois, n_times), dtype=data.dtype)
+
+    row_bytes = max(1, n_rois * traces.itemsize)
+    block_size = max(1, _READ_BLOCK_BYTES // row_bytes)
+    for start in range(0, n_times, block_size):
+        stop = min(start + block_size, n_times)
+        traces[:, start:stop] = np.asarray(data[start:stop]).T
+    return traces
+
+
+def _stack_rows(rows: Sequence[np.ndarray]) -> np.ndarray:
+    """Stacks 1d traces into a (roi x time) array.
+
+    Rows which lie one after another in a single buffer (as do the rows of
+    a dataframe built with `list(array)`) are returned as a view of that
+    buffer, without copying.
+    """
+    first = rows[0]
+    if isinstance(first, np.ndarray) and first.ndim == 1 and \
+            first.flags.c_contiguous and first.base is not None:
+        row_bytes = first.nbytes
+        start = first.__array_interface__['data'][0]
+        if all(isinstance(row, np.ndarray) and row.base is first.base and
+               row.dtype == first.dtype and row.shape == first.shape and
+               row.flags.c_contiguous and
+               row.__array_interface__['data'][0] == start + i * row_bytes
+               for i, row in enumerate(rows)):
+            return np.lib.stride_tricks.as_strided(
+                first, shape=(len(rows), first.shape[0]),
+                strides=(row_bytes, first.itemsize))
+    return np.stack(rows)
+
+
+class TracesMixin(RoisMixin):
+    """A mixin for a collection of roi traces stored as a single contiguous
+    (roi x time) array.
+
+    The legacy dataframe (._value), indexed by cell_roi_id with one list-like
+    trace per row, is only built when requested. Its traces are views into
+    the array rather than copies. Setting ._value to such a dataframe
+    replaces the traces.
+    """
+    # name of the column holding the traces in the legacy dataframe
+    _trace_column: str
+
+    def _set_traces(self,
+                    traces: Union[pd.DataFrame, np.ndarray],
+                    roi_ids: Optional[Iterable[int]] = None,
+                    roi_values: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Parameters
+        ----------
+        traces
+            Either the legacy dataframe, or a (roi x time) array
+        roi_ids
+            cell_roi_id of each row of traces, if traces is an array
+        roi_values
+            Additional per-roi values (ie columns of the legacy
+            dataframe), if traces is an array
+        """
+        self._legacy_value = None
+
+        if isinstance(traces, pd.DataFrame):
+            columns = [c for c in traces.columns if c != self._trace_column]
+            if len(traces) == 0:
+                self._traces = np.empty((0, 0))
+            else:
+                self._traces = _stack_rows(
+                    traces[self._trace_column].values)
+            self._roi_ids = traces.index
+            self._roi_values = traces[columns]
+            return
+
+        traces = np.asarray(traces)
+        if traces.ndim != 2:
+            raise ValueError(f'Expected a 2d (roi x time) array of traces, '
+                             f'got an array of shape {traces.shape}')
+        if roi_ids is None or len(roi_ids) != traces.shape[0]:
+            raise ValueError('Expected one roi id for each row of traces')
+
+        self._traces = traces
+        self._roi_ids = pd.Index(roi_ids, name='cell_roi_id')
+        self._roi_values = pd.DataFrame(
+            {} if roi_values is None else roi_values, index=self._roi_ids)
+
+    @property
+    def _value(self) -> Optional[pd.DataFrame]:
+        if getattr(self, '_legacy_value', None) is None and \
+                getattr(self, '_traces', None) is not None:
+            df = pd.DataFrame({self._trace_column: list(self._traces)},
+                              index=self._roi_ids.copy())
+            for column in self._roi_values.columns:
+                df[column] = self._roi_values[column].values
+            self._legacy_value = df
+        return getattr(self, '_legacy_value', None)
+
+    @_value.setter
+    def _value(self, value: Optional[pd.DataFrame]):
+        if value is None:
+            self._traces = None
+            self._legacy_value = None
+        else:
+            self._set_traces(traces=value)
+
+    def get_trace_array(self) -> np.ndarray:
+        """The (roi x time) array of traces, in the order of
+        get_roi_ids(). This is not a copy."""
+        return self._traces
+
+    def get_roi_ids(self) -> np.ndarray:
+        """The cell_roi_id of each row of get_trace_array()"""
+        return self._roi_ids.values
+
+    def get_number_of_frames(self) -> int:
+        """Returns the number of frames in the movie"""
+        if len(self._roi_ids) == 0:
+            raise RuntimeError('Cannot determine number of frames')
+        return self._traces.shape[1]
+
+    def filter_and_reorder(self, roi_ids: np.ndarray,
+                           raise_if_rois_missing=True):
+        """Orders traces according to input roi_ids.
+        Will also filter traces to contain only rois given by roi_ids.
+
+        See RoisMixin.filter_and_reorder. The traces are only copied if
+        they need to be filtered or reordered.
+        """
+        positions = self._roi_ids.get_indexer(roi_ids)
+        missing = positions == -1
+        if missing.any():
+            msg = f'Input contains roi ids not in ' \
+                  f'{type(self).__name__}.'
+            if raise_if_rois_missing:
+                raise RuntimeError(msg)
+            warnings.warn(msg)
+            positions = positions[~missing]
+
+        if np.array_equal(positions, np.arange(len(self._roi_ids))):
+            return
+
+        self._traces = self._traces[positions]
+        self._roi_ids = self._roi_ids[positions]
+        self._roi_values = self._roi_values.iloc[positions]
+        self._legacy_value = None
@@ -3,6 +3,7 @@ from typing import List, Dict, Any, Tuple, Optional, Union
 import numpy as np
 
 from allensdk import one
+from allensdk.deprecated import deprecated
 from allensdk.brain_observatory.behavior.data_files import SyncFile
 from allensdk.brain_observatory.behavior.data_files import BehaviorStimulusFile
 from allensdk.brain_observatory.behavior.data_objects import StimulusTimestamps
@@ -151,6 +152,15 @@ class Trial:
     def _get_trial_data(self) -> Dict[str, Any]:
         """
         Infer trial logic from trial log. Returns a dictionary.
+        See _get_trial_data_from_log
+        """
+        return self._get_trial_data_from_log(trial=self._trial)
+
+    @staticmethod
+    def _get_trial_data_from_log(trial: dict) -> Dict[str, Any]:
+        """
+        Infer trial logic from the trial log entry of a trial. Returns a
+        dictionary.
 
         * reward volume: volume of water delivered on the trial, in mL
 
@@ -178,7 +188,7 @@ class Trial:
                          This will bias the animals choice and should not be
                          categorized as hit/miss)
         """
-        trial_event_names = [val[0] for val in self._trial['events']]
+        trial_event_names = [val[0] for val in trial['events']]
         hit = 'hit' in trial_event_names
         false_alarm = 'false_alarm' in trial_event_names
         miss = 'miss' in trial_event_names
@@ -189,8 +199,8 @@ class Trial:
         if aborted:
             go = catch = auto_rewarded = False
         else:
-            catch = self._trial["trial_params"]["catch"] is True
-            auto_rewarded = self._trial["trial_params"]["auto_reward"]
+            catch = trial["trial_params"]["catch"] is True
+            auto_rewarded = trial["trial_params"]["auto_reward"]
             go = not catch and not auto_rewarded
 
         correct_reject = catch and not false_alarm
@@ -200,7 +210,7 @@ class Trial:
 
         return {
             "reward_volume": sum([
-                r[0] for r in self._trial.get("rewards", [])]),
+                r[0] for r in trial.get("rewards", [])]),
             "hit": hit,
             "false_alarm": false_alarm,
             "miss": miss,
@@ -312,8 +322,9 @@ class Trial:
 
         response_time = _get_response_time(licks, aborted)
 
-        change_frame = self.calculate_change_frame(
-                event_dict=event_dict,
+        change_frame = self._get_change_frame(
+                event_frames={
+                    key: event['frame'] for key, event in event_dict.items()},
                 go=go,
                 catch=catch,
                 auto_rewarded=auto_rewarded)
@@ -326,7 +337,7 @@ class Trial:
             "change_frame": change_frame
         }
 
-        result, change_time = self.add_change_time(result)
+        result, change_time = self._add_change_time(result)
 
         if not (go or catch or auto_rewarded):
             response_latency = None
@@ -339,21 +350,21 @@ class Trial:
 
         return result
 
-    def calculate_change_frame(
-            self,
-            event_dict: dict,
+    @staticmethod
+    def _get_change_frame(
+            event_frames: dict,
             go: bool,
             catch: bool,
             auto_rewarded: bool) -> Union[int, float]:
 
         """
-        Calculate the frame index of a stimulus change
-        associated with a specific event.
+        Calculate the frame index of the stimulus change of a trial.
 
         Parameters
         ----------
-        event_dict: dict
-            Dictionary of trial events in the well-known `pkl` file
+        event_frames: dict
+            Frame of each trial event in the well-known `pkl` file, keyed
+            by (event name, '')
         go: bool
             True if "go" trial, False otherwise. Mutually exclusive with
             `catch`.
@@ -367,23 +378,61 @@ class Trial:
         -------
         change_frame: Union[int, float]
             Index of the change frame; NaN if there is no change
-
-        Notes
-        -----
-        This is its own method so that child classes of Trial
-        can implement different logic as needed.
         """
 
         if go or auto_rewarded:
-            change_frame = event_dict.get(('stimulus_changed', ''))['frame']
+            change_frame = event_frames[('stimulus_changed', '')]
         elif catch:
-            change_frame = event_dict.get(('sham_change', ''))['frame']
+            change_frame = event_frames[('sham_change', '')]
         else:
             change_frame = float("nan")
 
         return change_frame
 
+    @deprecated("The trials table is built by Trials.from_stimulus_file")
+    def calculate_change_frame(
+            self,
+            event_dict: dict,
+            go: bool,
+            catch: bool,
+            auto_rewarded: bool) -> Union[int, float]:
+        """
+        Calculate the frame index of a stimulus change
+        associated with a specific event (see _get_change_frame).
+
+        Parameters
+        ----------
+        event_dict: dict
+            Dictionary of trial events in the well-known `pkl` file
+        go: bool
+            True if "go" trial, False otherwise
+        catch: bool
+            True if "catch" trial, False otherwise
+        auto_rewarded: bool
+            True if "auto_rewarded" trial, False otherwise
+
+        Returns
+        -------
+        change_frame: Union[int, float]
+            Index of the change frame; NaN if there is no change
+        """
+        return self._get_change_frame(
+            event_frames={
+                key: event['frame'] for key, event in event_dict.items()},
+            go=go,
+            catch=catch,
+            auto_rewarded=auto_rewarded)
+
+    @deprecated("Trials.add_change_times adds the change times of all "
+                "trials")
     def add_change_time(self, trial_dict: dict) -> Tuple[dict, float]:
+        """
+        Add change_time to a dict representing a single trial
+        (see _add_change_time).
+        """
+        return self._add_change_time(trial_dict)
+
+    def _add_change_time(self, trial_dict: dict) -> Tuple[dict, float]:
         """
         Add change_time to a dict representing a single trial.
 
@@ -439,31 +488,40 @@ class Trial:
             changed to.
 
         """
-        grating_oris = {'horizontal', 'vertical'}
         trial_start_frame = self._trial["events"][0][3]
         initial_image_category_name, _, initial_image_name = \
             self._resolve_initial_image(
                 stimuli, trial_start_frame)
-        if len(self._trial["stimulus_changes"]) == 0:
-            change_image_name = initial_image_name
-        else:
-            ((from_set, from_name),
-             (to_set, to_name),
-             _, _) = self._trial["stimulus_changes"][0]
-
-            # do this to fix names if the stimuli is a grating
-            if from_set in grating_oris:
-                from_name = f'gratings_{from_name}'
-            if to_set in grating_oris:
-                to_name = f'gratings_{to_name}'
-            assert from_name == initial_image_name
-            change_image_name = to_name
 
         return {
             "initial_image_name": initial_image_name,
-            "change_image_name": change_image_name
+            "change_image_name": self._get_change_image_name(
+                self._trial, initial_image_name)
         }
 
+    @staticmethod
+    def _get_change_image_name(trial: dict, initial_image_name: str) -> str:
+        """
+        Gets the name of the stimulus that the stimulus presented at the
+        beginning of a trial is changed to at the end of the trial (the
+        initial stimulus if it does not change)
+        """
+        grating_oris = {'horizontal', 'vertical'}
+        if len(trial["stimulus_changes"]) == 0:
+            return initial_image_name
+
+        ((from_set, from_name),
+         (to_set, to_name),
+         _, _) = trial["stimulus_changes"][0]
+
+        # do this to fix names if the stimuli is a grating
+        if from_set in grating_oris:
+            from_name = f'gratings_{from_name}'
+        if to_set in grating_oris:
+            to_name = f'gratings_{to_name}'
+        assert from_name == initial_image_name
+        return to_name
+
     @staticmethod
     def _resolve_initial_image(stimuli, start_frame) -> Tuple[str, str, str]:
         """Attempts to resolve the initial image for a given start_frame for
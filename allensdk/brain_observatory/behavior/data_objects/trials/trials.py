@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 from pynwb import NWBFile
 
+from allensdk import OneResultExpectedError
 from allensdk.brain_observatory import dict_to_indexed_array
 from allensdk.brain_observatory.behavior.data_files import (
     BehaviorStimulusFile, SyncFile)
@@ -23,12 +24,15 @@ from allensdk.core import \
 from allensdk.brain_observatory.behavior.data_objects.licks import Licks
 from allensdk.brain_observatory.behavior.data_objects.rewards import Rewards
 from allensdk.brain_observatory.behavior.data_objects.trials.trial import Trial
+from allensdk.deprecated import deprecated
 
 
 class Trials(DataObject, StimulusFileReadableInterface,
              NwbReadableInterface, NwbWritableInterface):
 
     @classmethod
+    @deprecated("The trials table is no longer built from Trial objects; "
+                "override add_change_times instead")
     def trial_class(cls):
         """
         Return the class to be used to represent a single Trial
@@ -164,25 +168,19 @@ class Trials(DataObject, StimulusFileReadableInterface,
         trial_log = bsf["items"]["behavior"]["trial_log"]
 
         trial_bounds = cls._get_trial_bounds(trial_log=trial_log)
-
-        all_trial_data = [None] * len(trial_log)
-
-        for idx, trial in enumerate(trial_log):
-            trial_start, trial_end = trial_bounds[idx]
-            t = cls.trial_class()(
-                      trial=trial,
-                      start=trial_start,
-                      end=trial_end,
-                      behavior_stimulus_file=stimulus_file,
-                      index=idx,
-                      stimulus_timestamps=stimulus_timestamps,
-                      licks=licks, rewards=rewards,
-                      stimuli=stimuli,
-                      sync_file=sync_file
-                      )
-            all_trial_data[idx] = t.data
-
-        trials = pd.DataFrame(all_trial_data).set_index('trial')
+        trial_starts = [start for start, _ in trial_bounds]
+        trial_ends = [
+            Trial._calculate_trial_end(
+                trial_end=end, behavior_stimulus_file=stimulus_file)
+            for _, end in trial_bounds]
+
+        trials = cls._get_trial_table(
+            trial_log=trial_log,
+            trial_starts=trial_starts,
+            trial_ends=trial_ends,
+            stimulus_timestamps=stimulus_timestamps,
+            licks=licks, rewards=rewards,
+            stimuli=stimuli).set_index('trial')
         trials.index = trials.index.rename('trials_id')
 
         # Order/Filter columns
@@ -195,6 +193,306 @@ class Trials(DataObject, StimulusFileReadableInterface,
             ).response_window_sec[0]
         )
 
+    @classmethod
+    def _get_trial_table(cls, trial_log: List,
+                         trial_starts: List[int],
+                         trial_ends: List[int],
+                         stimulus_timestamps: StimulusTimestamps,
+                         licks: Licks,
+                         rewards: Rewards,
+                         stimuli: dict) -> pd.DataFrame:
+        """
+        Build the table of all trials a column at a time. The values are
+        those of Trial(...).data for each trial, but the trial log is read
+        in a single pass and licks, rewards and initial images are assigned
+        to all trials at once with searchsorted, rather than by scanning
+        them for every trial.
+
+        Parameters
+        ----------
+        trial_log: list
+            The trial_log read in from the well known behavior stimulus
+            pickle file
+        trial_starts, trial_ends: list
+            The start and end frames of each trial (see _get_trial_bounds).
+            Trials with an end frame <= 0 have no end.
+        stimulus_timestamps: StimulusTimestamps
+            Timestamps of the stimulus frames, including monitor delay
+        licks: Licks
+        rewards: Rewards
+        stimuli: dict
+            The stimuli presentation log for the behavior session
+
+        Returns
+        -------
+        pd.DataFrame
+            A row per trial, with a column for each key of Trial.data
+        """
+        timestamps = stimulus_timestamps.subtract_monitor_delay().value
+
+        trials = {
+            key: [] for key in ("trial", "reward_volume", "hit",
+                                "false_alarm", "miss", "sham_change",
+                                "stimulus_change", "aborted", "go", "catch",
+                                "auto_rewarded", "correct_reject",
+                                "change_frame")}
+        start_frames = []
+        stop_frames = []
+        initial_frames = []
+        for trial in trial_log:
+            trial_data = Trial._get_trial_data_from_log(trial=trial)
+            for key, value in trial_data.items():
+                trials[key].append(value)
+            trials["trial"].append(trial["index"])
+
+            event_frames = {(e[0], e[1]): e[3] for e in trial["events"]}
+            start_frames.append(event_frames["trial_start", ""])
+            stop_frames.append(event_frames["trial_end", ""])
+            initial_frames.append(trial["events"][0][3])
+            trials["change_frame"].append(Trial._get_change_frame(
+                event_frames=event_frames, go=trial_data["go"],
+                catch=trial_data["catch"],
+                auto_rewarded=trial_data["auto_rewarded"]))
+
+        trials["start_time"] = timestamps[np.array(start_frames, dtype=int)]
+        trials["stop_time"] = timestamps[np.array(stop_frames, dtype=int)]
+        trials["trial_length"] = trials["stop_time"] - trials["start_time"]
+
+        lick_times = cls._get_trial_lick_times(
+            lick_frames=licks.value["frame"].values,
+            trial_starts=trial_starts, trial_ends=trial_ends,
+            timestamps=timestamps)
+        trials["lick_times"] = lick_times
+        trials["reward_time"] = cls._get_trial_reward_times(
+            reward_times=rewards.value["timestamps"].values,
+            start_times=trials["start_time"],
+            stop_times=trials["stop_time"])
+
+        aborted = np.array(trials["aborted"], dtype=bool)
+        has_licks = np.array([len(times) > 0 for times in lick_times],
+                             dtype=bool)
+        first_lick = np.array([times[0] if len(times) > 0 else np.nan
+                               for times in lick_times], dtype=float)
+        trials["response_time"] = np.where(~aborted & has_licks, first_lick,
+                                           np.nan)
+
+        trials, change_times = cls.add_change_times(
+            trials=trials, stimulus_timestamps=stimulus_timestamps)
+        response_latency = np.where(has_licks, first_lick - change_times,
+                                    np.inf)
+        trials["response_latency"] = [
+            latency if go or catch or auto_rewarded else None
+            for latency, go, catch, auto_rewarded in zip(
+                response_latency, trials["go"], trials["catch"],
+                trials["auto_rewarded"])]
+
+        initial_image_names = cls._get_initial_image_names(
+            stimuli=stimuli, start_frames=initial_frames)
+        trials["initial_image_name"] = initial_image_names
+        trials["change_image_name"] = [
+            Trial._get_change_image_name(trial, initial_image_name)
+            for trial, initial_image_name in zip(trial_log,
+                                                 initial_image_names)]
+
+        cls._validate_trial_conditions(trials=trials)
+
+        return pd.DataFrame(trials)
+
+    @classmethod
+    def add_change_times(
+            cls,
+            trials: dict,
+            stimulus_timestamps: StimulusTimestamps
+    ) -> Tuple[dict, np.ndarray]:
+        """
+        Add change_time to the columns of a trials table.
+
+        This implementation selects the values of stimulus_timestamps at
+        the change_frame of each trial.
+
+        Parameters
+        ----------
+        trials:
+            dict mapping the columns of the trials table to their values,
+            including change_frame
+        stimulus_timestamps:
+            Timestamps of the stimulus frames, including monitor delay
+
+        Returns
+        -------
+        trials:
+            Same as input, except the change_time column has been added
+
+        change_times: np.ndarray
+            The change time of each trial (NaN if there is no change)
+            (this is returned separately so that child classes have the
+            option of naming the column something different than
+            'change_time')
+
+        Note
+        ----
+        Modifies trials in-place, in addition to returning it. This is a
+        classmethod so that child classes can implement different logic
+        as needed.
+        """
+        change_times = cls._get_change_times(
+            change_frames=trials["change_frame"],
+            timestamps=stimulus_timestamps.value)
+        trials["change_time"] = change_times
+        return trials, change_times
+
+    @staticmethod
+    def _get_change_times(change_frames: List,
+                          timestamps: np.ndarray) -> np.ndarray:
+        """ timestamps at change_frames, NaN where change_frames is NaN """
+        change_frames = np.array(change_frames, dtype=float)
+        change_times = np.full(len(change_frames), np.nan)
+        has_change = ~np.isnan(change_frames)
+        change_times[has_change] = \
+            timestamps[change_frames[has_change].astype(int)]
+        return change_times
+
+    @staticmethod
+    def _get_trial_lick_times(lick_frames: np.ndarray,
+                              trial_starts: List[int],
+                              trial_ends: List[int],
+                              timestamps: np.ndarray) -> List[np.ndarray]:
+        """
+        Timestamps of the licks of each trial: the licks with frames in
+        (trial start, trial end], or after the trial start for trials
+        without an end. Licks on the boundary get assigned to the trial
+        that is ending, rather than the trial that is starting.
+
+        Trial starts must be in ascending order.
+        """
+        n_trials = len(trial_starts)
+        if len(lick_frames) == 0:
+            return [np.array([], dtype=float) for _ in range(n_trials)]
+
+        trial_starts = np.asarray(trial_starts)
+        trial_ends = np.asarray(trial_ends)
+
+        # the last trial starting before each lick is the only one which
+        # can contain it, unless it or an earlier trial has no end
+        trial = np.searchsorted(trial_starts, lick_frames, side="left") - 1
+        in_trial = trial >= 0
+        in_trial[in_trial] = \
+            lick_frames[in_trial] <= trial_ends[trial[in_trial]]
+        trial = trial[in_trial]
+        order = np.argsort(trial, kind="stable")
+        n_licks = np.bincount(trial, minlength=n_trials)
+        lick_times = np.split(
+            timestamps[lick_frames[in_trial][order]],
+            np.cumsum(n_licks)[:-1])
+
+        for i in np.flatnonzero(trial_ends <= 0):
+            valid_licks = lick_frames[lick_frames > trial_starts[i]]
+            lick_times[i] = timestamps[valid_licks] if len(valid_licks) \
+                else np.array([], dtype=float)
+        return lick_times
+
+    @staticmethod
+    def _get_trial_reward_times(reward_times: np.ndarray,
+                                start_times: np.ndarray,
+                                stop_times: np.ndarray) -> np.ndarray:
+        """
+        Time of the reward delivered in [start time, stop time] of each
+        trial, NaN for trials without a reward.
+
+        Raises
+        ------
+        OneResultExpectedError
+            If more than one reward was delivered in a trial
+        """
+        reward_times = np.asarray(reward_times, dtype=float)
+        sorted_times = np.sort(reward_times)
+        first = np.searchsorted(sorted_times, start_times, side="left")
+        last = np.searchsorted(sorted_times, stop_times, side="right")
+        n_rewards = np.maximum(last - first, 0)
+
+        for i in np.flatnonzero(n_rewards > 1):
+            trial_rewards = reward_times[(reward_times >= start_times[i]) &
+                                         (reward_times <= stop_times[i])]
+            raise OneResultExpectedError(
+                "Expected length one result, received: "
+                f"{trial_rewards} results from query")
+
+        trial_reward_times = np.full(len(start_times), np.nan)
+        has_reward = n_rewards == 1
+        trial_reward_times[has_reward] = sorted_times[first[has_reward]]
+        return trial_reward_times
+
+    @staticmethod
+    def _get_initial_image_names(stimuli: dict,
+                                 start_frames: List[int]) -> List[str]:
+        """
+        Names of the images shown at the start of each trial: the image of
+        the last set event at or before each start frame, across all
+        stimulus categories (see Trial._resolve_initial_image)
+        """
+        set_frames = []
+        set_names = []
+        for stim_category_name, stim_dict in stimuli.items():
+            for set_event in stim_dict["set_log"]:
+                set_frames.append(set_event[3])
+                if stim_category_name == 'grating':
+                    set_names.append(f'gratings_{set_event[1]}')
+                else:
+                    set_names.append(set_event[1])
+        if len(set_frames) == 0:
+            return [''] * len(start_frames)
+
+        # a stable sort so that of set events on the same frame, the one
+        # logged last is found
+        order = np.argsort(set_frames, kind="stable")
+        last_set = np.searchsorted(np.asarray(set_frames)[order],
+                                   start_frames, side="right") - 1
+        return [set_names[order[i]] if i >= 0 else '' for i in last_set]
+
+    @staticmethod
+    def _validate_trial_conditions(trials: dict) -> None:
+        """
+        Ensure that the categories of each trial are consistent, and that
+        only one of N possible mutually exclusive trial conditions is True
+        (see Trial._get_trial_timing and
+        Trial._validate_trial_condition_exclusivity)
+        """
+        hit, false_alarm, auto_rewarded, aborted, go, catch = (
+            np.array([bool(value) for value in trials[key]], dtype=bool)
+            for key in ('hit', 'false_alarm', 'auto_rewarded', 'aborted',
+                        'go', 'catch'))
+        assert not np.any(aborted & (hit | false_alarm | auto_rewarded)), (
+            "'aborted' trials cannot be 'hit', 'false_alarm', "
+            "or 'auto_rewarded'")
+        assert not np.any(hit & false_alarm), (
+            "both `hit` and `false_alarm` cannot be True, they are mutually "
+            "exclusive categories")
+        assert not np.any(go & catch), (
+            "both `go` and `catch` cannot be True, they are mutually "
+            "exclusive "
+            "categories")
+        assert not np.any(go & auto_rewarded), (
+            "both `go` and `auto_rewarded` cannot be True, they are mutually "
+            "exclusive categories")
+
+        all_conditions = ['hit',
+                          'miss',
+                          'false_alarm',
+                          'correct_reject',
+                          'auto_rewarded',
+                          'aborted']
+        conditions_on = np.array(
+            [[bool(value) for value in trials[condition]]
+             for condition in all_conditions], dtype=bool).reshape(
+                 len(all_conditions), -1)
+        for index in np.flatnonzero(conditions_on.sum(axis=0) != 1):
+            on = [condition for condition, value in
+                  zip(all_conditions, conditions_on[:, index]) if value]
+            msg = f"expected exactly 1 trial condition out of " \
+                  f"{all_conditions} "
+            msg += f"to be True, instead {on} were True (trial {index})"
+            raise AssertionError(msg)
+
     @staticmethod
     def _get_trial_bounds(trial_log: List) -> List[Tuple[int, int]]:
         """
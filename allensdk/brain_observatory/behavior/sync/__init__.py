@@ -209,7 +209,8 @@ def get_behavior_monitoring(
 
 def get_sync_data(
     sync_path: str,
-    permissive: bool = False
+    permissive: bool = False,
+    line_index_cache_dir: Optional[str] = None
 ) -> Dict[str, Union[List, np.ndarray, None]]:
     """ Convenience function for extracting several timestamp arrays from a
     sync file.
@@ -223,6 +224,10 @@ def get_sync_data(
     permissive : If True, None will be returned if timestamps are not found.
         If False, a KeyError will be raised
 
+    line_index_cache_dir : Directory in which the index of the edges of
+        each sync line is saved (see
+        allensdk.brain_observatory.sync_dataset.Dataset)
+
     Returns
     -------
     A dictionary with the following keys. All timestamps in seconds:
@@ -238,7 +243,8 @@ def get_sync_data(
 
     """
 
-    sync_dataset = SyncDataset(sync_path)
+    sync_dataset = SyncDataset(sync_path, line_index=True,
+                               line_index_cache_dir=line_index_cache_dir)
     return {
         'ophys_frames': get_ophys_frames(sync_dataset, permissive),
         'lick_times': get_lick_times(sync_dataset, permissive),
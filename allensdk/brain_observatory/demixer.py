@@ -33,17 +33,21 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 #
-from typing import Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Sequence, Union
 import os
 import logging
+import warnings
 
 import numpy as np
 import scipy.sparse as sparse
+import scipy.sparse.csgraph as csgraph
 import scipy.linalg as linalg
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 
 import allensdk.internal.brain_observatory.mask_set as mask_set
+from allensdk.brain_observatory import roi_masks
 from allensdk.config.manifest import Manifest
 
 
@@ -101,22 +105,191 @@ def _demix_point(source_frame: np.ndarray, mask_traces: np.ndarray,
     weighted_masks = norm_mat.dot(source_mask_projection)
     # cast to dense numpy array for linear solver because solution is dense
     overlap = flat_masks.dot(weighted_masks.T).toarray()
+    return _solve(overlap, mask_weighted_trace)
+
+
+def _solve(overlap: np.ndarray, mask_weighted_trace: np.ndarray
+           ) -> np.ndarray:
+    """
+    Solve overlap x = mask_weighted_trace, falling back to least squares
+    if overlap is singular or ill-conditioned (e.g. a mask over zero
+    pixels, or duplicate masks).
+    """
+    with warnings.catch_warnings(), \
+            np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("error", linalg.LinAlgWarning)
+        try:
+            demix_traces = linalg.solve(overlap, mask_weighted_trace)
+            if np.isfinite(demix_traces).all():
+                return demix_traces
+        except (linalg.LinAlgError, linalg.LinAlgWarning):
+            pass
+    logging.warning("Singular matrix, using least squares to solve.")
+    x, _, _, _ = linalg.lstsq(overlap, mask_weighted_trace)
+    return x
+
+
+def _solve_batch(overlaps: np.ndarray, traces: np.ndarray) -> np.ndarray:
+    """
+    Solve a stack of (k x k) systems overlaps x = traces. Systems which
+    are singular or ill-conditioned (1-norm condition number not below
+    1 / machine epsilon) are solved by _solve instead.
+    """
+    k = overlaps.shape[-1]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if k == 1:
+            inverses = 1 / overlaps
+        else:
+            try:
+                inverses = np.linalg.inv(overlaps)
+            except np.linalg.LinAlgError:
+                inverses = np.array([_inverse(a) for a in overlaps])
+        cond = np.abs(overlaps).sum(axis=-2).max(axis=-1) * \
+            np.abs(inverses).sum(axis=-2).max(axis=-1)
+    regular = cond < 1 / np.finfo(float).eps
+
+    demixed = np.empty(traces.shape)
+    demixed[regular] = np.matmul(inverses[regular],
+                                 traces[regular][..., None])[..., 0]
+    for i in np.flatnonzero(~regular):
+        demixed[i] = _solve(overlaps[i], traces[i])
+    return demixed
+
+
+def _inverse(overlap: np.ndarray) -> np.ndarray:
+    """ Inverse of overlap, or NaN if it is singular """
     try:
-        demix_traces = linalg.solve(overlap, mask_weighted_trace)
-    except linalg.LinAlgError:
-        logging.warning("Singular matrix, using least squares to solve.")
-        x, _, _, _ = linalg.lstsq(overlap, mask_weighted_trace)
-        demix_traces = x
-    return demix_traces
+        return np.linalg.inv(overlap)
+    except np.linalg.LinAlgError:
+        return np.full(overlap.shape, np.nan)
+
+
+class _ComponentGroup:
+    """
+    A set of connected components of overlapping masks, which are demixed
+    independently of all other masks.
+
+    Demixing a frame solves the (n x n) system of the overlaps of all
+    masks, weighted by the frame. It is block diagonal, with one block per
+    connected component of the graph of overlapping masks, so each
+    component is solved on its own. Components of the same size k are
+    solved together for all frames of a block, as one batch of (k x k)
+    systems.
+
+    The entries of the overlap matrices of a frame are the sums of the
+    frame over the intersections of each pair of overlapping masks (or
+    each mask with itself). These sums are found for all pairs at once,
+    with one sparse (pairs x pixels) matrix.
+
+    Parameters
+    ==========
+    flat_masks: sparse (n x HW) matrix of all masks
+    components: list of arrays of the indices of the masks in each
+        component of this group
+    """
+
+    def __init__(self, flat_masks: sparse.csr_matrix,
+                 components: List[np.ndarray]):
+        members = np.concatenate(components)
+        masks = flat_masks[members]
+        pairs = sparse.triu(masks.dot(masks.T)).tocoo()
+
+        # rows of pair_masks are the (weighted) intersections of pairs
+        self.pair_masks = masks[pairs.row].multiply(
+            masks[pairs.col]).tocsr()
+        n_pairs = self.pair_masks.shape[0]
+
+        # local index of each mask and pair; pairs which do not overlap
+        # refer to an extra pair (n_pairs) whose sums are zero
+        local = np.empty(flat_masks.shape[0], dtype=int)
+        local[members] = np.arange(len(members))
+        pair_index = sparse.coo_matrix(
+            (np.arange(1, n_pairs + 1), (pairs.row, pairs.col)),
+            shape=(len(members), len(members))).tocsr()
+        pair_index = pair_index + sparse.triu(pair_index, k=1).T
+
+        by_size: Dict[int, List[np.ndarray]] = {}
+        for component in components:
+            by_size.setdefault(len(component), []).append(component)
+        self.members: Dict[int, np.ndarray] = {}
+        self.pair_index: Dict[int, np.ndarray] = {}
+        for k, sized in by_size.items():
+            self.members[k] = np.array(sized)
+            indices = local[self.members[k]]
+            self.pair_index[k] = np.stack([
+                pair_index[index][:, index].toarray() - 1
+                for index in indices])
+            self.pair_index[k][self.pair_index[k] < 0] = n_pairs
+
+    def demix(self, frames: np.ndarray, mask_weighted_traces: np.ndarray,
+              pixels_per_mask: np.ndarray, demix_traces: np.ndarray):
+        """
+        Demix the masks of this group for a block of frames.
+
+        Parameters
+        ==========
+        frames: (t x HW) array of frames, none of which is skipped
+        mask_weighted_traces: (n x t) array of traces times pixels per
+            mask, for all masks
+        pixels_per_mask: Number of pixels for each of all masks
+        demix_traces: (n x t) array to which the demixed traces of the
+            masks of this group are written
+        """
+        pair_sums = np.zeros((len(frames), self.pair_masks.shape[0] + 1))
+        for i, frame in enumerate(frames):
+            pair_sums[i, :-1] = self.pair_masks.dot(frame)
+
+        for k, members in self.members.items():
+            # (frames, components, k) and (frames, components, k, k)
+            traces = mask_weighted_traces[members].transpose(2, 0, 1)
+            overlap = pair_sums[:, self.pair_index[k]]
+            overlap *= (pixels_per_mask[members] / traces)[:, :, None, :]
+            demixed = _solve_batch(overlap.reshape(-1, k, k),
+                                   traces.reshape(-1, k))
+            demix_traces[members] = demixed.reshape(traces.shape).transpose(
+                1, 2, 0)
+
+
+def _component_groups(flat_masks: sparse.csr_matrix,
+                      n_groups: int) -> List[_ComponentGroup]:
+    """
+    Split the masks into connected components of overlapping masks, and
+    the components into at most n_groups groups of about equal numbers of
+    mask pixels.
+    """
+    # sums of integer frames over integer masks may overflow
+    flat_masks = flat_masks.astype(float)
+    overlaps = flat_masks.dot(flat_masks.T)
+    n_components, labels = csgraph.connected_components(
+        overlaps, directed=False)
+    order = np.argsort(labels, kind="stable")
+    components = np.split(
+        order, np.cumsum(np.bincount(labels, minlength=n_components))[:-1])
+    sizes = np.bincount(labels, weights=flat_masks.getnnz(axis=1),
+                        minlength=n_components)
+
+    groups: List[List[np.ndarray]] = [[] for _ in range(n_groups)]
+    group_sizes = np.zeros(n_groups)
+    for c in np.argsort(-sizes, kind="stable"):
+        g = np.argmin(group_sizes)
+        groups[g].append(components[c])
+        group_sizes[g] += sizes[c]
+    return [_ComponentGroup(flat_masks, group) for group in groups if group]
 
 
 def demix_time_dep_masks(raw_traces: np.ndarray, stack: np.ndarray,
-                         masks: np.ndarray,
-                         max_block_size: int = 1000) -> Tuple[np.ndarray, list]:
+                         masks: Union[np.ndarray,
+                                      Sequence[roi_masks.SparseMask]],
+                         max_block_size: int = 1000,
+                         n_workers: int = 1) -> Tuple[np.ndarray, list]:
     """
     Demix traces of potentially overlapping masks extraced from a single
     2p recording.
 
+    Only masks which overlap are demixed together: the masks are split
+    into connected components of overlapping masks, and the components of
+    each size are demixed for a whole block of frames at once.
+
     :param raw_traces: 2d array of traces for each mask, of dimensions
         (n, t), where `t` is the number of time points and `n` is the
         number of masks.
@@ -124,15 +297,17 @@ def demix_time_dep_masks(raw_traces: np.ndarray, stack: np.ndarray,
         dimensions (t, H, W) or corresponding hdf5 dataset.
     :param masks: 3d array of binary roi masks, of shape (n, H, W),
         where `n` is the number of masks, and HW are the dimensions of
-        an individual frame in the movie `stack`.
+        an individual frame in the movie `stack`; or a list of `n`
+        roi_masks.SparseMask (or roi_masks.Mask) of frame shape (H, W),
+        in which case no dense mask array is built.
     :max_block_size: int representing maximum number of movie frames to read
         at a time (-1 for full length `t` of `stack`) (the default is 1000)
+    :param n_workers: number of threads among which the components are
+        divided (the default is 1)
     :return: Tuple of demixed traces and whether each frame was skipped
         in the demixing calculation.
     """
     N, T = raw_traces.shape
-    _, x, y = masks.shape
-    P = x * y
 
     if max_block_size == -1:
         max_block_size = T
@@ -141,30 +316,43 @@ def demix_time_dep_masks(raw_traces: np.ndarray, stack: np.ndarray,
                          "positive (>= 1), or -1 for full length block "
                          "size.".format(max_block_size))
 
-    num_pixels_in_mask = np.sum(masks, axis=(1, 2))
-
-    flat_masks = masks.reshape(N, P)
-    flat_masks = sparse.csr_matrix(flat_masks)
+    if isinstance(masks, np.ndarray):
+        _, x, y = masks.shape
+        P = x * y
+        num_pixels_in_mask = np.sum(masks, axis=(1, 2))
+        flat_masks = masks.reshape(N, P)
+        flat_masks = sparse.csr_matrix(flat_masks)
+    else:
+        flat_masks = roi_masks.create_mask_matrix(masks)
+        P = flat_masks.shape[1]
+        num_pixels_in_mask = flat_masks.getnnz(axis=1)
 
-    drop_frames = []
+    groups = _component_groups(flat_masks, max(1, n_workers))
+    drop_frames = np.zeros(T, dtype=bool)
     demix_traces = np.zeros((N, T))
 
-    for t in range(T):
-
-        block_t = t % max_block_size
-        if block_t == 0:  # load next block into memory and reshape
-            block_T = np.min([(T - t), max_block_size])
-            stack_block = stack[t : t+block_T].reshape(block_T, P)
-
-        demixed_point = _demix_point(
-            stack_block[block_t], raw_traces[:, t], flat_masks,
-            num_pixels_in_mask)
-        if demixed_point is not None:
-            demix_traces[:, t] = demixed_point
-            drop_frames.append(False)
-        else:
-            drop_frames.append(True)
-    return demix_traces, drop_frames
+    with ThreadPoolExecutor(max_workers=max(1, n_workers)) as executor:
+        for t in range(0, T, max_block_size):
+            block_T = min(T - t, max_block_size)
+            stack_block = stack[t:t + block_T].reshape(block_T, P)
+            mask_weighted_traces = \
+                raw_traces[:, t:t + block_T] * num_pixels_in_mask[:, None]
+
+            # Skip frames with zero signal anywhere in one of the traces
+            drop = (mask_weighted_traces == 0).any(axis=0)
+            drop_frames[t:t + block_T] = drop
+            if drop.all():
+                continue
+            keep = np.flatnonzero(~drop)
+            block_demix_traces = np.zeros((N, len(keep)))
+            futures = [executor.submit(
+                group.demix, stack_block[keep],
+                mask_weighted_traces[:, keep], num_pixels_in_mask,
+                block_demix_traces) for group in groups]
+            for future in futures:
+                future.result()
+            demix_traces[:, t + keep] = block_demix_traces
+    return demix_traces, drop_frames.tolist()
 
 
 def plot_traces(raw_trace, demix_trace, roi_id, roi_ind, save_file):
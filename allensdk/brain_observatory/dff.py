@@ -36,6 +36,8 @@
 import logging
 import os
 import argparse
+from functools import partial
+from multiprocessing import Pool
 import matplotlib.pyplot as plt
 import h5py
 import numpy as np
@@ -46,6 +48,10 @@ from allensdk.core.brain_observatory_nwb_data_set import \
 
 GAUSSIAN_MAD_STD_SCALE = 1.4826
 
+# memory budget for the histograms of rows processed together by
+# movingmode_rows
+MOVINGMODE_HISTOGRAM_BYTES = 64 * 1024 ** 2
+
 
 def movingmode_fast(x, kernelsize, y):
     """Compute the windowed mode of an array.  A running mode is initialized
@@ -63,64 +69,114 @@ def movingmode_fast(x, kernelsize, y):
         Output array to store the results
     """
 
-    # offset so that the trace is non-negative
-    minval = min(x.min(), 0)
-    if minval < 0:
-        x = x - minval
-
-    maxval = x.max()
-
-    # compute a histogram of a half kernel
-    halfsize = int(kernelsize / 2)
-    histo = np.bincount(np.rint(x[:halfsize]).astype(
-        np.uint32), minlength=int(maxval + 2))
-
-    # find the mode of the first half kernel
-    mode = np.argmax(histo)
+    movingmode_rows(x[np.newaxis], kernelsize, y[np.newaxis])
 
-    # here initial mode is available
-    for m in range(0, halfsize):
-        q = int(round(x[halfsize + m]))
+    return 0
 
-        histo[q] += 1
 
-        if histo[q] > histo[mode]:
-            mode = q
+def movingmode_rows(x, kernelsize, y,
+                    max_histogram_bytes=MOVINGMODE_HISTOGRAM_BYTES):
+    """Compute the windowed mode of each row of a 2D array, as
+    :func:`movingmode_fast` does for a 1D array.
 
-        y[m] = mode
+    Rows are processed together in blocks: the histograms of the rows of
+    a block are the rows of a 2D array, and each step of the kernel
+    updates the histograms and modes of all of them at once. Rows are
+    grouped by the number of histogram bins they need, and each block
+    is limited to max_histogram_bytes of histograms (a row which needs
+    more is processed on its own).
 
-    for m in range(halfsize, x.shape[0] - halfsize):
-        p = int(round(x[m - halfsize]))
-        histo[p] -= 1
-
-        # need to find possibly new mode value
-        if p == mode:
-            mode = np.argmax(histo)
+    Parameters
+    ----------
+    x : np.ndarray
+        2D array, each row of which is to be analyzed
+    kernelsize : int
+        Size of the moving window
+    y : np.ndarray
+        2D output array to store the results
+    max_histogram_bytes : int
+        Memory budget for the histograms of a block of rows
+    """
 
-        q = int(round(x[m + halfsize]))
+    # offset so that the traces are non-negative
+    minval = np.minimum(x.min(axis=1), 0)
+    n_bins = np.rint(x.max(axis=1) - minval).astype(np.intp) + 2
+
+    order = np.argsort(n_bins, kind='stable')
+    itemsize = np.dtype(np.intp).itemsize
+    start = 0
+    while start < len(order):
+        # n_bins increases along order, so the last row of a block
+        # determines the size of its histograms
+        stop = start + 1
+        while stop < len(order) and \
+                (stop - start + 1) * n_bins[order[stop]] * itemsize \
+                <= max_histogram_bytes:
+            stop += 1
+        rows = order[start:stop]
+        block = np.empty((len(rows), x.shape[1]), dtype=y.dtype)
+        _movingmode_block(x[rows], minval[rows], kernelsize, block)
+        y[rows] = block
+        start = stop
 
-        histo[q] += 1
+    return 0
 
-        if histo[q] > histo[mode]:
-            mode = q
 
-        y[m] = mode
+def _movingmode_block(x, minval, kernelsize, y):
+    """Compute the windowed modes of all rows of x together (see
+    movingmode_rows). minval is the (non-positive) offset of each row
+    which makes it non-negative.
+    """
 
-    for m in range(x.shape[0] - halfsize, x.shape[0]):
-        p = int(round(x[m - halfsize]))
-        histo[p] -= 1
+    xq = np.rint(x - minval[:, np.newaxis]).astype(np.intp)
+    n_rows, n_samples = xq.shape
 
-        # need to find possibly new mode value
-        if p == mode:
-            mode = np.argmax(histo)
+    # compute histograms of a half kernel, one row per row of x
+    halfsize = int(kernelsize / 2)
+    n_bins = xq.max() + 2
+    offsets = np.arange(n_rows) * n_bins
+    histo = np.bincount((xq[:, :halfsize] + offsets[:, np.newaxis]).ravel(),
+                        minlength=n_rows * n_bins).reshape(n_rows, n_bins)
+    flat_histo = histo.ravel()
+
+    # find the modes of the first half kernel
+    mode = np.argmax(histo, axis=1)
+
+    # the samples of all rows at each step
+    xq = np.ascontiguousarray(xq.T)
+    modes = np.empty((n_samples, n_rows), dtype=np.intp)
+
+    def add(q):
+        q_index = offsets + q
+        flat_histo[q_index] += 1
+        new_mode = flat_histo[q_index] > flat_histo[offsets + mode]
+        mode[new_mode] = q[new_mode]
+
+    def remove(p):
+        flat_histo[offsets + p] -= 1
+
+        # need to find possibly new mode values
+        removed_mode = np.flatnonzero(p == mode)
+        if len(removed_mode) > 0:
+            mode[removed_mode] = np.argmax(histo[removed_mode], axis=1)
+
+    # here initial modes are available
+    for m in range(0, halfsize):
+        add(xq[halfsize + m])
+        modes[m] = mode
 
-        y[m] = mode
+    for m in range(halfsize, n_samples - halfsize):
+        remove(xq[m - halfsize])
+        add(xq[m + halfsize])
+        modes[m] = mode
 
-    # undo the offset
-    if minval < 0:
-        y += minval
+    for m in range(n_samples - halfsize, n_samples):
+        remove(xq[m - halfsize])
+        modes[m] = mode
 
-    return 0
+    # undo the offsets
+    y[:] = modes.T
+    y += minval[:, np.newaxis]
 
 
 def movingaverage(x, kernelsize, y):
@@ -154,6 +210,63 @@ def movingaverage(x, kernelsize, y):
     return 0
 
 
+def movingaverage_rows(x, kernelsize, y):
+    """Compute the windowed average of each row of a 2D array, as
+    :func:`movingaverage` does for a 1D array (with the same floating
+    point operations, so the results are identical).
+
+    Parameters
+    ----------
+    x : np.ndarray
+        2D array, each row of which is to be analyzed
+    kernelsize : int
+        Size of the moving window
+    y : np.ndarray
+        2D output array to store the results
+    """
+
+    halfsize = int(kernelsize / 2)
+    n_samples = x.shape[1]
+    averages = np.empty((n_samples, x.shape[0]))
+    sumkernel = np.sum(x[:, 0:halfsize], axis=1)
+    first_sumkernel = np.sum(x[:, 0:kernelsize], axis=1)
+    x = np.ascontiguousarray(x.T)
+
+    for m in range(0, halfsize):
+        sumkernel = sumkernel + x[m + halfsize]
+        averages[m] = sumkernel / (halfsize + m)
+
+    sumkernel = first_sumkernel
+    for m in range(halfsize, n_samples - halfsize):
+        sumkernel = sumkernel - x[m - halfsize] + x[m + halfsize]
+        averages[m] = sumkernel / kernelsize
+
+    for m in range(n_samples - halfsize, n_samples):
+        sumkernel = sumkernel - x[m - halfsize]
+        averages[m] = sumkernel / (halfsize - 1 + (n_samples - m))
+
+    y[:] = averages.T
+
+    return 0
+
+
+def _map_roi_chunks(func, traces, n_workers=1):
+    """Apply func to chunks of rows of traces, on a pool of n_workers
+    processes if n_workers > 1.
+
+    Returns
+    -------
+    list
+        Results of func for each chunk, in order
+    """
+    if n_workers <= 1 or traces.shape[0] <= 1:
+        return [func(traces)]
+
+    chunks = np.array_split(traces, min(n_workers, traces.shape[0]))
+    with Pool(n_workers) as pool:
+        return pool.map(func, chunks)
+
+
 def plot_onetrace(dff, fc):
     """Debug plotting function"""
     qs = np.rint(np.linspace(0, len(dff), 5)).astype(int)
@@ -185,7 +298,8 @@ def plot_onetrace(dff, fc):
 
 def compute_dff_windowed_mode(traces,
                               mode_kernelsize=5400,
-                              mean_kernelsize=3000):
+                              mean_kernelsize=3000,
+                              n_workers=1):
     """Compute dF/F of a set of traces using a low-pass windowed-mode operator.
 
     The operation is basically:
@@ -202,6 +316,9 @@ def compute_dff_windowed_mode(traces,
         Window size to use for windowed_mode.
     mean_kernelsize : int
         Window size to use for windowed_mean.
+    n_workers : int
+        Number of processes among which the traces are divided. By default
+        all traces are processed together in this process.
 
     Returns
     -------
@@ -222,33 +339,45 @@ def compute_dff_windowed_mode(traces,
     logging.debug("trace matrix shape: %d %d" %
                   (traces.shape[0], traces.shape[1]))
 
-    modeline = np.zeros(traces.shape[1])
-    modelineLP = np.zeros(traces.shape[1])
     dff = np.zeros((traces.shape[0], traces.shape[1]))
 
-    logging.debug("computing df/f")
+    valid = ~np.any(np.isnan(traces), axis=1)
+    for n in np.flatnonzero(~valid):
+        logging.warning(
+            "trace for roi %d contains NaNs, setting to NaN", n)
+        dff[n, :] = np.nan
+    if not valid.any():
+        return dff
 
-    for n in range(0, traces.shape[0]):
-        if np.any(np.isnan(traces[n])):
-            logging.warning(
-                "trace for roi %d contains NaNs, setting to NaN", n)
-            dff[n, :] = np.nan
-            continue
+    logging.debug("computing df/f")
 
-        movingmode_fast(traces[n, :], mode_kernelsize, modeline[:])
-        movingaverage(modeline[:], mean_kernelsize, modelineLP[:])
-        dff[n, :] = (traces[n, :] - modelineLP[:]) / modelineLP[:]
+    modelineLP = np.concatenate(_map_roi_chunks(
+        partial(_windowed_mode_baseline, mode_kernelsize=mode_kernelsize,
+                mean_kernelsize=mean_kernelsize),
+        traces[valid], n_workers))
+    dff[valid] = (traces[valid] - modelineLP) / modelineLP
 
-        logging.debug("finished trace %d/%d" % (n + 1, traces.shape[0]))
+    logging.debug("finished %d traces" % valid.sum())
 
     return dff
 
 
+def _windowed_mode_baseline(traces, mode_kernelsize, mean_kernelsize):
+    """Low-pass windowed mode of each of a set of traces, ie the baseline
+    of :func:`compute_dff_windowed_mode`"""
+    modeline = np.zeros(traces.shape)
+    modelineLP = np.zeros(traces.shape)
+    movingmode_rows(traces, mode_kernelsize, modeline)
+    movingaverage_rows(modeline, mean_kernelsize, modelineLP)
+    return modelineLP
+
+
 def compute_dff_windowed_median(traces,
                                 median_kernel_long=5401,
                                 median_kernel_short=101,
                                 noise_stds=None,
                                 n_small_baseline_frames=None,
+                                n_workers=1,
                                 **kwargs):
     """Compute dF/F of a set of traces with median filter detrending.
 
@@ -277,6 +406,9 @@ def compute_dff_windowed_median(traces,
         List that will contain the number of frames for each trace where
         the long-timescale median window is less than noise_std(T). The
         value for each trace will be appended to the list if provided.
+    n_workers : int
+        Number of processes among which the traces are divided. By default
+        all traces are processed in this process.
     kwargs:
         Additional keyword arguments are passed to :func:`noise_std` .
 
@@ -288,7 +420,28 @@ def compute_dff_windowed_median(traces,
     _check_kernel(median_kernel_long, traces.shape[1])
     _check_kernel(median_kernel_short, traces.shape[1])
 
+    results = _map_roi_chunks(
+        partial(_windowed_median_dff, median_kernel_long=median_kernel_long,
+                median_kernel_short=median_kernel_short, **kwargs),
+        traces, n_workers)
+
+    if noise_stds is not None:
+        noise_stds.extend(std for _, stds, _ in results for std in stds)
+    if n_small_baseline_frames is not None:
+        n_small_baseline_frames.extend(
+            n for _, _, ns in results for n in ns)
+
+    return np.concatenate([dff_traces for dff_traces, _, _ in results])
+
+
+def _windowed_median_dff(traces, median_kernel_long, median_kernel_short,
+                         **kwargs):
+    """dF/F of each of a set of traces, as computed by
+    :func:`compute_dff_windowed_median`, and their noise_std(T_dff1) and
+    numbers of small baseline frames"""
     dff_traces = np.copy(traces)
+    noise_stds = []
+    n_small_baseline_frames = []
 
     for dff in dff_traces:
         sigma_f = noise_std(dff, **kwargs)
@@ -298,19 +451,17 @@ def compute_dff_windowed_median(traces,
         dff -= tf
         dff /= np.maximum(tf, sigma_f)
 
-        if n_small_baseline_frames is not None:
-            n_small_baseline_frames.append(np.sum(tf <= sigma_f))
+        n_small_baseline_frames.append(np.sum(tf <= sigma_f))
 
         sigma_dff = noise_std(dff, **kwargs)
-        if noise_stds is not None:
-            noise_stds.append(sigma_dff)
+        noise_stds.append(sigma_dff)
 
         # short timescale detrending
         tf = median_filter(dff, median_kernel_short, mode='constant')
         tf = np.minimum(tf, 2.5*sigma_dff)
         dff -= tf
 
-    return dff_traces
+    return dff_traces, noise_stds, n_small_baseline_frames
 
 
 def _check_kernel(kernel_size, data_size):
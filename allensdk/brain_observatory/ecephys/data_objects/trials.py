@@ -1,85 +1,28 @@
-from typing import Union, Tuple, List
+from typing import Tuple, List
 
 import numpy as np
 
+from allensdk.brain_observatory.behavior.data_objects import (
+    StimulusTimestamps)
 from allensdk.brain_observatory.behavior.data_objects.trials.trial import (
     Trial)
 from allensdk.brain_observatory.behavior.data_objects.\
     trials.trials import Trials
+from allensdk.deprecated import class_deprecated, deprecated
 
 
+@class_deprecated("The trials table is built by "
+                  "VBNTrials.from_stimulus_file")
 class VBNTrial(Trial):
 
-    def calculate_change_frame(
-            self,
-            event_dict: dict,
-            go: bool,
-            catch: bool,
-            auto_rewarded: bool) -> Union[int, float]:
-
-        """
-        Calculate the frame index of a stimulus change
-        associated with a specific event.
-
-        Parameters
-        ----------
-        event_dict: dict
-            Dictionary of trial events in the well-known `pkl` file
-        go: bool
-            True if "go" trial, False otherwise. Mutually exclusive with
-            `catch`.
-        catch: bool
-            True if "catch" trial, False otherwise. Mutually exclusive
-            with `go.`
-        auto_rewarded: bool
-            True if "auto_rewarded" trial, False otherwise.
-
-        Returns
-        -------
-        change_frame: Union[int, float]
-            Index of the change frame; NaN if there is no change
-
-        Notes
-        -----
-        This is its own method so that child classes of Trial
-        can implement different logic as needed.
-        """
-
-        if go or auto_rewarded:
-            change_frame = event_dict.get(('stimulus_changed', ''))['frame']
-        elif catch:
-            change_frame = event_dict.get(('sham_change', ''))['frame']
-        else:
-            change_frame = float("nan")
-
-        return change_frame
-
-    def add_change_time(self, trial_dict: dict) -> Tuple[dict, float]:
+    def _add_change_time(self, trial_dict: dict) -> Tuple[dict, float]:
         """
         Add change_time_no_display_delay to a dict representing
         a single trial.
 
         This implementation will just take change_frame and
-        select the value of self._stimulus_timestamps corresponding
-        to that frame.
-
-        Parameters
-        ----------
-        trial_dict:
-            dict containing all trial parameters except
-            change_time
-
-        Returns
-        -------
-        trial_dict:
-            Same as input, except change_time_no_display_delay
-            field has been added
-
-        change_time: float
-            The change time value that was added
-            (this is returned separately so that child classes have the
-            option of naming the column something different than
-            'change_time')
+        select the value of self._stimulus_timestamps, without monitor
+        delay, corresponding to that frame.
 
         Note
         ----
@@ -100,12 +43,54 @@ class VBNTrial(Trial):
 class VBNTrials(Trials):
 
     @classmethod
+    @deprecated("The trials table is no longer built from Trial objects; "
+                "override add_change_times instead")
     def trial_class(cls):
         """
         Return the class to be used to represent a single Trial
         """
         return VBNTrial
 
+    @classmethod
+    def add_change_times(
+            cls,
+            trials: dict,
+            stimulus_timestamps: StimulusTimestamps
+    ) -> Tuple[dict, np.ndarray]:
+        """
+        Add change_time_no_display_delay to the columns of a trials table.
+
+        This implementation selects the values of stimulus_timestamps,
+        without monitor delay, at the change_frame of each trial.
+
+        Parameters
+        ----------
+        trials:
+            dict mapping the columns of the trials table to their values,
+            including change_frame
+        stimulus_timestamps:
+            Timestamps of the stimulus frames, including monitor delay
+
+        Returns
+        -------
+        trials:
+            Same as input, except the change_time_no_display_delay
+            column has been added
+
+        change_times: np.ndarray
+            The change time of each trial (NaN if there is no change)
+
+        Note
+        ----
+        Modifies trials in-place, in addition to returning it
+        """
+        no_delay = stimulus_timestamps.subtract_monitor_delay()
+        change_times = cls._get_change_times(
+            change_frames=trials['change_frame'],
+            timestamps=no_delay.value)
+        trials['change_time_no_display_delay'] = change_times
+        return trials, change_times
+
     @classmethod
     def columns_to_output(cls) -> List[str]:
         """
@@ -14,6 +14,14 @@ from allensdk.brain_observatory.ecephys.ecephys_session_api import (
     EcephysNwbSessionApi,
     EcephysSessionApi,
 )
+from allensdk.brain_observatory.ecephys.lazy_lfp import LazyLFP
+from allensdk.brain_observatory.ecephys.spike_times import (
+    SpikeTimeStore,
+    build_spike_histogram_csr,
+    concatenate_spike_times,
+    iter_spike_histogram_blocks,
+    presentationwise_spike_table,
+)
 from allensdk.brain_observatory.ecephys.stimulus_table import naming_utilities
 from allensdk.brain_observatory.ecephys.stimulus_table._schemas import (
     default_column_renames,
@@ -74,8 +82,10 @@ class EcephysSession(LazyPropertyMixin):
                 about this unit's probe.
             location : str
                 Gross-scale location of this unit's probe.
-    spike_times : dict
+    spike_times : SpikeTimeStore
         Maps integer unit ids to arrays of spike times (float) for those units.
+        The spike times of all units are stored in a single array; see
+        allensdk.brain_observatory.ecephys.spike_times.SpikeTimeStore
     running_speed : RunningSpeed
         NamedTuple with two fields
             timestamps : numpy.ndarray
@@ -367,7 +377,8 @@ class EcephysSession(LazyPropertyMixin):
 
         return self.api.get_current_source_density(probe_id)
 
-    def get_lfp(self, probe_id, mask_invalid_intervals=True):
+    def get_lfp(self, probe_id, mask_invalid_intervals=True,
+                time_slice=None, channel_ids=None, decimation=1, lazy=False):
         ''' Load an xarray DataArray with LFP data from channels on a
          single probe
 
@@ -378,6 +389,19 @@ class EcephysSession(LazyPropertyMixin):
         mask_invalid_intervals : bool
             if True (default) will mask data in the invalid intervals with
             np.nan
+        time_slice : tuple or slice, optional
+            (start, stop) times (s) of the window to load. Both ends are
+            inclusive and either may be None. Defaults to the whole session.
+        channel_ids : array-like, optional
+            Load only these channels. Defaults to all channels.
+        decimation : int, optional
+            Keep only every nth sample (no anti-aliasing filter is applied).
+            Defaults to 1 (keep every sample).
+        lazy : bool, optional
+            If True, return a LazyLFP handle, from which windows of data can
+            be read later on, instead of loading any data. time_slice,
+            channel_ids and decimation are ignored in this case.
+
         Returns
         -------
         xr.DataArray :
@@ -389,6 +413,10 @@ class EcephysSession(LazyPropertyMixin):
         Unlike many other data access methods on this class. This one does not
         cache the loaded data in memory due to the large size of the LFP data.
 
+        When the api supports it (see EcephysSessionApi.get_lazy_lfp), only
+        the requested samples and channels are read from disk, in bounded
+        chunks, and invalid intervals are masked as each chunk is read.
+
         '''
 
         if mask_invalid_intervals:
@@ -396,14 +424,111 @@ class EcephysSession(LazyPropertyMixin):
             fail_tags = ["all_probes", probe_name]
             invalid_time_intervals = \
                 self._filter_invalid_times_by_tags(fail_tags)
-            lfp = self.api.get_lfp(probe_id)
+        else:
+            invalid_time_intervals = pd.DataFrame()
+
+        try:
+            lfp = self.api.get_lazy_lfp(probe_id)
+        except NotImplementedError:
+            lfp = None
+
+        if lfp is not None or lazy:
+            if lfp is None:
+                lfp = LazyLFP.from_dataarray(self.api.get_lfp(probe_id))
+            if not invalid_time_intervals.empty:
+                lfp = lfp.mask_intervals(
+                    invalid_time_intervals[["start_time", "stop_time"]].values)
+            if lazy:
+                return lfp
+            return lfp.read(time_slice=time_slice,
+                            channel_ids=channel_ids,
+                            decimation=decimation)
+
+        lfp = self.api.get_lfp(probe_id)
+        lfp = _select_lfp(lfp, time_slice, channel_ids, decimation)
+        if mask_invalid_intervals:
             time_points = lfp.time
             valid_time_points = \
                 self._get_valid_time_points(time_points,
                                             invalid_time_intervals)
             return lfp.where(cond=valid_time_points)
         else:
-            return self.api.get_lfp(probe_id)
+            return lfp
+
+    def presentationwise_lfp(self, stimulus_presentation_ids, window,
+                             channel_ids=None, probe_id=None,
+                             mask_invalid_intervals=True, max_workers=None):
+        ''' Cut a window of LFP data around the onset of each of a set of
+        stimulus presentations.
+
+        Windows close to one another are read from disk together and written
+        directly into the output array, so that the full LFP is never loaded.
+
+        Parameters
+        ----------
+        stimulus_presentation_ids : array-like
+            Cut a window around the onset of each of these presentations
+        window : tuple
+            (start, stop) times (s), relative to presentation onset, of each
+            window. The stop time is exclusive.
+        channel_ids : array-like, optional
+            Load these channels, which must all be on the same probe.
+            Defaults to all channels of probe_id.
+        probe_id : int, optional
+            The probe whose LFP is loaded. Defaults to the probe of
+            channel_ids.
+        mask_invalid_intervals : bool, optional
+            if True (default) will mask data in the invalid intervals with
+            np.nan
+        max_workers : int, optional
+            If provided, read from disk on a pool of this many threads.
+
+        Returns
+        -------
+        xarray.DataArray :
+            Dimensions are stimulus presentation, time (s, relative to
+            presentation onset) and channel. Samples falling outside of the
+            recording are np.nan.
+
+        '''
+
+        stimulus_presentations = self._filter_owned_df(
+            'stimulus_presentations', ids=stimulus_presentation_ids)
+
+        if probe_id is None:
+            if channel_ids is None:
+                raise ValueError(
+                    "either probe_id or channel_ids must be provided")
+            probe_ids = np.unique(
+                self.channels.loc[channel_ids, "probe_id"].values)
+            if probe_ids.size != 1:
+                raise ValueError(
+                    f"channel_ids must all belong to a single probe; got "
+                    f"channels from probes {probe_ids.tolist()}")
+            probe_id = probe_ids[0]
+
+        lfp = self.get_lfp(probe_id,
+                           mask_invalid_intervals=mask_invalid_intervals,
+                           lazy=True)
+        data, relative_times = lfp.read_epochs(
+            stimulus_presentations["start_time"].values,
+            window,
+            channel_ids=channel_ids,
+            max_workers=max_workers)
+
+        return xr.DataArray(
+            name='LFP',
+            data=data,
+            coords={
+                'stimulus_presentation_id':
+                    stimulus_presentations.index.values,
+                'time_relative_to_stimulus_onset': relative_times,
+                'channel': lfp.channel_ids[lfp.channel_positions(channel_ids)]
+            },
+            dims=['stimulus_presentation_id',
+                  'time_relative_to_stimulus_onset',
+                  'channel']
+        )
 
     def _get_valid_time_points(self, time_points, invalid_time_intevals):
 
@@ -688,7 +813,9 @@ class EcephysSession(LazyPropertyMixin):
         binarize=False,
         dtype=None,
         large_bin_size_threshold=0.001,
-        time_domain_callback=None
+        time_domain_callback=None,
+        max_workers=None,
+        use_processes=False
     ):
         ''' Build an array of spike counts surrounding stimulus onset per
         unit and stimulus frame.
@@ -713,6 +840,12 @@ class EcephysSession(LazyPropertyMixin):
             The time domain is a numpy array whose values are trial-aligned bin
             edges (each row is aligned to a different trial). This optional
             function will be applied to the time domain before counting spikes.
+        max_workers : int, optional
+            If provided, count the spikes of blocks of units concurrently
+            using this many workers.
+        use_processes : bool, optional
+            If True (and max_workers is provided), use a process pool
+            rather than a thread pool.
 
         Returns
         -------
@@ -727,6 +860,115 @@ class EcephysSession(LazyPropertyMixin):
             ids=stimulus_presentation_ids)
         units = self._filter_owned_df('units', ids=unit_ids)
 
+        bin_edges = np.array(bin_edges)
+        domain = self._build_presentationwise_domain(
+            bin_edges,
+            stimulus_presentations,
+            binarize=binarize,
+            large_bin_size_threshold=large_bin_size_threshold,
+            time_domain_callback=time_domain_callback)
+
+        tiled_data = build_spike_histogram(
+            domain,
+            self.spike_times,
+            units.index.values,
+            dtype=dtype,
+            binarize=binarize,
+            max_workers=max_workers,
+            use_processes=use_processes
+        )
+
+        return _spike_counts_data_array(
+            tiled_data,
+            stimulus_presentations.index.values,
+            bin_edges,
+            units.index.values)
+
+    def iter_presentationwise_spike_counts(
+        self,
+        bin_edges,
+        stimulus_presentation_ids,
+        unit_ids,
+        presentations_per_block=1000,
+        binarize=False,
+        dtype=None,
+        large_bin_size_threshold=0.001,
+        time_domain_callback=None
+    ):
+        ''' As presentationwise_spike_counts, but generate the spike counts
+        one block of stimulus presentations at a time. Memory use is bounded
+        by presentations_per_block * bins * units, rather than growing with
+        the number of presentations.
+
+        Parameters
+        ---------
+        bin_edges : numpy.ndarray
+            Spikes will be counted into the bins defined by these edges.
+            Values are in seconds, relative to stimulus onset.
+        stimulus_presentation_ids : array-like
+            Filter to these stimulus presentations
+        unit_ids : array-like
+            Filter to these units
+        presentations_per_block : int, optional
+            Number of stimulus presentations in each generated block
+        binarize : bool, optional
+            If true, all counts greater than 0 will be treated as 1.
+        large_bin_size_threshold : float, optional
+            If binarize is True and the largest bin width is greater than
+            this value, a warning will be emitted.
+        time_domain_callback : callable, optional
+            Applied to the (full) time domain before counting spikes. See
+            presentationwise_spike_counts.
+
+        Yields
+        ------
+        xarray.DataArray :
+            Data array whose dimensions are stimulus presentation, unit,
+            and time bin and whose values are spike counts, for one block
+            of stimulus presentations.
+
+        '''
+
+        stimulus_presentations = self._filter_owned_df(
+            'stimulus_presentations',
+            ids=stimulus_presentation_ids)
+        units = self._filter_owned_df('units', ids=unit_ids)
+
+        bin_edges = np.array(bin_edges)
+        domain = self._build_presentationwise_domain(
+            bin_edges,
+            stimulus_presentations,
+            binarize=binarize,
+            large_bin_size_threshold=large_bin_size_threshold,
+            time_domain_callback=time_domain_callback)
+
+        spike_times, offsets = concatenate_spike_times(
+            self.spike_times, units.index.values)
+        stim_presentation_id = stimulus_presentations.index.values
+
+        for rows, counts in iter_spike_histogram_blocks(
+                domain, spike_times, offsets,
+                rows_per_block=presentations_per_block,
+                dtype=dtype,
+                binarize=binarize):
+            yield _spike_counts_data_array(
+                counts,
+                stim_presentation_id[rows],
+                bin_edges,
+                units.index.values)
+
+    def _build_presentationwise_domain(
+        self,
+        bin_edges,
+        stimulus_presentations,
+        binarize,
+        large_bin_size_threshold,
+        time_domain_callback
+    ):
+        ''' Build (and validate) the trial-aligned bin edges used to count
+        spikes around the onset of each stimulus presentation
+        '''
+
         largest_bin_size = np.amax(np.diff(bin_edges))
         if binarize and largest_bin_size > large_bin_size_threshold:
             warnings.warn(
@@ -739,7 +981,6 @@ class EcephysSession(LazyPropertyMixin):
                 'seconds wide.'
             )
 
-        bin_edges = np.array(bin_edges)
         domain = build_time_window_domain(
             bin_edges,
             stimulus_presentations['start_time'].values,
@@ -766,36 +1007,13 @@ class EcephysSession(LazyPropertyMixin):
                           "with a maximum overlap of"
                           f" {np.abs(np.min(time_diffs))} seconds.")
 
-        tiled_data = build_spike_histogram(
-            domain,
-            self.spike_times,
-            units.index.values,
-            dtype=dtype,
-            binarize=binarize
-        )
-
-        stim_presentation_id = stimulus_presentations.index.values
-
-        tiled_data = xr.DataArray(
-            name='spike_counts',
-            data=tiled_data,
-            coords={
-                'stimulus_presentation_id': stim_presentation_id,
-                'time_relative_to_stimulus_onset': (bin_edges[:-1] +
-                                                    np.diff(bin_edges) / 2),
-                'unit_id': units.index.values
-            },
-            dims=['stimulus_presentation_id',
-                  'time_relative_to_stimulus_onset',
-                  'unit_id']
-        )
-
-        return tiled_data
+        return domain
 
     def presentationwise_spike_times(
             self,
             stimulus_presentation_ids=None,
-            unit_ids=None):
+            unit_ids=None,
+            as_structured_array=False):
         ''' Produce a table associating spike times with units and
         stimulus presentations
 
@@ -805,6 +1023,10 @@ class EcephysSession(LazyPropertyMixin):
             Filter to these stimulus presentations
         unit_ids : array-like
             Filter to these units
+        as_structured_array : bool, optional
+            If True, return a numpy structured array with fields spike_time,
+            stimulus_presentation_id, unit_id and
+            time_since_stimulus_presentation_onset instead of a DataFrame.
 
         Returns
         -------
@@ -824,43 +1046,20 @@ class EcephysSession(LazyPropertyMixin):
                                   ids=stimulus_presentation_ids)
         units = self._filter_owned_df('units', ids=unit_ids)
 
-        presentation_times = np.zeros([stimulus_presentations.shape[0] * 2])
-        presentation_times[::2] = \
-            np.array(stimulus_presentations['start_time'])
-        presentation_times[1::2] = \
-            np.array(stimulus_presentations['stop_time'])
-        all_presentation_ids = np.array(stimulus_presentations.index.values)
-
-        presentation_ids = []
-        unit_ids = []
-        spike_times = []
+        spike_times, offsets = concatenate_spike_times(
+            self.spike_times, units.index.values)
+        table = presentationwise_spike_table(
+            spike_times,
+            offsets,
+            units.index.values,
+            stimulus_presentations.index.values,
+            stimulus_presentations['start_time'].values,
+            stimulus_presentations['stop_time'].values)
 
-        for ii, unit_id in enumerate(units.index.values):
-            data = self.spike_times[unit_id]
-            indices = np.searchsorted(presentation_times, data) - 1
+        if as_structured_array:
+            return table
 
-            index_valid = indices % 2 == 0
-            presentations = \
-                all_presentation_ids[np.floor(indices / 2).astype(int)]
-
-            sorder = np.argsort(presentations)
-            presentations = presentations[sorder]
-            index_valid = index_valid[sorder]
-            data = data[sorder]
-
-            changes = \
-                np.where(np.ediff1d(presentations, to_begin=1, to_end=1))[0]
-            for ii, jj in zip(changes[:-1], changes[1:]):
-                values = data[ii:jj][index_valid[ii:jj]]
-                if values.size == 0:
-                    continue
-
-                unit_ids.append(np.zeros([values.size]) + unit_id)
-                presentation_ids.append(np.zeros([values.size]) +
-                                        presentations[ii])
-                spike_times.append(values)
-
-        if not spike_times:
+        if table.size == 0:
             # If there are no units firing during the given stimulus return an
             # empty dataframe
             return pd.DataFrame(columns=[
@@ -869,24 +1068,12 @@ class EcephysSession(LazyPropertyMixin):
                  'unit_id',
                  'time_since_stimulus_presentation_onset'])
 
-        pres_ids = np.concatenate(presentation_ids).astype(int)
-
-        spike_df = pd.DataFrame({
-            'stimulus_presentation_id': pres_ids,
-            'unit_id': np.concatenate(unit_ids).astype(int)
-        }, index=pd.Index(np.concatenate(spike_times), name='spike_time'))
-
-        # Add time since stimulus presentation onset
-        onset_times = self._filter_owned_df(
-            "stimulus_presentations", ids=all_presentation_ids)["start_time"]
-        spikes_with_onset = spike_df.join(onset_times,
-                                          on=["stimulus_presentation_id"])
-        spikes_with_onset["time_since_stimulus_presentation_onset"] = (
-            spikes_with_onset.index - spikes_with_onset["start_time"]
-        )
-        spikes_with_onset.sort_values('spike_time', axis=0, inplace=True)
-        spikes_with_onset.drop(columns=["start_time"], inplace=True)
-        return spikes_with_onset
+        return pd.DataFrame({
+            'stimulus_presentation_id': table['stimulus_presentation_id'],
+            'unit_id': table['unit_id'],
+            'time_since_stimulus_presentation_onset':
+                table['time_since_stimulus_presentation_onset']
+        }, index=pd.Index(table['spike_time'], name='spike_time'))
 
     def conditionwise_spike_statistics(
             self,
@@ -1087,16 +1274,13 @@ class EcephysSession(LazyPropertyMixin):
         return labels, intervals
 
     def _build_spike_times(self, spike_times):
-        retained_units = set(self._units.index.values)
-        output_spike_times = {}
-
-        for unit_id in list(spike_times.keys()):
-            data = spike_times.pop(unit_id)
-            if unit_id not in retained_units:
-                continue
-            output_spike_times[unit_id] = data
+        if not isinstance(spike_times, SpikeTimeStore):
+            spike_times = SpikeTimeStore.from_dict(spike_times)
 
-        return output_spike_times
+        retained_units = set(self._units.index.values)
+        unit_ids = [unit_id for unit_id in spike_times.unit_ids
+                    if unit_id in retained_units]
+        return spike_times.select(unit_ids)
 
     def _build_stimulus_presentations(
             self,
@@ -1378,29 +1562,58 @@ def build_spike_histogram(time_domain,
                           spike_times,
                           unit_ids,
                           dtype=None,
-                          binarize=False):
-
-    time_domain = np.array(time_domain)
-    unit_ids = np.array(unit_ids)
+                          binarize=False,
+                          max_workers=None,
+                          use_processes=False):
+    """ Count the spikes of each unit into trial-aligned time bins. See
+    allensdk.brain_observatory.ecephys.spike_times.build_spike_histogram_csr
+    for details.
+    """
 
-    tiled_data = np.zeros(
-        (time_domain.shape[0], time_domain.shape[1] - 1, unit_ids.size),
-        dtype=(np.uint8 if binarize else np.uint16) if dtype is None else dtype
+    spike_times, offsets = concatenate_spike_times(spike_times,
+                                                   np.array(unit_ids))
+    return build_spike_histogram_csr(time_domain,
+                                     spike_times,
+                                     offsets,
+                                     dtype=dtype,
+                                     binarize=binarize,
+                                     max_workers=max_workers,
+                                     use_processes=use_processes)
+
+
+def _spike_counts_data_array(counts, stimulus_presentation_ids, bin_edges,
+                             unit_ids):
+    return xr.DataArray(
+        name='spike_counts',
+        data=counts,
+        coords={
+            'stimulus_presentation_id': stimulus_presentation_ids,
+            'time_relative_to_stimulus_onset': (bin_edges[:-1] +
+                                                np.diff(bin_edges) / 2),
+            'unit_id': unit_ids
+        },
+        dims=['stimulus_presentation_id',
+              'time_relative_to_stimulus_onset',
+              'unit_id']
     )
 
-    starts = time_domain[:, :-1]
-    ends = time_domain[:, 1:]
-
-    for ii, unit_id in enumerate(unit_ids):
-        data = np.array(spike_times[unit_id])
 
-        start_positions = np.searchsorted(data, starts.flat)
-        end_positions = np.searchsorted(data, ends.flat, side="right")
-        counts = (end_positions - start_positions)
-
-        tiled_data[:, :, ii].flat = counts > 0 if binarize else counts
-
-    return tiled_data
+def _select_lfp(lfp, time_slice=None, channel_ids=None, decimation=1):
+    """ Apply get_lfp's time_slice, channel_ids and decimation arguments to
+    LFP which has already been loaded into memory
+    """
+    if decimation < 1:
+        raise ValueError(
+            f"decimation must be a positive integer; got {decimation}")
+    if time_slice is not None:
+        if not isinstance(time_slice, slice):
+            time_slice = slice(*time_slice)
+        lfp = lfp.sel(time=time_slice)
+    if channel_ids is not None:
+        lfp = lfp.sel(channel=channel_ids)
+    if decimation > 1:
+        lfp = lfp.isel(time=slice(None, None, decimation))
+    return lfp
 
 
 def build_time_window_domain(bin_edges, offsets, callback=None):
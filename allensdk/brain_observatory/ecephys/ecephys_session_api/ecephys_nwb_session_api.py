@@ -13,6 +13,8 @@ import \
     allensdk.brain_observatory.ecephys.nwb  # noqa Necessary to import pyNWB
 # namespaces
 from allensdk.brain_observatory.ecephys import get_unit_filter_value
+from allensdk.brain_observatory.ecephys.lazy_lfp import LazyLFP
+from allensdk.brain_observatory.ecephys.spike_times import SpikeTimeStore
 from allensdk.brain_observatory.nwb import check_nwbfile_version
 from .._channels import Channels
 from ..optotagging import OptotaggingTable
@@ -145,9 +147,8 @@ class EcephysNwbSessionApi(NwbApi, EcephysSessionApi):
         probes = Probes.from_nwb(nwbfile=self.nwbfile)
         return probes.mean_waveforms
 
-    def get_spike_times(self) -> Dict[int, np.ndarray]:
-        probes = Probes.from_nwb(nwbfile=self.nwbfile)
-        return probes.spike_times
+    def get_spike_times(self) -> SpikeTimeStore:
+        return SpikeTimeStore.from_nwb_units(self.nwbfile.units)
 
     def get_spike_amplitudes(self) -> Dict[int, np.ndarray]:
         probes = Probes.from_nwb(nwbfile=self.nwbfile)
@@ -164,20 +165,20 @@ class EcephysNwbSessionApi(NwbApi, EcephysSessionApi):
         )
 
     def get_lfp(self, probe_id: int) -> xr.DataArray:
+        return self.get_lazy_lfp(probe_id).to_dataarray()
+
+    def get_lazy_lfp(self, probe_id: int) -> LazyLFP:
         lfp_file = self._probe_nwbfile(probe_id)
         lfp = lfp_file.get_acquisition(f'probe_{probe_id}_lfp')
         series = lfp.get_electrical_series(f'probe_{probe_id}_lfp_data')
 
-        electrodes = lfp_file.electrodes.to_dataframe()
-
-        data = series.data[:]
-        timestamps = series.timestamps[:]
-
-        return xr.DataArray(
-            name="LFP",
-            data=data,
-            dims=['time', 'channel'],
-            coords=[timestamps, electrodes.index.values]
+        # the data and timestamps are left on disk (as h5py datasets) until
+        # they are read through the returned handle
+        return LazyLFP(
+            data=series.data,
+            timestamps=series.timestamps,
+            channel_ids=lfp_file.electrodes.id.data[:],
+            name="LFP"
         )
 
     def get_running_speed(self, include_rotation=False) -> pd.DataFrame:
@@ -6,6 +6,7 @@ import pandas as pd
 import xarray as xr
 
 from ...running_speed import RunningSpeed
+from ..lazy_lfp import LazyLFP
 
 
 class EcephysSessionApi:
@@ -53,6 +54,9 @@ class EcephysSessionApi:
     def get_lfp(self, probe_id: int) -> xr.DataArray:
         raise NotImplementedError
 
+    def get_lazy_lfp(self, probe_id: int) -> LazyLFP:
+        raise NotImplementedError
+
     def get_optogenetic_stimulation(self) -> pd.DataFrame:
         raise NotImplementedError
 
@@ -171,7 +171,7 @@ class EcephysSyncDataset(Dataset):
             raise ValueError('unrecognized strategy: {}'.format(strategy))
 
     @classmethod
-    def factory(cls, path):
+    def factory(cls, path, line_index=True, line_index_cache_dir=None):
         ''' Build a new SyncDataset.
 
         Parameters
@@ -179,10 +179,17 @@ class EcephysSyncDataset(Dataset):
         path : str
             Filesystem path to the h5 file containing sync information
             to be loaded.
+        line_index : bool
+            Answer edge queries from an index of the edges of each line
+            (see allensdk.brain_observatory.sync_dataset.Dataset)
+        line_index_cache_dir : str
+            Directory in which line indexes are saved
 
         '''
 
         obj = cls()
+        obj.use_line_index = line_index
+        obj.line_index_cache_dir = line_index_cache_dir
         obj.load(path)
         return obj
 #
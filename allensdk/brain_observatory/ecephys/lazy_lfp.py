@@ -0,0 +1,445 @@
+""" Lazy access to a probe's LFP.
+
+A probe's LFP can take up several GB, so rather than loading it in full,
+LazyLFP holds on to the (h5py) datasets backing it and reads only the
+samples and channels that are asked for, one bounded chunk at a time.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# upper bound on the size of each block of data read from disk
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+TimeSlice = Union[slice, Tuple[Optional[float], Optional[float]]]
+
+
+class LazyLFP(object):
+    """ A handle on the LFP recorded by one probe. Nothing is read from disk
+    until data is requested with read (or to_dataarray).
+
+    Parameters
+    ----------
+    data :
+        Array-like (time, channel) supporting numpy-style slicing, such as
+        an h5py.Dataset
+    timestamps :
+        Array-like holding the time (s) of each sample. Loaded into memory
+        on first use.
+    channel_ids :
+        The id of each channel (column) of data
+    invalid_intervals :
+        (n, 2) array of [start, stop] times. Samples falling within any of
+        these intervals (inclusive) are replaced with NaN when read.
+    chunk_bytes :
+        Upper bound on the number of bytes read from data at once
+    name :
+        Name given to the DataArrays produced by this handle
+
+    """
+
+    def __init__(self,
+                 data,
+                 timestamps,
+                 channel_ids: Sequence[int],
+                 invalid_intervals: Optional[np.ndarray] = None,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+                 name: str = "LFP"):
+        self._data = data
+        self._timestamps = timestamps
+        self._channel_ids = pd.Index(np.asarray(channel_ids), name="channel")
+
+        if invalid_intervals is None:
+            invalid_intervals = np.zeros((0, 2))
+        self._invalid_intervals = \
+            np.asarray(invalid_intervals, dtype=float).reshape(-1, 2)
+
+        self._chunk_bytes = chunk_bytes
+        self.name = name
+
+        if len(data.shape) != 2 or data.shape[1] != len(self._channel_ids):
+            raise ValueError(
+                f"expected LFP data of shape (time, {len(self._channel_ids)})"
+                f"; got {data.shape}")
+
+    @classmethod
+    def from_dataarray(cls, lfp: xr.DataArray, **kwargs) -> "LazyLFP":
+        """ Wrap LFP which has already been loaded into memory
+        """
+        lfp = lfp.transpose("time", "channel")
+        return cls(lfp.values, lfp["time"].values, lfp["channel"].values,
+                   name=lfp.name or "LFP", **kwargs)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return tuple(self._data.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self._data.dtype)
+
+    @property
+    def channel_ids(self) -> np.ndarray:
+        return self._channel_ids.values
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        if not isinstance(self._timestamps, np.ndarray):
+            self._timestamps = np.asarray(self._timestamps[:])
+        return self._timestamps
+
+    @property
+    def invalid_intervals(self) -> np.ndarray:
+        return self._invalid_intervals
+
+    def mask_intervals(self, invalid_intervals: np.ndarray) -> "LazyLFP":
+        """ A handle on the same data which replaces samples falling within
+        any of invalid_intervals ((n, 2) array of [start, stop] times) with
+        NaN
+        """
+        invalid_intervals = np.concatenate([
+            self._invalid_intervals,
+            np.asarray(invalid_intervals, dtype=float).reshape(-1, 2)])
+        return self.__class__(self._data, self._timestamps,
+                              self.channel_ids,
+                              invalid_intervals=invalid_intervals,
+                              chunk_bytes=self._chunk_bytes,
+                              name=self.name)
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}(name={self.name!r}, "
+                f"shape={self.shape}, dtype={self.dtype})")
+
+    def time_range(self, time_slice: Optional[TimeSlice] = None
+                   ) -> Tuple[int, int]:
+        """ Convert a (start, stop) time window (either bound may be None)
+        into the [start, stop) range of samples within it. Both ends of the
+        window are inclusive, as with xarray's sel.
+        """
+        if time_slice is None:
+            return 0, self.shape[0]
+        if isinstance(time_slice, slice):
+            start, stop = time_slice.start, time_slice.stop
+        else:
+            start, stop = time_slice
+
+        timestamps = self.timestamps
+        first = 0 if start is None else \
+            int(np.searchsorted(timestamps, start, side="left"))
+        last = self.shape[0] if stop is None else \
+            int(np.searchsorted(timestamps, stop, side="right"))
+        return first, max(first, last)
+
+    def channel_positions(self, channel_ids: Optional[Sequence[int]] = None
+                          ) -> np.ndarray:
+        """ The column of data holding each of channel_ids
+        """
+        if channel_ids is None:
+            return np.arange(self.shape[1])
+        channel_ids = np.atleast_1d(np.asarray(channel_ids))
+        positions = self._channel_ids.get_indexer(channel_ids)
+        if np.any(positions < 0):
+            raise KeyError(
+                f"no LFP recorded for channels "
+                f"{channel_ids[positions < 0].tolist()}")
+        return positions
+
+    def _output_dtype(self) -> np.dtype:
+        # invalid samples are replaced with NaN
+        if (self._invalid_intervals.shape[0] == 0
+                or np.issubdtype(self.dtype, np.floating)):
+            return self.dtype
+        return np.dtype(float)
+
+    def _invalid_samples(self, times: np.ndarray) -> np.ndarray:
+        invalid = np.zeros(times.shape, dtype=bool)
+        for start, stop in self._invalid_intervals:
+            invalid |= (times >= start) & (times <= stop)
+        return invalid
+
+    def read_into(self,
+                  out: np.ndarray,
+                  rows: slice,
+                  channel_positions: np.ndarray) -> None:
+        """ Read the samples selected by rows (a slice with a positive step)
+        of the listed columns into out, one bounded chunk at a time, masking
+        invalid samples as they are read.
+
+        Parameters
+        ----------
+        out :
+            (len(range(rows)), len(channel_positions)) array to fill
+        rows :
+            The samples to read
+        channel_positions :
+            The columns to read, as returned by channel_positions
+
+        """
+        start, stop, step = rows.indices(self.shape[0])
+        n_rows = len(range(start, stop, step))
+        if n_rows == 0 or channel_positions.size == 0:
+            return
+
+        # read the contiguous block of columns spanning the request, which
+        # h5py handles much faster than a list of columns
+        col_lo = int(channel_positions.min())
+        col_hi = int(channel_positions.max()) + 1
+        columns = channel_positions - col_lo
+        contiguous = np.array_equal(columns, np.arange(col_hi - col_lo))
+
+        row_bytes = (col_hi - col_lo) * self.dtype.itemsize
+        rows_per_chunk = max(1, self._chunk_bytes // row_bytes)
+        mask = self._invalid_intervals.shape[0] > 0
+
+        for out_start in range(0, n_rows, rows_per_chunk):
+            out_stop = min(n_rows, out_start + rows_per_chunk)
+            first = start + out_start * step
+            last = start + (out_stop - 1) * step + 1
+
+            block = self._data[first:last:step, col_lo:col_hi]
+            if not contiguous:
+                block = block[:, columns]
+            out[out_start:out_stop] = block
+
+            if mask:
+                times = self.timestamps[first:last:step]
+                out[out_start:out_stop][self._invalid_samples(times)] = np.nan
+
+    def read(self,
+             time_slice: Optional[TimeSlice] = None,
+             channel_ids: Optional[Sequence[int]] = None,
+             decimation: int = 1) -> xr.DataArray:
+        """ Load a window of LFP data.
+
+        Parameters
+        ----------
+        time_slice :
+            (start, stop) times (s) of the window to load; both ends are
+            inclusive and either may be None. Defaults to all samples.
+        channel_ids :
+            The channels to load, in the order given. Defaults to all
+            channels.
+        decimation :
+            Keep only every nth sample of the window. No anti-aliasing
+            filter is applied.
+
+        Returns
+        -------
+        xr.DataArray :
+            dimensions are time (seconds) and channel (id)
+
+        """
+        if decimation < 1:
+            raise ValueError(
+                f"decimation must be a positive integer; got {decimation}")
+
+        first, last = self.time_range(time_slice)
+        rows = slice(first, last, decimation)
+        positions = self.channel_positions(channel_ids)
+
+        out = np.empty((len(range(first, last, decimation)), positions.size),
+                       dtype=self._output_dtype())
+        self.read_into(out, rows, positions)
+
+        return xr.DataArray(
+            name=self.name,
+            data=out,
+            dims=["time", "channel"],
+            coords=[self.timestamps[rows], self.channel_ids[positions]]
+        )
+
+    def sampling_interval(self) -> float:
+        """ The median interval (s) between consecutive samples
+        """
+        timestamps = self.timestamps
+        if timestamps.size < 2:
+            raise ValueError("at least two LFP samples are needed to "
+                             "determine the sampling interval")
+        # a prefix of the timestamps is plenty to estimate this
+        return float(np.median(np.diff(timestamps[:100000])))
+
+    def read_epochs(self,
+                    onset_times: Sequence[float],
+                    window: Tuple[float, float],
+                    channel_ids: Optional[Sequence[int]] = None,
+                    max_gap: Optional[int] = None,
+                    max_workers: Optional[int] = None
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Cut a window of LFP data around each of a set of onset times.
+
+        Epochs close to one another in time are coalesced into a single
+        contiguous read (bounded in size by chunk_bytes), and each read is
+        copied straight into a preallocated output array, so the number of
+        reads is typically much smaller than the number of epochs.
+
+        Parameters
+        ----------
+        onset_times :
+            The time (s) around which each epoch is cut
+        window :
+            (start, stop) times (s), relative to onset, of each epoch. The
+            stop time is exclusive.
+        channel_ids :
+            The channels to load, in the order given. Defaults to all
+            channels.
+        max_gap :
+            Epochs separated by at most this many samples are read
+            together. Defaults to the number of samples in one epoch.
+        max_workers :
+            If provided, issue reads from a pool of this many threads.
+            Whether this helps depends on the storage backend; h5py, for
+            instance, serializes reads from a file.
+
+        Returns
+        -------
+        epochs : np.ndarray
+            (epoch, time, channel) array. Samples falling outside of the
+            recording, or within an invalid interval, are NaN.
+        relative_times : np.ndarray
+            The time (s) of each sample of an epoch relative to its onset
+
+        """
+        start, stop = window
+        if stop <= start:
+            raise ValueError(f"window must have stop > start; got {window}")
+
+        onset_times = np.asarray(onset_times, dtype=float).ravel()
+        positions = self.channel_positions(channel_ids)
+        timestamps = self.timestamps
+        interval = self.sampling_interval()
+
+        relative_times = np.arange(start, stop, interval)
+        n_samples = relative_times.size
+
+        # the first sample of each epoch is the first at or after
+        # onset + start. Epochs beginning before the recording get a
+        # negative first sample
+        epoch_starts = onset_times + start
+        first = np.searchsorted(timestamps, epoch_starts).astype(np.int64)
+        before = epoch_starts < timestamps[0]
+        first[before] = -np.floor(
+            (timestamps[0] - epoch_starts[before]) / interval).astype(np.int64)
+
+        dtype = self.dtype if np.issubdtype(self.dtype, np.floating) \
+            else np.dtype(float)
+        out = np.full((onset_times.size, n_samples, positions.size), np.nan,
+                      dtype=dtype)
+        if onset_times.size == 0 or positions.size == 0:
+            return out, relative_times
+
+        if max_gap is None:
+            max_gap = n_samples
+        row_bytes = positions.size * self.dtype.itemsize
+        max_rows = max(n_samples, self._chunk_bytes // row_bytes)
+        groups = coalesce_epochs(np.clip(first, 0, self.shape[0]),
+                                 np.clip(first + n_samples, 0, self.shape[0]),
+                                 max_gap, max_rows)
+
+        def _read_group(group):
+            group_start, group_stop, epochs = group
+            block = np.empty((group_stop - group_start, positions.size),
+                             dtype=dtype)
+            self.read_into(block, slice(group_start, group_stop), positions)
+
+            for epoch in epochs:
+                lo = max(first[epoch], 0)
+                hi = min(first[epoch] + n_samples, self.shape[0])
+                out[epoch, lo - first[epoch]:hi - first[epoch]] = \
+                    block[lo - group_start:hi - group_start]
+
+        if max_workers is None or max_workers <= 1:
+            for group in groups:
+                _read_group(group)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # consume the iterator so that errors are raised here
+                list(executor.map(_read_group, groups))
+
+        return out, relative_times
+
+    def to_dataarray(self) -> xr.DataArray:
+        """ Load all of the data
+        """
+        return self.read()
+
+    def to_dask(self) -> xr.DataArray:
+        """ A DataArray backed by a dask array, which reads (and masks) the
+        data chunk by chunk as it is computed. Requires dask.
+        """
+        try:
+            import dask.array
+        except ImportError:
+            raise ImportError(
+                "LazyLFP.to_dask requires dask; "
+                "use LazyLFP.read to load data without it")
+
+        row_bytes = self.shape[1] * self.dtype.itemsize
+        rows_per_chunk = max(1, self._chunk_bytes // row_bytes)
+        data = dask.array.from_array(self._data,
+                                     chunks=(rows_per_chunk, self.shape[1]))
+
+        lfp = xr.DataArray(
+            name=self.name,
+            data=data,
+            dims=["time", "channel"],
+            coords=[self.timestamps, self.channel_ids]
+        )
+        if self._invalid_intervals.shape[0] > 0:
+            valid = xr.DataArray(~self._invalid_samples(self.timestamps),
+                                 dims=["time"])
+            lfp = lfp.where(valid)
+        return lfp
+
+
+def coalesce_epochs(starts: np.ndarray,
+                    stops: np.ndarray,
+                    max_gap: int,
+                    max_rows: int) -> List[Tuple[int, int, np.ndarray]]:
+    """ Group [start, stop) ranges of samples into a few contiguous reads.
+
+    Parameters
+    ----------
+    starts, stops :
+        The first and one-past-last sample of each range. Empty ranges
+        (stop <= start) are left out of every group.
+    max_gap :
+        Ranges separated by at most this many samples are read together
+    max_rows :
+        A group is not extended past this many samples, unless it holds a
+        single range which is longer than that
+
+    Returns
+    -------
+    list of (start, stop, indices) :
+        The span of each read and the (positional) indices of the ranges it
+        covers
+
+    """
+    starts = np.asarray(starts)
+    stops = np.asarray(stops)
+
+    order = np.argsort(starts, kind="stable")
+    order = order[stops[order] > starts[order]]
+
+    groups = []
+    members: List[int] = []
+    group_start = group_stop = 0
+    for index in order:
+        start, stop = int(starts[index]), int(stops[index])
+        if (members and start - group_stop <= max_gap
+                and max(stop, group_stop) - group_start <= max_rows):
+            members.append(index)
+            group_stop = max(group_stop, stop)
+            continue
+
+        if members:
+            groups.append((group_start, group_stop, np.array(members)))
+        members = [index]
+        group_start, group_stop = start, stop
+
+    if members:
+        groups.append((group_start, group_stop, np.array(members)))
+    return groups
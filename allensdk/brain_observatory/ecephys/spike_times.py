@@ -0,0 +1,615 @@
+""" Utilities for working with the spike times of many units at once.
+
+Spike times are stored in a flat, compressed sparse row (CSR) layout: a
+single array holding the spike times of every unit, one unit after the
+other, and an array of offsets such that the spike times of the ith unit
+are ``spike_times[offsets[i]:offsets[i + 1]]``. This lets the per-unit
+computations below operate on all units in a handful of numpy calls.
+SpikeTimeStore wraps the two arrays in a read-only mapping from unit id to
+spike times.
+"""
+from collections.abc import Mapping as MappingABC
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SpikeTimeStore(MappingABC):
+    """ A read-only mapping from unit id to spike times, backed by a single
+    array of spike times in CSR layout.
+
+    Looking up a unit returns a view into the shared array, so building a
+    store (for instance from an NWB units table) does not allocate an array
+    per unit. Code which needs the spike times of many units at once can
+    use the flat arrays directly (see csr).
+
+    Parameters
+    ----------
+    spike_times :
+        The spike times of all units, concatenated
+    offsets :
+        Array of length len(unit_ids) + 1. The spike times of unit_ids[i]
+        are spike_times[offsets[i]:offsets[i + 1]]
+    unit_ids :
+        The id of each unit
+
+    """
+
+    def __init__(self,
+                 spike_times: np.ndarray,
+                 offsets: np.ndarray,
+                 unit_ids: Sequence[int]):
+        spike_times = np.asarray(spike_times, dtype=np.float64).ravel()
+        offsets = np.asarray(offsets, dtype=np.int64).ravel()
+        unit_ids = np.asarray(unit_ids).ravel()
+
+        if offsets.size != unit_ids.size + 1:
+            raise ValueError(
+                f"expected {unit_ids.size + 1} offsets for {unit_ids.size} "
+                f"units; got {offsets.size}")
+        if (offsets[0] != 0 or offsets[-1] != spike_times.size
+                or np.any(np.diff(offsets) < 0)):
+            raise ValueError(
+                "offsets must increase from 0 to the number of spike times")
+
+        self._spike_times = spike_times
+        self._offsets = offsets
+        self._unit_ids = unit_ids
+        self._positions: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def from_dict(cls,
+                  spike_times: Mapping[int, np.ndarray],
+                  unit_ids: Optional[Sequence[int]] = None
+                  ) -> "SpikeTimeStore":
+        """ Pack a mapping from unit id to spike times into a store.
+
+        Parameters
+        ----------
+        spike_times :
+            Maps unit ids to arrays of spike times
+        unit_ids :
+            The units to include, in order. Defaults to all units, in the
+            mapping's order.
+
+        """
+        if unit_ids is None:
+            unit_ids = list(spike_times.keys())
+        data, offsets = concatenate_spike_times(spike_times, unit_ids)
+        return cls(data, offsets, unit_ids)
+
+    @classmethod
+    def from_nwb_units(cls, units) -> "SpikeTimeStore":
+        """ Read the spike times of every unit in an NWB units table.
+
+        The spike_times VectorData and its spike_times_index are each read
+        in a single pass; no per-unit arrays are built.
+
+        Parameters
+        ----------
+        units : pynwb.misc.Units
+            The units table of an NWB file
+
+        """
+        index = units["spike_times"]
+        data = np.asarray(index.target.data[:], dtype=np.float64)
+
+        offsets = np.zeros(len(index.data) + 1, dtype=np.int64)
+        offsets[1:] = index.data[:]
+
+        return cls(data, offsets, np.asarray(units.id.data[:]))
+
+    @property
+    def spike_times(self) -> np.ndarray:
+        """ The spike times of all units, concatenated
+        """
+        return self._spike_times
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """ CSR offsets into spike_times, one longer than the number of
+        units
+        """
+        return self._offsets
+
+    @property
+    def unit_ids(self) -> np.ndarray:
+        return self._unit_ids
+
+    def _unit_positions(self, unit_ids: Sequence[int]) -> np.ndarray:
+        if self._positions is None:
+            self._positions = {
+                unit_id: ii
+                for ii, unit_id in enumerate(self._unit_ids.tolist())}
+        try:
+            return np.array([self._positions[unit_id]
+                             for unit_id in unit_ids], dtype=np.int64)
+        except KeyError as err:
+            raise KeyError(f"no spike times stored for unit {err}")
+
+    def __getitem__(self, unit_id: int) -> np.ndarray:
+        position = self._unit_positions([unit_id])[0]
+        return self._spike_times[
+            self._offsets[position]:self._offsets[position + 1]]
+
+    def __contains__(self, unit_id) -> bool:
+        try:
+            self._unit_positions([unit_id])
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._unit_ids.tolist())
+
+    def __len__(self) -> int:
+        return self._unit_ids.size
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}({len(self)} units, "
+                f"{self._spike_times.size} spikes)")
+
+    def csr(self, unit_ids: Optional[Sequence[int]] = None
+            ) -> Tuple[np.ndarray, np.ndarray]:
+        """ The spike times of some units in CSR layout (see
+        concatenate_spike_times).
+
+        When unit_ids is a contiguous run of this store's units (as when it
+        is all of them, in order), the returned spike times are a view
+        rather than a copy.
+
+        Parameters
+        ----------
+        unit_ids :
+            The units to include, in order. Defaults to all units.
+
+        """
+        if unit_ids is None:
+            return self._spike_times, self._offsets
+
+        positions = self._unit_positions(unit_ids)
+        if positions.size == 0:
+            return (np.zeros(0, dtype=np.float64),
+                    np.zeros(1, dtype=np.int64))
+
+        starts = self._offsets[positions]
+        stops = self._offsets[positions + 1]
+
+        if np.all(np.diff(positions) == 1):
+            return (self._spike_times[starts[0]:stops[-1]],
+                    np.concatenate([starts, stops[-1:]]) - starts[0])
+
+        counts = stops - starts
+        offsets = np.zeros(positions.size + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        # position within the store of each selected spike
+        index = (np.arange(offsets[-1])
+                 + np.repeat(starts - offsets[:-1], counts))
+        return self._spike_times[index], offsets
+
+    def select(self, unit_ids: Sequence[int]) -> "SpikeTimeStore":
+        """ A store holding only the listed units, in the listed order
+        """
+        return self.__class__(*self.csr(unit_ids), unit_ids)
+
+
+def concatenate_spike_times(
+    spike_times: Mapping[int, np.ndarray],
+    unit_ids: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Pack the spike times of several units into CSR layout.
+
+    Parameters
+    ----------
+    spike_times :
+        Maps unit ids to arrays of spike times
+    unit_ids :
+        The units to include, in order
+
+    Returns
+    -------
+    spike_times : np.ndarray
+        The spike times of all requested units, concatenated
+    offsets : np.ndarray
+        Array of length len(unit_ids) + 1. The spike times of
+        unit_ids[i] are spike_times[offsets[i]:offsets[i + 1]]
+
+    If spike_times is a SpikeTimeStore, its flat arrays are used directly.
+
+    """
+
+    if isinstance(spike_times, SpikeTimeStore):
+        return spike_times.csr(unit_ids)
+
+    arrays = [np.asarray(spike_times[unit_id], dtype=float).ravel()
+              for unit_id in unit_ids]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([arr.size for arr in arrays])
+
+    if len(arrays) == 0:
+        return np.zeros(0, dtype=float), offsets
+    return np.concatenate(arrays), offsets
+
+
+def unit_indices_from_offsets(offsets: np.ndarray) -> np.ndarray:
+    """ For each spike in a CSR spike time array, the (positional) index of
+    the unit which emitted it.
+    """
+    offsets = np.asarray(offsets)
+    return np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+
+
+def _is_monotonic(values: np.ndarray) -> bool:
+    return values.size < 2 or bool(np.all(np.diff(values) >= 0))
+
+
+def unsorted_units(spike_times: np.ndarray,
+                   offsets: np.ndarray) -> np.ndarray:
+    """ Find the (positional) indices of units whose spike times, in a CSR
+    spike time array, are not sorted.
+    """
+    decreasing = np.flatnonzero(np.diff(spike_times) < 0) + 1
+    if decreasing.size == 0:
+        return decreasing
+    units = unit_indices_from_offsets(offsets)[decreasing]
+    # a decrease across the boundary between two units does not count
+    within_unit = offsets[units] != decreasing
+    return np.unique(units[within_unit])
+
+
+def _bin_spikes_monotonic(starts, ends, times, unit_index):
+    """ Find the bins containing each spike, assuming that both the bin
+    starts and the bin ends are sorted. In that case the bins satisfying
+    start <= spike <= end form a contiguous run, which is found for every
+    spike (of every unit) with two searchsorted calls in total.
+
+    Returns
+    -------
+    bins, units : np.ndarray
+        One entry per (spike, bin) pair. A spike lying exactly on the edge
+        between two bins is reported for both.
+    """
+    first_bin = np.searchsorted(ends, times, side="left")
+    last_bin = np.searchsorted(starts, times, side="right")
+    span = last_bin - first_bin
+
+    in_domain = span > 0
+    first_bin = first_bin[in_domain]
+    unit_index = unit_index[in_domain]
+    span = span[in_domain]
+
+    if np.all(span == 1):
+        return first_bin, unit_index
+
+    spike = np.repeat(np.arange(span.size), span)
+    within = np.arange(spike.size) - np.repeat(np.cumsum(span) - span, span)
+    return first_bin[spike] + within, unit_index[spike]
+
+
+def _count_spikes_one_unit(starts, ends, data):
+    return (np.searchsorted(data, ends, side="right")
+            - np.searchsorted(data, starts))
+
+
+def _sparse_counts_per_unit(starts, ends, times, offsets, units):
+    """ Count the spikes of the listed units by searching each unit's spike
+    times for every bin edge. This handles arbitrary (overlapping or
+    unordered) bins.
+    """
+    bins, unit_index, counts = [], [], []
+    for ii in units:
+        unit_counts = _count_spikes_one_unit(
+            starts, ends, times[offsets[ii]:offsets[ii + 1]])
+        nonzero = np.flatnonzero(unit_counts)
+        bins.append(nonzero)
+        unit_index.append(np.full(nonzero.size, ii))
+        counts.append(unit_counts[nonzero])
+
+    if len(bins) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return (np.concatenate(bins), np.concatenate(unit_index),
+            np.concatenate(counts))
+
+
+def _sparse_counts(starts, ends, times, offsets, monotonic):
+    """ Count the spikes of a block of units (times and offsets describe
+    only the units in the block) into bins.
+
+    Returns
+    -------
+    bins, units, counts : np.ndarray
+        The number of spikes emitted by each unit in each bin, listing
+        only nonzero entries. Memory use scales with the number of spikes,
+        rather than with the number of bins times the number of units.
+    """
+    n_units = offsets.size - 1
+    if not monotonic:
+        return _sparse_counts_per_unit(starts, ends, times, offsets,
+                                       range(n_units))
+
+    bins, unit_index = _bin_spikes_monotonic(
+        starts, ends, times, unit_indices_from_offsets(offsets))
+
+    # Searching unsorted spike times does not count the spikes in each
+    # bin, but this is what has always been reported for such units.
+    # Keep doing so, so that results do not depend on the code path.
+    unsorted = unsorted_units(times, offsets)
+    if unsorted.size > 0:
+        keep = ~np.isin(unit_index, unsorted)
+        bins, unit_index = bins[keep], unit_index[keep]
+
+    flat_index, counts = np.unique(bins * n_units + unit_index,
+                                   return_counts=True)
+    bins, unit_index = np.divmod(flat_index, n_units)
+
+    if unsorted.size > 0:
+        legacy = _sparse_counts_per_unit(starts, ends, times, offsets,
+                                         unsorted)
+        bins, unit_index, counts = (np.concatenate([current, previous])
+                                    for current, previous
+                                    in zip((bins, unit_index, counts),
+                                           legacy))
+    return bins, unit_index, counts
+
+
+def _histogram_dtype(dtype, binarize):
+    if dtype is not None:
+        return dtype
+    return np.uint8 if binarize else np.uint16
+
+
+def build_spike_histogram_csr(
+    time_domain: np.ndarray,
+    spike_times: np.ndarray,
+    offsets: np.ndarray,
+    dtype=None,
+    binarize: bool = False,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False
+) -> np.ndarray:
+    """ Count the spikes of many units into trial-aligned time bins.
+
+    Parameters
+    ----------
+    time_domain :
+        (n_rows, n_edges) array. Each row holds the bin edges for one
+        trial. A spike at time t is counted in bin j of row i if
+        time_domain[i, j] <= t <= time_domain[i, j + 1].
+    spike_times :
+        Spike times of all units, in CSR layout (see
+        concatenate_spike_times)
+    offsets :
+        CSR offsets into spike_times, one longer than the number of units
+    dtype : optional
+        dtype of the output. Defaults to uint8 if binarize else uint16.
+    binarize :
+        If True, report whether any spike fell in each bin rather than
+        the number of spikes.
+    max_workers :
+        If provided (and > 1), split the units into this many blocks and
+        count them concurrently.
+    use_processes :
+        If True, use a process pool rather than a thread pool. Only
+        relevant if max_workers > 1.
+
+    Returns
+    -------
+    np.ndarray :
+        (n_rows, n_edges - 1, n_units) array of spike counts
+
+    Notes
+    -----
+    Spike times are expected to be sorted within each unit. When the bin
+    starts and bin ends are each sorted across the whole domain (the usual
+    case: non-overlapping, time ordered trials) the spikes of every unit
+    are binned together and only the nonzero counts are ever materialized.
+    Otherwise (and for any unit whose spike times are not sorted) each
+    unit's spike times are searched separately.
+
+    """
+
+    time_domain = np.asarray(time_domain, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    spike_times = np.asarray(spike_times, dtype=float)
+
+    n_rows, n_edges = time_domain.shape
+    n_units = offsets.size - 1
+
+    tiled_data = np.zeros((n_rows, n_edges - 1, n_units),
+                          dtype=_histogram_dtype(dtype, binarize))
+    if tiled_data.size == 0:
+        return tiled_data
+
+    starts = time_domain[:, :-1].ravel()
+    ends = time_domain[:, 1:].ravel()
+    monotonic = _is_monotonic(starts) and _is_monotonic(ends)
+
+    n_blocks = 1 if max_workers is None else max(1, min(max_workers,
+                                                        n_units))
+    bounds = np.linspace(0, n_units, n_blocks + 1).astype(int)
+    blocks = list(zip(bounds[:-1], bounds[1:]))
+
+    flat = tiled_data.reshape(starts.size, n_units)
+
+    def _block_args(low, high):
+        return (starts, ends,
+                spike_times[offsets[low]:offsets[high]],
+                offsets[low:high + 1] - offsets[low],
+                monotonic)
+
+    def _store(low, sparse):
+        bins, unit_index, counts = sparse
+        flat[bins, unit_index + low] = counts > 0 if binarize else counts
+
+    if n_blocks == 1:
+        for low, high in blocks:
+            _store(low, _sparse_counts(*_block_args(low, high)))
+        return tiled_data
+
+    executor_cls = ProcessPoolExecutor if use_processes \
+        else ThreadPoolExecutor
+    with executor_cls(max_workers=max_workers) as executor:
+        futures = [(low, executor.submit(_sparse_counts,
+                                         *_block_args(low, high)))
+                   for low, high in blocks]
+        for low, future in futures:
+            _store(low, future.result())
+
+    return tiled_data
+
+
+def iter_spike_histogram_blocks(
+    time_domain: np.ndarray,
+    spike_times: np.ndarray,
+    offsets: np.ndarray,
+    rows_per_block: int,
+    dtype=None,
+    binarize: bool = False
+) -> Iterator[Tuple[slice, np.ndarray]]:
+    """ As build_spike_histogram_csr, but yield the histogram a block of
+    rows (trials) at a time, so that memory use is bounded by
+    rows_per_block * (n_edges - 1) * n_units rather than by the size of
+    the whole histogram.
+
+    Yields
+    ------
+    rows : slice
+        The rows of time_domain described by this block
+    counts : np.ndarray
+        (rows.stop - rows.start, n_edges - 1, n_units) array of spike counts
+
+    """
+
+    if rows_per_block < 1:
+        raise ValueError(
+            f"rows_per_block must be positive; got {rows_per_block}")
+
+    time_domain = np.asarray(time_domain, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    spike_times = np.asarray(spike_times, dtype=float)
+
+    n_rows, n_edges = time_domain.shape
+    n_bins = n_edges - 1
+    n_units = offsets.size - 1
+    out_dtype = _histogram_dtype(dtype, binarize)
+
+    starts = time_domain[:, :-1].ravel()
+    ends = time_domain[:, 1:].ravel()
+    monotonic = _is_monotonic(starts) and _is_monotonic(ends)
+
+    if monotonic:
+        # sort every spike once, so that each block can find the spikes
+        # that fall within it by bisection
+        order = np.argsort(spike_times, kind="stable")
+        sorted_times = spike_times[order]
+        sorted_units = unit_indices_from_offsets(offsets)[order]
+        unsorted = unsorted_units(spike_times, offsets)
+
+    for low in range(0, n_rows, rows_per_block):
+        high = min(low + rows_per_block, n_rows)
+        block_starts = starts[low * n_bins:high * n_bins]
+        block_ends = ends[low * n_bins:high * n_bins]
+        counts = np.zeros((high - low, n_bins, n_units), dtype=out_dtype)
+        flat = counts.reshape(block_starts.size, n_units)
+
+        if monotonic and block_starts.size > 0:
+            first = np.searchsorted(sorted_times, block_starts[0],
+                                    side="left")
+            last = np.searchsorted(sorted_times, block_ends[-1],
+                                   side="right")
+            bins, unit_index = _bin_spikes_monotonic(
+                block_starts, block_ends,
+                sorted_times[first:last], sorted_units[first:last])
+            if binarize:
+                flat[bins, unit_index] = 1
+            else:
+                np.add.at(flat, (bins, unit_index), 1)
+            flat[:, unsorted] = 0
+            legacy_units = unsorted
+        else:
+            legacy_units = range(n_units)
+
+        if block_starts.size > 0 and len(legacy_units) > 0:
+            bins, unit_index, unit_counts = _sparse_counts_per_unit(
+                block_starts, block_ends, spike_times, offsets,
+                legacy_units)
+            flat[bins, unit_index] = \
+                unit_counts > 0 if binarize else unit_counts
+
+        yield slice(low, high), counts
+
+
+PRESENTATIONWISE_SPIKE_TIMES_DTYPE = np.dtype([
+    ("spike_time", np.float64),
+    ("stimulus_presentation_id", np.int64),
+    ("unit_id", np.int64),
+    ("time_since_stimulus_presentation_onset", np.float64),
+])
+
+
+def presentationwise_spike_table(
+    spike_times: np.ndarray,
+    offsets: np.ndarray,
+    unit_ids: np.ndarray,
+    presentation_ids: np.ndarray,
+    start_times: np.ndarray,
+    stop_times: np.ndarray
+) -> np.ndarray:
+    """ Associate each spike with the stimulus presentation during which it
+    was emitted, for all units at once.
+
+    Parameters
+    ----------
+    spike_times :
+        Spike times of all units, in CSR layout (see
+        concatenate_spike_times)
+    offsets :
+        CSR offsets into spike_times, one longer than the number of units
+    unit_ids :
+        The id of each unit described by offsets
+    presentation_ids :
+        The id of each stimulus presentation
+    start_times, stop_times :
+        The start and stop time of each stimulus presentation. Presentations
+        are expected to be sorted and not to overlap. A spike is assigned
+        to a presentation if start_time < spike_time <= stop_time.
+
+    Returns
+    -------
+    np.ndarray :
+        Structured array (see PRESENTATIONWISE_SPIKE_TIMES_DTYPE) with one
+        row per spike emitted during a presentation, sorted by spike time.
+
+    """
+
+    spike_times = np.asarray(spike_times, dtype=float)
+    unit_ids = np.asarray(unit_ids)
+    presentation_ids = np.asarray(presentation_ids)
+    start_times = np.asarray(start_times, dtype=float)
+
+    presentation_times = np.zeros(start_times.size * 2)
+    presentation_times[::2] = start_times
+    presentation_times[1::2] = stop_times
+
+    # one search for every spike of every unit: even intervals of
+    # presentation_times are presentations, odd ones are the gaps between
+    # them
+    interval = np.searchsorted(presentation_times, spike_times) - 1
+    during_presentation = interval % 2 == 0
+
+    spike_index = np.flatnonzero(during_presentation)
+    spike_index = spike_index[np.argsort(spike_times[spike_index],
+                                         kind="stable")]
+    presentation_index = interval[spike_index] // 2
+
+    table = np.empty(spike_index.size,
+                     dtype=PRESENTATIONWISE_SPIKE_TIMES_DTYPE)
+    table["spike_time"] = spike_times[spike_index]
+    table["stimulus_presentation_id"] = presentation_ids[presentation_index]
+    table["unit_id"] = unit_ids[
+        np.searchsorted(offsets, spike_index, side="right") - 1]
+    table["time_since_stimulus_presentation_onset"] = \
+        table["spike_time"] - start_times[presentation_index]
+    return table
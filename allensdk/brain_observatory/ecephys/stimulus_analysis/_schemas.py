@@ -1,6 +1,7 @@
 from argschema import ArgSchema
 from argschema.schemas import DefaultSchema
-from argschema.fields import Nested, String, Float, List, Int
+from argschema.fields import Nested, String, Float, List, Int, Boolean
+from marshmallow.validate import OneOf
 
 from .drifting_gratings import DriftingGratings
 from .static_gratings import StaticGratings
@@ -73,6 +74,42 @@ class InputParameters(ArgSchema):
     output_file = String(required=True, help='Location for saving output file')
 
 
+class BatchInputParameters(ArgSchema):
+    drifting_gratings = Nested(DriftingGratings, default={})
+    static_gratings = Nested(StaticGratings, default={})
+    natural_scenes = Nested(NaturalScenes, default={})
+    dot_motion = Nested(DotMotion, default={})
+    flashes = Nested(Flashes, default={})
+    receptive_field_mapping = Nested(ReceptiveFieldMapping, default={})
+
+    stimuli = List(String,
+                   default=['receptive_field_mapping', 'drifting_gratings',
+                            'dot_motion', 'static_gratings',
+                            'natural_scenes', 'flashes'],
+                   cli_as_single_argument=True,
+                   help='Stimulus analyses to run on each session')
+    manifest = String(required=True,
+                      help='Path to the manifest of an EcephysProjectCache')
+    fixed = Boolean(default=False,
+                    help=("Only use data already in the cache, never "
+                          "download"))
+    session_ids = List(Int, default=None, allow_none=True,
+                       cli_as_single_argument=True,
+                       help=("Sessions to process (default: every session "
+                             "in the cache)"))
+    output_dir = String(required=True,
+                        help='Directory of the partitioned output dataset')
+    output_format = String(default='csv', validate=OneOf(['csv', 'parquet']),
+                           help=("File format of each partition. parquet "
+                                 "requires pyarrow or fastparquet"))
+    max_workers = Int(default=1,
+                      help=("Number of worker processes. Each processes "
+                            "one session at a time"))
+    max_worker_memory_gb = Float(default=None, allow_none=True,
+                                 help=("Limit on the address space of each "
+                                       "worker process (GB)"))
+
+
 class OutputSchema(DefaultSchema):
     input_parameters = Nested(InputParameters,
                               description=("Input parameters the module was run with"),
@@ -81,3 +118,14 @@ class OutputSchema(DefaultSchema):
 
 class OutputParameters(OutputSchema):
     execution_time = Float()
+
+
+class BatchOutputParameters(DefaultSchema):
+    input_parameters = Nested(BatchInputParameters,
+                              description=("Input parameters the module was "
+                                           "run with"),
+                              required=True)
+    completed = List(Int, help='Sessions processed by this run')
+    skipped = List(Int, help='Sessions already present in the output dataset')
+    failed = List(Int, help='Sessions which could not be processed')
+    execution_time = Float()
@@ -0,0 +1,243 @@
+""" A persistent, size-bounded cache for the intermediate products of
+StimulusAnalysis (conditionwise_psth, presentationwise_statistics,
+conditionwise_statistics, ...).
+
+Each entry is stored as a single .npz file named after a hash of everything
+that determines its contents (see StimulusAnalysisCache.make_key), so that
+entries never need to be invalidated: changing the session, stimulus, units
+or parameters simply produces a different key. Entries are evicted least
+recently used first once the cache grows beyond max_bytes.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# bump this when the contents or layout of cached entries change
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_part(value: Any) -> Any:
+    """ Reduce a component of a cache key to something JSON serializable,
+    replacing arrays by a digest of their contents
+    """
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.values
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            value = value.astype(str)
+        digest = hashlib.blake2b(np.ascontiguousarray(value).tobytes(),
+                                 digest_size=16)
+        digest.update(str((value.dtype.str, value.shape)).encode())
+        return digest.hexdigest()
+    if isinstance(value, dict):
+        return {str(k): _hash_part(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_hash_part(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _encode(value: Union[xr.DataArray, pd.DataFrame]) -> Optional[dict]:
+    """ Flatten a DataArray or DataFrame into a dict of arrays suitable for
+    np.savez. Returns None for values which can't be stored without
+    pickling.
+    """
+    arrays = {}
+    if isinstance(value, xr.DataArray):
+        meta = {"kind": "DataArray", "name": value.name,
+                "dims": list(value.dims), "coords": []}
+        arrays["data"] = value.values
+        for ii, (name, coord) in enumerate(value.coords.items()):
+            if coord.ndim != 1:
+                return None
+            meta["coords"].append([name, coord.dims[0]])
+            arrays[f"coord_{ii}"] = coord.values
+    elif isinstance(value, pd.DataFrame):
+        frame = value.reset_index()
+        meta = {"kind": "DataFrame",
+                "index": list(value.index.names),
+                "columns": list(frame.columns)}
+        if not all(isinstance(name, str) for name in meta["columns"]):
+            return None
+        for ii, name in enumerate(frame.columns):
+            if not isinstance(frame[name].dtype, np.dtype):
+                # extension types (e.g. categoricals)
+                return None
+            arrays[f"column_{ii}"] = frame[name].values
+    else:
+        return None
+
+    if any(arr.dtype.hasobject for arr in arrays.values()):
+        return None
+
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+def _decode(arrays) -> Union[xr.DataArray, pd.DataFrame]:
+    meta = json.loads(str(arrays["meta"]))
+    if meta["kind"] == "DataArray":
+        coords = {name: (dim, arrays[f"coord_{ii}"])
+                  for ii, (name, dim) in enumerate(meta["coords"])}
+        return xr.DataArray(arrays["data"], dims=meta["dims"],
+                            coords=coords, name=meta["name"])
+
+    frame = pd.DataFrame({
+        name: arrays[f"column_{ii}"]
+        for ii, name in enumerate(meta["columns"])
+    }, columns=meta["columns"])
+    # reset_index moved the index levels to the first columns
+    n_levels = len(meta["index"])
+    frame = frame.set_index(meta["columns"][:n_levels])
+    frame.index.names = meta["index"]
+    return frame
+
+
+class StimulusAnalysisCache(object):
+    """ A directory of cached StimulusAnalysis intermediate products.
+
+    Parameters
+    ----------
+    cache_dir :
+        Directory in which entries are stored. Created if necessary.
+    max_bytes :
+        Once the entries stored in cache_dir take up more than this many
+        bytes, the least recently used are deleted. Defaults to 10 GB.
+
+    Notes
+    -----
+    The cache may be shared by several processes: entries are written to a
+    temporary file and then moved into place, and "recently used" is
+    tracked through each entry's modification time.
+
+    """
+
+    SUFFIX = ".npz"
+
+    def __init__(self,
+                 cache_dir: Union[str, Path],
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """ Build a key from everything that determines the contents of an
+        entry. Array-like parts (unit ids, presentation times, ...) are
+        hashed by content.
+        """
+        parts = dict(parts, cache_version=CACHE_VERSION)
+        serialized = json.dumps(_hash_part(parts), sort_keys=True)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def get(self, key: str) -> Optional[Union[xr.DataArray, pd.DataFrame]]:
+        """ Load an entry, or return None if it is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                value = _decode(arrays)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning(f"discarding unreadable cache entry {path}: {err}")
+            self._remove(path)
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str,
+            value: Union[xr.DataArray, pd.DataFrame]) -> bool:
+        """ Store an entry. Returns False if value could not be stored
+        (for instance, because it holds python objects).
+        """
+        arrays = _encode(value)
+        if arrays is None:
+            logger.info(f"not caching {type(value).__name__} holding "
+                        f"python objects")
+            return False
+
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as out_file:
+            np.savez(out_file, **arrays)
+        os.replace(tmp_path, path)
+
+        self.evict()
+        return True
+
+    def get_or_compute(self, key: str,
+                       compute: Callable[[], Any]) -> Any:
+        """ Load an entry, computing and storing it if it is missing
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    @property
+    def size(self) -> int:
+        """ Total size (bytes) of the stored entries
+        """
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.SUFFIX}"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                # removed by another process
+                continue
+        return entries
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        """ Delete least recently used entries until the cache fits within
+        max_bytes
+        """
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda x: x[1].st_mtime)
+            total = sum(stat.st_size for _, stat in entries)
+            for path, stat in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= stat.st_size
+
+    def clear(self) -> None:
+        for path, _ in self._entries():
+            self._remove(path)
@@ -0,0 +1,273 @@
+""" Compute stimulus metrics for every session in an EcephysProjectCache.
+
+Sessions are spread over a pool of worker processes. Each worker handles one
+session at a time and is replaced after every session, so memory does not
+accumulate across sessions; the address space of each worker can also be
+capped with max_worker_memory_gb. Each session's metrics are written as
+soon as they are available to their own partition of a hive-style dataset:
+
+    output_dir/ecephys_session_id=<session_id>/part-0.<csv|parquet>
+
+Partitions are moved into place only once complete, so a session whose
+partition exists is finished and is skipped when the batch is restarted.
+
+    python -m allensdk.brain_observatory.ecephys.stimulus_analysis.batch \\
+        --manifest /data/ecephys_cache/manifest.json \\
+        --output_dir /data/unit_metrics --max_workers 4
+
+"""
+import gc
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from argschema import ArgSchemaParser
+
+from allensdk.brain_observatory.argschema_utilities import \
+    write_or_print_outputs
+from .dot_motion import DotMotion
+from .drifting_gratings import DriftingGratings
+from .flashes import Flashes
+from .natural_scenes import NaturalScenes
+from .receptive_field_mapping import ReceptiveFieldMapping
+from .static_gratings import StaticGratings
+from ..ecephys_project_cache import EcephysProjectCache
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEY = "ecephys_session_id"
+
+stim_classes = {
+    'receptive_field_mapping': ReceptiveFieldMapping,
+    'drifting_gratings': DriftingGratings,
+    'dot_motion': DotMotion,
+    'static_gratings': StaticGratings,
+    'natural_scenes': NaturalScenes,
+    'flashes': Flashes,
+}
+
+# metrics are calculated for every unit, not only those passing the default
+# quality filters
+UNFILTERED_SESSION_KWARGS = {
+    "amplitude_cutoff_maximum": np.inf,
+    "presence_ratio_minimum": -np.inf,
+    "isi_violations_maximum": np.inf,
+    "filter_by_validity": False
+}
+
+
+def open_cache(manifest: str, fixed: bool = False) -> EcephysProjectCache:
+    if fixed:
+        return EcephysProjectCache.fixed(manifest=manifest)
+    return EcephysProjectCache.from_warehouse(manifest=manifest)
+
+
+def load_session(manifest: str, session_id: int, fixed: bool = False):
+    cache = open_cache(manifest, fixed)
+    return cache.get_session_data(session_id, **UNFILTERED_SESSION_KWARGS)
+
+
+def partition_path(output_dir: str, session_id: int,
+                   output_format: str = 'csv') -> Path:
+    return (Path(output_dir) / f"{PARTITION_KEY}={session_id}" /
+            f"part-0.{output_format}")
+
+
+def completed_sessions(output_dir: str,
+                       output_format: str = 'csv') -> List[int]:
+    """ Ids of the sessions already written to the dataset in output_dir
+    """
+    completed = []
+    for path in Path(output_dir).glob(
+            f"{PARTITION_KEY}=*/part-0.{output_format}"):
+        completed.append(int(path.parent.name.split("=", 1)[1]))
+    return sorted(completed)
+
+
+def write_partition(metrics: pd.DataFrame, output_dir: str, session_id: int,
+                    output_format: str = 'csv') -> Path:
+    """ Atomically write one session's metrics to the dataset in output_dir
+    """
+    path = partition_path(output_dir, session_id, output_format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    if output_format == 'parquet':
+        metrics.to_parquet(tmp_path)
+    else:
+        metrics.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metrics(output_dir: str, output_format: str = 'csv') -> pd.DataFrame:
+    """ Load the metrics of every completed session in output_dir into a
+    single table indexed by unit_id, with an ecephys_session_id column.
+    """
+    tables = []
+    for session_id in completed_sessions(output_dir, output_format):
+        path = partition_path(output_dir, session_id, output_format)
+        if output_format == 'parquet':
+            table = pd.read_parquet(path)
+        else:
+            table = pd.read_csv(path, index_col='unit_id')
+        table[PARTITION_KEY] = session_id
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame(
+            columns=[PARTITION_KEY], index=pd.Index([], name='unit_id'))
+    return pd.concat(tables, sort=False)
+
+
+def calculate_session_metrics(session, stimuli: Dict[str, dict]
+                              ) -> pd.DataFrame:
+    """ Runs each stimulus analysis on a session and combines their metrics
+    into one table, indexed by unit_id. Stimuli which were not presented
+    during the session are skipped.
+    """
+    combined = []
+    for name, params in stimuli.items():
+        analysis = stim_classes[name](session, **params)
+        try:
+            analysis.stim_table
+        except Exception as err:
+            logger.info(f"skipping {name}: {err}")
+            continue
+
+        combined.append(analysis.metrics)
+        # free the analysis' intermediate tables before the next stimulus
+        del analysis
+        gc.collect()
+
+    if not combined:
+        return pd.DataFrame(index=pd.Index([], name='unit_id'))
+    return pd.concat(combined, axis=1, sort=False)
+
+
+def process_session(session_id: int, args: dict,
+                    loader: Callable = load_session) -> dict:
+    """ Calculate and write the metrics of one session. Failures are
+    reported rather than raised, so that one bad session does not end the
+    batch. loader(manifest, session_id, fixed) loads the session.
+    """
+    start = time.time()
+    try:
+        session = loader(args['manifest'], session_id,
+                         fixed=args.get('fixed', False))
+        stimuli = {name: args.get(name, {}) for name in args['stimuli']}
+        metrics = calculate_session_metrics(session, stimuli)
+        write_partition(metrics, args['output_dir'], session_id,
+                        args.get('output_format', 'csv'))
+    except Exception as err:
+        logger.exception(f"failed to process session {session_id}")
+        return {"session_id": session_id, "error": repr(err)}
+
+    return {"session_id": session_id, "error": None,
+            "unit_count": len(metrics), "time": time.time() - start}
+
+
+def _limit_worker_memory(max_bytes: Optional[int]):
+    if max_bytes is None:
+        return
+    import resource
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def _process_session_star(item):
+    return process_session(*item)
+
+
+def run_batch(args: dict, session_ids: Optional[Iterable[int]] = None,
+              loader: Callable = load_session) -> dict:
+    """ Process every session in session_ids (by default, every session in
+    the cache) which is not already in the output dataset.
+
+    Parameters
+    ----------
+    args : dict
+        validated BatchInputParameters
+    session_ids : iterable of int, optional
+        sessions to process; by default args['session_ids'], or every
+        session in the cache
+    loader : callable, optional
+        loader(manifest, session_id, fixed) loads a session. It is sent to
+        the worker processes, so must be picklable (e.g. a module level
+        function).
+
+    Returns
+    -------
+    dict :
+        completed, skipped and failed session ids
+    """
+    output_dir = args['output_dir']
+    output_format = args.get('output_format', 'csv')
+    if session_ids is None:
+        session_ids = args.get('session_ids')
+    if session_ids is None:
+        cache = open_cache(args['manifest'], args.get('fixed', False))
+        session_ids = cache.get_session_table().index.values
+    session_ids = [int(session_id) for session_id in session_ids]
+
+    done = set(completed_sessions(output_dir, output_format))
+    skipped = [sid for sid in session_ids if sid in done]
+    pending = [sid for sid in session_ids if sid not in done]
+    logger.info(f"{len(pending)} sessions to process, {len(skipped)} "
+                f"already complete")
+
+    max_workers = max(1, min(args.get('max_workers', 1), len(pending)))
+    memory_gb = args.get('max_worker_memory_gb')
+    max_bytes = None if memory_gb is None else int(memory_gb * 1024 ** 3)
+
+    work = [(session_id, args, loader) for session_id in pending]
+    if max_workers == 1 and max_bytes is None:
+        results = map(_process_session_star, work)
+        pool = None
+    else:
+        # a fresh worker for each session returns that session's memory to
+        # the system
+        pool = multiprocessing.Pool(
+            processes=max_workers, initializer=_limit_worker_memory,
+            initargs=(max_bytes,), maxtasksperchild=1)
+        results = pool.imap_unordered(_process_session_star, work)
+
+    completed, failed = [], []
+    try:
+        for ii, result in enumerate(results):
+            session_id = result['session_id']
+            if result['error'] is None:
+                completed.append(session_id)
+                logger.info(
+                    f"session {session_id}: {result['unit_count']} units in "
+                    f"{result['time']:.1f} s ({ii + 1}/{len(pending)})")
+            else:
+                failed.append(session_id)
+                logger.error(f"session {session_id}: {result['error']}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return {"completed": completed, "skipped": skipped, "failed": failed}
+
+
+def main():
+    from ._schemas import BatchInputParameters, BatchOutputParameters
+
+    mod = ArgSchemaParser(schema_type=BatchInputParameters,
+                          output_schema_type=BatchOutputParameters)
+    start = time.time()
+    output = run_batch(mod.args)
+    output["execution_time"] = time.time() - start
+    write_or_print_outputs(data=output, parser=mod)
+
+
+if __name__ == "__main__":
+    main()
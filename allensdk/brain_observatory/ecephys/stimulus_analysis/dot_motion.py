@@ -113,23 +113,17 @@ class DotMotion(StimulusAnalysis):
             metrics_df = self.empty_metrics_table()
 
             if len(self.stim_table) > 0:
+                preferred_conditions = self._get_preferred_condition_many()
                 metrics_df['pref_speed_dm'] = [self._get_pref_speed(unit) for unit in unit_ids]
-                metrics_df['pref_speed_multi_dm'] = [
-                    self._check_multiple_pref_conditions(unit_id, self._col_speed, self.speeds) for unit_id in unit_ids
-                ]
+                metrics_df['pref_speed_multi_dm'] = self._check_multiple_pref_conditions_many(self._col_speed, self.speeds)
                 metrics_df['pref_dir_dm'] = [self._get_pref_dir(unit) for unit in unit_ids]
-                metrics_df['pref_dir_multi_dm'] = [
-                    self._check_multiple_pref_conditions(unit_id, self._col_dir, self.directions) for unit_id in unit_ids
-                ]
+                metrics_df['pref_dir_multi_dm'] = self._check_multiple_pref_conditions_many(self._col_dir, self.directions)
                 metrics_df['firing_rate_dm'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-                metrics_df['fano_dm'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                         for unit in unit_ids]
+                metrics_df['fano_dm'] = self._get_fano_factor_many(preferred_conditions)
                 # metrics_df['speed_tuning_idx_dm'] = [self._get_speed_tuning_index(unit) for unit in unit_ids]
-                metrics_df['time_to_peak_dm'] = [self._get_time_to_peak(unit, self._get_preferred_condition(unit)) for
-                                                 unit in unit_ids]
-                metrics_df['lifetime_sparseness_dm'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-                metrics_df.loc[:, ['run_pval_dm', 'run_mod_dm']] = \
-                        [self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
+                metrics_df['time_to_peak_dm'] = self._get_time_to_peak_many(preferred_conditions)
+                metrics_df['lifetime_sparseness_dm'] = self._get_lifetime_sparseness_many()
+                metrics_df.loc[:, ['run_pval_dm', 'run_mod_dm']] = self._get_running_modulation_many(preferred_conditions)
 
 
             self._metrics = metrics_df
@@ -158,9 +158,13 @@ class DriftingGratings(StimulusAnalysis):
     def conditionwise_statistics_contrast(self):
         """ Conditionwise statistics for contrast stimulus """
         if self._conditionwise_statistics_contrast is None:
-            self._conditionwise_statistics_contrast = self.ecephys_session.conditionwise_spike_statistics(
-                self.stim_table_contrast.index.values,
-                self.unit_ids
+            self._conditionwise_statistics_contrast = self._cached(
+                'conditionwise_statistics_contrast',
+                lambda: self.ecephys_session.conditionwise_spike_statistics(
+                    self.stim_table_contrast.index.values,
+                    self.unit_ids
+                ),
+                stimulus_presentation_ids=self.stim_table_contrast.index.values
             )
 
         return self._conditionwise_statistics_contrast
@@ -191,14 +195,11 @@ class DriftingGratings(StimulusAnalysis):
             metrics_df = self.empty_metrics_table()
 
             if len(self.stim_table) > 0:
+                preferred_conditions = self._get_preferred_condition_many()
                 metrics_df['pref_ori_dg'] = [self._get_pref_ori(unit) for unit in unit_ids]
-                metrics_df['pref_ori_multi_dg'] = [
-                    self._check_multiple_pref_conditions(unit_id, self._col_ori, self.orivals) for unit_id in unit_ids
-                ]
+                metrics_df['pref_ori_multi_dg'] = self._check_multiple_pref_conditions_many(self._col_ori, self.orivals)
                 metrics_df['pref_tf_dg'] = [self._get_pref_tf(unit) for unit in unit_ids]
-                metrics_df['pref_tf_multi_dg'] = [
-                    self._check_multiple_pref_conditions(unit_id, self._col_tf, self.tfvals) for unit_id in unit_ids
-                ]
+                metrics_df['pref_tf_multi_dg'] = self._check_multiple_pref_conditions_many(self._col_tf, self.tfvals)
                 metrics_df['f1_f0_dg'] = [self._get_f1_f0(unit, self._get_preferred_condition(unit))
                                           for unit in unit_ids]
                 metrics_df['mod_idx_dg'] = [self._get_modulation_index(unit, self._get_preferred_condition(unit))
@@ -208,11 +209,9 @@ class DriftingGratings(StimulusAnalysis):
                 metrics_df['g_dsi_dg'] = [self._get_selectivity(unit, metrics_df.loc[unit]['pref_tf_dg'], 'dsi')
                                           for unit in unit_ids]
                 metrics_df['firing_rate_dg'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-                metrics_df['fano_dg'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                         for unit in unit_ids]
-                metrics_df['lifetime_sparseness_dg'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-                metrics_df.loc[:, ['run_pval_dg', 'run_mod_dg']] = [
-                    self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
+                metrics_df['fano_dg'] = self._get_fano_factor_many(preferred_conditions)
+                metrics_df['lifetime_sparseness_dg'] = self._get_lifetime_sparseness_many()
+                metrics_df.loc[:, ['run_pval_dg', 'run_mod_dg']] = self._get_running_modulation_many(preferred_conditions)
 
             if len(self.stim_table_contrast) > 0:
                 metrics_df['c50_dg'] = [self._get_c50(unit) for unit in unit_ids]
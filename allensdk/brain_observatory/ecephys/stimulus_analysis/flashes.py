@@ -95,17 +95,15 @@ class Flashes(StimulusAnalysis):
             metrics_df = self.empty_metrics_table()
 
             if len(self. stim_table) > 0:
+                preferred_conditions = self._get_preferred_condition_many()
                 metrics_df['on_off_ratio_fl'] = [self._get_on_off_ratio(unit) for unit in unit_ids]
                 metrics_df['sustained_idx_fl'] = [self._get_sustained_index(unit, self._get_preferred_condition(unit))
                                                   for unit in unit_ids]
                 metrics_df['firing_rate_fl'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-                metrics_df['time_to_peak_fl'] = [self._get_time_to_peak(unit, self._get_preferred_condition(unit))
-                                                 for unit in unit_ids]
-                metrics_df['fano_fl'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                         for unit in unit_ids]
-                metrics_df['lifetime_sparseness_fl'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-                metrics_df.loc[:, ['run_pval_fl', 'run_mod_fl']] = [
-                    self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
+                metrics_df['time_to_peak_fl'] = self._get_time_to_peak_many(preferred_conditions)
+                metrics_df['fano_fl'] = self._get_fano_factor_many(preferred_conditions)
+                metrics_df['lifetime_sparseness_fl'] = self._get_lifetime_sparseness_many()
+                metrics_df.loc[:, ['run_pval_fl', 'run_mod_fl']] = self._get_running_modulation_many(preferred_conditions)
 
             self._metrics = metrics_df
 
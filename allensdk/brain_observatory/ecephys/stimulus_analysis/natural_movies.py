@@ -72,13 +72,13 @@ class NaturalMovies(StimulusAnalysis):
 
             unit_ids = self.unit_ids
             metrics_df = self.empty_metrics_table()
-            metrics_df['fano_nm'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                     for unit in unit_ids]
+            preferred_conditions = self._get_preferred_condition_many()
+            metrics_df['fano_nm'] = self._get_fano_factor_many(preferred_conditions)
             metrics_df['firing_rate_nm'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-            metrics_df['lifetime_sparseness_nm'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-            run_vals = [self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
-            metrics_df['run_pval_nm'] = [rv[0] for rv in run_vals]
-            metrics_df['run_mod_nm'] = [rv[1] for rv in run_vals]
+            metrics_df['lifetime_sparseness_nm'] = self._get_lifetime_sparseness_many()
+            run_vals = self._get_running_modulation_many(preferred_conditions)
+            metrics_df['run_pval_nm'] = run_vals[:, 0]
+            metrics_df['run_mod_nm'] = run_vals[:, 1]
 
             self._metrics = metrics_df
 
@@ -117,22 +117,17 @@ class NaturalScenes(StimulusAnalysis):
             metrics_df = self.empty_metrics_table()
 
             if len(self.stim_table) > 0:
+                preferred_conditions = self._get_preferred_condition_many()
                 logger.info('Calculating metrics for ' + self.name)
 
-                metrics_df['pref_image_ns'] = [self._get_preferred_condition(unit) for unit in unit_ids]
-                metrics_df['pref_images_multi_ns'] = [
-                    self._check_multiple_pref_conditions(unit_id, self._col_image, self.images_nonblank)
-                    for unit_id in unit_ids
-                ]
+                metrics_df['pref_image_ns'] = preferred_conditions
+                metrics_df['pref_images_multi_ns'] = self._check_multiple_pref_conditions_many(self._col_image, self.images_nonblank)
                 metrics_df['image_selectivity_ns'] = [self._get_image_selectivity(unit) for unit in unit_ids]
                 metrics_df['firing_rate_ns'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-                metrics_df['fano_ns'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                         for unit in unit_ids]
-                metrics_df['time_to_peak_ns'] = [self._get_time_to_peak(unit, self._get_preferred_condition(unit))
-                                                 for unit in unit_ids]
-                metrics_df['lifetime_sparseness_ns'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-                metrics_df.loc[:, ['run_pval_ns', 'run_mod_ns']] = [
-                    self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
+                metrics_df['fano_ns'] = self._get_fano_factor_many(preferred_conditions)
+                metrics_df['time_to_peak_ns'] = self._get_time_to_peak_many(preferred_conditions)
+                metrics_df['lifetime_sparseness_ns'] = self._get_lifetime_sparseness_many()
+                metrics_df.loc[:, ['run_pval_ns', 'run_mod_ns']] = self._get_running_modulation_many(preferred_conditions)
 
             self._metrics = metrics_df
 
@@ -139,6 +139,7 @@ class ReceptiveFieldMapping(StimulusAnalysis):
             metrics_df = self.empty_metrics_table()
 
             if len(self.stim_table) > 0:
+                preferred_conditions = self._get_preferred_condition_many()
                 metrics_df.loc[:, ['azimuth_rf',
                                    'elevation_rf',
                                    'width_rf',
@@ -148,13 +149,10 @@ class ReceptiveFieldMapping(StimulusAnalysis):
                                    'on_screen_rf',
                                    ]] = [self._get_rf_stats(unit) for unit in unit_ids]
                 metrics_df['firing_rate_rf'] = [self._get_overall_firing_rate(unit) for unit in unit_ids]
-                metrics_df['fano_rf'] = [self._get_fano_factor(unit, self._get_preferred_condition(unit))
-                                         for unit in unit_ids]
-                metrics_df['time_to_peak_rf'] = [self._get_time_to_peak(unit, self._get_preferred_condition(unit))
-                                                 for unit in unit_ids]
-                metrics_df['lifetime_sparseness_rf'] = [self._get_lifetime_sparseness(unit) for unit in unit_ids]
-                metrics_df.loc[:, ['run_pval_rf', 'run_mod_rf']] = \
-                        [self._get_running_modulation(unit, self._get_preferred_condition(unit)) for unit in unit_ids]
+                metrics_df['fano_rf'] = self._get_fano_factor_many(preferred_conditions)
+                metrics_df['time_to_peak_rf'] = self._get_time_to_peak_many(preferred_conditions)
+                metrics_df['lifetime_sparseness_rf'] = self._get_lifetime_sparseness_many()
+                metrics_df.loc[:, ['run_pval_rf', 'run_mod_rf']] = self._get_running_modulation_many(preferred_conditions)
 
             self._metrics = metrics_df
 
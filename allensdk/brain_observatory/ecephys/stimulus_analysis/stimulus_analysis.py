@@ -8,6 +8,7 @@ from scipy.optimize import curve_fit
 from scipy.ndimage import gaussian_filter
 
 from ..ecephys_session import EcephysSession
+from .analysis_cache import StimulusAnalysisCache
 from allensdk.brain_observatory.ecephys.ecephys_session_api import \
     EcephysNwbSessionApi
 
@@ -79,6 +80,18 @@ class StimulusAnalysis(object):
         # Keeps track of preferred stimulus_condition_id for each unit
         self._preferred_condition = {}
 
+        # presentationwise_statistics reshaped for the batched metrics
+        self._presentationwise_matrix_cache = None
+
+        # Optional persistent cache of conditionwise_psth,
+        # presentationwise_statistics and conditionwise_statistics. May be
+        # a StimulusAnalysisCache or the path to a cache directory.
+        cache = kwargs.get('cache', None)
+        if cache is not None and not isinstance(cache,
+                                                StimulusAnalysisCache):
+            cache = StimulusAnalysisCache(cache)
+        self._cache = cache
+
     @property
     def ecephys_session(self):
         return self._ecephys_session
@@ -147,12 +160,16 @@ class StimulusAnalysis(object):
         # TODO: This may be unecessary since we already have the
         #  presentationwise_spike_times table.
         if self._spikes is None:
-            self._spikes = self.ecephys_session.spike_times
-            if len(self._spikes) > self.unit_count:
+            spike_times = self.ecephys_session.spike_times
+            if len(spike_times) > self.unit_count:
                 # if a filter has been applied such that not all the cells
                 # are being used in the analysis
-                self._spikes = {k: v for k, v in self._spikes.items() if
+                self._spikes = {k: v for k, v in spike_times.items() if
                                 k in self.unit_ids}
+            else:
+                # the session's spike times are shared between units; this
+                # builds views rather than copying them
+                self._spikes = dict(spike_times)
 
         return self._spikes
 
@@ -267,40 +284,10 @@ class StimulusAnalysis(object):
         """
 
         if self._conditionwise_psth is None:
-            if self._psth_resolution > self.trial_duration:
-                warnings.warn(
-                    'parameter "psth_resolution" > "trial_duration", '
-                    'PSTH will not be properly created.')
-
-            # get the spike-counts for every stimulus_presentation_id
-            dataset = self.ecephys_session.presentationwise_spike_counts(
-                bin_edges=np.arange(0, self.trial_duration,
-                                    self._psth_resolution),
-                stimulus_presentation_ids=self.stim_table.index.values,
-                unit_ids=self.unit_ids
-            )
-
-            # replace the stimulus_presentation_id (which will be unique for
-            # every single stim) with the corresponding
-            # stimulus_condition_id (which will be shared among presenations
-            # with the same conditions.
-            da = dataset.assign_coords(
-                stimulus_presentation_id=self.stim_table[
-                    'stimulus_condition_id'].values)
-            da = da.rename(
-                {'stimulus_presentation_id': 'stimulus_condition_id'})
-
-            # Average spike counts across each stimulus_condition_id.
-            n_stimuli = len(da['stimulus_condition_id'])
-            n_cond_ids = len(
-                np.unique(da.coords['stimulus_condition_id'].values))
-            if n_stimuli == n_cond_ids:
-                # If every condition_id is unique then calling
-                # groupby().mean() is unnecessary and will raise an error.
-                self._conditionwise_psth = da
-            else:
-                self._conditionwise_psth = da.groupby(
-                    'stimulus_condition_id').mean(dim='stimulus_condition_id')
+            self._conditionwise_psth = self._cached(
+                'conditionwise_psth', self._build_conditionwise_psth,
+                trial_duration=self.trial_duration,
+                psth_resolution=self._psth_resolution)
 
         return self._conditionwise_psth
 
@@ -317,9 +304,10 @@ class StimulusAnalysis(object):
             spike_std and stimulus_presentation_count information.
         """
         if self._conditionwise_statistics is None:
-            self._conditionwise_statistics = \
-                self.ecephys_session.conditionwise_spike_statistics(
-                    self.stim_table.index.values, self.unit_ids)
+            self._conditionwise_statistics = self._cached(
+                'conditionwise_statistics',
+                lambda: self.ecephys_session.conditionwise_spike_statistics(
+                    self.stim_table.index.values, self.unit_ids))
 
         return self._conditionwise_statistics
 
@@ -358,21 +346,10 @@ class StimulusAnalysis(object):
 
         """
         if self._presentationwise_statistics is None:
-            # for each presentation_id and unit_id get the spike_counts
-            # across the entire duration. Since there is only
-            # a single bin we can drop time_relative_to_stimulus_onset.
-            df = self.ecephys_session.presentationwise_spike_counts(
-                bin_edges=np.array([0.0, self.trial_duration]),
-                stimulus_presentation_ids=self.stim_table.index.values,
-                unit_ids=self.unit_ids
-            ).to_dataframe().reset_index(
-                level='time_relative_to_stimulus_onset', drop=True)
-
-            # left join table with stimulus_condition_id and mean
-            # running_speed joined on stimulus_presentation_id
-            df = df.join(self.stim_table.loc[df.index.levels[0].values][
-                             'stimulus_condition_id'])
-            self._presentationwise_statistics = df.join(self.running_speed)
+            self._presentationwise_statistics = self._cached(
+                'presentationwise_statistics',
+                self._build_presentationwise_statistics,
+                trial_duration=self.trial_duration)
 
         return self._presentationwise_statistics
 
@@ -431,6 +408,90 @@ class StimulusAnalysis(object):
 
         return self._running_speed
 
+    def _build_conditionwise_psth(self):
+        if self._psth_resolution > self.trial_duration:
+            warnings.warn(
+                'parameter "psth_resolution" > "trial_duration", '
+                'PSTH will not be properly created.')
+
+        # get the spike-counts for every stimulus_presentation_id
+        dataset = self.ecephys_session.presentationwise_spike_counts(
+            bin_edges=np.arange(0, self.trial_duration,
+                                self._psth_resolution),
+            stimulus_presentation_ids=self.stim_table.index.values,
+            unit_ids=self.unit_ids
+        )
+
+        # replace the stimulus_presentation_id (which will be unique for
+        # every single stim) with the corresponding
+        # stimulus_condition_id (which will be shared among presenations
+        # with the same conditions.
+        da = dataset.assign_coords(
+            stimulus_presentation_id=self.stim_table[
+                'stimulus_condition_id'].values)
+        da = da.rename(
+            {'stimulus_presentation_id': 'stimulus_condition_id'})
+
+        # Average spike counts across each stimulus_condition_id.
+        n_stimuli = len(da['stimulus_condition_id'])
+        n_cond_ids = len(
+            np.unique(da.coords['stimulus_condition_id'].values))
+        if n_stimuli == n_cond_ids:
+            # If every condition_id is unique then calling
+            # groupby().mean() is unnecessary and will raise an error.
+            return da
+        else:
+            return da.groupby(
+                'stimulus_condition_id').mean(dim='stimulus_condition_id')
+
+    def _build_presentationwise_statistics(self):
+        # for each presentation_id and unit_id get the spike_counts
+        # across the entire duration. Since there is only
+        # a single bin we can drop time_relative_to_stimulus_onset.
+        df = self.ecephys_session.presentationwise_spike_counts(
+            bin_edges=np.array([0.0, self.trial_duration]),
+            stimulus_presentation_ids=self.stim_table.index.values,
+            unit_ids=self.unit_ids
+        ).to_dataframe().reset_index(
+            level='time_relative_to_stimulus_onset', drop=True)
+
+        # left join table with stimulus_condition_id and mean
+        # running_speed joined on stimulus_presentation_id
+        df = df.join(self.stim_table.loc[df.index.levels[0].values][
+                         'stimulus_condition_id'])
+        return df.join(self.running_speed)
+
+    def _cached(self, product, compute, **params):
+        """ Load product from the persistent cache (if one was provided),
+        computing and storing it if it is missing.
+
+        Entries are keyed by the session, stimulus, units and presentations
+        analysed, along with params.
+        """
+        if self._cache is None:
+            return compute()
+
+        try:
+            session_id = self.ecephys_session.ecephys_session_id
+        except NotImplementedError:
+            # without a session id, entries can't be told apart
+            return compute()
+
+        stim_table = self.stim_table
+        key = self._cache.make_key(
+            product=product,
+            analysis=self.__class__.__name__,
+            ecephys_session_id=session_id,
+            stimulus_key=self._stimulus_key,
+            unit_ids=self.unit_ids,
+            stimulus_presentation_ids=stim_table.index.values,
+            start_times=stim_table['start_time'].values,
+            stop_times=stim_table['stop_time'].values,
+            stimulus_condition_ids=stim_table[
+                'stimulus_condition_id'].values,
+            params=params)
+        return self._cache.get_or_compute(key, compute)
+
     @property
     def metrics(self):
         """Returns a pandas DataFrame of the stimulus response metrics for
@@ -568,6 +629,199 @@ class StimulusAnalysis(object):
             stop_times=self._block_stops,
             spike_times=self.ecephys_session.spike_times[unit_id])
 
+    ############
+    # Helper functions for calculating metrics of all units at once. Each
+    # returns one value per entry of self.unit_ids, equal to the result of
+    # the corresponding per-unit helper above.
+    ############
+    def _conditionwise_matrix(self, column, drop_conditions=None):
+        """Reshape a column of conditionwise_statistics into a
+        (unit x stimulus_condition_id) table, rows ordered as
+        self.unit_ids."""
+        matrix = self.conditionwise_statistics[column].unstack(
+            'stimulus_condition_id')
+        if drop_conditions is not None:
+            matrix = matrix[drop_conditions(matrix.columns)]
+        return matrix.reindex(self.unit_ids)
+
+    def _presentationwise_matrix(self):
+        """Reshape presentationwise_statistics into a (unit x presentation)
+        array of spike counts, along with the stimulus_condition_id and
+        running speed of each presentation."""
+        if self._presentationwise_matrix_cache is None:
+            stats = self.presentationwise_statistics
+            spike_counts = stats['spike_counts'].unstack('unit_id')
+            presentations = stats.xs(
+                self.unit_ids[0], level='unit_id'
+            ).reindex(spike_counts.index)
+
+            self._presentationwise_matrix_cache = (
+                spike_counts[self.unit_ids].values.T,
+                presentations['stimulus_condition_id'].values,
+                presentations['running_speed'].values)
+
+        return self._presentationwise_matrix_cache
+
+    @staticmethod
+    def _group_by_preferred_condition(preferred_conditions, condition_ids):
+        """Yields (unit indices, presentation indices) for the units sharing
+        each preferred condition. Units without a preferred condition are
+        skipped."""
+        preferred_conditions = np.asarray(preferred_conditions)
+        for condition in pd.unique(preferred_conditions):
+            if pd.isnull(condition):
+                continue
+            yield (np.flatnonzero(preferred_conditions == condition),
+                   np.flatnonzero(condition_ids == condition))
+
+    def _get_preferred_condition_many(self):
+        """Determines and caches the prefered stimulus_condition_id of every
+        unit. Units without one are assigned NaN."""
+        if all(unit_id in self._preferred_condition
+               for unit_id in self.unit_ids):
+            return np.array([self._preferred_condition[unit_id]
+                             for unit_id in self.unit_ids])
+
+        def drop_null(conditions):
+            try:
+                return conditions.drop(self.null_condition)
+            except (IndexError, NotImplementedError, KeyError):
+                return conditions
+
+        spike_means = self._conditionwise_matrix('spike_mean', drop_null)
+        values = spike_means.values
+        has_mean = ~np.all(np.isnan(values), axis=1)
+
+        preferred = np.full(len(self.unit_ids), np.nan, dtype=object)
+        if values.shape[1] > 0:
+            # matches idxmax, which skips NaN and picks the first maximum
+            best = np.argmax(np.where(np.isnan(values), -np.inf, values),
+                             axis=1)
+            preferred[has_mean] = spike_means.columns.values[best[has_mean]]
+        preferred = pd.Series(preferred).infer_objects().values
+
+        for unit_id, condition in zip(self.unit_ids, preferred):
+            self._preferred_condition.setdefault(unit_id, condition)
+        return np.array([self._preferred_condition[unit_id]
+                         for unit_id in self.unit_ids])
+
+    def _check_multiple_pref_conditions_many(self, stim_cond_col,
+                                             valid_conditions):
+        """Equivalent to _check_multiple_pref_conditions for every unit"""
+        spike_means = self._conditionwise_matrix('spike_mean')
+        condition_values = self.stimulus_conditions[stim_cond_col].reindex(
+            spike_means.columns).values
+
+        means = np.full((len(self.unit_ids), len(valid_conditions)), np.nan)
+        for ii, value in enumerate(valid_conditions):
+            similar = condition_values == value
+            if np.any(similar):
+                means[:, ii] = np.nanmean(spike_means.values[:, similar],
+                                          axis=1)
+
+        # a NaN mean makes the maximum NaN, which nothing compares equal to
+        is_max = means == np.max(means, axis=1, keepdims=True)
+        return np.sum(is_max, axis=1) > 1
+
+    def _get_running_modulation_many(self, preferred_conditions,
+                                     threshold=1.0):
+        """Get running modulation (p_value, run_mod) of every unit for its
+        preferred condition, as an (n_units x 2) array"""
+        spike_counts, condition_ids, running_speeds = \
+            self._presentationwise_matrix()
+        out = np.full((len(self.unit_ids), 2), np.nan)
+
+        groups = self._group_by_preferred_condition(preferred_conditions,
+                                                    condition_ids)
+        for units, presentations in groups:
+            is_running = running_speeds[presentations] >= threshold
+            # Requires at-least two periods when the mouse is running and
+            # two when the mouse is not running.
+            if not 1 < np.sum(is_running) < (len(presentations) - 1):
+                continue
+
+            counts = spike_counts[np.ix_(units, presentations)]
+            run = counts[:, is_running]
+            stat = counts[:, ~is_running]
+            run_mean = np.mean(run, axis=1)
+            stat_mean = np.mean(stat, axis=1)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                run_mod = np.where(run_mean > stat_mean,
+                                   (run_mean - stat_mean) / run_mean,
+                                   -1 * (stat_mean - run_mean) / stat_mean)
+            _, p = st.ttest_ind(run, stat, axis=1, equal_var=False)
+
+            silent = (run_mean == 0) & (stat_mean == 0)
+            out[units, 0] = np.where(silent, np.nan, p)
+            out[units, 1] = np.where(silent, np.nan, run_mod)
+
+        return out
+
+    def _get_lifetime_sparseness_many(self):
+        """Computes lifetime sparseness of responses for every unit"""
+        responses = self._conditionwise_matrix(
+            'spike_count',
+            lambda conditions: conditions.drop(self.null_condition,
+                                               errors='ignore')).values
+
+        n_conditions = responses.shape[1]
+        if n_conditions <= 1:
+            warnings.warn(
+                'responses array must contain at least two or more values to '
+                'calculate.')
+            return np.full(len(self.unit_ids), np.nan)
+
+        coeff = 1.0 / n_conditions
+        return (1.0 - coeff * ((np.power(np.sum(responses, axis=1), 2)) / (
+            np.sum(np.power(responses, 2), axis=1)))) / (1.0 - coeff)
+
+    def _get_fano_factor_many(self, preferred_conditions):
+        """Computes the fano factor of every unit's spike counts at its
+        preferred condition"""
+        spike_counts, condition_ids, _ = self._presentationwise_matrix()
+        out = np.full(len(self.unit_ids), np.nan)
+
+        groups = self._group_by_preferred_condition(preferred_conditions,
+                                                    condition_ids)
+        for units, presentations in groups:
+            if len(presentations) == 0:
+                continue
+            counts = spike_counts[np.ix_(units, presentations)]
+            spike_count_mean = np.mean(counts, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[units] = np.where(
+                    spike_count_mean == 0, np.nan,
+                    np.var(counts, axis=1) / spike_count_mean)
+
+        return out
+
+    def _get_time_to_peak_many(self, preferred_conditions):
+        """Equal to the time of the maximum firing rate of each unit's
+        average PSTH at its preferred condition"""
+        psth = self.conditionwise_psth.transpose(
+            'stimulus_condition_id', 'unit_id',
+            'time_relative_to_stimulus_onset')
+        times = psth['time_relative_to_stimulus_onset'].values
+        unit_index = pd.Index(psth['unit_id'].values).get_indexer(
+            self.unit_ids)
+        out = np.full(len(self.unit_ids), np.nan)
+
+        groups = self._group_by_preferred_condition(
+            preferred_conditions, psth['stimulus_condition_id'].values)
+        for units, conditions in groups:
+            units = units[unit_index[units] >= 0]
+            if len(conditions) == 0 or len(units) == 0:
+                continue
+            values = psth.values[conditions[0], unit_index[units], :]
+
+            is_peak = values == np.nanmax(values, axis=1, keepdims=True)
+            has_peak = np.any(is_peak, axis=1)
+            out[units[has_peak]] = times[np.argmax(is_peak[has_peak],
+                                                   axis=1)]
+
+        return out
+
     def get_intrinsic_timescale(self, unit_ids):
         """Calculates the intrinsic timescale for a subset of units"""
         # TODO: Recently added by not yet being used, should indicate if/how
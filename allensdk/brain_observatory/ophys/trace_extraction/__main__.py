@@ -88,7 +88,8 @@ def write_trace_file(data, names, path):
         fil.create_dataset("roi_names", data=np.array(names).astype(np.string_), dtype=utf_dtype)
 
 
-def extract_traces(motion_corrected_stack, motion_border, storage_directory, rois, log_0, **kwargs):
+def extract_traces(motion_corrected_stack, motion_border, storage_directory, rois, log_0,
+                   memory_budget_bytes=None, **kwargs):
 
     # find width and height of movie
     with h5py.File(motion_corrected_stack, "r") as f:
@@ -110,7 +111,8 @@ def extract_traces(motion_corrected_stack, motion_border, storage_directory, roi
 
     # extract traces
     roi_traces, neuropil_traces, exclusions = roi_masks.calculate_roi_and_neuropil_traces(
-        motion_corrected_stack, roi_mask_list, border
+        motion_corrected_stack, roi_mask_list, border,
+        memory_budget_bytes=memory_budget_bytes
     )
 
     roi_file = os.path.abspath(os.path.join(storage_directory, "roi_traces.h5"))
@@ -58,6 +58,11 @@ class InputSchema(ArgSchema):
     log_0 = String(required=True,
                    description='path to motion correction output csv')  #
     # TODO: is this redundant with motion border?
+    memory_budget_bytes = Integer(
+        required=False, allow_none=True, default=None,
+        description='if provided, the movie is read in the largest blocks '
+                    'of frames which fit in this many bytes. Otherwise, it '
+                    'is read 1000 frames at a time')
 
 
 class OutputSchema(RaisingSchema):
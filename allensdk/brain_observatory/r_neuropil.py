@@ -33,11 +33,17 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 #
+from functools import partial
+from multiprocessing import Pool
 import numpy as np
 import scipy.sparse as sparse
 from scipy.linalg import solve_banded
 import logging
 
+# number of ROIs whose folds are solved together by
+# estimate_contamination_ratios_many
+SOLVE_BLOCK_ROIS = 64
+
 
 def get_diagonals_from_sparse(mat):
     ''' Returns a dictionary of diagonals keyed by offsets
@@ -260,58 +266,15 @@ class NeuropilSubtract(object):
         around the minimum error values and repeat multiple times.
         TODO: docs
         """
-        global_min_error = None
-        global_min_r = None
-
-        r_vals = []
-        error_vals = []
-
-        it_range = r_range
-        it = 0
-
-        it_dr = dr
-        while it < iterations:
-            it_errors = []
-
-            # build a set of r values evenly distributed in a current range
-            rs = np.arange(it_range[0], it_range[1], it_dr)
-
-            # estimate error for each r
-            for r in rs:
-                error = self.estimate_error(r)
-                it_errors.append(error)
-
-                r_vals.append(r)
-                error_vals.append(error)
-
-            # find the minimum in this range and update the global minimum
-            min_i = np.argmin(it_errors)
-            min_error = it_errors[min_i]
-
-            if global_min_error is None or min_error < global_min_error:
-                global_min_error = min_error
-                global_min_r = rs[min_i]
-
-            logging.debug("iteration %d, r=%0.4f, e=%.6e",
-                          it, global_min_r, global_min_error)
-
-            # if the minimum error is on the upper boundary,
-            # extend the boundary and redo this iteration
-            if min_i == len(it_errors) - 1:
-                logging.debug(
-                    "minimum error found on upper r bound, extending range")
-                it_range = [rs[-1], rs[-1] + (rs[-1] - rs[0])]
-            else:
-                # error is somewhere on either side of the minimum error index
-                it_range = [rs[max(min_i - 1, 0)],
-                            rs[min(min_i + 1, len(rs) - 1)]]
-                it_dr *= dr_factor
-                it += 1
+        r_vals, error_vals, r, error = _fit_r(
+            lambda rs: [self.estimate_error(r) for r in rs],
+            r_range=r_range, iterations=iterations, dr=dr,
+            dr_factor=dr_factor)
 
         self.r_vals = r_vals
         self.error_vals = error_vals
-        self.r = global_min_r
-        self.error = global_min_error
+        self.r = r
+        self.error = error
 
     def estimate_error(self, r):
         """ Estimate error values for a given r for each fold and return the mean. """
@@ -326,6 +289,84 @@ class NeuropilSubtract(object):
         return np.mean(errors)
 
 
+def _fit_r(estimate_errors, r_range=[0.0, 2.0], iterations=3, dr=0.1,
+           dr_factor=0.1):
+    """ Coarse to fine grid search for the r with minimum error.  Estimate
+    error values for a range of r values.  Identify a new r range around
+    the minimum error values and repeat multiple times.
+
+    Parameters
+    ----------
+    estimate_errors: function
+        Takes an array of r values and returns their errors
+
+    Returns
+    -------
+    tuple: all r values evaluated, their errors, the r value with minimum
+        error, and that error
+    """
+    global_min_error = None
+    global_min_r = None
+
+    r_vals = []
+    error_vals = []
+
+    it_range = r_range
+    it = 0
+
+    it_dr = dr
+    while it < iterations:
+        # build a set of r values evenly distributed in a current range
+        rs = np.arange(it_range[0], it_range[1], it_dr)
+
+        # estimate error for each r
+        it_errors = estimate_errors(rs)
+
+        r_vals.extend(rs)
+        error_vals.extend(it_errors)
+
+        # find the minimum in this range and update the global minimum
+        min_i = np.argmin(it_errors)
+        min_error = it_errors[min_i]
+
+        if global_min_error is None or min_error < global_min_error:
+            global_min_error = min_error
+            global_min_r = rs[min_i]
+
+        logging.debug("iteration %d, r=%0.4f, e=%.6e",
+                      it, global_min_r, global_min_error)
+
+        # if the minimum error is on the upper boundary,
+        # extend the boundary and redo this iteration
+        if min_i == len(it_errors) - 1:
+            logging.debug(
+                "minimum error found on upper r bound, extending range")
+            it_range = [rs[-1], rs[-1] + (rs[-1] - rs[0])]
+        else:
+            # error is somewhere on either side of the minimum error index
+            it_range = [rs[max(min_i - 1, 0)],
+                        rs[min(min_i + 1, len(rs) - 1)]]
+            it_dr *= dr_factor
+            it += 1
+
+    return r_vals, error_vals, global_min_r, global_min_error
+
+
+def _contamination_ratio_results(r, r_vals, error, error_vals):
+    if r < 0:
+        logging.warning("r is negative (%f). return 0.0.", r)
+        r = 0
+
+    return {
+        "r": r,
+        "r_vals": r_vals,
+        "err": error,
+        "err_vals": error_vals,
+        "min_error": error,
+        "it": len(r_vals)
+    }
+
+
 def estimate_contamination_ratios(F_M, F_N,
                                   lam=0.05, folds=4, iterations=3,
                                   r_range=[0.0, 2.0], dr=0.1, dr_factor=0.1):
@@ -356,15 +397,98 @@ def estimate_contamination_ratios(F_M, F_N,
 
     # ns.fit_block_coordinate_desc()
 
-    if ns.r < 0:
-        logging.warning("r is negative (%f). return 0.0.", ns.r)
-        ns.r = 0
+    return _contamination_ratio_results(ns.r, ns.r_vals, ns.error,
+                                        ns.error_vals)
 
-    return {
-        "r": ns.r,
-        "r_vals": ns.r_vals,
-        "err": ns.error,
-        "err_vals": ns.error_vals,
-        "min_error": ns.error,
-        "it": len(ns.r_vals)
-    }
+
+def estimate_contamination_ratios_many(F_M, F_N,
+                                       lam=0.05, folds=4, iterations=3,
+                                       r_range=[0.0, 2.0], dr=0.1,
+                                       dr_factor=0.1, n_workers=1):
+    ''' Calculates neuropil contamination of many ROIs of the same length,
+    as estimate_contamination_ratios does for one ROI.
+
+    The corrected trace of a fold, F_C = A^-1 (F_M - r * F_N), is linear
+    in r, and A depends only on the fold length, lam and dt. So A is
+    factorized once, both F_M and F_N of every fold of every ROI are solved
+    against it together, and the error of any r follows from three moments
+    of the residuals of those solutions.
+
+    Parameters
+    ----------
+       F_M: 2D array of ROI traces, (ROIs x time)
+       F_N: 2D array of neuropil traces, (ROIs x time)
+       n_workers: number of processes among which the ROIs are divided
+
+    Returns
+    -------
+    list: a dictionary for each ROI, as returned by
+        estimate_contamination_ratios
+    '''
+    F_M = np.atleast_2d(F_M)
+    F_N = np.atleast_2d(F_N)
+
+    if F_M.shape != F_N.shape:
+        raise Exception(
+            "F_M and F_N must have the same shape (%s vs %s)" %
+            (F_M.shape, F_N.shape))
+
+    estimate = partial(_estimate_contamination_ratios_block,
+                       lam=lam, folds=folds, iterations=iterations,
+                       r_range=r_range, dr=dr, dr_factor=dr_factor)
+
+    if n_workers <= 1 or F_M.shape[0] <= 1:
+        return estimate(F_M, F_N)
+
+    n_chunks = min(n_workers, F_M.shape[0])
+    with Pool(n_workers) as pool:
+        results = pool.starmap(estimate, zip(np.array_split(F_M, n_chunks),
+                                             np.array_split(F_N, n_chunks)))
+    return [result for chunk in results for result in chunk]
+
+
+def _estimate_contamination_ratios_block(F_M, F_N, lam, folds, iterations,
+                                         r_range, dr, dr_factor, dt=1.0):
+    n_rois, T = F_M.shape
+    T_f = int(T / folds)
+    ab = ab_from_T(T_f, lam, dt)
+
+    # the mean squared residual of a fold, F_C - (F_M - r * F_N), is
+    # a + 2 * b * r + c * r**2
+    a = np.zeros((n_rois, folds))
+    b = np.zeros((n_rois, folds))
+    c = np.zeros((n_rois, folds))
+    mean_F_M = np.zeros((n_rois, folds))
+
+    for start in range(0, n_rois, SOLVE_BLOCK_ROIS):
+        block = slice(start, start + SOLVE_BLOCK_ROIS)
+        fold_F_M = F_M[block, :folds * T_f].reshape(-1, folds, T_f)
+        fold_F_N = F_N[block, :folds * T_f].reshape(-1, folds, T_f)
+
+        rhs = np.concatenate([fold_F_M, fold_F_N]).reshape(-1, T_f)
+        solved = solve_banded((1, 1), ab, rhs.T).T.reshape(
+            (2,) + fold_F_M.shape)
+        residual_M = solved[0] - fold_F_M
+        residual_N = fold_F_N - solved[1]
+
+        a[block] = np.mean(np.square(residual_M), axis=2)
+        b[block] = np.mean(residual_M * residual_N, axis=2)
+        c[block] = np.mean(np.square(residual_N), axis=2)
+        mean_F_M[block] = np.mean(fold_F_M, axis=2)
+
+    results = []
+    for i in range(n_rois):
+        def estimate_errors(rs):
+            rs = np.asarray(rs)[:, np.newaxis]
+            mean_square = np.maximum(a[i] + 2 * b[i] * rs + c[i] * rs ** 2,
+                                     0)
+            return np.mean(np.abs(np.sqrt(mean_square) / mean_F_M[i]),
+                           axis=1)
+
+        r_vals, error_vals, r, error = _fit_r(
+            estimate_errors, r_range=r_range, iterations=iterations, dr=dr,
+            dr_factor=dr_factor)
+        results.append(_contamination_ratio_results(r, r_vals, error,
+                                                    error_vals))
+
+    return results
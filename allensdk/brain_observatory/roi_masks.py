@@ -36,8 +36,10 @@
 import numpy as np
 import math
 import scipy.ndimage.morphology as morphology
+import scipy.sparse
 import logging
 import h5py
+from concurrent.futures import ThreadPoolExecutor
 
 # constants used for accessing border array
 RIGHT_SHIFT = 0
@@ -135,6 +137,177 @@ class Mask(object):
         mask[self.y:self.y + self.height, self.x:self.x + self.width] = self.mask
         return mask
 
+    def get_sparse_mask(self):
+        '''
+        Returns mask content as a SparseMask, without building the
+        full-size image plane
+
+        Returns
+        -------
+        SparseMask
+        '''
+        if self.mask is None:
+            cropped = np.zeros((0, 0), dtype=bool)
+        else:
+            cropped = np.asarray(self.mask) > 0
+        return SparseMask(shape=(self.img_rows, self.img_cols),
+                          x=self.x, y=self.y, mask=cropped)
+
+
+class SparseMask(object):
+    '''
+    A binary mask on an image plane, stored as its bounding box and the
+    bit-packed pixels within it. A 512x512 plane takes 256 kB as a dense
+    boolean array, whereas a typical cell mask packs into a few hundred
+    bytes.
+
+    The full-size plane is only built on request, with to_dense() or
+    np.asarray().
+
+    Parameters
+    ----------
+    shape: (int, int)
+        (height, width) of the image plane
+
+    x: int
+        Column of the left of the bounding box
+
+    y: int
+        Row of the top of the bounding box
+
+    mask: bool[height][width]
+        Mask within the bounding box
+    '''
+
+    def __init__(self, shape, x, y, mask):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim != 2:
+            raise ValueError("Expected a 2d mask, got an array of shape "
+                             "{}".format(mask.shape))
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.x = int(x)
+        self.y = int(y)
+        self.height, self.width = mask.shape
+        if self.y < 0 or self.x < 0 or \
+                self.y + self.height > self.shape[0] or \
+                self.x + self.width > self.shape[1]:
+            raise ValueError("Mask bounding box (x={}, y={}, width={}, "
+                             "height={}) does not fit in an image plane of "
+                             "shape {}".format(self.x, self.y, self.width,
+                                               self.height, self.shape))
+        self._packed = np.packbits(mask, axis=None)
+
+    @classmethod
+    def from_dense(cls, array):
+        '''
+        Creates a SparseMask from a full-size image plane
+
+        Parameters
+        ----------
+        array: integer[image height][image width]
+            Active parts of the mask should have values >0. Background
+            pixels must be zero
+
+        Returns
+        -------
+        SparseMask
+        '''
+        array = np.asarray(array)
+        rows = np.flatnonzero(array.any(axis=1))
+        cols = np.flatnonzero(array.any(axis=0))
+        if len(rows) == 0:
+            return cls(shape=array.shape, x=0, y=0,
+                       mask=np.zeros((0, 0), dtype=bool))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = cols[0], cols[-1] + 1
+        return cls(shape=array.shape, x=left, y=top,
+                   mask=array[top:bottom, left:right] > 0)
+
+    @property
+    def dtype(self):
+        return np.dtype(bool)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nbytes(self):
+        '''Number of bytes used to store the mask pixels'''
+        return self._packed.nbytes
+
+    @property
+    def mask(self):
+        '''
+        Mask within the bounding box
+
+        Returns
+        -------
+        bool[height][width]
+        '''
+        n_pixels = self.height * self.width
+        return np.unpackbits(self._packed, count=n_pixels).astype(
+            bool).reshape(self.height, self.width)
+
+    @property
+    def area(self):
+        '''Number of pixels in the mask'''
+        return int(np.unpackbits(self._packed).sum())
+
+    def to_dense(self):
+        '''
+        Returns mask content on full-size image plane
+
+        Returns
+        -------
+        bool[image height][image width]
+        '''
+        dense = np.zeros(self.shape, dtype=bool)
+        dense[self.y:self.y + self.height,
+              self.x:self.x + self.width] = self.mask
+        return dense
+
+    def __array__(self, dtype=None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def pixel_indices(self):
+        '''
+        Returns the indices of the mask pixels into the raveled (row-major)
+        image plane, in increasing order
+
+        Returns
+        -------
+        int[number of pixels]
+        '''
+        rows, cols = np.nonzero(self.mask)
+        return (rows + self.y) * self.shape[1] + cols + self.x
+
+    def add_to(self, image, value=1):
+        '''
+        Adds value to the pixels of image covered by the mask, in place
+
+        Parameters
+        ----------
+        image: numeric[image height][image width]
+            Image plane of the same shape as the mask
+
+        value: numeric
+            Value to add
+        '''
+        image[self.y:self.y + self.height,
+              self.x:self.x + self.width] += value * self.mask
+
+    def __eq__(self, other):
+        if not isinstance(other, SparseMask):
+            return NotImplemented
+        return self.shape == other.shape and \
+            np.array_equal(self.pixel_indices(), other.pixel_indices())
+
+    def __repr__(self):
+        return "SparseMask(shape={}, x={}, y={}, width={}, height={})".format(
+            self.shape, self.x, self.y, self.width, self.height)
+
 
 def create_roi_mask(image_w, image_h, border, pix_list=None, roi_mask=None, label=None, mask_group=-1):
     '''
@@ -406,11 +579,71 @@ def validate_mask(mask):
     return exclusions
     
 
-def calculate_traces(stack, mask_list, block_size=1000):
+def block_size_for_memory_budget(stack, memory_budget_bytes):
+    '''
+    Number of frames of stack that calculate_traces reads per block to stay
+    within a memory budget. Two blocks are held at once: the block being
+    reduced and the one being read.
+
+    Parameters
+    ----------
+    stack: float[frames][image height][image width]
+        Image stack, ie an h5py.Dataset
+
+    memory_budget_bytes: int
+        Memory available for blocks of frames
+
+    Returns
+    -------
+    int
+        Number of frames per block (at least 1)
+    '''
+    pixels_per_frame = int(np.prod(stack.shape[1:]))
+    itemsize = np.dtype(stack.dtype).itemsize
+    bytes_per_frame = 2 * pixels_per_frame * itemsize
+    return max(1, int(memory_budget_bytes // bytes_per_frame))
+
+
+def _read_blocks(stack, block_size, prefetch=True):
+    '''
+    Yields (first frame index, frames) for consecutive blocks of stack.
+    With prefetch, the next block is read in a background thread while the
+    caller works on the current one, so that (HDF5) reads overlap compute.
+    '''
+    num_frames = stack.shape[0]
+    starts = range(0, num_frames, block_size)
+
+    def read(start):
+        return np.asarray(stack[start:start + block_size])
+
+    if not prefetch:
+        for start in starts:
+            logging.debug("frame " + str(start) + " of " + str(num_frames))
+            yield start, read(start)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+        for start in starts:
+            current = pending if pending is not None else \
+                executor.submit(read, start)
+            next_start = start + block_size
+            pending = executor.submit(read, next_start) \
+                if next_start < num_frames else None
+            logging.debug("frame " + str(start) + " of " + str(num_frames))
+            yield start, current.result()
+
+
+def calculate_traces(stack, mask_list, block_size=1000,
+                     memory_budget_bytes=None, prefetch=True):
     '''
     Calculates the average response of the specified masks in the
     image stack
 
+    All masks are reduced together: the masks form one sparse
+    (masks x pixels) matrix, which multiplies each frame. Frames are read
+    in blocks.
+
     Parameters
     ----------
     stack: float[image height][image width]
@@ -419,6 +652,17 @@ def calculate_traces(stack, mask_list, block_size=1000):
     mask_list: list<Mask>
         List of masks
 
+    block_size: int
+        Number of frames read at a time
+
+    memory_budget_bytes: int
+        If given, overrides block_size with the largest block that fits in
+        this many bytes (see block_size_for_memory_budget)
+
+    prefetch: bool
+        Whether to read the next block of frames in a background thread
+        while the current one is reduced
+
     Returns
     -------
     float[number masks][number frames]
@@ -448,32 +692,43 @@ def calculate_traces(stack, mask_list, block_size=1000):
             mask.mask = np.array(mask.mask)
         mask_areas[i] = mask.mask.sum()
 
-    # calculate traces
-    for frame_num in range(0, num_frames, block_size):
-        if frame_num % block_size == 0:
-            logging.debug("frame " + str(frame_num) + " of " + str(num_frames))
-        frames = stack[frame_num:frame_num+block_size]
+    if memory_budget_bytes is not None:
+        block_size = block_size_for_memory_budget(stack, memory_budget_bytes)
 
-        for i in range(len(mask_list)):
-            if not valid_masks[i]:
-                continue
+    # one row of pixel weights per valid mask
+    valid_indices = np.flatnonzero(valid_masks)
+    weights = create_mask_matrix(
+        [mask_list[i] for i in valid_indices], shape=stack.shape[1:])
+    valid_areas = mask_areas[valid_indices][:, np.newaxis]
 
-            mask = mask_list[i]
-            subframe = frames[:,mask.y:mask.y + mask.height, 
-                                mask.x:mask.x + mask.width]
+    if len(valid_indices) == 0:
+        return traces, exclusions
 
-            total = subframe[:, mask.mask].sum(axis=1)
-            traces[i, frame_num:frame_num+block_size] = total / mask_areas[i]
+    # calculate traces
+    totals = np.zeros((len(valid_indices), num_frames), dtype=float)
+    for frame_num, frames in _read_blocks(stack, block_size, prefetch):
+        frames = frames.reshape(frames.shape[0], -1)
+        # one sparse matrix-vector product per (contiguous) frame is
+        # faster than a product with the transposed block, and needs no
+        # copy of it
+        for i, frame in enumerate(frames):
+            totals[:, frame_num + i] = weights.dot(frame)
+    traces[valid_indices] = totals / valid_areas
 
     return traces, exclusions
 
-def calculate_roi_and_neuropil_traces(movie_h5, roi_mask_list, motion_border):
-    """ get roi and neuropil masks """
+
+def calculate_roi_and_neuropil_traces(movie_h5, roi_mask_list, motion_border,
+                                      block_size=1000,
+                                      memory_budget_bytes=None):
+    """ get roi and neuropil masks
+
+    block_size and memory_budget_bytes are passed to calculate_traces
+    """
 
     # a combined binary mask for all ROIs (this is used to 
     #   subtracted ROIs from annuli
-    mask_array = create_roi_mask_array(roi_mask_list)
-    combined_mask = mask_array.max(axis=0)
+    combined_mask = create_combined_mask(roi_mask_list).astype(np.uint8)
 
     logging.info("%d total ROIs" % len(roi_mask_list))
 
@@ -490,7 +745,9 @@ def calculate_roi_and_neuropil_traces(movie_h5, roi_mask_list, motion_border):
         stack_frames = movie_f["data"]
 
         logging.info("Calculating %d traces (neuropil + ROI) over %d frames" % (len(combined_list), len(stack_frames)))
-        traces, exclusions = calculate_traces(stack_frames, combined_list)
+        traces, exclusions = calculate_traces(
+            stack_frames, combined_list, block_size=block_size,
+            memory_budget_bytes=memory_budget_bytes)
 
         roi_traces = traces[:num_rois]
         neuropil_traces = traces[num_rois:]
@@ -498,6 +755,71 @@ def calculate_roi_and_neuropil_traces(movie_h5, roi_mask_list, motion_border):
     return roi_traces, neuropil_traces, exclusions
 
 
+def create_mask_matrix(masks, shape=None):
+    '''Create a sparse matrix of masks, with one row per mask and one
+    column per pixel of the raveled (row-major) image plane.
+
+    Parameters
+    ----------
+    masks: list<Mask or SparseMask>
+        List of masks on image planes of the same shape.
+
+    shape: (int, int)
+        (height, width) of the image plane. Only needed if masks is empty.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix: N x (H*W)
+        Binary (float) matrix of len(masks) raveled masks.
+    '''
+    masks = [m if isinstance(m, SparseMask) else m.get_sparse_mask()
+             for m in masks]
+    if shape is None:
+        if not masks:
+            raise ValueError("shape is required if there are no masks")
+        shape = masks[0].shape
+
+    indices = [m.pixel_indices() for m in masks]
+    indptr = np.zeros(len(masks) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(i) for i in indices])
+    if indices:
+        indices = np.concatenate(indices)
+    else:
+        indices = np.zeros(0, dtype=np.int64)
+    return scipy.sparse.csr_matrix(
+        (np.ones(len(indices)), indices, indptr),
+        shape=(len(masks), shape[0] * shape[1]))
+
+
+def create_combined_mask(masks, shape=None):
+    '''Create the union of masks on the full image plane, without
+    building a full-size plane for each mask.
+
+    Parameters
+    ----------
+    masks: list<Mask or SparseMask>
+        List of masks on image planes of the same shape.
+
+    shape: (int, int)
+        (height, width) of the image plane. Only needed if masks is empty.
+
+    Returns
+    -------
+    np.ndarray: HxW
+        Boolean image of the pixels in any of the masks.
+    '''
+    masks = [m if isinstance(m, SparseMask) else m.get_sparse_mask()
+             for m in masks]
+    if shape is None:
+        if not masks:
+            raise ValueError("shape is required if there are no masks")
+        shape = masks[0].shape
+    combined = np.zeros(shape[0] * shape[1], dtype=bool)
+    for m in masks:
+        combined[m.pixel_indices()] = True
+    return combined.reshape(shape)
+
+
 def create_roi_mask_array(rois):
     '''Create full image mask array from list of RoiMasks.
 
@@ -516,7 +838,10 @@ def create_roi_mask_array(rois):
         width = rois[0].img_cols
         masks = np.zeros((len(rois), height, width), dtype=np.uint8)
         for i, roi in enumerate(rois):
-            masks[i, :, :] = roi.get_mask_plane()
+            # write the bounding box of each mask only
+            if roi.mask is not None:
+                masks[i, roi.y:roi.y + roi.height,
+                      roi.x:roi.x + roi.width] = roi.mask
     else:
         masks = None
     return masks
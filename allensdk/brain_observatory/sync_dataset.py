@@ -15,6 +15,7 @@ h5py   http://www.h5py.org/
 
 """
 import collections
+from pathlib import Path
 from typing import Union, Sequence, Optional
 
 import h5py as h5
@@ -22,6 +23,10 @@ import numpy as np
 
 import warnings
 import logging
+
+from allensdk.api.cloud_cache.utils import file_hash_from_path
+from allensdk.brain_observatory.sync_line_index import SyncLineIndex
+
 logger = logging.getLogger(__name__)
 
 dset_version = 1.04
@@ -74,6 +79,14 @@ class Dataset(object):
     ----------
     path : str
         Path to HDF5 file.
+    line_index : bool
+        If True, the events are read once, on the first edge query, to
+        build a SyncLineIndex of the edges of every line, from which all
+        edge and event queries are answered.
+    line_index_cache_dir : str
+        Directory in which line indexes are saved, keyed by the hash of
+        the sync file, so that they are only built once per file. Only
+        used if line_index is True.
 
     Examples
     --------
@@ -113,7 +126,14 @@ class Dataset(object):
 
     DEPRECATED_KEYS = set()
 
-    def __init__(self, path):
+    use_line_index = False
+    line_index_cache_dir = None
+    _line_index = None
+    _times = None
+
+    def __init__(self, path, line_index=False, line_index_cache_dir=None):
+        self.use_line_index = line_index
+        self.line_index_cache_dir = line_index_cache_dir
         self.dfile = self.load(path)
         self._check_line_labels()
 
@@ -129,22 +149,65 @@ class Dataset(object):
             warnings.warn(("The loaded sync file has no line labels and may "
                            "not be valid."), stacklevel=2)
 
-    def _process_times(self):
+    def _process_times(self, events=None):
         """
         Preprocesses the time array to account for rollovers.
             This is only relevant for event-based sampling.
 
         """
-        times = self.get_all_events()[:, 0:1].astype(np.int64)
+        if events is None:
+            events = self.get_all_events()
+        times = events[:, 0:1].astype(np.int64)
 
         intervals = np.ediff1d(times, to_begin=0)
-        rollovers = np.where(intervals < 0)[0]
-
-        for i in rollovers:
-            times[i:] += 4294967296
+        times += 4294967296 * np.cumsum(intervals < 0)[:, np.newaxis]
 
         return times
 
+    @property
+    def times(self):
+        """
+        Counter values of all events, accounting for rollovers
+        """
+        if self._times is None:
+            self._times = self._process_times()
+        return self._times
+
+    @times.setter
+    def times(self, value):
+        self._times = value
+
+    @property
+    def line_index(self) -> SyncLineIndex:
+        """
+        Index of the edges of every line, which is loaded from
+            line_index_cache_dir or built from the events on first access.
+        """
+        if self._line_index is None:
+            self._line_index = self._load_line_index()
+        return self._line_index
+
+    def _load_line_index(self) -> SyncLineIndex:
+        index_path = None
+        if self.line_index_cache_dir is not None:
+            file_hash = file_hash_from_path(self.dfile.filename)
+            index_path = Path(self.line_index_cache_dir) / \
+                f"{file_hash}.sync_line_index.npz"
+            line_index = SyncLineIndex.load(index_path, file_hash)
+            if line_index is not None:
+                return line_index
+
+        events = self.get_all_events()
+        if self.meta_data['ni_daq']['counter_bits'] == 32:
+            times = events[:, 0]
+        else:
+            times = self._times = self._process_times(events)
+        line_index = SyncLineIndex.from_events(events[:, -1], times)
+
+        if index_path is not None:
+            line_index.save(index_path, file_hash)
+        return line_index
+
     def load(self, path):
         """
         Loads an hdf5 sync dataset.
@@ -159,7 +222,8 @@ class Dataset(object):
             path, 'r')  # MG edit 3/15 removed 'r' because some sync files were unable to load  # NOQA E501
         self.meta_data = eval(self.dfile['meta'][()])
         self.line_labels = self.meta_data['line_labels']
-        self.times = self._process_times()
+        if not self.use_line_index:
+            self.times = self._process_times()
         return self.dfile
 
     @property
@@ -242,6 +306,12 @@ class Dataset(object):
             times = self.get_all_events()[:, 0]
         else:
             times = self.times
+        return self._convert_times(times, units)
+
+    def _convert_times(self, times, units):
+        """
+        Converts counter values to units ('samples' or 'seconds').
+        """
         units = units.lower()
         if units == 'samples':
             return times
@@ -268,6 +338,8 @@ class Dataset(object):
             Bit for which to return events.
 
         """
+        if self.use_line_index:
+            return self._convert_times(self.line_index.events(bit), units)
         changes = self.get_bit_changes(bit)
         return self.get_all_times(units)[np.where(changes != 0)]
 
@@ -326,6 +398,9 @@ class Dataset(object):
 
         """
         bit = self._line_to_bit(line)
+        if self.use_line_index:
+            return self._convert_times(self.line_index.rising_edges(bit),
+                                       units)
         changes = self.get_bit_changes(bit)
         return self.get_all_times(units)[np.where(changes == 1)]
 
@@ -396,6 +471,9 @@ class Dataset(object):
 
         """
         bit = self._line_to_bit(line)
+        if self.use_line_index:
+            return self._convert_times(self.line_index.falling_edges(bit),
+                                       units)
         changes = self.get_bit_changes(bit)
         return self.get_all_times(units)[np.where(changes == 255)]
 
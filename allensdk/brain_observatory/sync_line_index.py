@@ -0,0 +1,150 @@
+"""
+Index of the rising and falling edges of each line of a sync dataset, so
+that edge queries do not need to read and unpack the whole event array.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+# increment when the layout of saved indexes changes
+LINE_INDEX_VERSION = 1
+
+
+class SyncLineIndex(object):
+    """
+    Sample indices and times of the rising and falling edges of every bit
+    (line) of a sync dataset, built in a single pass over its events.
+
+    Parameters
+    ----------
+    edges : dict
+        Maps each bit with edges to a tuple of arrays (rising indices,
+        falling indices, rising times, falling times). Indices are into
+        the event array; times are the sample counter values at those
+        indices.
+    empty_times : np.ndarray
+        Empty array of the dtype and trailing shape of the times, returned
+        for bits without edges
+    """
+
+    def __init__(self,
+                 edges: Dict[int, Tuple[np.ndarray, np.ndarray,
+                                        np.ndarray, np.ndarray]],
+                 empty_times: np.ndarray):
+        self._edges = edges
+        self._empty_times = empty_times
+
+    @classmethod
+    def from_events(cls, bits: np.ndarray,
+                    times: np.ndarray) -> "SyncLineIndex":
+        """
+        Build the index of a sync dataset
+
+        Parameters
+        ----------
+        bits : np.ndarray
+            The IO state of every event, ie the last column of the
+            dataset's event array
+        times : np.ndarray
+            The time (sample counter value) of every event, as returned by
+            Dataset.get_all_times(units='samples')
+        """
+        changed = np.flatnonzero(bits[1:] != bits[:-1]) + 1
+        toggled = bits[changed] ^ bits[changed - 1]
+        values = bits[changed]
+
+        edges = {}
+        active = int(np.bitwise_or.reduce(toggled)) if len(toggled) else 0
+        for bit in range(bits.dtype.itemsize * 8):
+            if not active & (1 << bit):
+                continue
+            bit_toggled = (toggled >> bit) & 1 == 1
+            high = (values >> bit) & 1 == 1
+            rising = changed[bit_toggled & high]
+            falling = changed[bit_toggled & ~high]
+            edges[bit] = (rising, falling, times[rising], times[falling])
+
+        return cls(edges, times[:0].copy())
+
+    def rising_edges(self, bit: int) -> np.ndarray:
+        """ Times of the rising edges of bit """
+        if bit not in self._edges:
+            return self._empty_times
+        return self._edges[bit][2]
+
+    def falling_edges(self, bit: int) -> np.ndarray:
+        """ Times of the falling edges of bit """
+        if bit not in self._edges:
+            return self._empty_times
+        return self._edges[bit][3]
+
+    def events(self, bit: int) -> np.ndarray:
+        """ Times of all edges of bit, in the order of the events """
+        if bit not in self._edges:
+            return self._empty_times
+        rising, falling, rising_times, falling_times = self._edges[bit]
+        order = np.argsort(np.concatenate([rising, falling]), kind='stable')
+        return np.concatenate([rising_times, falling_times])[order]
+
+    def save(self, path: Union[str, Path], file_hash: str):
+        """
+        Write the index to an npz file, atomically
+
+        Parameters
+        ----------
+        path : str or Path
+            Path of the index file
+        file_hash : str
+            Hash of the sync file this index was built from
+        """
+        arrays = {
+            'version': np.array(LINE_INDEX_VERSION),
+            'file_hash': np.array(file_hash),
+            'bits': np.array(sorted(self._edges), dtype=int),
+            'empty_times': self._empty_times
+        }
+        for bit, (rising, falling, rising_times, falling_times) in \
+                self._edges.items():
+            arrays[f'rising_{bit}'] = rising
+            arrays[f'falling_{bit}'] = falling
+            arrays[f'rising_times_{bit}'] = rising_times
+            arrays[f'falling_times_{bit}'] = falling_times
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez(tmp_file, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: Union[str, Path],
+             file_hash: str) -> Optional["SyncLineIndex"]:
+        """
+        Read an index written by save
+
+        Returns
+        -------
+        SyncLineIndex, or None if the file does not exist or was written
+        for another sync file or by another version
+        """
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays['version']) != LINE_INDEX_VERSION or \
+                    str(arrays['file_hash']) != file_hash:
+                return None
+            edges = {
+                int(bit): (arrays[f'rising_{bit}'],
+                           arrays[f'falling_{bit}'],
+                           arrays[f'rising_times_{bit}'],
+                           arrays[f'falling_times_{bit}'])
+                for bit in arrays['bits']}
+            return cls(edges, arrays['empty_times'])
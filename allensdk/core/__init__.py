@@ -42,3 +42,6 @@ from ._data_object_base.readable_interfaces import (    # noqa F401
 from ._data_object_base.writable_interfaces import (    # noqa F401
     NwbWritableInterface
 )
+from ._data_object_base.lazy_attribute import (    # noqa F401
+    LazyAttribute, LazyLoader, get_unloaded, is_loaded
+)
@@ -0,0 +1,78 @@
+from typing import Any, Callable
+
+
+class LazyLoader:
+    """Deferred construction of an attribute value, ie a DataObject which
+    is read from an open NWB file only when it is first needed.
+
+    Assign a LazyLoader to a LazyAttribute in place of the value itself.
+    """
+
+    def __init__(self, load: Callable[[], Any]):
+        """
+        :param load
+            Called without arguments to construct the value
+        """
+        self._load = load
+
+    def __call__(self) -> Any:
+        return self._load()
+
+    def then(self, func: Callable[[Any], Any]) -> "LazyLoader":
+        """Returns a LazyLoader which passes the value constructed by this
+        loader through func"""
+        return LazyLoader(lambda: func(self()))
+
+
+class LazyAttribute:
+    """A (typically private) attribute whose value may be assigned either
+    directly or as a LazyLoader. A LazyLoader is called the first time the
+    attribute is accessed, and its result replaces it.
+
+    :examples
+        >>> class A:
+        ...     _b = LazyAttribute()
+        ...     def __init__(self, b):
+        ...         self._b = b
+        >>> a = A(b=LazyLoader(lambda: 'loaded'))
+        >>> is_loaded(a, '_b')
+        False
+        >>> a._b
+        'loaded'
+        >>> is_loaded(a, '_b')
+        True
+    """
+
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            value = obj.__dict__[self._name]
+        except KeyError:
+            raise AttributeError(
+                f"'{type(obj).__name__}' object has no attribute "
+                f"'{self._name}'") from None
+        if isinstance(value, LazyLoader):
+            value = value()
+            obj.__dict__[self._name] = value
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self._name] = value
+
+
+def get_unloaded(obj: Any, name: str) -> Any:
+    """Returns the value of attribute name of obj without loading it, ie
+    either the value or the LazyLoader which will construct it"""
+    if isinstance(getattr(type(obj), name, None), LazyAttribute):
+        return obj.__dict__[name]
+    return getattr(obj, name)
+
+
+def is_loaded(obj: Any, name: str) -> bool:
+    """Whether attribute name of obj holds a value (rather than a
+    LazyLoader)"""
+    return not isinstance(get_unloaded(obj, name), LazyLoader)
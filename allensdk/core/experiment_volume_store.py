@@ -0,0 +1,224 @@
+"""
+Volumes of many connectivity experiments in a single chunked, compressed
+HDF5 array (experiment x X x Y x Z), which is sliced and reduced without
+loading whole volumes.
+"""
+import os
+from typing import Iterable, List, Tuple
+
+import h5py
+import numpy as np
+
+
+class ExperimentVolumeStore(object):
+    """
+    Registered volumes (e.g. projection density) of many experiments, stored
+    as one HDF5 dataset of shape (experiments, X, Y, Z) which grows as
+    experiments are added. Each chunk holds a block of one experiment's
+    volume, so reading a region of a few experiments only decompresses the
+    chunks which overlap it.
+
+    Parameters
+    ----------
+    path : str
+        Path of the HDF5 file. It is created when the first volume is added.
+    chunks : tuple of int, optional
+        Spatial shape of the chunks. It is clipped to the volume shape.
+    compression : str, optional
+        HDF5 compression filter of the volumes
+    compression_opts : optional
+        Options of the compression filter (the level, for gzip)
+    """
+
+    VOLUMES_KEY = "volumes"
+    EXPERIMENTS_KEY = "experiment_ids"
+
+    def __init__(self, path: str, chunks: Tuple[int, int, int] = (64, 64, 64),
+                 compression: str = "gzip", compression_opts=4):
+        self.path = path
+        self.chunks = tuple(chunks)
+        self.compression = compression
+        self.compression_opts = compression_opts
+
+    def experiment_ids(self) -> List[int]:
+        """ Ids of the stored experiments, in the order of the store """
+        if not os.path.exists(self.path):
+            return []
+        with h5py.File(self.path, "r") as store:
+            return store[self.EXPERIMENTS_KEY][()].tolist()
+
+    def add(self, experiment_id: int, volume: np.ndarray):
+        """
+        Store the volume of an experiment, replacing any stored for it
+
+        Parameters
+        ----------
+        experiment_id : int
+            Experiment whose volume this is
+        volume : np.ndarray
+            3D volume, of the shape of the volumes already stored
+        """
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        with h5py.File(self.path, "a") as store:
+            if self.VOLUMES_KEY not in store:
+                chunks = tuple(min(chunk, size) for chunk, size
+                               in zip(self.chunks, volume.shape))
+                store.create_dataset(
+                    self.VOLUMES_KEY, shape=(0,) + volume.shape,
+                    maxshape=(None,) + volume.shape, dtype=volume.dtype,
+                    chunks=(1,) + chunks, compression=self.compression,
+                    compression_opts=self.compression_opts)
+                store.create_dataset(self.EXPERIMENTS_KEY, shape=(0,),
+                                     maxshape=(None,), dtype=np.int64)
+
+            volumes = store[self.VOLUMES_KEY]
+            experiments = store[self.EXPERIMENTS_KEY]
+            if volumes.shape[1:] != volume.shape:
+                raise ValueError(
+                    f"volume of shape {volume.shape} does not match the "
+                    f"stored volumes, of shape {volumes.shape[1:]}")
+
+            stored = np.flatnonzero(experiments[()] == experiment_id)
+            if len(stored) > 0:
+                volumes[stored[0]] = volume
+                return
+
+            # the volume is written before the experiment is recorded, so an
+            # interrupted add leaves an unused slot rather than a wrong volume
+            position = experiments.shape[0]
+            volumes.resize(position + 1, axis=0)
+            volumes[position] = volume
+            experiments.resize(position + 1, axis=0)
+            experiments[position] = experiment_id
+
+    def volumes(self, experiment_ids: Iterable[int]) -> "ExperimentVolumes":
+        """
+        Lazy array of the volumes of some experiments
+
+        Parameters
+        ----------
+        experiment_ids : iterable of int
+            Stored experiments, in the order of the first axis of the array
+
+        Returns
+        -------
+        ExperimentVolumes :
+            Array of shape (experiments, X, Y, Z) whose elements are only
+            read from the store when sliced.
+        """
+        return ExperimentVolumes(self, self._positions(experiment_ids))
+
+    def reduce_by_label(self, experiment_ids: Iterable[int],
+                        annotation) -> Tuple[np.ndarray, np.ndarray,
+                                             np.ndarray]:
+        """
+        Sum the volumes of some experiments over the voxels of each label of
+        an annotation, reading one slab of chunks along the first axis at a
+        time.
+
+        Parameters
+        ----------
+        experiment_ids : iterable of int
+            Stored experiments
+        annotation : array-like
+            Volume of labels (structure ids) of the shape of the stored
+            volumes. Only slabs of it are read, so it may be a memory map or
+            an HDF5 dataset.
+
+        Returns
+        -------
+        labels : np.ndarray
+            Sorted distinct labels of the annotation
+        sums : np.ndarray
+            Array of shape (experiments, labels), the sum of each experiment's
+            volume over the voxels of each label
+        counts : np.ndarray
+            Number of voxels of each label
+        """
+        positions = self._positions(experiment_ids)
+
+        with h5py.File(self.path, "r") as store:
+            volumes = store[self.VOLUMES_KEY]
+            if tuple(annotation.shape) != volumes.shape[1:]:
+                raise ValueError(
+                    f"annotation of shape {annotation.shape} does not match "
+                    f"the stored volumes, of shape {volumes.shape[1:]}")
+            thickness = volumes.chunks[1]
+            slabs = [slice(start, start + thickness) for start
+                     in range(0, volumes.shape[1], thickness)]
+
+            labels = np.unique(np.concatenate(
+                [np.unique(annotation[slab]) for slab in slabs]))
+            sums = np.zeros((len(positions), len(labels)))
+            counts = np.zeros(len(labels), dtype=np.int64)
+
+            for slab in slabs:
+                slab_labels = np.searchsorted(
+                    labels, np.asarray(annotation[slab])).reshape(-1)
+                counts += np.bincount(slab_labels, minlength=len(labels))
+                for row, position in enumerate(positions):
+                    weights = volumes[position, slab].reshape(-1)
+                    sums[row] += np.bincount(slab_labels, weights=weights,
+                                             minlength=len(labels))
+
+        return labels, sums, counts
+
+    def _positions(self, experiment_ids: Iterable[int]) -> np.ndarray:
+        """ Positions in the store of some experiments """
+        experiment_ids = list(experiment_ids)
+        stored = self.experiment_ids()
+        position = {eid: pos for pos, eid in enumerate(stored)}
+        missing = [eid for eid in experiment_ids if eid not in position]
+        if missing:
+            raise KeyError(f"experiments {missing} are not in the store")
+        return np.array([position[eid] for eid in experiment_ids],
+                        dtype=np.int64)
+
+
+class ExperimentVolumes(object):
+    """
+    Lazy (experiments, X, Y, Z) array of the volumes of some experiments of
+    an ExperimentVolumeStore, returned by ExperimentVolumeStore.volumes.
+    Indexing it reads only the indexed region of the indexed experiments,
+    e.g. volumes[:, 100:200, 50:80, :] or volumes[[0, 2], bbox] with bbox a
+    tuple of spatial slices.
+    """
+
+    def __init__(self, store: ExperimentVolumeStore, positions: np.ndarray):
+        self.store = store
+        self.positions = positions
+        with h5py.File(store.path, "r") as volumes_file:
+            volumes = volumes_file[store.VOLUMES_KEY]
+            self.shape = (len(positions),) + volumes.shape[1:]
+            self.dtype = volumes.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        # spatial indices may be passed as one tuple, e.g. a bounding box
+        flat_key = []
+        for index in key:
+            flat_key.extend(index if isinstance(index, tuple) else [index])
+        experiments = flat_key[0] if flat_key else slice(None)
+        spatial = tuple(flat_key[1:])
+
+        selected = np.arange(len(self.positions))[experiments]
+        with h5py.File(self.store.path, "r") as volumes_file:
+            volumes = volumes_file[self.store.VOLUMES_KEY]
+            if np.ndim(selected) == 0:
+                return volumes[(self.positions[selected],) + spatial]
+            regions = [volumes[(self.positions[row],) + spatial]
+                       for row in selected]
+
+        if regions:
+            return np.stack(regions)
+        # the shape of an empty selection, without reading any volume
+        region = np.broadcast_to(np.zeros((), dtype=self.dtype),
+                                 self.shape[1:])[spatial]
+        return np.zeros((0,) + region.shape, dtype=self.dtype)
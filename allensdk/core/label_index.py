@@ -0,0 +1,218 @@
+"""
+Index of the voxels of each label of an annotation volume, so that masks
+and voxel counts of structures do not need a pass over the whole volume for
+each label.
+"""
+import os
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from allensdk.api.cloud_cache.utils import file_hash_from_path
+
+# increment when the layout of saved indexes changes
+LABEL_INDEX_VERSION = 1
+
+
+class LabelIndex(object):
+    """
+    The voxels of each label of an annotation volume, as runs of
+    consecutive voxels in the volume's C order. Built in a single pass over
+    the volume.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the annotation volume
+    labels : np.ndarray
+        Sorted distinct labels of the volume
+    offsets : np.ndarray
+        The runs of labels[i] are runs offsets[i]:offsets[i + 1]
+    run_starts : np.ndarray
+        Flat index of the first voxel of each run, grouped by label and
+        ascending within each label
+    run_lengths : np.ndarray
+        Number of voxels of each run
+    """
+
+    def __init__(self, shape: Tuple[int, ...], labels: np.ndarray,
+                 offsets: np.ndarray, run_starts: np.ndarray,
+                 run_lengths: np.ndarray):
+        self.shape = tuple(int(size) for size in shape)
+        self.labels = labels
+        self.offsets = offsets
+        self.run_starts = run_starts
+        self.run_lengths = run_lengths
+
+    @classmethod
+    def from_annotation(cls, annotation: np.ndarray) -> "LabelIndex":
+        """
+        Build the index of an annotation volume
+
+        Parameters
+        ----------
+        annotation : np.ndarray
+            Volume whose elements are labels (structure ids)
+        """
+        flat = np.ascontiguousarray(annotation).reshape(-1)
+        if flat.size == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(annotation.shape, flat[:0].copy(),
+                       np.zeros(1, dtype=np.int64), empty, empty)
+
+        run_starts = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        run_starts = np.concatenate([[0], run_starts]).astype(np.int64)
+        run_lengths = np.diff(np.append(run_starts, flat.size))
+        run_labels = flat[run_starts]
+
+        order = np.argsort(run_labels, kind='stable')
+        run_labels = run_labels[order]
+        first = np.flatnonzero(np.concatenate(
+            [[True], run_labels[1:] != run_labels[:-1]]))
+        offsets = np.append(first, len(run_labels)).astype(np.int64)
+
+        return cls(annotation.shape, run_labels[first], offsets,
+                   run_starts[order], run_lengths[order])
+
+    def voxel_counts(self) -> np.ndarray:
+        """ Number of voxels of each label of self.labels """
+        if len(self.labels) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat(self.run_lengths, self.offsets[:-1])
+
+    def runs(self, label_ids: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Starts and lengths of the runs of the voxels of some labels
+
+        Parameters
+        ----------
+        label_ids : iterable
+            Labels whose runs are returned. Labels which are not in the
+            volume have no runs.
+        """
+        label_ids = np.unique(np.asarray(list(label_ids)))
+        positions = np.searchsorted(self.labels, label_ids)
+        positions = positions[positions < len(self.labels)]
+        positions = positions[np.isin(self.labels[positions], label_ids)]
+
+        if len(positions) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        run_index = np.concatenate([
+            np.arange(self.offsets[pos], self.offsets[pos + 1])
+            for pos in positions])
+        return self.run_starts[run_index], self.run_lengths[run_index]
+
+    def mask(self, label_ids: Iterable) -> np.ndarray:
+        """
+        Indicator array of the voxels of some labels
+
+        Parameters
+        ----------
+        label_ids : iterable
+            Labels to include in the mask
+
+        Returns
+        -------
+        np.ndarray :
+            uint8 array of the shape of the volume, 1 inside the mask and 0
+            outside
+        """
+        mask = np.zeros(self.shape, dtype=np.uint8, order='C')
+        starts, lengths = self.runs(label_ids)
+        if len(starts) == 0:
+            return mask
+
+        # runs of distinct labels do not overlap, so marking +1 at the
+        # start and -1 after the end of each run and accumulating gives the
+        # mask, over the span of the runs only
+        stops = starts + lengths
+        low = starts.min()
+        high = stops.max()
+        delta = mask.reshape(-1).view(np.int8)[low:high]
+        delta[starts - low] += 1
+        inner = stops < high
+        delta[stops[inner] - low] -= 1
+        np.add.accumulate(delta, dtype=np.int8, out=delta)
+
+        return mask
+
+    def save(self, path: str, file_hash: str):
+        """
+        Write the index to an npz file, atomically
+
+        Parameters
+        ----------
+        path : str
+            Path of the index file
+        file_hash : str
+            Hash of the annotation file this index was built from
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez(tmp_file,
+                         version=np.array(LABEL_INDEX_VERSION),
+                         file_hash=np.array(file_hash),
+                         shape=np.array(self.shape, dtype=np.int64),
+                         labels=self.labels,
+                         offsets=self.offsets,
+                         run_starts=self.run_starts,
+                         run_lengths=self.run_lengths)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, file_hash: str) -> Optional["LabelIndex"]:
+        """
+        Read an index written by save
+
+        Returns
+        -------
+        LabelIndex, or None if the file does not exist or was written for
+        another annotation file or by another version
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays['version']) != LABEL_INDEX_VERSION or \
+                    str(arrays['file_hash']) != file_hash:
+                return None
+            return cls(tuple(arrays['shape']), arrays['labels'],
+                       arrays['offsets'], arrays['run_starts'],
+                       arrays['run_lengths'])
+
+
+def label_index_path(annotation_path: str) -> str:
+    """ Path of the label index saved next to an annotation file """
+    return os.path.splitext(annotation_path)[0] + '.label_index.npz'
+
+
+def load_or_build_label_index(annotation: np.ndarray,
+                              annotation_path: str) -> LabelIndex:
+    """
+    Read the label index saved next to the file an annotation volume was
+    read from, building and saving it if it does not exist yet.
+
+    Parameters
+    ----------
+    annotation : np.ndarray
+        Volume whose elements are labels (structure ids)
+    annotation_path : str
+        Path of the file annotation was read from. The index is keyed by
+        the hash of this file.
+    """
+    file_hash = file_hash_from_path(annotation_path)
+    index_path = label_index_path(annotation_path)
+
+    index = LabelIndex.load(index_path, file_hash)
+    if index is not None and index.shape == annotation.shape:
+        return index
+
+    index = LabelIndex.from_annotation(annotation)
+    index.save(index_path, file_hash)
+    return index
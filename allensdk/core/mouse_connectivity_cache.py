@@ -40,6 +40,8 @@ from allensdk.deprecated import deprecated
 
 from . import json_utilities
 from .reference_space_cache import ReferenceSpaceCache
+from .structure_unionize_store import StructureUnionizeStore
+from .experiment_volume_store import ExperimentVolumeStore
 
 import nrrd
 import re
@@ -102,18 +104,23 @@ class MouseConnectivityCache(ReferenceSpaceCache):
     INJECTION_FRACTION_KEY = 'INJECTION_FRACTION'
     DATA_MASK_KEY = 'DATA_MASK'
     STRUCTURE_UNIONIZES_KEY = 'STRUCTURE_UNIONIZES'
+    STRUCTURE_UNIONIZE_STORE_KEY = 'STRUCTURE_UNIONIZE_STORE'
+    VOLUME_STORE_KEY = 'VOLUME_STORE'
     EXPERIMENTS_KEY = 'EXPERIMENTS'
     DEFORMATION_FIELD_HEADER_KEY = 'DEFORMATION_FIELD_HEADER'
     DEFORMATION_FIELD_VOXEL_KEY = 'DEFORMATION_FIELD_VOXELS'
     ALIGNMENT3D_KEY = 'ALIGNMENT3D'
 
-    MANIFEST_VERSION = 1.3
+    MANIFEST_VERSION = 1.4
 
     SUMMARY_STRUCTURE_SET_ID = 167587189
     DEFAULT_STRUCTURE_SET_IDS = tuple([SUMMARY_STRUCTURE_SET_ID])
 
     DFMFLD_RESOLUTIONS = (25,)
 
+    # number of experiments whose unionizes are appended to the store at once
+    STRUCTURE_UNIONIZE_STORE_BATCH = 100
+
     @property
     def default_structure_ids(self):
 
@@ -269,6 +276,171 @@ class MouseConnectivityCache(ReferenceSpaceCache):
 
         return nrrd.read(file_name)
 
+    def get_volume_store(self, volume_type='projection_density',
+                         file_name=None):
+        """
+        Get the store holding the volumes of one type (e.g. projection
+        density) of the experiments added so far with add_to_volume_store,
+        as one chunked and compressed (experiment x X x Y x Z) array.
+
+        Parameters
+        ----------
+
+        volume_type: string
+            One of 'projection_density', 'injection_density',
+            'injection_fraction' and 'data_mask'.  Default is
+            'projection_density'.
+
+        file_name: string
+            File name of the store.  If file_name is None, the file_name will
+            be pulled out of the manifest.  Default is None.
+
+        Returns
+        -------
+        ExperimentVolumeStore, or None if caching is disabled.
+        """
+
+        if volume_type not in self._volume_readers():
+            raise ValueError('unknown volume type: {}'.format(volume_type))
+
+        file_name = self.get_cache_path(file_name, self.VOLUME_STORE_KEY,
+                                        volume_type, self.resolution)
+        if file_name is None:
+            return None
+
+        return ExperimentVolumeStore(file_name)
+
+    def add_to_volume_store(self, experiment_ids,
+                            volume_type='projection_density',
+                            file_name=None):
+        """
+        Add the volumes of one type of some experiments to its store.  The
+        volumes which are not stored yet are read (and downloaded first if
+        they are not cached) one experiment at a time.
+
+        Parameters
+        ----------
+
+        experiment_ids: list
+            List of experiment IDs.  Corresponds to section_data_set_id in the API.
+
+        volume_type: string
+            One of 'projection_density', 'injection_density',
+            'injection_fraction' and 'data_mask'.  Default is
+            'projection_density'.
+
+        file_name: string
+            File name of the store.  If file_name is None, the file_name will
+            be pulled out of the manifest.  Default is None.
+
+        Returns
+        -------
+        ExperimentVolumeStore
+        """
+
+        store = self.get_volume_store(volume_type, file_name)
+        if store is None:
+            raise ValueError('volume stores are only available when caching '
+                             'is enabled')
+
+        read_volume = self._volume_readers()[volume_type]
+        stored = set(store.experiment_ids())
+        for eid in dict.fromkeys(experiment_ids):
+            if eid not in stored:
+                volume, _ = read_volume(eid)
+                store.add(eid, volume)
+
+        return store
+
+    def projection_volumes(self, experiment_ids, file_name=None):
+        """
+        Lazily read projection density volumes of many experiments.  Volumes
+        are added to the projection density store first if needed (see
+        add_to_volume_store), then only the regions which are sliced out of
+        the returned array are read, e.g.
+        cache.projection_volumes(experiment_ids)[:, 100:200, :, 50:60].
+
+        Parameters
+        ----------
+
+        experiment_ids: list
+            List of experiment IDs.  Corresponds to section_data_set_id in the API.
+
+        file_name: string
+            File name of the store.  If file_name is None, the file_name will
+            be pulled out of the manifest.  Default is None.
+
+        Returns
+        -------
+        ExperimentVolumes :
+            Array-like of shape (experiments, X, Y, Z).
+        """
+
+        store = self.add_to_volume_store(experiment_ids,
+                                         'projection_density', file_name)
+        return store.volumes(experiment_ids)
+
+    def get_structure_volume_reductions(self, experiment_ids,
+                                        structure_ids=None,
+                                        volume_type='projection_density',
+                                        reduction='mean'):
+        """
+        Reduce the volumes of many experiments over the voxels of structures
+        and their descendants, without loading whole volumes.
+
+        Parameters
+        ----------
+
+        experiment_ids: list
+            List of experiment IDs.  Corresponds to section_data_set_id in the API.
+
+        structure_ids: list
+            Structures to reduce over.  Default is the summary structures.
+
+        volume_type: string
+            One of 'projection_density', 'injection_density',
+            'injection_fraction' and 'data_mask'.  Default is
+            'projection_density'.
+
+        reduction: string
+            'sum' or 'mean' of the volumes over each structure's voxels.
+            Default is 'mean'.
+
+        Returns
+        -------
+        pd.DataFrame :
+            Indexed by experiment id, with a column per structure id.
+        """
+
+        if reduction not in ('sum', 'mean'):
+            raise ValueError('unknown reduction: {}'.format(reduction))
+        if structure_ids is None:
+            structure_ids = self.default_structure_ids
+
+        store = self.add_to_volume_store(experiment_ids, volume_type)
+        annotation, _ = self.get_annotation_volume()
+        labels, sums, counts = store.reduce_by_label(experiment_ids,
+                                                     annotation)
+
+        # which labels are in each structure's subtree
+        descendant_ids = self.get_structure_tree().descendant_ids(structure_ids)
+        in_structure = np.stack([np.isin(labels, ids)
+                                 for ids in descendant_ids], axis=1)
+        values = sums @ in_structure
+        if reduction == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = values / (counts @ in_structure)
+
+        return pd.DataFrame(values, index=pd.Index(experiment_ids,
+                                                   name='experiment_id'),
+                            columns=pd.Index(structure_ids,
+                                             name='structure_id'))
+
+    def _volume_readers(self):
+        return {'projection_density': self.get_projection_density,
+                'injection_density': self.get_injection_density,
+                'injection_fraction': self.get_injection_fraction,
+                'data_mask': self.get_data_mask}
 
     def get_experiments(self, dataframe=False, file_name=None, cre=None, injection_structure_ids=None):
         """
@@ -569,14 +741,90 @@ class MouseConnectivityCache(ReferenceSpaceCache):
             records [1, 2, 3].  Default None.
         """
 
-        unionizes = [self.get_experiment_structure_unionizes(eid,
-                                                             is_injection=is_injection,
-                                                             structure_ids=structure_ids,
-                                                             include_descendants=include_descendants,
-                                                             hemisphere_ids=hemisphere_ids)
-                     for eid in experiment_ids]
+        store = self.add_to_structure_unionize_store(experiment_ids)
+        if store is None:
+            unionizes = [self.get_experiment_structure_unionizes(eid,
+                                                                 is_injection=is_injection,
+                                                                 structure_ids=structure_ids,
+                                                                 include_descendants=include_descendants,
+                                                                 hemisphere_ids=hemisphere_ids)
+                         for eid in experiment_ids]
+
+            return pd.concat(unionizes, ignore_index=True, sort=True)
+
+        if structure_ids is not None:
+            structure_ids = MouseConnectivityCache.validate_structure_ids(structure_ids)
+            if include_descendants:
+                structure_ids = reduce(op.add, self.get_structure_tree().descendant_ids(structure_ids))
+
+        return store.select(experiment_ids,
+                            is_injection=is_injection,
+                            structure_ids=structure_ids,
+                            hemisphere_ids=hemisphere_ids)
+
+    def get_structure_unionize_store(self, file_name=None):
+        """
+        Get the store holding the structure unionizes of the experiments added
+        so far with add_to_structure_unionize_store (or read with
+        get_structure_unionizes), in a single table which is queried for many
+        experiments at once.
+
+        Parameters
+        ----------
+        file_name: string
+            File name of the store.  If file_name is None, the file_name will
+            be pulled out of the manifest.  Default is None.
+
+        Returns
+        -------
+        StructureUnionizeStore, or None if caching is disabled.
+        """
+
+        file_name = self.get_cache_path(file_name,
+                                        self.STRUCTURE_UNIONIZE_STORE_KEY)
+        if file_name is None:
+            return None
+
+        return StructureUnionizeStore(file_name)
+
+    def add_to_structure_unionize_store(self, experiment_ids, file_name=None):
+        """
+        Add the structure unionizes of some experiments to the store.  Those
+        which are not stored yet are read (and cached) one experiment at a
+        time, and appended STRUCTURE_UNIONIZE_STORE_BATCH experiments at a
+        time.
+
+        Parameters
+        ----------
+        experiment_ids: list
+            List of experiment IDs.  Corresponds to section_data_set_id in the API.
 
-        return pd.concat(unionizes, ignore_index=True, sort=True)
+        file_name: string
+            File name of the store.  If file_name is None, the file_name will
+            be pulled out of the manifest.  Default is None.
+
+        Returns
+        -------
+        StructureUnionizeStore, or None if caching is disabled.
+        """
+
+        store = self.get_structure_unionize_store(file_name)
+        if store is None:
+            return None
+
+        stored = store.experiment_ids()
+        missing = [eid for eid in dict.fromkeys(experiment_ids)
+                   if eid not in stored]
+        batch_size = self.STRUCTURE_UNIONIZE_STORE_BATCH
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            unionizes = [self.get_experiment_structure_unionizes(eid).assign(
+                             experiment_id=eid)
+                         for eid in batch]
+            store.append(pd.concat(unionizes, ignore_index=True, sort=True),
+                         batch)
+
+        return store
 
     def get_projection_matrix(self, experiment_ids,
                               projection_structure_ids=None,
@@ -622,11 +870,24 @@ class MouseConnectivityCache(ReferenceSpaceCache):
                     {'hemisphere_id': hid, 'structure_id': sid, 'label': label})
                 cidx += 1
 
-        for _, row in unionizes.iterrows():
-            ridx = row_lookup[row['experiment_id']]
-            k = (row['hemisphere_id'], row['structure_id'])
-            cidx = column_lookup[k]
-            matrix[ridx, cidx] = row[parameter]
+        # later records of an (experiment, hemisphere, structure) overwrite
+        # earlier ones
+        unionizes = unionizes.drop_duplicates(
+            subset=['experiment_id', 'hemisphere_id', 'structure_id'],
+            keep='last')
+        if len(unionizes) > 0:
+            rows = pd.Index(list(row_lookup)).get_indexer(
+                unionizes['experiment_id'])
+            cols = pd.MultiIndex.from_tuples(list(column_lookup)).get_indexer(
+                pd.MultiIndex.from_arrays([unionizes['hemisphere_id'],
+                                           unionizes['structure_id']]))
+            if (rows < 0).any() or (cols < 0).any():
+                raise KeyError('unionizes of experiments or structures which '
+                               'are not in the matrix')
+            ridx = np.array(list(row_lookup.values()))[rows]
+            cidx = np.array(list(column_lookup.values()))[cols]
+            matrix[ridx, cidx] = np.asarray(
+                unionizes[parameter], dtype=float).reshape(len(unionizes))
 
         if dataframe:
             warnings.warn("dataframe argument is deprecated.")
@@ -756,6 +1017,16 @@ class MouseConnectivityCache(ReferenceSpaceCache):
                                   parent_key='BASEDIR',
                                   typename='file')
 
+        manifest_builder.add_path(self.STRUCTURE_UNIONIZE_STORE_KEY,
+                                  'structure_unionizes.h5',
+                                  parent_key='BASEDIR',
+                                  typename='file')
+
+        manifest_builder.add_path(self.VOLUME_STORE_KEY,
+                                  'volume_stores/%s_%d.h5',
+                                  parent_key='BASEDIR',
+                                  typename='file')
+
         manifest_builder.add_path(self.INJECTION_DENSITY_KEY,
                                   'experiment_%d/injection_density_%d.nrrd',
                                   parent_key='BASEDIR',
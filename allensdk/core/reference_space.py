@@ -34,7 +34,8 @@
 # POSSIBILITY OF SUCH DAMAGE.
 #
 from __future__ import division, print_function, absolute_import
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import operator as op
 import functools
 import os
@@ -46,6 +47,7 @@ import nrrd
 import pandas as pd
 
 from allensdk.core.structure_tree import StructureTree
+from allensdk.core.label_index import LabelIndex, load_or_build_label_index
 
 
 class ReferenceSpace(object):
@@ -69,8 +71,41 @@ class ReferenceSpace(object):
     @total_voxel_map.setter
     def total_voxel_map(self, data):
         self._total_voxel_map = data
+
+    @property
+    def annotation(self):
+        return self._annotation
+
+    @annotation.setter
+    def annotation(self, data):
+        self._annotation = np.ascontiguousarray(data)
+        self._label_index = None
+        self.annotation_path = None
+
+    @property
+    def label_index(self):
+        '''Index of the voxels of each structure id of the annotation,
+        built on first use (or read from next to annotation_path). Masks and
+        voxel counts are computed from this index. It is rebuilt when the
+        annotation is replaced (which also clears annotation_path), but not
+        when it is modified in place.
+        '''
+        if self._label_index is None:
+            if self.annotation_path is not None and \
+                    os.path.exists(self.annotation_path):
+                self._label_index = load_or_build_label_index(
+                    self.annotation, self.annotation_path)
+            else:
+                self._label_index = LabelIndex.from_annotation(
+                    self.annotation)
+        return self._label_index
+
+    @label_index.setter
+    def label_index(self, data):
+        self._label_index = data
         
-    def __init__(self, structure_tree, annotation, resolution):
+    def __init__(self, structure_tree, annotation, resolution,
+                 annotation_path=None):
         '''Handles brain structures in a 3d reference space
         
         Parameters
@@ -81,13 +116,19 @@ class ReferenceSpace(object):
             3d volume whose elements are structure ids.
         resolution : length-3 tuple of numeric
             Resolution of annotation voxels along each dimension.
+        annotation_path : str, optional
+            File the annotation was read from. If supplied, the index of the
+            voxels of each structure is saved next to this file (keyed by its
+            hash) and read back by later reference spaces, rather than
+            rebuilt.
         
         '''
         
         self.structure_tree = structure_tree
         self.resolution = resolution
         
-        self.annotation = np.ascontiguousarray(annotation)
+        self.annotation = annotation
+        self.annotation_path = annotation_path
         
     def direct_voxel_counts(self):
         '''Determines the number of voxels directly assigned to one or more 
@@ -101,7 +142,7 @@ class ReferenceSpace(object):
         
         '''
 
-        uniques = np.unique(self.annotation, return_counts=True)
+        uniques = (self.label_index.labels, self.label_index.voxel_counts())
         found = {k: v for k, v in zip(*uniques) if k != 0}
 
         self._direct_voxel_map = {k: (found[k] if k in found else 0) for k 
@@ -119,12 +160,8 @@ class ReferenceSpace(object):
         
         ''' 
 
-        self._total_voxel_map = {}
-        for stid in self.structure_tree.node_ids():
-
-            desc_ids = self.structure_tree.descendant_ids([stid])[0]
-            self._total_voxel_map[stid] = sum([self.direct_voxel_map[dscid] 
-                                               for dscid in desc_ids])
+        self._total_voxel_map = self.structure_tree.subtree_sums(
+            self.direct_voxel_map)
     
     def remove_unassigned(self, update_self=True):
         '''Obtains a structure tree consisting only of structures that have 
@@ -169,15 +206,9 @@ class ReferenceSpace(object):
         '''
     
         if direct_only:
-            mask = np.zeros(self.annotation.shape, dtype=np.uint8, order='C')
-            for stid in structure_ids:
-                
-                if self.direct_voxel_map[stid] == 0:
-                    continue
-                    
-                mask[self.annotation == stid] = True
-                
-            return mask
+            structure_ids = [stid for stid in structure_ids
+                             if self.direct_voxel_map[stid] != 0]
+            return self.label_index.mask(structure_ids)
             
         else:
             structure_ids = self.structure_tree.descendant_ids(structure_ids)
@@ -185,7 +216,7 @@ class ReferenceSpace(object):
             return self.make_structure_mask(structure_ids, direct_only=True)
                         
     def many_structure_masks(self, structure_ids, output_cb=None, 
-                             direct_only=False):
+                             direct_only=False, n_workers=1):
         '''Build one or more structure masks and do something with them
         
         Parameters
@@ -199,6 +230,11 @@ class ReferenceSpace(object):
         direct_only : bool, optional
             If True, only include voxels directly assigned to a structure in 
             the mask. Otherwise include voxels assigned to descendants.
+        n_workers : int, optional
+            Number of threads which call output_cb (and so build masks and,
+            e.g., write them) concurrently. Results are still yielded in the
+            order of structure_ids, and at most 2 * n_workers of them are
+            pending at once.
             
         Yields
         -------
@@ -216,10 +252,26 @@ class ReferenceSpace(object):
         
         if output_cb is None:
             output_cb = ReferenceSpace.return_mask_cb
-                                              
-        for stid in structure_ids:
-            yield output_cb(stid, functools.partial(self.make_structure_mask, 
-                                                    [stid], direct_only))
+
+        def call_output_cb(stid):
+            return output_cb(stid, functools.partial(self.make_structure_mask,
+                                                     [stid], direct_only))
+
+        if n_workers == 1:
+            for stid in structure_ids:
+                yield call_output_cb(stid)
+            return
+
+        # build the index and voxel map before any thread needs them
+        self.direct_voxel_map
+        with ThreadPoolExecutor(n_workers) as executor:
+            pending = deque()
+            for stid in structure_ids:
+                pending.append(executor.submit(call_output_cb, stid))
+                if len(pending) == 2 * n_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
 
     def check_coverage(self, structure_ids, domain_mask):
@@ -171,12 +171,19 @@ class ReferenceSpaceCache(Cache):
             File name to store the annotation volume.  If it already exists,
             it will be read from this file.  If file_name is None, the
             file_name will be pulled out of the manifest.  Default is None.
+            The index of the voxels of each structure is cached next to
+            this file.
         
         """
+
+        annotation_path = self.get_cache_path(
+            annotation_file_name, self.ANNOTATION_KEY,
+            self.reference_space_key, self.resolution)
         
         return ReferenceSpace(self.get_structure_tree(structure_file_name), 
                               self.get_annotation_volume(annotation_file_name)[0], 
-                              [self.resolution] * 3)
+                              [self.resolution] * 3,
+                              annotation_path=annotation_path)
 
     def get_structure_mask(self, structure_id, file_name=None, annotation_file_name=None):
         """
@@ -33,11 +33,11 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 #
-import functools
-import operator as op
 from collections import defaultdict
 from six import iteritems
 
+import numpy as np
+
 from allensdk.deprecated import deprecated
 
 
@@ -84,6 +84,72 @@ class SimpleTree( object ):
         self.node_id_cb = node_id_cb
         self.parent_id_cb = parent_id_cb
 
+        self._build_index()
+
+
+    def _build_index(self):
+        '''Number the nodes in depth-first pre-order (the order of
+        descendant_ids) and store each node's ancestors as compressed sparse
+        rows, so that subtrees are slices of the pre-order and ancestry tests
+        are comparisons of positions.
+
+        Raises
+        ------
+        ValueError :
+            If the parent ids contain a cycle.
+
+        '''
+
+        roots = [nid for nid, pid in iteritems(self._parent_ids)
+                 if pid is None]
+
+        preorder = []
+        stack = roots[::-1]
+        while stack:
+            nid = stack.pop()
+            preorder.append(nid)
+            stack.extend(self._child_ids[nid][::-1])
+
+        if len(preorder) != len(self._nodes):
+            raise ValueError('parent ids contain a cycle')
+
+        position = {nid: pos for pos, nid in enumerate(preorder)}
+        parent = np.array([-1 if self._parent_ids[nid] is None
+                           else position[self._parent_ids[nid]]
+                           for nid in preorder], dtype=np.int64)
+
+        # parents precede their children in pre-order
+        size = np.ones(len(preorder), dtype=np.int64)
+        depth = np.zeros(len(preorder), dtype=np.int64)
+        for pos in range(len(preorder) - 1, 0, -1):
+            if parent[pos] >= 0:
+                size[parent[pos]] += size[pos]
+        for pos in range(len(preorder)):
+            if parent[pos] >= 0:
+                depth[pos] = depth[parent[pos]] + 1
+
+        offsets = np.zeros(len(preorder) + 1, dtype=np.int64)
+        np.cumsum(depth + 1, out=offsets[1:])
+        ancestors = np.empty(offsets[-1], dtype=np.int64)
+        for pos in range(len(preorder)):
+            ancestors[offsets[pos]] = pos
+            if parent[pos] >= 0:
+                ancestors[offsets[pos] + 1:offsets[pos + 1]] = \
+                    ancestors[offsets[parent[pos]]:offsets[parent[pos] + 1]]
+
+        self._preorder = preorder
+        self._position = position
+        self._subtree_end = np.arange(len(preorder)) + size
+        self._ancestor_offsets = offsets
+        self._ancestor_positions = ancestors
+
+
+    def _positions(self, node_ids):
+        '''Pre-order positions of nodes, as an array'''
+
+        return np.array([self._position[nid] for nid in node_ids],
+                        dtype=np.int64)
+
 
     def filter_nodes(self, criterion):
         '''Obtain a list of nodes filtered by some criterion
@@ -249,13 +315,11 @@ class SimpleTree( object ):
         '''
     
         out = []
-        for nid in node_ids:
-        
-            current = [nid]
-            while current[-1] is not None:
-                current.extend(self.parent_ids([current[-1]]))
-            out.append(current[:-1])
-                
+        for pos in self._positions(node_ids):
+            ancestors = self._ancestor_positions[
+                self._ancestor_offsets[pos]:self._ancestor_offsets[pos + 1]]
+            out.append([self._preorder[anc] for anc in ancestors])
+
         return out
             
     
@@ -282,18 +346,62 @@ class SimpleTree( object ):
         
         '''
     
-        out = []
-        for ii, nid in enumerate(node_ids):
+        return [self._preorder[pos:self._subtree_end[pos]]
+                for pos in self._positions(node_ids)]
+
+
+    def descends_from(self, node_ids, ancestor_ids):
+        '''Test whether nodes descend from (or are) other nodes
+
+        Parameters
+        ----------
+        node_ids : list of hashable
+            Items are ids of the putative descendants.
+        ancestor_ids : list of hashable
+            Items are ids of the putative ancestors, one per item of
+            node_ids. Ids which are not in the tree are ancestors of no node.
             
-            current = [nid]
-            children = self.child_ids([nid])[0]
+        Returns
+        -------
+        numpy ndarray of bool :
+            True where the node descends from or is the corresponding
+            ancestor.
+
+        '''
+
+        if len(node_ids) != len(ancestor_ids):
+            raise ValueError('node_ids and ancestor_ids differ in length')
+
+        positions = self._positions(node_ids)
+        ancestors = np.array([self._position.get(nid, -1)
+                              for nid in ancestor_ids], dtype=np.int64)
+        found = ancestors >= 0
+        ends = np.where(found, self._subtree_end[ancestors], -1)
+        return found & (ancestors <= positions) & (positions < ends)
+
+
+    def subtree_sums(self, values):
+        '''Sum a quantity over each node and its descendants
+
+        Parameters
+        ----------
+        values : dict
+            Maps node ids to numbers. Missing nodes count as 0.
             
-            if children:
-                current.extend(functools.reduce(op.add, map(list, 
-                               self.descendant_ids(children))))
-                               
-            out.append(current)
-        return out
+        Returns
+        -------
+        dict :
+            Maps each node id to the sum of values over that node and its
+            descendants.
+
+        '''
+
+        direct = np.array([values.get(nid, 0) for nid in self._preorder])
+        totals = np.concatenate([np.zeros(1, dtype=direct.dtype),
+                                 np.cumsum(direct)])
+        starts = np.arange(len(self._preorder))
+        sums = totals[self._subtree_end] - totals[starts]
+        return dict(zip(self._preorder, sums.tolist()))
 
     
     @deprecated("Use SimpleTree.nodes instead")
@@ -214,8 +214,10 @@ class StructureTree( SimpleTree ):
         
         '''
 
-        return self.value_map(lambda x: x['id'], 
-                              lambda y: self.ancestor_ids([y['id']])[0])
+        node_ids = self.node_ids()
+        ancestor_ids = self.ancestor_ids(node_ids)
+        return {self._nodes[nid]['id']: ancestors
+                for nid, ancestors in zip(node_ids, ancestor_ids)}
         
         
     def structure_descends_from(self, child_id, parent_id):
@@ -223,20 +225,26 @@ class StructureTree( SimpleTree ):
         
         Parameters
         ----------
-        child_id : int
+        child_id : int or array-like of int
             Id of the putative child structure.
-        parent_id : int
-            Id of the putative parent structure.
+        parent_id : int or array-like of int
+            Id of the putative parent structure. Broadcast against child_id.
             
         Returns
         -------
-        bool :
+        bool or numpy ndarray of bool :
             True if the structure specified by child_id is a descendant of 
-            the one specified by parent_id. Otherwise False.
+            the one specified by parent_id. Otherwise False. An array if
+            either argument is an array.
         
         '''
-    
-        return parent_id in self.ancestor_ids([child_id])[0]
+
+        child_ids, parent_ids = np.broadcast_arrays(child_id, parent_id)
+        descends = self.descends_from(child_ids.ravel().tolist(),
+                                      parent_ids.ravel().tolist())
+        if child_ids.ndim == 0:
+            return bool(descends[0])
+        return descends.reshape(child_ids.shape)
     
     
     def get_structure_sets(self):
@@ -271,10 +279,12 @@ class StructureTree( SimpleTree ):
         
         '''
     
-        ancestor_ids = functools.reduce(op.add, 
-                              map(lambda x: x[1:], 
-                                  self.ancestor_ids(structure_ids)))
-        return (set(ancestor_ids) & set(structure_ids))
+        # a structure overlaps another of the set if the next of the set in
+        # pre-order lies within its subtree
+        positions = np.unique(self._positions(structure_ids))
+        following = np.append(positions[1:], len(self._preorder))
+        overlaps = following < self._subtree_end[positions]
+        return set(self._preorder[pos] for pos in positions[overlaps])
         
 
     def export_label_description(self, alphas=None, exclude_label_vis=None, exclude_mesh_vis=None, label_key='acronym'):
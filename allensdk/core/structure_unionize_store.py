@@ -0,0 +1,268 @@
+"""
+A single columnar table of the structure unionizes of many connectivity
+experiments, so that projection matrices over thousands of experiments do not
+re-read a csv file per experiment.
+"""
+import os
+from typing import Iterable, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+
+class StructureUnionizeStore(object):
+    """
+    Structure unionizes of many experiments, in one HDF5 table which grows as
+    experiments are added. The experiment, structure, hemisphere and
+    injection columns are indexed, so selections on them are evaluated by
+    the table rather than after loading all records.
+
+    Parameters
+    ----------
+    path : str
+        Path of the HDF5 file. It is created on the first append.
+
+    Notes
+    -----
+    Numeric unionize columns are stored as float64, except the integer key
+    columns (INTEGER_COLUMNS) and is_injection, and other columns as strings
+    of up to MIN_STRING_LENGTH characters (or the longest of the first
+    append). The dtype of each column over all appended records is recorded
+    and restored on selection, as pd.concat would combine them: e.g. an
+    integer column which is missing from some selected experiments is
+    float64. Columns are returned sorted, as by pd.concat(..., sort=True).
+    The columns of the store are fixed by the first append; columns missing
+    from later experiments are stored as NaN and extra ones are dropped.
+    """
+
+    UNIONIZES_KEY = "unionizes"
+    EXPERIMENTS_KEY = "experiment_ids"
+    DTYPES_KEY = "dtypes"
+
+    INDEXED_COLUMNS = ["experiment_id", "structure_id", "hemisphere_id",
+                       "is_injection"]
+    INTEGER_COLUMNS = ["experiment_id", "structure_id", "hemisphere_id",
+                       "id"]
+
+    # longest list of values which a selection passes to the table
+    MAX_SELECTED_VALUES = 31
+
+    # shortest string which non-numeric columns can hold
+    MIN_STRING_LENGTH = 256
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def experiment_ids(self) -> Set[int]:
+        """ Ids of the experiments whose unionizes are stored """
+        if not os.path.exists(self.path):
+            return set()
+        with pd.HDFStore(self.path, mode="r") as store:
+            if self.EXPERIMENTS_KEY not in store:
+                return set()
+            stored = store.select(self.EXPERIMENTS_KEY)
+        return set(stored["experiment_id"].tolist())
+
+    def append(self, unionizes: pd.DataFrame, experiment_ids: Iterable[int]):
+        """
+        Add the unionizes of some experiments, replacing any stored for them
+
+        Parameters
+        ----------
+        unionizes : pd.DataFrame
+            Unionize records of the experiments, with an experiment_id column
+        experiment_ids : iterable of int
+            Experiments whose unionizes these are. Experiments without records
+            are recorded as stored with no unionizes.
+        """
+        experiment_ids = sorted(set(int(eid) for eid in experiment_ids))
+
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        with pd.HDFStore(self.path, mode="a") as store:
+            dtypes = self._merge_dtypes(
+                self._source_dtypes(store), unionizes)
+            if self.UNIONIZES_KEY in store:
+                stored_dtypes = store.select(self.UNIONIZES_KEY,
+                                             stop=0).dtypes
+                unionizes = self._to_stored_columns(unionizes, stored_dtypes)
+                # written by an append which was interrupted
+                stored = store.select_column(self.UNIONIZES_KEY,
+                                             "experiment_id")
+                replaced = np.flatnonzero(stored.isin(experiment_ids))
+                if len(replaced) > 0:
+                    store.remove(self.UNIONIZES_KEY, where=replaced)
+            else:
+                unionizes = self._to_stored_columns(unionizes)
+
+            if len(unionizes) > 0:
+                min_itemsize = {
+                    column: max(self.MIN_STRING_LENGTH,
+                                int(unionizes[column].str.len().max()))
+                    for column in unionizes.columns
+                    if unionizes[column].dtype == object}
+                store.append(self.UNIONIZES_KEY, unionizes, format="table",
+                             data_columns=self.INDEXED_COLUMNS, index=False,
+                             min_itemsize=min_itemsize or None)
+                store.create_table_index(self.UNIONIZES_KEY,
+                                         columns=self.INDEXED_COLUMNS,
+                                         optlevel=6, kind="medium")
+
+            store.put(self.DTYPES_KEY, pd.Series(
+                {column: str(dtype) for column, dtype in dtypes.items()},
+                dtype=object))
+
+            # recorded last, so experiments are stored only once all of
+            # their records are
+            store.append(self.EXPERIMENTS_KEY,
+                         pd.DataFrame({"experiment_id": np.array(
+                             experiment_ids, dtype=np.int64)}),
+                         format="table", index=False)
+
+    def select(self, experiment_ids: Optional[Iterable[int]] = None,
+               is_injection: Optional[bool] = None,
+               structure_ids: Optional[Iterable[int]] = None,
+               hemisphere_ids: Optional[Iterable[int]] = None
+               ) -> pd.DataFrame:
+        """
+        Read the stored unionizes which match some conditions. A condition
+        which is None is not applied.
+
+        Parameters
+        ----------
+        experiment_ids : iterable of int, optional
+            Only return unionizes of these experiments. Records are returned
+            in the order of these experiments.
+        is_injection : bool, optional
+            Only return injection (or non-injection) unionizes
+        structure_ids : iterable of int, optional
+            Only return unionizes of these structures
+        hemisphere_ids : iterable of int, optional
+            Only return unionizes of these hemispheres
+
+        Returns
+        -------
+        pd.DataFrame :
+            The selected records, with a default index and sorted columns.
+            It is empty (with the stored columns, if any) if no records
+            match or none are stored.
+        """
+        selections = {}
+        if experiment_ids is not None:
+            selections["experiment_id"] = [int(eid) for eid in experiment_ids]
+        if structure_ids is not None:
+            selections["structure_id"] = [int(sid) for sid in structure_ids]
+        if hemisphere_ids is not None:
+            selections["hemisphere_id"] = [int(hid) for hid in hemisphere_ids]
+
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+
+        with pd.HDFStore(self.path, mode="r") as store:
+            dtypes = self._source_dtypes(store)
+            if self.UNIONIZES_KEY not in store or \
+                    any(len(values) == 0 for values in selections.values()):
+                return self._from_stored_columns(
+                    pd.DataFrame(columns=list(dtypes)), dtypes)
+
+        # the table evaluates short lists of values itself. Longer ones
+        # (which pandas would filter after reading) are narrowed to their
+        # range by the table and filtered after reading.
+        conditions = []
+        if is_injection is not None:
+            conditions.append(f"is_injection == {bool(is_injection)}")
+        for column, values in selections.items():
+            if len(values) <= self.MAX_SELECTED_VALUES:
+                conditions.append(f"{column} in {values}")
+            else:
+                conditions.append(f"{column} >= {min(values)} & "
+                                  f"{column} <= {max(values)}")
+
+        with pd.HDFStore(self.path, mode="r") as store:
+            unionizes = store.select(self.UNIONIZES_KEY,
+                                     where=" & ".join(conditions) or None)
+
+        for column, values in selections.items():
+            if len(values) > self.MAX_SELECTED_VALUES:
+                unionizes = unionizes[unionizes[column].isin(values)]
+
+        if experiment_ids is not None:
+            order = pd.Index(selections["experiment_id"]).drop_duplicates()
+            unionizes = unionizes.iloc[np.argsort(
+                order.get_indexer(unionizes["experiment_id"]),
+                kind="stable")]
+        return self._from_stored_columns(unionizes.reset_index(drop=True),
+                                         dtypes)
+
+    @classmethod
+    def _source_dtypes(cls, store: pd.HDFStore) -> dict:
+        """ Recorded dtype of each stored column, by column """
+        if cls.DTYPES_KEY not in store:
+            return {}
+        return {column: np.dtype(dtype) for column, dtype
+                in store.select(cls.DTYPES_KEY).items()}
+
+    @staticmethod
+    def _merge_dtypes(dtypes: dict, unionizes: pd.DataFrame) -> dict:
+        """ The dtypes of the stored columns once unionizes are appended, as
+        pd.concat would combine them. The columns of the first append are
+        kept. """
+        merged = dict(dtypes)
+        for column, dtype in unionizes.dtypes.items():
+            if not dtypes:
+                merged[column] = dtype
+            elif column in dtypes:
+                if dtype == object or dtypes[column] == object:
+                    merged[column] = np.dtype(object)
+                else:
+                    merged[column] = np.result_type(dtypes[column], dtype)
+        return merged
+
+    @staticmethod
+    def _from_stored_columns(unionizes: pd.DataFrame,
+                             dtypes: dict) -> pd.DataFrame:
+        """ Restore the recorded dtypes of selected records, and sort their
+        columns. As in pd.concat, integer columns holding NaN are float64
+        and boolean ones are object. """
+        for column, dtype in dtypes.items():
+            if column not in unionizes:
+                continue
+            values = unionizes[column]
+            if dtype.kind in "iub" and values.isnull().any():
+                if dtype.kind == "b":
+                    unionizes[column] = values.map({0: False, 1: True})
+                continue
+            if dtype.kind == "M":
+                unionizes[column] = pd.to_datetime(values)
+            elif dtype == object:
+                unionizes[column] = values.astype(object)
+            else:
+                unionizes[column] = values.astype(dtype)
+        return unionizes.sort_index(axis=1)
+
+    @classmethod
+    def _to_stored_columns(cls, unionizes: pd.DataFrame,
+                           stored_dtypes: Optional[pd.Series] = None
+                           ) -> pd.DataFrame:
+        """ Convert unionize records to the stored columns and dtypes. If
+        stored_dtypes is None, they are those of the columns of unionizes:
+        numeric columns are stored as numbers and the others as strings. """
+        if stored_dtypes is None:
+            stored_dtypes = pd.Series(
+                {column: np.dtype(np.int64) if column in cls.INTEGER_COLUMNS
+                 else np.dtype(bool) if column == "is_injection"
+                 else np.dtype(np.float64)
+                 if pd.api.types.is_numeric_dtype(unionizes[column])
+                 else np.dtype(object)
+                 for column in unionizes.columns}, dtype=object)
+
+        unionizes = unionizes.reindex(columns=stored_dtypes.index)
+        unionizes = unionizes.astype(stored_dtypes.to_dict())
+        for column, dtype in stored_dtypes.items():
+            if dtype == object:
+                values = unionizes[column]
+                unionizes[column] = values.where(values.isnull(),
+                                                 values.astype(str))
+        return unionizes.reset_index(drop=True)
@@ -248,7 +248,7 @@ class OphysTimeAligner(object):
                  stimulus_pkl=None, eye_video=None, behavior_video=None,
                  long_stim_threshold=LONG_STIM_THRESHOLD):
         self.scanner = scanner if scanner is not None else "SCIVIVO"
-        self._dataset = Dataset(sync_file)
+        self._dataset = Dataset(sync_file, line_index=True)
         self._keys = get_keys(self._dataset)
         self.long_stim_threshold = long_stim_threshold
 
@@ -4,7 +4,7 @@ matplotlib.use('agg')
 import matplotlib.pyplot as plt
 import logging
 import numpy as np
-from allensdk.brain_observatory.r_neuropil import estimate_contamination_ratios
+from allensdk.brain_observatory.r_neuropil import estimate_contamination_ratios_many
 import allensdk.internal.core.lims_utilities as lu
 import h5py
 import json
@@ -159,9 +159,19 @@ def main():
     corrected = np.zeros((num_traces, T_orig))
     r_vals = [ None ] * num_traces
 
+    # estimate r for all traces without NaNs at once
+    roi_data = roi_traces['data'][()]
+    neuropil_data = neuropil_traces['data'][()]
+    valid = ~(np.isnan(roi_data).any(axis=1) |
+              np.isnan(neuropil_data).any(axis=1))
+    logging.info("Estimating contamination ratios of %d traces", valid.sum())
+    all_results = dict(zip(np.flatnonzero(valid),
+                           estimate_contamination_ratios_many(
+                               roi_data[valid], neuropil_data[valid])))
+
     for n in range(num_traces):
-        roi = roi_traces['data'][n]
-        neuropil = neuropil_traces['data'][n]   
+        roi = roi_data[n]
+        neuropil = neuropil_data[n]
 
         if np.any(np.isnan(neuropil)):
             logging.warning("neuropil trace for roi %d contains NaNs, skipping", n)
@@ -174,7 +184,7 @@ def main():
         r = None
 
         logging.info("Correcting trace %d (roi %s)", n, str(n_id[n]))
-        results  = estimate_contamination_ratios(roi, neuropil)
+        results = all_results[n]
         logging.info("r=%f err=%f it=%d", results["r"], results["err"], results["it"])
 
         r = results["r"]
@@ -197,8 +207,8 @@ def main():
 
     # fill in empty r values
     for n in range(num_traces):        
-        roi = roi_traces['data'][n]
-        neuropil = neuropil_traces['data'][n]
+        roi = roi_data[n]
+        neuropil = neuropil_data[n]
 
         if r_list[n] is None:
             logging.warning("Error estimated r for trace %d. Setting to zero.", n)
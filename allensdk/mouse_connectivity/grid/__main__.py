@@ -87,7 +87,8 @@ def run_grid(args):
         subimage_kwargs=subimage_kwargs,
         nprocesses=args['nprocesses'],
         affine_params=args['affine_params'],
-        dfmfld_path=args['deformation_field_path']
+        dfmfld_path=args['deformation_field_path'],
+        accumulator_dir=args.get('accumulator_dir')
     )
 
     gridder.setup_subimages()
@@ -89,6 +89,11 @@ class InputParameters(ArgSchema):
                      help='if provided, signals that pixels with this bit '
                           'high have passed the optional post-filter stage')
     nprocesses = Int(default=8, help='spawn this many worker subprocesses')
+    accumulator_dir = String(default=None, allow_none=True,
+                             help='if provided, workers write coarse grid '
+                                  'accumulators into memory-mapped volumes '
+                                  'in this directory rather than sending '
+                                  'them to the parent process')
     reduce_level = Int(default=0,
                        help='power of two by which to downsample each input '
                             'axis')
@@ -1,12 +1,15 @@
 import multiprocessing as mp
 import logging
+import os
+import time
 
 from six import iteritems
 import SimpleITK as sitk
 import numpy as np
 
-from .subimage import run_subimage
+from .subimage import run_subimage, run_subimage_into_volumes
 from .utilities import image_utilities as iu
+from .utilities.accumulator_volumes import AccumulatorVolumes
 from .utilities.downsampling_utilities import block_average, window_average
 
 
@@ -27,13 +30,14 @@ class ImageSeriesGridder(object):
 
 
     def __init__(self, in_dims, in_spacing, 
-                       out_dims, out_spacing,
-                       reduce_level,  
-                       subimages, 
-                       subimage_kwargs, 
-                       nprocesses, 
-                       affine_params, 
-                       dfmfld_path):
+                 out_dims, out_spacing,
+                 reduce_level,
+                 subimages,
+                 subimage_kwargs,
+                 nprocesses,
+                 affine_params,
+                 dfmfld_path,
+                 accumulator_dir=None):
         
         self.in_dims = np.array(in_dims)
         self.in_spacing = np.array(in_spacing)
@@ -52,6 +56,9 @@ class ImageSeriesGridder(object):
         
         self.subimages = subimages
         self.subimage_kwargs = subimage_kwargs
+
+        self.accumulator_dir = accumulator_dir
+        self.accumulator_volumes = None
         
         
     def set_coarse_grid_parameters(self):
@@ -117,6 +124,10 @@ class ImageSeriesGridder(object):
     
     def build_coarse_grids(self):
     
+        if self.accumulator_dir is not None:
+            self.build_shared_coarse_grids()
+            return
+
         pool = mp.Pool(processes=self.nprocesses)
         mapper = pool.imap_unordered(run_subimage, self.subimages)
         
@@ -125,11 +136,67 @@ class ImageSeriesGridder(object):
             
             logging.info('received coarse planar data from subimage at index {0}'.format(index))
             self.paste_subimage(index, output)
-        
+
+    def build_shared_coarse_grids(self):
+        '''Builds the coarse grids with workers writing their planes directly
+        into memory-mapped accumulator volumes in accumulator_dir (each owns
+        the plane at its subimage's index), rather than sending them back to
+        be pasted. The volumes are read by coarse_volume when first needed.
+
+        Any volumes already in accumulator_dir (e.g. from a previous run) are
+        removed first, and each volume is removed once coarse_volume has read
+        it, so the directory only holds this run's unread volumes.
+        '''
+
+        if not hasattr(self, 'coarse_dims'):
+            self.set_coarse_grid_parameters()
+
+        if not os.path.isdir(self.accumulator_dir):
+            os.makedirs(self.accumulator_dir)
+        self.accumulator_volumes = AccumulatorVolumes(self.accumulator_dir,
+                                                      self.coarse_dims)
+        self.accumulator_volumes.clear()
+
+        inputs = [dict(si, accumulator_volumes=self.accumulator_volumes)
+                  for si in self.subimages]
+
+        pool = mp.Pool(processes=self.nprocesses)
+        mapper = pool.imap_unordered(run_subimage_into_volumes, inputs)
+
+        logging.info('building coarse grids in {0} ({1} processes)'.format(
+            self.accumulator_dir, self.nprocesses))
+        start = time.time()
+        for count, (index, keys, elapsed) in enumerate(mapper, 1):
+            logging.info('subimage at index {0} wrote {1} coarse planes in '
+                         '{2:.1f} s ({3} of {4} subimages, {5:.1f} s '
+                         'elapsed)'.format(index, len(keys), elapsed, count,
+                                           len(inputs), time.time() - start))
+
+        pool.close()
+        pool.join()
+
+    def coarse_volume(self, key):
+        '''The coarse grid volume of an accumulator, read (and then removed)
+        from the shared accumulator volumes if it is not held in memory yet
+        '''
+
+        if key not in self.volumes and self.accumulator_volumes is not None:
+            logging.info('reading {0} coarse grid volume'.format(key))
+            self.volumes[key] = iu.image_from_array(
+                self.accumulator_volumes.open(key), self.coarse_spacing, True)
+            self.accumulator_volumes.remove(key)
+
+            origin = list(self.volumes[key].GetOrigin())
+            origin[2] = 0
+            self.volumes[key].SetOrigin(origin)
+
+        return self.volumes[key]
+
 
     def resample_volume(self, key):
         logging.info('resampling {0} volume'.format(key))
-        self.volumes[key] = iu.resample_volume(self.volumes[key], self.out_dims, 
+        coarse_volume = self.coarse_volume(key)
+        self.volumes[key] = iu.resample_volume(coarse_volume, self.out_dims,
                                                self.out_spacing, None, 
                                                self.transform)
 
@@ -1,4 +1,5 @@
 import logging
+import time
 
 from .count_subimage import CountSubImage
 from .cav_subimage import CavSubImage
@@ -25,3 +26,21 @@ def run_subimage(input_data):
         raise err
     
     return index, si.accumulators
+
+
+def run_subimage_into_volumes(input_data):
+    '''As run_subimage, but writes the coarse planes into the shared
+    accumulator volumes (input_data['accumulator_volumes']) rather than
+    returning them. Returns the index, the accumulator keys and the time
+    taken, in seconds.
+    '''
+
+    start = time.time()
+    volumes = input_data.pop('accumulator_volumes')
+    index, accumulators = run_subimage(input_data)
+
+    keys = sorted(accumulators)
+    for key in keys:
+        volumes.write_plane(key, index, accumulators.pop(key))
+
+    return index, keys, time.time() - start
@@ -0,0 +1,102 @@
+import errno
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+
+class AccumulatorVolumes(object):
+    '''Coarse grid accumulator volumes, kept as memory-mapped .npy files in a
+    directory so that subimage workers write their planes into them directly
+    rather than sending them back to the parent process.
+
+    Each subimage owns the plane at its index, so concurrent writers never
+    touch the same elements and no locking is needed.
+
+    The volumes belong to whoever builds them (see
+    ImageSeriesGridder.build_shared_coarse_grids): it clears them before
+    the workers start and removes each once it has been read.
+
+    Parameters
+    ----------
+    directory : str
+        Where the volumes are kept. One <key>.npy file per accumulator.
+    dims : list of int
+        Coarse grid dimensions (x, y, z). Volumes are stored in numpy (z, y, x)
+        order, as SimpleITK images are viewed.
+
+    '''
+
+    def __init__(self, directory, dims):
+        self.directory = directory
+        self.dims = [int(dim) for dim in dims]
+
+    @property
+    def shape(self):
+        return tuple(self.dims[::-1])
+
+    def path(self, key):
+        return os.path.join(self.directory, '{0}.npy'.format(key))
+
+    def keys(self):
+        return sorted(os.path.splitext(name)[0]
+                      for name in os.listdir(self.directory)
+                      if name.endswith('.npy'))
+
+    def write_plane(self, key, index, array):
+        '''Write a coarse planar accumulator (in (x, y) order) into the plane
+        of its volume at index
+        '''
+
+        volume = self._open_or_create(key, array.dtype)
+        volume[index, :array.shape[1], :array.shape[0]] = array.T
+        volume.flush()
+        del volume
+
+    def open(self, key, mode='r'):
+        return np.load(self.path(key), mmap_mode=mode)
+
+    def remove(self, key):
+        os.remove(self.path(key))
+
+    def clear(self):
+        '''Remove all volumes, e.g. those left by a previous run
+        '''
+
+        for key in self.keys():
+            logging.info('removing accumulator volume {0}'.format(
+                self.path(key)))
+            self.remove(key)
+
+    def _open_or_create(self, key, dtype):
+        path = self.path(key)
+        if not os.path.exists(path):
+            self._create(path, dtype)
+
+        volume = np.load(path, mmap_mode='r+')
+        if volume.shape != self.shape or volume.dtype != dtype:
+            raise ValueError('accumulator volume {0} has shape {1} and dtype '
+                             '{2}, not {3} and {4}'.format(
+                                 path, volume.shape, volume.dtype,
+                                 self.shape, np.dtype(dtype)))
+        return volume
+
+    def _create(self, path, dtype):
+        '''Create a zeroed (sparse) volume file, without overwriting one
+        created concurrently by another worker
+        '''
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype,
+                                      shape=self.shape).flush()
+            try:
+                os.link(tmp_path, path)
+                logging.info('created accumulator volume {0}'.format(path))
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        finally:
+            os.remove(tmp_path)
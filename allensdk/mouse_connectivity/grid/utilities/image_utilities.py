@@ -1,4 +1,5 @@
 from __future__ import division
+import gzip
 import logging
 import os
 import sys
@@ -23,6 +24,15 @@ else:
 NUMPY_SITK_TYPE_LOOKUP = {np.dtype(np.float32): sitk.sitkFloat32}
 SITK_NUMPY_TYPE_LOOKUP = {v: k for k, v in iteritems(NUMPY_SITK_TYPE_LOOKUP)}
 
+NUMPY_NRRD_TYPE_LOOKUP = {np.dtype(np.float32): 'float',
+                          np.dtype(np.float64): 'double',
+                          np.dtype(np.uint8): 'unsigned char',
+                          np.dtype(np.int8): 'signed char',
+                          np.dtype(np.uint16): 'unsigned short',
+                          np.dtype(np.int16): 'short',
+                          np.dtype(np.uint32): 'unsigned int',
+                          np.dtype(np.int32): 'int'}
+
 
 # ITK/Numpy
 
@@ -247,12 +257,62 @@ def write_volume(volume,
     logging.info('writing {0} volume to {1}'.format(name, path))
     Manifest.safe_make_parent_dirs(path)
     volume.SetOrigin([0, 0, 0])
-    sitk.WriteImage(volume, str(path), True)
+    if extension == '.nrrd':
+        write_nrrd_in_chunks(volume, path)
+    else:
+        sitk.WriteImage(volume, str(path), True)
 
     if paths is not None:
         paths.append(path)
 
 
+def write_nrrd_in_chunks(volume, path, planes_per_chunk=16, compresslevel=4):
+    '''Writes a 3D scalar image as a gzip-encoded nrrd (with the header
+    SimpleITK writes), compressing a few planes at a time from a view of the
+    image's buffer rather than compressing a copy of the whole volume.
+    Other images are written by SimpleITK.
+    '''
+
+    array = sitk.GetArrayViewFromImage(volume)
+    if volume.GetDimension() != 3 or \
+            volume.GetNumberOfComponentsPerPixel() != 1 or \
+            array.dtype not in NUMPY_NRRD_TYPE_LOOKUP:
+        sitk.WriteImage(volume, str(path), True)
+        return
+
+    def vector(values):
+        return '({0})'.format(','.join('{0:.17g}'.format(value)
+                                       for value in values))
+
+    direction = np.reshape(volume.GetDirection(), (3, 3))
+    space_directions = direction * np.array(volume.GetSpacing())
+    header = '\n'.join([
+        'NRRD0004',
+        '# Complete NRRD file format specification at:',
+        '# http://teem.sourceforge.net/nrrd/format.html',
+        'type: {0}'.format(NUMPY_NRRD_TYPE_LOOKUP[array.dtype]),
+        'dimension: 3',
+        'space: left-posterior-superior',
+        'sizes: {0}'.format(' '.join(str(size) for size in volume.GetSize())),
+        'space directions: {0}'.format(' '.join(
+            vector(space_directions[:, axis]) for axis in range(3))),
+        'kinds: domain domain domain',
+        'endian: little',
+        'encoding: gzip',
+        'space origin: {0}'.format(vector(volume.GetOrigin())),
+        '', ''])
+
+    little_endian = array.dtype.newbyteorder('<')
+    with open(str(path), 'wb') as nrrd_file:
+        nrrd_file.write(header.encode('ascii'))
+        with gzip.GzipFile(fileobj=nrrd_file, mode='wb',
+                           compresslevel=compresslevel) as data_file:
+            for start in range(0, array.shape[0], planes_per_chunk):
+                chunk = array[start:start + planes_per_chunk]
+                data_file.write(np.ascontiguousarray(
+                    chunk, dtype=little_endian).tobytes())
+
+
 def __read_segmentation_image_with_kakadu(path):
     if not os.path.exists(path):
         raise OSError('file not found at {}'.format(path))
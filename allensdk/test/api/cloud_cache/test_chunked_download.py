@@ -0,0 +1,258 @@
+import pytest
+import json
+import threading
+import hashlib
+import pathlib
+import boto3
+from moto import mock_s3
+from .utils import create_bucket
+from allensdk.api.cloud_cache.cloud_cache import S3CloudCache
+from allensdk.api.cloud_cache.chunked_download import (
+    chunk_ranges, download_s3_object, partial_download_paths,
+    is_partial_download)
+
+
+def _make_versioned_object(bucket_name: str, key: str, data: bytes):
+    conn = boto3.resource('s3', region_name='us-east-1')
+    conn.create_bucket(Bucket=bucket_name, ACL='public-read')
+    conn.BucketVersioning(bucket_name).enable()
+
+    client = boto3.client('s3', region_name='us-east-1')
+    client.put_object(Bucket=bucket_name, Key=key, Body=data)
+    response = client.list_object_versions(Bucket=bucket_name)
+    version_id = response['Versions'][0]['VersionId']
+    return client, version_id
+
+
+class FlakyClient(object):
+    """
+    Wraps a boto3 client; the get_object calls whose Range starts at
+    one of fail_on raise an error. Records every Range requested.
+    """
+
+    def __init__(self, client, fail_on=()):
+        self._client = client
+        self.fail_on = set(fail_on)
+        self.requested = []
+
+    def get_object(self, **kwargs):
+        start = int(kwargs['Range'].split('=')[1].split('-')[0])
+        self.requested.append(start)
+        if start in self.fail_on:
+            raise RuntimeError("simulated connection failure")
+        return self._client.get_object(**kwargs)
+
+
+class StallingClient(FlakyClient):
+    """
+    FlakyClient whose request for the first chunk does not return until
+    stall seconds have passed. Records how many ranges had been requested
+    by then.
+    """
+
+    def __init__(self, client, stall):
+        super(StallingClient, self).__init__(client)
+        self.stall = stall
+        self.requested_while_stalled = None
+
+    def get_object(self, **kwargs):
+        if kwargs['Range'].startswith('bytes=0-'):
+            threading.Event().wait(self.stall)
+            self.requested_while_stalled = len(self.requested) + 1
+        return super(StallingClient, self).get_object(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "file_size, chunk_size, expected",
+    [(10, 4, [(0, 3), (4, 7), (8, 9)]),
+     (8, 4, [(0, 3), (4, 7)]),
+     (3, 4, [(0, 2)]),
+     (0, 4, [])])
+def test_chunk_ranges(file_size, chunk_size, expected):
+    assert chunk_ranges(file_size, chunk_size) == expected
+
+
+def test_chunk_ranges_bad_chunk_size():
+    with pytest.raises(ValueError, match='chunk_size must be positive'):
+        chunk_ranges(10, 0)
+
+
+def test_is_partial_download(tmpdir):
+    local_path = pathlib.Path(tmpdir) / 'data.nwb'
+    data_path, state_path = partial_download_paths(local_path)
+    assert is_partial_download(data_path)
+    assert is_partial_download(state_path)
+    assert not is_partial_download(local_path)
+
+
+@mock_s3
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_download_s3_object(tmpdir, max_workers):
+    """
+    Test that a file downloaded in many ranged chunks is reassembled
+    correctly and that the hash accumulated along the way is correct
+    """
+    data = bytes(range(256)) * 41
+    bucket_name = 'chunked_bucket'
+    client, version_id = _make_versioned_object(bucket_name,
+                                                'data/f.bin', data)
+
+    local_path = pathlib.Path(tmpdir) / 'f.bin'
+    file_hash = download_s3_object(client,
+                                   bucket_name=bucket_name,
+                                   obj_key='data/f.bin',
+                                   version_id=version_id,
+                                   file_size=len(data),
+                                   local_path=local_path,
+                                   chunk_size=1000,
+                                   max_workers=max_workers)
+
+    assert file_hash == hashlib.blake2b(data).hexdigest()
+    with open(local_path, 'rb') as in_file:
+        assert in_file.read() == data
+    for path in partial_download_paths(local_path):
+        assert not path.exists()
+
+
+@mock_s3
+def test_download_s3_object_resume(tmpdir):
+    """
+    Test that, after a download is interrupted, calling
+    download_s3_object again only requests the missing chunks
+    """
+    data = b'abcdefghij' * 100
+    bucket_name = 'resume_bucket'
+    client, version_id = _make_versioned_object(bucket_name,
+                                                'data/f.bin', data)
+
+    local_path = pathlib.Path(tmpdir) / 'f.bin'
+    flaky = FlakyClient(client, fail_on=(300, 700))
+
+    kwargs = dict(bucket_name=bucket_name,
+                  obj_key='data/f.bin',
+                  version_id=version_id,
+                  file_size=len(data),
+                  local_path=local_path,
+                  chunk_size=100,
+                  max_workers=1)
+
+    with pytest.raises(RuntimeError, match='simulated'):
+        download_s3_object(flaky, **kwargs)
+
+    assert not local_path.exists()
+    data_path, state_path = partial_download_paths(local_path)
+    assert data_path.is_file()
+    with open(state_path, 'r') as in_file:
+        state = json.load(in_file)
+    # chunks before the failure were kept; the failed chunk was not
+    assert {0, 1, 2}.issubset(state['completed'])
+    assert 3 not in state['completed']
+    missing = [100 * ii for ii in range(10)
+               if ii not in state['completed']]
+
+    flaky.fail_on = set()
+    flaky.requested = []
+    file_hash = download_s3_object(flaky, **kwargs)
+
+    assert sorted(flaky.requested) == missing
+    assert file_hash == hashlib.blake2b(data).hexdigest()
+    with open(local_path, 'rb') as in_file:
+        assert in_file.read() == data
+    assert not data_path.exists()
+    assert not state_path.exists()
+
+
+@mock_s3
+def test_download_s3_object_stale_state(tmpdir):
+    """
+    Test that a partial download recorded for a different chunking
+    of the file is discarded rather than resumed
+    """
+    data = b'0123456789' * 50
+    bucket_name = 'stale_bucket'
+    client, version_id = _make_versioned_object(bucket_name,
+                                                'data/f.bin', data)
+
+    local_path = pathlib.Path(tmpdir) / 'f.bin'
+    data_path, state_path = partial_download_paths(local_path)
+    with open(data_path, 'wb') as out_file:
+        out_file.write(b'x' * len(data))
+    with open(state_path, 'w') as out_file:
+        json.dump({'version_id': version_id,
+                   'size': len(data),
+                   'chunk_size': 7,
+                   'completed': [0, 1, 2]}, out_file)
+
+    file_hash = download_s3_object(client,
+                                   bucket_name=bucket_name,
+                                   obj_key='data/f.bin',
+                                   version_id=version_id,
+                                   file_size=len(data),
+                                   local_path=local_path,
+                                   chunk_size=100,
+                                   max_workers=2)
+
+    assert file_hash == hashlib.blake2b(data).hexdigest()
+    with open(local_path, 'rb') as in_file:
+        assert in_file.read() == data
+
+
+@mock_s3
+def test_download_s3_object_stalled_chunk(tmpdir):
+    """
+    Test that chunks which arrive while an earlier chunk is stalled are
+    buffered for hashing only up to the in-flight limit, rather than
+    every later chunk being requested and held in memory
+    """
+    data = b'abcdefghij' * 100
+    bucket_name = 'stalled_bucket'
+    client, version_id = _make_versioned_object(bucket_name,
+                                                'data/f.bin', data)
+
+    local_path = pathlib.Path(tmpdir) / 'f.bin'
+    stalling = StallingClient(client, stall=0.5)
+    file_hash = download_s3_object(stalling,
+                                   bucket_name=bucket_name,
+                                   obj_key='data/f.bin',
+                                   version_id=version_id,
+                                   file_size=len(data),
+                                   local_path=local_path,
+                                   chunk_size=100,
+                                   max_workers=2)
+
+    # 2 * max_workers chunks, including the stalled one
+    assert stalling.requested_while_stalled == 4
+    assert sorted(stalling.requested) == list(range(0, 1000, 100))
+    assert file_hash == hashlib.blake2b(data).hexdigest()
+    with open(local_path, 'rb') as in_file:
+        assert in_file.read() == data
+
+
+@mock_s3
+def test_download_data_many(tmpdir, example_datasets):
+    """
+    Test that CloudCacheBase.download_data_many downloads every
+    requested file and records them in the list of downloads
+    """
+    bucket_name = 'download_many_bucket'
+    create_bucket(bucket_name, example_datasets)
+
+    cache_dir = pathlib.Path(tmpdir) / 'cache'
+    cache = S3CloudCache(cache_dir, bucket_name, 'project-x',
+                         download_chunk_size=3)
+    cache.load_manifest('project-x_manifest_v1.0.0.json')
+
+    result = cache.download_data_many(['1', '2', '3', '2'], max_workers=3)
+    assert list(result.keys()) == ['1', '2', '3']
+
+    for file_id, fname in (('1', 'f1.txt'),
+                           ('2', 'f2.txt'),
+                           ('3', 'f3.txt')):
+        expected = cache_dir / 'project-x-1.0.0' / 'data' / fname
+        assert result[file_id] == expected
+        with open(expected, 'rb') as in_file:
+            assert in_file.read() == example_datasets['1.0.0'][fname]['data']
+
+    with open(cache_dir / '_downloaded_data.json', 'rb') as in_file:
+        downloaded = json.load(in_file)
+    assert len(downloaded) == 3
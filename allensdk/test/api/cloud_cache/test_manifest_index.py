@@ -0,0 +1,217 @@
+import pytest
+import json
+import os
+import hashlib
+import pathlib
+from moto import mock_s3
+from .utils import create_bucket
+from allensdk.api.cloud_cache import manifest_index
+from allensdk.api.cloud_cache.manifest import Manifest
+from allensdk.api.cloud_cache.manifest_index import ManifestIndex
+from allensdk.api.cloud_cache.manifest_index import IndexedManifest
+from allensdk.api.cloud_cache.cloud_cache import S3CloudCache
+
+
+@pytest.fixture
+def manifest_path(tmpdir):
+    jpath = pathlib.Path(tmpdir) / "manifest_v1.json"
+    manifest = {}
+    manifest['metadata_files'] = {
+        'a.csv': {'url': 'http://my.url.com/myproject/meta/a.csv',
+                  'version_id': '111',
+                  'file_hash': 'aaaaa'},
+        'b.csv': {'url': 'http://my.url.com/myproject/meta/b.csv',
+                  'version_id': '222',
+                  'file_hash': 'bbbbb'}}
+    manifest['data_files'] = {
+        'x': {'url': 'http://my.url.com/myproject/data/x.nwb',
+              'version_id': '333',
+              'file_hash': 'xxxxx'},
+        'y': {'url': 'http://my.url.com/myproject/data/y.nwb',
+              'version_id': '444',
+              'file_hash': 'yyyyy'}}
+    manifest['project_name'] = 'myproject'
+    manifest['manifest_version'] = '1'
+    manifest['metadata_file_id_column_name'] = 'file_id'
+    manifest['data_pipeline'] = [{'name': 'AllenSDK', 'version': '1.0'}]
+    with open(jpath, 'w') as out_file:
+        json.dump(manifest, out_file)
+    yield jpath
+
+
+@pytest.fixture
+def index(tmpdir):
+    index = ManifestIndex(pathlib.Path(tmpdir) / 'index.sqlite')
+    yield index
+    index.close()
+
+
+def assert_same_attributes(obtained, expected):
+    assert obtained.url == expected.url
+    assert obtained.version_id == expected.version_id
+    assert obtained.file_hash == expected.file_hash
+    assert obtained.local_path == expected.local_path
+
+
+@pytest.mark.parametrize('use_static_project_dir', [True, False])
+def test_indexed_manifest_matches_manifest(tmpdir, manifest_path, index,
+                                           use_static_project_dir):
+    """
+    Test that an IndexedManifest describes exactly the same files as
+    the Manifest it was compiled from
+    """
+    cache_dir = pathlib.Path(tmpdir) / 'cache'
+    with open(manifest_path, 'r') as in_file:
+        expected = Manifest(cache_dir, in_file,
+                            use_static_project_dir=use_static_project_dir)
+    indexed = index.load_manifest(
+        manifest_path, cache_dir,
+        use_static_project_dir=use_static_project_dir)
+
+    assert isinstance(indexed, IndexedManifest)
+    assert indexed.project_name == expected.project_name
+    assert indexed.version == expected.version
+    assert indexed.file_id_column == expected.file_id_column
+    assert indexed.metadata_file_names == expected.metadata_file_names
+    assert indexed.file_id_values == expected.file_id_values
+    assert indexed._data == expected._data
+    assert indexed._data_pipeline == expected._data_pipeline
+
+    for name in expected.metadata_file_names:
+        assert_same_attributes(indexed.metadata_file_attributes(name),
+                               expected.metadata_file_attributes(name))
+    for file_id in expected.file_id_values:
+        assert_same_attributes(indexed.data_file_attributes(file_id),
+                               expected.data_file_attributes(file_id))
+
+
+def test_unknown_files(tmpdir, manifest_path, index):
+    """
+    Test that IndexedManifest raises the same errors as Manifest
+    """
+    indexed = index.load_manifest(manifest_path, pathlib.Path(tmpdir))
+
+    with pytest.raises(ValueError,
+                       match="c.csv\nis not in self.metadata_file_names"):
+        indexed.metadata_file_attributes('c.csv')
+
+    for bad_id in ('z', 1, None):
+        with pytest.raises(ValueError,
+                           match="Is not a data file listed in manifest"):
+            indexed.data_file_attributes(bad_id)
+
+
+def test_manifest_compiled_once(tmpdir, manifest_path, index, monkeypatch):
+    """
+    Test that a manifest is only parsed again once it has changed
+    """
+    cache_dir = pathlib.Path(tmpdir) / 'cache'
+    index.load_manifest(manifest_path, cache_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("manifest was parsed again")
+
+    with monkeypatch.context() as ctx:
+        ctx.setattr(manifest_index, 'Manifest', fail)
+        indexed = index.load_manifest(manifest_path, cache_dir)
+        assert indexed.file_id_values == ['x', 'y']
+
+        # the index persists between instances
+        other = ManifestIndex(index.index_path)
+        assert other.load_manifest(manifest_path,
+                                   cache_dir).file_id_values == ['x', 'y']
+        other.close()
+
+    with open(manifest_path, 'r') as in_file:
+        data = json.load(in_file)
+    del data['data_files']['x']
+    with open(manifest_path, 'w') as out_file:
+        json.dump(data, out_file)
+
+    indexed = index.load_manifest(manifest_path, cache_dir)
+    assert indexed.file_id_values == ['y']
+    with pytest.raises(ValueError):
+        indexed.data_file_attributes('x')
+
+
+def test_check_file(tmpdir, index, monkeypatch):
+    """
+    Test that ManifestIndex.check_file only hashes recorded files
+    which have changed since they were recorded
+    """
+    local_path = pathlib.Path(tmpdir) / 'data.txt'
+    with open(local_path, 'wb') as out_file:
+        out_file.write(b'abcdefg')
+    good_hash = hashlib.blake2b(b'abcdefg').hexdigest()
+
+    hashed = []
+
+    def file_hash_from_path(path):
+        hashed.append(path)
+        with open(path, 'rb') as in_file:
+            return hashlib.blake2b(in_file.read()).hexdigest()
+
+    monkeypatch.setattr(manifest_index, 'file_hash_from_path',
+                        file_hash_from_path)
+
+    # files which were never verified are trusted
+    assert index.check_file(local_path, 'not_the_hash')
+
+    index.record_file(local_path, good_hash)
+    assert index.check_file(local_path, good_hash)
+    assert not index.check_file(local_path, 'not_the_hash')
+    assert hashed == []
+
+    with open(local_path, 'wb') as out_file:
+        out_file.write(b'corrupted')
+    assert not index.check_file(local_path, good_hash)
+    assert len(hashed) == 1
+
+    index.forget_file(local_path)
+    assert index.check_file(local_path, good_hash)
+
+
+def test_index_version(tmpdir, manifest_path, index, monkeypatch):
+    """
+    Test that an index written with a different layout is rebuilt
+    """
+    index.load_manifest(manifest_path, pathlib.Path(tmpdir))
+    index.close()
+
+    monkeypatch.setattr(manifest_index, 'INDEX_VERSION', 99)
+    rebuilt = ManifestIndex(index.index_path)
+    assert rebuilt._execute('SELECT * FROM manifests') == []
+    rebuilt.close()
+
+
+@mock_s3
+def test_corrupted_file_downloaded_again(tmpdir, example_datasets):
+    """
+    Test that S3CloudCache notices that a file it downloaded has
+    been modified and downloads it again
+    """
+    test_bucket_name = 'index_bucket'
+    create_bucket(test_bucket_name, example_datasets)
+
+    cache_dir = pathlib.Path(tmpdir) / 'cache'
+    cache = S3CloudCache(cache_dir, test_bucket_name, 'project-x')
+    cache.load_manifest('project-x_manifest_v1.0.0.json')
+    assert isinstance(cache._manifest, IndexedManifest)
+
+    local_path = cache.download_data('1')
+    assert cache.data_path('1')['exists']
+
+    with open(local_path, 'wb') as out_file:
+        out_file.write(b'corrupted')
+    assert not cache.data_path('1')['exists']
+
+    local_path = cache.download_data('1')
+    with open(local_path, 'rb') as in_file:
+        assert in_file.read() == example_datasets['1.0.0']['f1.txt']['data']
+
+    # a new cache on the same directory shares the index
+    other = S3CloudCache(cache_dir, test_bucket_name, 'project-x')
+    other.load_manifest('project-x_manifest_v1.0.0.json')
+    assert other.data_path('1')['exists']
+    os.truncate(local_path, 0)
+    assert not other.data_path('1')['exists']
@@ -0,0 +1,140 @@
+import copy
+import datetime
+import pickle
+
+import numpy as np
+import pytest
+
+from allensdk.brain_observatory.behavior.data_files import (
+    BehaviorStimulusFile)
+from allensdk.brain_observatory.behavior.data_files import (
+    stimulus_file_cache)
+from allensdk.brain_observatory.behavior.data_files.stimulus_file_cache \
+    import LazyStimulusDict, STIMULUS_CACHE_DIR_ENV
+from allensdk.core.pickle_utils import load_and_sanitize_pickle
+
+
+def make_stimulus_data(n_frames=3000):
+    rng = np.random.default_rng(0)
+    dx = rng.random(n_frames)
+    return {
+        b'start_time': datetime.datetime(2021, 1, 2, 3, 4, 5),
+        'items': {
+            'behavior': {
+                'intervalsms': (rng.random(n_frames - 1) * 16).tolist(),
+                'encoders': [{'dx': dx, 'vsig': rng.random(n_frames),
+                              'dx_again': dx}],
+                'lick_sensors': [{'lick_events': list(range(0, n_frames,
+                                                            2))}],
+                'trial_log': [{'index': i,
+                               'events': [[b'trial_start', '', 1.5 * i,
+                                           10 * i]],
+                               'trial_params': {'change_image': 'im065'}}
+                              for i in range(50)],
+                'mixed': [1, 2.0, 'three'] * 500,
+                'small': np.arange(5),
+                'params': {'stage': 'OPHYS_1_images_A'}
+            },
+            b'foraging': {'intervalsms': [16.0] * 2000}
+        },
+        'unicode': 'abc',
+    }
+
+
+def assert_data_equal(obtained, expected):
+    if isinstance(expected, dict):
+        assert type(obtained) in (dict, LazyStimulusDict)
+        assert list(obtained.keys()) == list(expected.keys())
+        for key in expected:
+            assert_data_equal(obtained[key], expected[key])
+    elif isinstance(expected, (list, tuple)):
+        assert type(obtained) is type(expected)
+        assert len(obtained) == len(expected)
+        for obtained_value, expected_value in zip(obtained, expected):
+            assert_data_equal(obtained_value, expected_value)
+    elif isinstance(expected, np.ndarray):
+        assert isinstance(obtained, np.ndarray)
+        np.testing.assert_array_equal(obtained, expected)
+    else:
+        assert type(obtained) is type(expected)
+        assert obtained == expected
+
+
+@pytest.fixture
+def stimulus_pkl(tmp_path):
+    path = tmp_path / 'stimulus.pkl'
+    with open(path, 'wb') as pkl_file:
+        pickle.dump(make_stimulus_data(), pkl_file)
+    return path
+
+
+def test_stimulus_file_cache(stimulus_pkl, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    expected = load_and_sanitize_pickle(stimulus_pkl)
+
+    stimulus_file = BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir)
+    assert_data_equal(stimulus_file.data, expected)
+    cache_path, = cache_dir.glob('*.stimulus_cache')
+
+    # later loads read the cache rather than the pickle
+    def fail(pickle_path):
+        raise AssertionError('pickle should not be loaded')
+    monkeypatch.setattr(stimulus_file_cache, 'load_and_sanitize_pickle',
+                        fail)
+    stimulus_file = BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir)
+    data = stimulus_file.data
+    assert isinstance(data, dict)
+    assert_data_equal(data, expected)
+    assert stimulus_file.num_frames == 3000
+    assert stimulus_file.session_type == 'OPHYS_1_images_A'
+
+    # large numeric arrays and lists are stored as .npy files
+    assert len(list(cache_path.glob('*.npy'))) == 5
+
+
+def test_stimulus_file_cache_is_lazy(stimulus_pkl, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir)
+    data = BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir).data
+
+    behavior = data['items']['behavior']
+    encoders = behavior['encoders']
+    assert all(isinstance(dict.__getitem__(behavior, key),
+                          stimulus_file_cache._DeferredEntry)
+               for key in behavior if key != 'encoders')
+
+    # arrays are memory-mapped copy on write, and shared within an entry
+    assert isinstance(encoders[0]['dx'], np.memmap)
+    assert encoders[0]['dx'] is encoders[0]['dx_again']
+    encoders[0]['dx'][:] = 0
+    reloaded = BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir).data
+    assert reloaded['items']['behavior']['encoders'][0]['dx'].any()
+
+
+def test_lazy_stimulus_dict_copies(stimulus_pkl, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir)
+    expected = load_and_sanitize_pickle(stimulus_pkl)
+
+    for copy_data in (lambda data: pickle.loads(pickle.dumps(data)),
+                      copy.deepcopy, dict, lambda data: {**data},
+                      lambda data: data.copy()):
+        data = BehaviorStimulusFile(stimulus_pkl, cache_dir=cache_dir).data
+        copied = copy_data(data)
+        assert type(copied) is dict
+        assert_data_equal(copied, expected)
+
+
+def test_stimulus_file_cache_keyed_by_file(stimulus_pkl, tmp_path,
+                                           monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setenv(STIMULUS_CACHE_DIR_ENV, str(cache_dir))
+    BehaviorStimulusFile(stimulus_pkl)
+    assert len(list(cache_dir.glob('*.stimulus_cache'))) == 1
+
+    data = make_stimulus_data()
+    data['unicode'] = 'changed'
+    with open(stimulus_pkl, 'wb') as pkl_file:
+        pickle.dump(data, pkl_file)
+    assert BehaviorStimulusFile(stimulus_pkl).data['unicode'] == 'changed'
+    assert len(list(cache_dir.glob('*.stimulus_cache'))) == 2
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
+    .cell_specimens import CellSpecimens, CellSpecimenMeta
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.events \
+    import Events
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    import traces_mixin
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .corrected_fluorescence_traces import CorrectedFluorescenceTraces
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .demixed_traces import DemixedTraces
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .dff_traces import DFFTraces
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .neuropil_traces import NeuropilTraces
+from allensdk.brain_observatory.behavior.data_objects.metadata\
+    .ophys_experiment_metadata.imaging_plane import ImagingPlane
+from allensdk.brain_observatory.behavior.data_objects.timestamps\
+    .ophys_timestamps import OphysTimestamps
+from allensdk.core import LazyLoader, is_loaded
+
+
+@pytest.fixture
+def trace_array():
+    return np.arange(15, dtype=float).reshape(3, 5)
+
+
+@pytest.fixture
+def roi_ids():
+    return np.array([30, 10, 20])
+
+
+def test_legacy_dataframe(trace_array, roi_ids):
+    """The legacy dataframe is unchanged, and its traces are views into
+    the trace array"""
+    traces = DFFTraces(traces=trace_array, roi_ids=roi_ids)
+
+    expected = pd.DataFrame(
+        {'dff': [x for x in trace_array.copy()]},
+        index=pd.Index(roi_ids, name='cell_roi_id'))
+    pd.testing.assert_frame_equal(traces.value, expected)
+    for trace in traces.value['dff']:
+        assert np.shares_memory(trace, traces.get_trace_array())
+    assert traces.get_number_of_frames() == 5
+
+
+def test_from_dataframe_does_not_copy(trace_array, roi_ids):
+    df = pd.DataFrame(
+        {'demixed_trace': list(trace_array)},
+        index=pd.Index(roi_ids, name='cell_roi_id'))
+
+    traces = DemixedTraces(traces=df)
+    assert np.shares_memory(traces.get_trace_array(), trace_array)
+    np.testing.assert_array_equal(traces.get_trace_array(), trace_array)
+    assert traces.get_trace_array().flags.c_contiguous
+    np.testing.assert_array_equal(traces.get_roi_ids(), roi_ids)
+
+    # rows which are not views of one array are stacked
+    df = pd.DataFrame(
+        {'demixed_trace': [list(x) for x in trace_array[::-1]]},
+        index=pd.Index(roi_ids, name='cell_roi_id'))
+    traces._value = df
+    np.testing.assert_array_equal(traces.get_trace_array(),
+                                  trace_array[::-1])
+
+
+def test_corrected_fluorescence_roi_values(trace_array, roi_ids):
+    traces = CorrectedFluorescenceTraces(
+        traces=trace_array, roi_ids=roi_ids,
+        r=np.array([0.1, 0.2, 0.3]), rmse=np.array([1.0, 2.0, 3.0]))
+
+    traces.filter_and_reorder(roi_ids=np.array([10, 20, 30]))
+    expected = pd.DataFrame({
+        'corrected_fluorescence': list(trace_array[[1, 2, 0]]),
+        'r': [0.2, 0.3, 0.1],
+        'RMSE': [2.0, 3.0, 1.0]
+    }, index=pd.Index([10, 20, 30], name='cell_roi_id'))
+    pd.testing.assert_frame_equal(traces.value, expected)
+
+
+@pytest.mark.parametrize('raise_if_rois_missing', (True, False))
+def test_filter_and_reorder(trace_array, roi_ids, raise_if_rois_missing):
+    traces = NeuropilTraces(traces=trace_array, roi_ids=roi_ids)
+
+    traces.filter_and_reorder(roi_ids=roi_ids)
+    # already in order
+    assert traces.get_trace_array() is trace_array
+
+    if raise_if_rois_missing:
+        with pytest.raises(RuntimeError):
+            traces.filter_and_reorder(
+                roi_ids=np.array([20, 40]),
+                raise_if_rois_missing=raise_if_rois_missing)
+    else:
+        with pytest.warns(UserWarning):
+            traces.filter_and_reorder(
+                roi_ids=np.array([20, 40, 30]),
+                raise_if_rois_missing=raise_if_rois_missing)
+        np.testing.assert_array_equal(traces.get_roi_ids(), [20, 30])
+        np.testing.assert_array_equal(traces.get_trace_array(),
+                                      trace_array[[2, 0]])
+        np.testing.assert_array_equal(traces.value.index.values, [20, 30])
+        assert traces.get_trace_array().flags.c_contiguous
+
+
+def test_read_roi_response_series_data(monkeypatch):
+    """NWB data (time x roi) is read in blocks into a contiguous (roi x
+    time) array"""
+    data = np.random.default_rng(0).random((101, 4)).astype(np.float32)
+    monkeypatch.setattr(traces_mixin, '_READ_BLOCK_BYTES', 40)
+
+    obtained = traces_mixin.read_roi_response_series_data(data)
+    assert obtained.dtype == np.float32
+    assert obtained.flags.c_contiguous
+    np.testing.assert_array_equal(obtained, data.T)
+
+
+def _cell_specimens(trace_array, roi_ids, n_timestamps=None, lazy=False):
+    """CellSpecimens in which only rois 10 and 30 are valid"""
+    n_rois, n_frames = trace_array.shape
+    if n_timestamps is None:
+        n_timestamps = n_frames
+    cell_specimen_table = pd.DataFrame({
+        'cell_roi_id': [10, 20, 30],
+        'valid_roi': [True, False, True],
+        'roi_mask': [np.zeros((4, 4), dtype=bool)] * n_rois
+    }, index=pd.Index([1, 2, 3], name='cell_specimen_id'))
+
+    def _load(func, **kwargs):
+        if lazy:
+            return LazyLoader(lambda: func(**kwargs))
+        return func(**kwargs)
+
+    events = _load(
+        Events,
+        events=np.zeros((n_rois, n_frames)),
+        events_meta=pd.DataFrame({'lambda': np.zeros(n_rois),
+                                  'noise_std': np.zeros(n_rois),
+                                  'cell_roi_id': roi_ids}),
+        frame_rate_hz=31.0)
+    timestamps = OphysTimestamps(timestamps=np.arange(n_timestamps) / 31.0)
+
+    return CellSpecimens(
+        cell_specimen_table=cell_specimen_table,
+        meta=CellSpecimenMeta(imaging_plane=ImagingPlane(
+            ophys_frame_rate=31.0, targeted_structure='VISp',
+            excitation_lambda=910.0, indicator='GCaMP6f')),
+        events=events,
+        ophys_timestamps=timestamps,
+        segmentation_mask_image_spacing=(1.0, 1.0),
+        corrected_fluorescence_traces=_load(
+            CorrectedFluorescenceTraces,
+            traces=trace_array, roi_ids=roi_ids,
+            r=np.zeros(n_rois), rmse=np.zeros(n_rois)),
+        dff_traces=_load(DFFTraces, traces=trace_array, roi_ids=roi_ids))
+
+
+def test_get_trace_array(trace_array, roi_ids):
+    csp = _cell_specimens(trace_array=trace_array, roi_ids=roi_ids)
+    timestamps = csp._ophys_timestamps
+
+    obtained = csp.get_trace_array('dff_traces')
+    assert obtained.dims == ('cell_specimen_id', 'time')
+    np.testing.assert_array_equal(obtained['cell_specimen_id'], [1, 3])
+    np.testing.assert_array_equal(obtained['cell_roi_id'], [10, 30])
+    np.testing.assert_array_equal(obtained['time'], timestamps.value)
+    np.testing.assert_array_equal(obtained.values, trace_array[[1, 0]])
+    assert obtained.values is csp._dff_traces.get_trace_array()
+
+    # the legacy dataframe holds the same traces
+    np.testing.assert_array_equal(
+        np.stack(csp.dff_traces['dff'].values), obtained.values)
+
+    assert csp.get_trace_array('demixed_traces') is None
+    with pytest.raises(ValueError, match='trace_type must be one of'):
+        csp.get_trace_array('dff')
+
+
+def test_lazy_traces(trace_array, roi_ids):
+    """Traces given as LazyLoaders are only loaded, validated and
+    filtered on first access"""
+    n_frames = trace_array.shape[1]
+    csp = _cell_specimens(trace_array=trace_array, roi_ids=roi_ids,
+                          n_timestamps=n_frames + 2, lazy=True)
+    for name in ('_dff_traces', '_corrected_fluorescence_traces',
+                 '_events'):
+        assert not is_loaded(csp, name)
+    assert csp.table.index.tolist() == [1, 3]
+
+    # sentinel ophys timestamps are truncated when the dff traces load
+    assert not is_loaded(csp, '_ophys_timestamps')
+    obtained = csp.get_trace_array('dff_traces')
+    assert is_loaded(csp, '_dff_traces')
+    assert not is_loaded(csp, '_corrected_fluorescence_traces')
+    assert len(csp._ophys_timestamps.value) == n_frames
+    np.testing.assert_array_equal(csp._dff_traces.get_roi_ids(), [10, 30])
+    np.testing.assert_array_equal(obtained.values, trace_array[[1, 0]])
+
+    np.testing.assert_array_equal(
+        csp.events['cell_roi_id'].values, [10, 30])
+    assert is_loaded(csp, '_events')
+
+
+def test_lazy_traces_before_dff(trace_array, roi_ids):
+    """Traces read before the dff traces are validated against the
+    trimmed ophys timestamps"""
+    n_frames = trace_array.shape[1]
+    csp = _cell_specimens(trace_array=trace_array, roi_ids=roi_ids,
+                          n_timestamps=n_frames + 2, lazy=True)
+
+    obtained = csp.get_trace_array('corrected_fluorescence_traces')
+    assert obtained.shape == (2, n_frames)
+    assert is_loaded(csp, '_dff_traces')
+    assert len(csp._ophys_timestamps.value) == n_frames
+
+    eager = _cell_specimens(trace_array=trace_array, roi_ids=roi_ids,
+                            n_timestamps=n_frames + 2)
+    np.testing.assert_array_equal(
+        obtained.values,
+        eager.get_trace_array('corrected_fluorescence_traces').values)
+    np.testing.assert_array_equal(obtained['time'].values,
+                                  eager._ophys_timestamps.value)
+
+
+def test_lazy_traces_validated(trace_array, roi_ids):
+    """Invalid traces only raise once loaded"""
+    csp = _cell_specimens(trace_array=trace_array,
+                          roi_ids=np.array([30, 10, 40]), lazy=True)
+    with pytest.raises(RuntimeError, match='not in cell_specimen_table'):
+        csp.get_trace_array('dff_traces')
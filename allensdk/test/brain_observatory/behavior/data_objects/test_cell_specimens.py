@@ -7,6 +7,7 @@ import pandas as pd
 
 import pytest
 
+from allensdk.brain_observatory.roi_masks import SparseMask
 from allensdk.core import DataObject
 from allensdk.brain_observatory.behavior.data_objects.cell_specimens\
     .cell_specimens import (
@@ -126,6 +127,34 @@ class TestJson:
         assert not csp.corrected_fluorescence_traces.empty
         assert csp.meta == self.expected_meta
 
+    def test_roi_masks_are_sparse(self):
+        """tests that roi masks are stored sparsely, and that full frame
+        masks are built on request"""
+        csp = CellSpecimens.from_json(
+            dict_repr=self.dict_repr,
+            ophys_timestamps=self.ophys_timestamps,
+            segmentation_mask_image_spacing=(0.78125e-3, 0.78125e-3),
+            events_params=EventsParams(
+                filter_scale_seconds=2.0 / 31.0, filter_n_time_steps=20
+            ),
+        )
+        sparse = csp.table["roi_mask"]
+        dense = csp.get_table(dense_roi_masks=True)["roi_mask"]
+        fov_shape = (self.dict_repr["movie_height"],
+                     self.dict_repr["movie_width"])
+
+        assert all(isinstance(m, SparseMask) for m in sparse)
+        assert all(isinstance(m, SparseMask)
+                   for m in csp.get_table(dense_roi_masks=False)["roi_mask"])
+        assert all(m.shape == fov_shape for m in sparse)
+        for sparse_mask, dense_mask in zip(sparse, dense):
+            assert dense_mask.dtype == bool
+            np.testing.assert_array_equal(sparse_mask.to_dense(), dense_mask)
+        np.testing.assert_array_equal(
+            np.stack(csp.roi_masks["roi_mask"].values), np.stack(dense))
+        np.testing.assert_array_equal(
+            csp.segmentation_mask_image.data, np.sum(dense).astype(int))
+
     @pytest.mark.parametrize(
         "data",
         (
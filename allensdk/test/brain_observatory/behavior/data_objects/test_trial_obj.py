@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from numpy import VisibleDeprecationWarning
 import pandas as pd
 from allensdk.brain_observatory.behavior.data_objects import (
     StimulusTimestamps)
@@ -233,3 +234,29 @@ def test_get_trial_timing():
     pd.testing.assert_frame_equal(pd.DataFrame(result, index=[0]),
                                   pd.DataFrame(expected_result, index=[0]),
                                   check_names=False)
+
+
+def test_deprecated_change_frame_and_time():
+    stimulus_timestamps = StimulusTimestamps(
+        timestamps=np.arange(10, dtype=float),
+        monitor_delay=0.01)
+
+    class DummyTrial(Trial):
+        def __init__(self, timestamps):
+            self._stimulus_timestamps = timestamps
+
+    this_trial = DummyTrial(timestamps=stimulus_timestamps)
+    event_dict = {('stimulus_changed', ''): {'frame': 3},
+                  ('sham_change', ''): {'frame': 5}}
+
+    with pytest.warns(VisibleDeprecationWarning):
+        change_frame = this_trial.calculate_change_frame(
+            event_dict=event_dict, go=False, catch=True,
+            auto_rewarded=False)
+    assert change_frame == 5
+
+    with pytest.warns(VisibleDeprecationWarning):
+        trial_dict, change_time = this_trial.add_change_time(
+            {'change_frame': change_frame})
+    assert change_time == 5.01
+    assert trial_dict == {'change_frame': 5, 'change_time': 5.01}
@@ -1,12 +1,16 @@
+import warnings
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 from unittest.mock import patch, create_autospec
 
+import numpy as np
+from numpy import VisibleDeprecationWarning
 import pandas as pd
 import pynwb
 import pytest
 
+from allensdk import OneResultExpectedError
 from allensdk.brain_observatory.behavior.data_files import (
     BehaviorStimulusFile,
     SyncFile)
@@ -22,6 +26,7 @@ from allensdk.brain_observatory.behavior.data_objects.task_parameters import \
     TaskParameters
 from allensdk.brain_observatory.behavior.data_objects.trials.trials import \
     Trials
+from allensdk.brain_observatory.ecephys.data_objects.trials import VBNTrials
 from allensdk.internal.brain_observatory.time_sync import OphysTimeAligner
 from allensdk.test.brain_observatory.behavior.data_objects.lims_util import \
     LimsTest
@@ -76,6 +81,52 @@ class TestFromBehaviorStimulusFile(LimsTest):
             rewards=rewards
         )
 
+    @pytest.mark.parametrize('trials_class', [Trials, VBNTrials])
+    def test_from_stimulus_file_matches_trial_objects(self, trials_class):
+        """The columnar trial table equals the table of the data of a Trial
+        object for each trial"""
+        dir = Path(__file__).parent.parent.resolve()
+        stimulus_filepath = dir / 'resources' / 'example_stimulus.pkl.gz'
+        stimulus_file = BehaviorStimulusFile(filepath=stimulus_filepath)
+        stimulus_file, stimulus_timestamps, licks, rewards, \
+            response_window_start = \
+            self._get_trial_table_data(stimulus_file=stimulus_file)
+
+        trials = trials_class.from_stimulus_file(
+            stimulus_file=stimulus_file,
+            stimulus_timestamps=stimulus_timestamps,
+            licks=licks,
+            rewards=rewards
+        )
+
+        behavior = stimulus_file.data['items']['behavior']
+        trial_bounds = trials_class._get_trial_bounds(
+            trial_log=behavior['trial_log'])
+        # the deprecated per-trial objects still agree with the table
+        with pytest.warns(VisibleDeprecationWarning):
+            trial_class = trials_class.trial_class()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', VisibleDeprecationWarning)
+            expected = pd.DataFrame([
+                trial_class(
+                    trial=trial, start=start, end=end,
+                    behavior_stimulus_file=stimulus_file, index=idx,
+                    stimulus_timestamps=stimulus_timestamps,
+                    licks=licks, rewards=rewards,
+                    stimuli=behavior['stimuli']).data
+                for idx, (trial, (start, end)) in enumerate(
+                    zip(behavior['trial_log'], trial_bounds))
+            ]).set_index('trial')
+        expected.index = expected.index.rename('trials_id')
+        expected = expected[trials_class.columns_to_output()].rename(
+            columns={'stimulus_change': 'is_change'})
+
+        pd.testing.assert_frame_equal(trials.data, expected)
+        for obtained_times, expected_times in zip(
+                trials.data['lick_times'], expected['lick_times']):
+            assert obtained_times.dtype == expected_times.dtype
+            np.testing.assert_array_equal(obtained_times, expected_times)
+
     def _get_trial_table_data(
             self,
             stimulus_file: Optional[BehaviorStimulusFile] = None):
@@ -106,6 +157,40 @@ class TestFromBehaviorStimulusFile(LimsTest):
             response_window_start
 
 
+@pytest.mark.parametrize('trial_ends, expected', [
+    ([10, 20, -1], [[0, 1], [2], [3, 4]]),
+    ([10, 20, 25], [[0, 1], [2], [3]]),
+    ([10, 20, 0], [[0, 1], [2], [3, 4]]),
+])
+def test_get_trial_lick_times(trial_ends, expected):
+    """Licks are assigned to the trial in (start, end] that contains them;
+    licks on a boundary belong to the trial that is ending"""
+    timestamps = np.arange(40) / 10.
+    lick_frames = np.array([3, 10, 12, 25, 30, 0])
+    lick_times = Trials._get_trial_lick_times(
+        lick_frames=lick_frames, trial_starts=[0, 10, 20],
+        trial_ends=trial_ends, timestamps=timestamps)
+    assert len(lick_times) == len(expected)
+    for obtained, expected_licks in zip(lick_times, expected):
+        assert obtained.dtype == float
+        np.testing.assert_array_equal(obtained,
+                                      timestamps[lick_frames[expected_licks]])
+
+
+def test_get_trial_reward_times():
+    reward_times = Trials._get_trial_reward_times(
+        reward_times=np.array([2., 1.]),
+        start_times=np.array([0., 1., 1.5, 3.]),
+        stop_times=np.array([1., 1.5, 2., 4.]))
+    np.testing.assert_array_equal(reward_times, [1., 1., 2., np.nan])
+
+    with pytest.raises(OneResultExpectedError):
+        Trials._get_trial_reward_times(
+            reward_times=np.array([1., 2.]),
+            start_times=np.array([0.]),
+            stop_times=np.array([3.]))
+
+
 class TestMonitorDelay:
     @classmethod
     def setup_class(cls):
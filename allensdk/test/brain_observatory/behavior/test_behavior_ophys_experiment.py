@@ -3,6 +3,7 @@ import os
 import uuid
 
 import numpy as np
+import pandas as pd
 import pytest
 import pytz
 from pynwb import NWBHDF5IO
@@ -217,6 +218,8 @@ def test_behavior_ophys_experiment_list_data_attributes_and_methods(
         'get_reward_rate',
         'get_rolling_performance_df',
         'get_segmentation_mask_image',
+        'get_trace_array',
+        'get_cell_specimen_table',
         'licks',
         'max_projection',
         'metadata',
@@ -270,3 +273,85 @@ def test_stim_v_trials_time(
 
     delta = np.abs(stim-trials)
     assert delta.max() < 1.0e-6
+
+
+def test_from_nwb_lazy(monkeypatch):
+    """Test that with lazy=True, the ophys data and the behavior session
+    data are only read from nwb once accessed"""
+    from types import SimpleNamespace
+
+    from allensdk.brain_observatory.behavior import \
+        behavior_ophys_experiment as module
+    from allensdk.core import LazyLoader, is_loaded
+
+    read = []
+
+    def _patch(cls, value=None):
+        def from_nwb(_cls, nwbfile, **kwargs):
+            read.append(cls.__name__)
+            return value if value is not None else cls.__name__
+        monkeypatch.setattr(cls, 'from_nwb', classmethod(from_nwb))
+
+    behavior_data = ('stimulus_timestamps', 'running_acquisition',
+                     'raw_running_speed', 'running_speed', 'licks',
+                     'rewards', 'stimuli', 'task_parameters', 'trials',
+                     'eye_tracking_table', 'eye_tracking_rig_geometry')
+
+    def behavior_session_from_nwb(_cls, nwbfile, lazy):
+        assert lazy
+        data = {name: LazyLoader(lambda name=name: read.append(name))
+                for name in behavior_data}
+        return module.BehaviorSession(
+            behavior_session_id='id', metadata='metadata',
+            date_of_acquisition='date', **data)
+
+    monkeypatch.setattr(module.BehaviorSession, 'from_nwb',
+                        classmethod(behavior_session_from_nwb))
+    _patch(module.Projections, value=SimpleNamespace(
+        max_projection=SimpleNamespace(spacing=(0.5, 0.5))))
+    _patch(module.CellSpecimens)
+    _patch(module.MotionCorrection)
+    _patch(module.BehaviorOphysMetadata)
+    _patch(module.OphysTimestamps)
+    _patch(module.DateOfAcquisitionOphys)
+    monkeypatch.setattr(module.ImagingPlaneGroup, 'from_nwb',
+                        classmethod(lambda _cls, nwbfile: None))
+
+    experiment = BehaviorOphysExperiment.from_nwb(nwbfile='nwbfile',
+                                                  lazy=True)
+    assert read == ['BehaviorOphysMetadata', 'OphysTimestamps',
+                    'DateOfAcquisitionOphys']
+    for name in ('_projections', '_cell_specimens', '_motion_correction',
+                 '_licks', '_trials'):
+        assert not is_loaded(experiment, name)
+
+    # cell specimens need the spacing of the max projection
+    assert experiment._cell_specimens == 'CellSpecimens'
+    assert read[3:] == ['Projections', 'CellSpecimens']
+    assert is_loaded(experiment, '_projections')
+    experiment._licks
+    assert read[5:] == ['licks']
+    assert not is_loaded(experiment, '_trials')
+
+
+@pytest.mark.parametrize('ids', ([5, 7], [np.nan, np.nan]))
+def test_get_cell_specimen_ids(ids):
+    """Test that cell specimen ids are read without building dense roi
+    masks"""
+    class Experiment:
+        ophys_experiment_id = 1
+
+        def get_cell_specimen_table(self, dense_roi_masks=True):
+            assert not dense_roi_masks
+            return pd.DataFrame(index=pd.Index(ids, name='cell_specimen_id'))
+
+        @property
+        def cell_specimen_table(self):
+            raise AssertionError('dense roi masks built')
+
+    if np.isnan(ids[0]):
+        with pytest.raises(ValueError, match='not assigned'):
+            BehaviorOphysExperiment.get_cell_specimen_ids(Experiment())
+    else:
+        np.testing.assert_array_equal(
+            BehaviorOphysExperiment.get_cell_specimen_ids(Experiment()), ids)
@@ -117,3 +117,96 @@ class TestBehaviorSession(LimsTest):
         sess = BehaviorSession.from_lims(behavior_session_id=sess_id,
                                          lims_db=self.dbconn)
         assert not sess.eye_tracking.empty
+
+
+@pytest.fixture
+def patched_from_nwb(monkeypatch):
+    """Replaces the from_nwb of each data object read by
+    BehaviorSession.from_nwb with one which records that it was called.
+    Returns the names of the classes read so far"""
+    from allensdk.brain_observatory.behavior import behavior_session
+
+    read = []
+
+    def _patch(cls):
+        def from_nwb(_cls, nwbfile, **kwargs):
+            read.append(cls.__name__)
+            return f'{cls.__name__} from {nwbfile}'
+        monkeypatch.setattr(cls, 'from_nwb', classmethod(from_nwb))
+
+    for name in ('BehaviorSessionId', 'StimulusTimestamps',
+                 'RunningAcquisition', 'RunningSpeed', 'BehaviorMetadata',
+                 'Licks', 'Rewards', 'Stimuli', 'TaskParameters', 'Trials',
+                 'DateOfAcquisition', 'EyeTrackingRigGeometry',
+                 'EyeTrackingTable'):
+        _patch(getattr(behavior_session, name))
+    return read
+
+
+@pytest.mark.parametrize('lazy', (True, False))
+def test_from_nwb_lazy(patched_from_nwb, lazy):
+    """Test that with lazy=True, data are only read from nwb once
+    accessed"""
+    from allensdk.core import is_loaded
+
+    session = BehaviorSession.from_nwb(nwbfile='nwbfile', lazy=lazy)
+
+    eager = ['BehaviorSessionId', 'BehaviorMetadata', 'DateOfAcquisition']
+    if lazy:
+        assert patched_from_nwb == eager
+        assert not is_loaded(session, '_licks')
+        assert not is_loaded(session, '_eye_tracking')
+    else:
+        assert len(patched_from_nwb) == 14
+
+    assert session._licks == 'Licks from nwbfile'
+    assert session._licks == 'Licks from nwbfile'
+    assert patched_from_nwb.count('Licks') == 1
+    assert is_loaded(session, '_licks')
+    assert session._eye_tracking == 'EyeTrackingTable from nwbfile'
+    if lazy:
+        assert patched_from_nwb == eager + ['Licks', 'EyeTrackingTable']
+
+
+@pytest.mark.parametrize('lazy', (True, False))
+def test_from_nwb_path_close(monkeypatch, lazy):
+    """Test that a lazy session keeps its nwb file open until closed"""
+    from allensdk.brain_observatory.behavior import behavior_session
+
+    opened = []
+
+    class DummyIO:
+        def __init__(self, path, mode, load_namespaces):
+            self.closed = False
+            opened.append(self)
+
+        def read(self):
+            return 'nwbfile'
+
+        def close(self):
+            self.closed = True
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.close()
+
+    monkeypatch.setattr(behavior_session.pynwb, 'NWBHDF5IO', DummyIO)
+    monkeypatch.setattr(BehaviorSession, 'from_nwb',
+                        classmethod(lambda cls, nwbfile, lazy: cls.__new__(
+                            cls)))
+
+    session = BehaviorSession.from_nwb_path('session.nwb', lazy=lazy)
+    if not lazy:
+        assert opened[0].closed
+        return
+
+    assert session._nwb_io is opened[0]
+    assert not opened[0].closed
+    with session as entered:
+        assert entered is session
+        assert not opened[0].closed
+    assert opened[0].closed
+    assert session._nwb_io is None
+    session.close()
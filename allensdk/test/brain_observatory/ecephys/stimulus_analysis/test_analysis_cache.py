@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from .test_stimulus_analysis import MockSessionApi
+from allensdk.brain_observatory.ecephys.ecephys_session import EcephysSession
+from allensdk.brain_observatory.ecephys.stimulus_analysis.analysis_cache \
+    import StimulusAnalysisCache
+from allensdk.brain_observatory.ecephys.stimulus_analysis.stimulus_analysis \
+    import StimulusAnalysis
+
+
+class MockSessionWithIdApi(MockSessionApi):
+    def get_ecephys_session_id(self):
+        return 12345
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return StimulusAnalysisCache(str(tmpdir.join("cache")))
+
+
+def test_round_trip_data_array(cache):
+    expected = xr.DataArray(
+        name="spike_counts",
+        data=np.arange(24, dtype=np.uint16).reshape(2, 3, 4),
+        coords={"stimulus_condition_id": [3, 7],
+                "time_relative_to_stimulus_onset": [0.1, 0.2, 0.3],
+                "unit_id": [10, 11, 12, 13]},
+        dims=["stimulus_condition_id", "time_relative_to_stimulus_onset",
+              "unit_id"])
+
+    assert cache.put("a", expected)
+    xr.testing.assert_identical(expected, cache.get("a"))
+
+
+def test_round_trip_data_frame(cache):
+    expected = pd.DataFrame({
+        "spike_counts": np.array([1, 0, 3, 2], dtype=np.uint16),
+        "running_speed": [0.5, np.nan, 1.0, 2.0]
+    }, index=pd.MultiIndex.from_product([[5, 6], [100, 101]],
+                                        names=["stimulus_presentation_id",
+                                               "unit_id"]))
+
+    assert cache.put("a", expected)
+    pd.testing.assert_frame_equal(expected, cache.get("a"))
+
+
+def test_objects_not_cached(cache):
+    frame = pd.DataFrame({"name": ["a", "b"]})
+    assert not cache.put("a", frame)
+    assert "a" not in cache
+    assert cache.get("a") is None
+
+
+def test_make_key():
+    key = StimulusAnalysisCache.make_key(
+        product="psth", unit_ids=np.arange(5), params={"bin": 0.1})
+    assert key == StimulusAnalysisCache.make_key(
+        product="psth", unit_ids=np.arange(5), params={"bin": 0.1})
+    assert key != StimulusAnalysisCache.make_key(
+        product="psth", unit_ids=np.arange(1, 6), params={"bin": 0.1})
+    assert key != StimulusAnalysisCache.make_key(
+        product="psth", unit_ids=np.arange(5), params={"bin": 0.2})
+
+
+def test_lru_eviction(cache):
+    value = xr.DataArray(np.zeros(1000), dims=["x"])
+    cache.put("a", value)
+    entry_size = cache.size
+    cache.max_bytes = int(2.5 * entry_size)
+
+    cache.put("b", value)
+    # make "a" the most recently used entry
+    past = os.stat(cache._path("b")).st_mtime - 10
+    os.utime(cache._path("a"), (past, past))
+    os.utime(cache._path("b"), (past - 10, past - 10))
+    assert cache.get("a") is not None
+
+    cache.put("c", value)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.size <= cache.max_bytes
+
+
+def test_stimulus_analysis_cache(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join("analysis_cache"))
+    kwargs = dict(stimulus_key='s0', trial_duration=0.5, psth_resolution=0.1,
+                  cache=cache_dir)
+
+    session = EcephysSession(api=MockSessionWithIdApi())
+    expected = StimulusAnalysis(ecephys_session=session, **kwargs)
+    expected_psth = expected.conditionwise_psth
+    expected_presentationwise = expected.presentationwise_statistics
+    expected_conditionwise = expected.conditionwise_statistics
+    assert len(os.listdir(cache_dir)) == 3
+
+    session = EcephysSession(api=MockSessionWithIdApi())
+
+    def fail(*args, **kwargs):
+        raise AssertionError("expected a cached value")
+
+    monkeypatch.setattr(session, "presentationwise_spike_counts", fail)
+    monkeypatch.setattr(session, "conditionwise_spike_statistics", fail)
+
+    obtained = StimulusAnalysis(ecephys_session=session, **kwargs)
+    xr.testing.assert_identical(expected_psth, obtained.conditionwise_psth)
+    pd.testing.assert_frame_equal(expected_presentationwise,
+                                  obtained.presentationwise_statistics)
+    pd.testing.assert_frame_equal(expected_conditionwise,
+                                  obtained.conditionwise_statistics)
+
+    # different parameters are computed afresh
+    other = StimulusAnalysis(ecephys_session=session, stimulus_key='s0',
+                             trial_duration=0.4, cache=cache_dir)
+    with pytest.raises(AssertionError, match="expected a cached value"):
+        other.presentationwise_statistics
@@ -0,0 +1,104 @@
+import multiprocessing
+
+import pytest
+import pandas as pd
+from argschema import ArgSchemaParser
+
+from .test_flashes import MockFlSessionApi
+from allensdk.brain_observatory.ecephys.ecephys_session import EcephysSession
+from allensdk.brain_observatory.ecephys.stimulus_analysis import batch
+from allensdk.brain_observatory.ecephys.stimulus_analysis.flashes import \
+    Flashes
+from allensdk.brain_observatory.ecephys.stimulus_analysis._schemas import \
+    BatchInputParameters
+
+
+class MockLoader:
+    """ Picklable session loader, so that it reaches the pool workers
+    under any start method. """
+
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, manifest, session_id, fixed=False):
+        self.loaded.append(session_id)
+        if session_id == 3:
+            raise ValueError('corrupt nwb file')
+        return EcephysSession(api=MockFlSessionApi())
+
+
+def batch_args(tmpdir, **kwargs):
+    input_data = {
+        'manifest': str(tmpdir.join('manifest.json')),
+        'output_dir': str(tmpdir.join('metrics')),
+        'session_ids': [1, 2, 3],
+        'stimuli': ['flashes', 'drifting_gratings'],
+        'flashes': {'trial_duration': 0.25},
+        'log_level': 'ERROR'
+    }
+    input_data.update(kwargs)
+    return ArgSchemaParser(input_data=input_data,
+                           schema_type=BatchInputParameters, args=[]).args
+
+
+def test_batch_args(tmpdir):
+    args = batch_args(tmpdir)
+    assert args['max_workers'] == 1
+    assert args['output_format'] == 'csv'
+    assert args['flashes']['psth_resolution'] == 0.001
+    assert args['drifting_gratings']['trial_duration'] == 2.0
+
+
+def test_run_batch(tmpdir):
+    args = batch_args(tmpdir)
+    loader = MockLoader()
+    output = batch.run_batch(args, loader=loader)
+
+    assert output == {'completed': [1, 2], 'skipped': [], 'failed': [3]}
+    assert batch.completed_sessions(args['output_dir']) == [1, 2]
+
+    expected = Flashes(EcephysSession(api=MockFlSessionApi()),
+                       trial_duration=0.25).metrics
+    obtained = batch.read_metrics(args['output_dir'])
+    assert len(obtained) == 2 * len(expected)
+    assert set(obtained['ecephys_session_id']) == {1, 2}
+    for _, table in obtained.groupby('ecephys_session_id'):
+        pd.testing.assert_frame_equal(
+            expected, table.drop(columns='ecephys_session_id'),
+            check_dtype=False)
+
+    # finished sessions are not loaded again
+    loader.loaded.clear()
+    output = batch.run_batch(args, loader=loader)
+    assert output == {'completed': [], 'skipped': [1, 2], 'failed': [3]}
+    assert loader.loaded == [3]
+
+
+@pytest.mark.parametrize('start_method', ['spawn', 'fork'])
+def test_run_batch_pool(tmpdir, monkeypatch, start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f'{start_method} is not available')
+    monkeypatch.setattr(batch, 'multiprocessing',
+                        multiprocessing.get_context(start_method))
+    args = batch_args(tmpdir, max_workers=2, session_ids=[1, 2, 3, 4])
+    output = batch.run_batch(args, loader=MockLoader())
+
+    assert sorted(output['completed']) == [1, 2, 4]
+    assert output['failed'] == [3]
+    assert batch.completed_sessions(args['output_dir']) == [1, 2, 4]
+
+
+def test_calculate_session_metrics():
+    session = EcephysSession(api=MockFlSessionApi())
+    metrics = batch.calculate_session_metrics(
+        session, {'flashes': {}, 'static_gratings': {}})
+
+    assert metrics.index.name == 'unit_id'
+    assert 'fano_fl' in metrics.columns
+    assert not any(column.endswith('_sg') for column in metrics.columns)
+
+
+def test_read_metrics_empty(tmpdir):
+    obtained = batch.read_metrics(str(tmpdir))
+    assert obtained.empty
+    assert list(obtained.columns) == ['ecephys_session_id']
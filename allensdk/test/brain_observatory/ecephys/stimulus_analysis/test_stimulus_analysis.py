@@ -265,6 +265,118 @@ def test_get_time_to_peak(ecephys_api):
     assert(stim_analysis._get_time_to_peak(1, stim_analysis._get_preferred_condition(1)) == 0.0005)
 
 
+class RandomSessionApi(MockSessionApi):
+    """Many more units and presentations than MockSessionApi, for comparing
+    the per-unit and batched metrics"""
+    n_units = 25
+    n_presentations = 80
+
+    def __init__(self):
+        rng = np.random.default_rng(42)
+        starts = np.arange(self.n_presentations) * 0.5
+        self._stimulus_presentations = pd.DataFrame({
+            'start_time': starts,
+            'stop_time': starts + 0.4,
+            'stimulus_name': 's0',
+            'stimulus_block': 1,
+            'duration': 0.4,
+            'stimulus_index': 1,
+            'conditions': rng.integers(0, 6, self.n_presentations)
+        }, index=pd.Index(name='id', data=np.arange(self.n_presentations)))
+
+        duration = starts[-1] + 1.0
+        self._spike_times = {
+            unit_id: np.sort(rng.uniform(0, duration, rng.integers(0, 200)))
+            for unit_id in range(self.n_units)
+        }
+        self._spike_times[3] = np.array([])  # silent unit
+        # only fires at the onset of presentations of condition 2
+        conditions = self._stimulus_presentations['conditions']
+        self._spike_times[7] = starts[conditions == 2] + 0.05
+
+        self._running_speed = pd.DataFrame({
+            "start_time": np.arange(0.0, duration, 0.1),
+            "end_time": np.arange(0.1, duration + 0.1, 0.1),
+            "velocity": 3.0 * np.sin(np.arange(0.0, duration, 0.1) / 3.0)
+        })
+
+    def get_spike_times(self):
+        return self._spike_times
+
+    def get_units(self):
+        return pd.DataFrame({
+            'firing_rate': 1.0,
+            'isi_violations': 0.0,
+            'local_index': 0,
+            'peak_channel_id': 1,
+            'quality': 'good',
+        }, index=pd.Index(name='unit_id', data=np.arange(self.n_units)[::-1]))
+
+    def get_stimulus_presentations(self):
+        return self._stimulus_presentations
+
+    def get_running_speed(self):
+        return self._running_speed
+
+
+@pytest.mark.parametrize('null_condition', [-1, 0, [0, 100]])
+def test_metrics_many(null_condition):
+    class Analysis(StimulusAnalysis):
+        @property
+        def null_condition(self):
+            return null_condition
+
+    session = EcephysSession(api=RandomSessionApi())
+    stim_analysis = Analysis(ecephys_session=session, stimulus_key='s0',
+                             trial_duration=0.4, psth_resolution=0.05)
+    unit_ids = stim_analysis.unit_ids
+
+    # per-unit helpers, computed on a separate object so they don't share
+    # the cached preferred conditions
+    expected = Analysis(ecephys_session=session, stimulus_key='s0',
+                        trial_duration=0.4, psth_resolution=0.05)
+    preferred = [expected._get_preferred_condition(unit) for unit in unit_ids]
+    unit_prefs = list(zip(unit_ids, preferred))
+
+    obtained = stim_analysis._get_preferred_condition_many()
+    assert np.array_equal(np.array(preferred, dtype=float),
+                          obtained.astype(float), equal_nan=True)
+
+    for values in ([0, 1, 2, 3, 4, 5], [0, 2, 4], [1, 9]):
+        assert np.array_equal(
+            stim_analysis._check_multiple_pref_conditions_many(
+                'conditions', values),
+            [expected._check_multiple_pref_conditions(
+                unit, 'conditions', values) for unit in unit_ids])
+
+    for threshold in [1.0, 2.5]:
+        assert np.allclose(
+            stim_analysis._get_running_modulation_many(obtained, threshold),
+            [expected._get_running_modulation(unit, pref, threshold)
+             for unit, pref in unit_prefs],
+            equal_nan=True)
+
+    assert np.allclose(
+        stim_analysis._get_lifetime_sparseness_many(),
+        [expected._get_lifetime_sparseness(unit) for unit in unit_ids],
+        equal_nan=True)
+    assert np.allclose(
+        stim_analysis._get_fano_factor_many(obtained),
+        [expected._get_fano_factor(unit, pref) for unit, pref in unit_prefs],
+        equal_nan=True)
+    assert np.allclose(
+        stim_analysis._get_time_to_peak_many(obtained),
+        [expected._get_time_to_peak(unit, pref) for unit, pref in unit_prefs],
+        equal_nan=True)
+
+    # units without a preferred condition
+    missing = np.full(len(unit_ids), np.nan)
+    assert np.all(np.isnan(stim_analysis._get_fano_factor_many(missing)))
+    assert np.all(np.isnan(stim_analysis._get_time_to_peak_many(missing)))
+    assert np.all(np.isnan(
+        stim_analysis._get_running_modulation_many(missing)))
+
+
 @pytest.mark.parametrize('spike_counts,running_speeds,speed_threshold,expected',
                          [
                              (np.zeros(10), np.zeros(1),1.0, (np.nan, np.nan)),  # Input error, return nan
@@ -8,6 +8,8 @@ from allensdk.brain_observatory.ecephys.ecephys_session_api import \
     EcephysSessionApi
 from allensdk.brain_observatory.ecephys.ecephys_session import \
     EcephysSession, nan_intervals, build_spike_histogram
+from allensdk.brain_observatory.ecephys.lazy_lfp import LazyLFP
+from allensdk.brain_observatory.ecephys.spike_times import SpikeTimeStore
 
 
 @pytest.fixture
@@ -399,6 +401,23 @@ def test_presentationwise_spike_counts(spike_times_api):
     assert np.allclose([4, 2, 3], obtained.shape)
 
 
+@pytest.mark.parametrize("presentations_per_block", [1, 3, 10])
+def test_iter_presentationwise_spike_counts(spike_times_api,
+                                            presentations_per_block):
+    session = EcephysSession(api=spike_times_api)
+    args = (np.linspace(-.1, .1, 3),
+            session.stimulus_presentations.index.values,
+            session.units.index.values)
+
+    expected = session.presentationwise_spike_counts(*args)
+    blocks = list(session.iter_presentationwise_spike_counts(
+        *args, presentations_per_block=presentations_per_block))
+
+    assert all(block.shape[0] <= presentations_per_block for block in blocks)
+    obtained = xr.concat(blocks, dim='stimulus_presentation_id')
+    xr.testing.assert_equal(expected, obtained)
+
+
 @pytest.mark.parametrize("spike_times,time_domain,expected", [
     [
         {1: [1.5, 2.5]},
@@ -457,6 +476,32 @@ def test_presentationwise_spike_times(spike_times_api):
                                   check_dtype=False)
 
 
+def test_spike_times(spike_times_api, raw_spike_times):
+    session = EcephysSession(api=spike_times_api)
+    spike_times = session.spike_times
+
+    assert isinstance(spike_times, SpikeTimeStore)
+    assert set(spike_times) == set(session.units.index.values)
+    for unit_id in session.units.index.values:
+        assert np.allclose(spike_times[unit_id], raw_spike_times[unit_id])
+
+
+def test_presentationwise_spike_times_structured(spike_times_api):
+    session = EcephysSession(api=spike_times_api)
+    expected = session.presentationwise_spike_times(
+        session.stimulus_presentations.index.values,
+        session.units.index.values)
+    obtained = session.presentationwise_spike_times(
+        session.stimulus_presentations.index.values,
+        session.units.index.values,
+        as_structured_array=True)
+
+    assert isinstance(obtained, np.ndarray)
+    assert np.allclose(expected.index.values, obtained['spike_time'])
+    for column in expected.columns:
+        assert np.allclose(expected[column].values, obtained[column])
+
+
 def test_empty_presentationwise_spike_times(spike_times_api):
     # Test that when there are no spikes presentationwise_spike_times
     # doesn't fail and instead returns a empty dataframe
@@ -640,6 +685,70 @@ def test_get_lfp_mask_invalid(lfp_masking_api):
     xr.testing.assert_equal(expected, obtained)
 
 
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"mask_invalid_intervals": False},
+    {"time_slice": (0.5, 1.5)},
+    {"time_slice": (1.0, None), "channel_ids": [1]},
+    {"channel_ids": [1, 2], "decimation": 2},
+])
+def test_get_lfp_lazy_api(lfp_masking_api, raw_lfp, kwargs):
+    class EcephysLazyLFPApi(type(lfp_masking_api)):
+        def get_lazy_lfp(self, pid):
+            return LazyLFP.from_dataarray(raw_lfp[pid], chunk_bytes=8)
+
+    # the in-memory path applies the same selection with xarray
+    expected = EcephysSession(api=lfp_masking_api).get_lfp(0, **kwargs)
+    obtained = EcephysSession(api=EcephysLazyLFPApi()).get_lfp(0, **kwargs)
+
+    xr.testing.assert_equal(expected.transpose("time", "channel"),
+                            obtained.astype(expected.dtype))
+
+
+def test_get_lfp_lazy_handle(lfp_masking_api):
+    session = EcephysSession(api=lfp_masking_api)
+    lfp = session.get_lfp(0, lazy=True)
+
+    assert isinstance(lfp, LazyLFP)
+    obtained = lfp.read(time_slice=(0.0, 1.0))
+    assert np.allclose(obtained.values, [[1, 6], [2, 7], [3, 8]])
+    obtained = lfp.read(time_slice=(1.5, None))
+    assert np.all(np.isnan(obtained.values))
+
+
+@pytest.mark.parametrize("lazy_api", [False, True])
+def test_presentationwise_lfp(lfp_masking_api, raw_lfp, lazy_api):
+    api = lfp_masking_api
+    if lazy_api:
+        class EcephysLazyLFPApi(type(lfp_masking_api)):
+            def get_lazy_lfp(self, pid):
+                return LazyLFP.from_dataarray(raw_lfp[pid])
+        api = EcephysLazyLFPApi()
+    session = EcephysSession(api=api)
+
+    obtained = session.presentationwise_lfp(
+        stimulus_presentation_ids=[0, 3], window=(-0.5, 1.0),
+        channel_ids=[1, 2])
+
+    assert obtained.dims == ('stimulus_presentation_id',
+                             'time_relative_to_stimulus_onset',
+                             'channel')
+    assert np.array_equal(obtained['stimulus_presentation_id'], [0, 3])
+    assert np.allclose(obtained['time_relative_to_stimulus_onset'],
+                       [-0.5, 0, 0.5])
+    assert np.array_equal(obtained['channel'], [1, 2])
+    assert np.allclose(obtained.values,
+                       [[[np.nan, np.nan], [6, 1], [7, 2]],
+                        [[8, 3], [np.nan, np.nan], [np.nan, np.nan]]],
+                       equal_nan=True)
+
+
+def test_presentationwise_lfp_requires_probe(lfp_masking_api):
+    session = EcephysSession(api=lfp_masking_api)
+    with pytest.raises(ValueError, match="probe_id or channel_ids"):
+        session.presentationwise_lfp([0], (0, 1))
+
+
 @pytest.mark.parametrize("inp,expected", [
     [[np.nan, np.nan, 4, 4, 4, 5, 5], [0, 2, 5, 7]]
 ])
@@ -0,0 +1,184 @@
+import h5py
+import numpy as np
+import pytest
+import xarray as xr
+
+from allensdk.brain_observatory.ecephys.lazy_lfp import (
+    LazyLFP, coalesce_epochs)
+
+
+@pytest.fixture
+def lfp_arrays():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(1000, 12)).astype(np.float32)
+    timestamps = np.arange(1000) / 100.0
+    channel_ids = np.arange(12) * 3 + 100
+    return data, timestamps, channel_ids
+
+
+@pytest.fixture
+def lfp_h5(tmpdir, lfp_arrays):
+    data, timestamps, channel_ids = lfp_arrays
+    path = str(tmpdir.join("lfp.h5"))
+    with h5py.File(path, "w") as h5:
+        h5.create_dataset("data", data=data, chunks=(100, 12))
+        h5.create_dataset("timestamps", data=timestamps)
+
+    h5 = h5py.File(path, "r")
+    yield h5
+    h5.close()
+
+
+def expected_lfp(lfp_arrays, time_slice=None, channel_ids=None,
+                 decimation=1, invalid_intervals=()):
+    data, timestamps, all_channel_ids = lfp_arrays
+    lfp = xr.DataArray(name="LFP", data=data, dims=["time", "channel"],
+                       coords=[timestamps, all_channel_ids])
+    if time_slice is not None:
+        lfp = lfp.sel(time=slice(*time_slice))
+    if channel_ids is not None:
+        lfp = lfp.sel(channel=channel_ids)
+    lfp = lfp.isel(time=slice(None, None, decimation))
+    for start, stop in invalid_intervals:
+        lfp = lfp.where((lfp.time < start) | (lfp.time > stop))
+    return lfp
+
+
+@pytest.mark.parametrize("chunk_bytes", [64, 1000, 2 ** 26])
+@pytest.mark.parametrize("time_slice,channel_ids,decimation", [
+    (None, None, 1),
+    ((1.0, 2.5), None, 1),
+    ((None, 0.5), [130, 100, 112], 1),
+    ((7.25, None), [121], 3),
+    (slice(2.0, 8.0), [103, 106, 109], 7),
+    ((20.0, 30.0), None, 1),
+])
+def test_read(lfp_h5, lfp_arrays, chunk_bytes, time_slice, channel_ids,
+              decimation):
+    lfp = LazyLFP(lfp_h5["data"], lfp_h5["timestamps"], lfp_arrays[2],
+                  chunk_bytes=chunk_bytes)
+    obtained = lfp.read(time_slice=time_slice, channel_ids=channel_ids,
+                        decimation=decimation)
+
+    if isinstance(time_slice, slice):
+        time_slice = (time_slice.start, time_slice.stop)
+    expected = expected_lfp(lfp_arrays, time_slice, channel_ids, decimation)
+    xr.testing.assert_identical(expected, obtained)
+
+
+@pytest.mark.parametrize("chunk_bytes", [64, 2 ** 26])
+def test_read_masked(lfp_h5, lfp_arrays, chunk_bytes):
+    invalid_intervals = [(1.0, 1.5), (4.333, 6.0), (5.0, 5.5)]
+    lfp = LazyLFP(lfp_h5["data"], lfp_h5["timestamps"], lfp_arrays[2],
+                  chunk_bytes=chunk_bytes)
+    masked = lfp.mask_intervals(invalid_intervals)
+
+    obtained = masked.read(time_slice=(0.5, 7.0), decimation=2)
+    expected = expected_lfp(lfp_arrays, (0.5, 7.0), decimation=2,
+                            invalid_intervals=invalid_intervals)
+    xr.testing.assert_identical(expected, obtained)
+    assert obtained.dtype == np.float32
+
+    # the original handle is unaffected
+    assert not np.any(np.isnan(lfp.read().values))
+
+
+def test_read_masked_integer_data():
+    lfp = LazyLFP(np.arange(10).reshape(5, 2), np.arange(5.0), [1, 2],
+                  invalid_intervals=[(1.0, 2.0)])
+    obtained = lfp.read()
+    assert obtained.dtype == np.float64
+    assert np.allclose(obtained.values,
+                       [[0, 1], [np.nan, np.nan], [np.nan, np.nan],
+                        [6, 7], [8, 9]], equal_nan=True)
+
+
+def test_from_dataarray(lfp_arrays):
+    expected = expected_lfp(lfp_arrays)
+    lfp = LazyLFP.from_dataarray(expected.transpose("channel", "time"))
+    xr.testing.assert_identical(expected, lfp.to_dataarray())
+
+
+def test_errors(lfp_arrays):
+    data, timestamps, channel_ids = lfp_arrays
+    with pytest.raises(ValueError, match="expected LFP data of shape"):
+        LazyLFP(data, timestamps, channel_ids[:3])
+
+    lfp = LazyLFP(data, timestamps, channel_ids)
+    with pytest.raises(KeyError, match=r"\[5\]"):
+        lfp.read(channel_ids=[100, 5])
+    with pytest.raises(ValueError, match="decimation"):
+        lfp.read(decimation=0)
+
+
+def reference_epochs(data, timestamps, onset_times, window, interval):
+    relative_times = np.arange(window[0], window[1], interval)
+    out = np.full((len(onset_times), relative_times.size, data.shape[1]),
+                  np.nan)
+    for ii, onset in enumerate(onset_times):
+        for jj, time in enumerate(onset + relative_times):
+            index = np.searchsorted(timestamps, time - 1e-9)
+            if (index < timestamps.size
+                    and np.isclose(timestamps[index], time)):
+                out[ii, jj] = data[index]
+    return out, relative_times
+
+
+@pytest.mark.parametrize("chunk_bytes,max_gap,max_workers", [
+    (2 ** 26, None, None),
+    (2 ** 26, 0, None),
+    (256, None, None),
+    (2 ** 26, 1000, 3),
+])
+def test_read_epochs(lfp_h5, lfp_arrays, chunk_bytes, max_gap, max_workers):
+    data, timestamps, channel_ids = lfp_arrays
+    lfp = LazyLFP(lfp_h5["data"], lfp_h5["timestamps"], channel_ids,
+                  chunk_bytes=chunk_bytes)
+
+    # includes onsets out of order, overlapping epochs and epochs running
+    # off either end of the recording
+    onset_times = np.array([5.0, 1.0, 1.07, 0.02, 9.95, 3.0, 3.0, 20.0])
+    window = (-0.05, 0.1)
+    selected = [112, 100, 130]
+
+    obtained, relative_times = lfp.read_epochs(
+        onset_times, window, channel_ids=selected, max_gap=max_gap,
+        max_workers=max_workers)
+
+    expected, expected_times = reference_epochs(
+        data[:, [4, 0, 10]], timestamps, onset_times, window, 0.01)
+    assert np.allclose(expected_times, relative_times)
+    assert obtained.dtype == np.float32
+    assert np.allclose(expected, obtained, equal_nan=True)
+
+
+def test_read_epochs_masked(lfp_arrays):
+    data, timestamps, channel_ids = lfp_arrays
+    lfp = LazyLFP(data, timestamps, channel_ids,
+                  invalid_intervals=[(2.0, 2.02)])
+    obtained, _ = lfp.read_epochs([2.0], (-0.02, 0.04))
+    assert np.allclose(obtained[0, :2], data[198:200])
+    assert np.all(np.isnan(obtained[0, 2:5]))
+    assert np.allclose(obtained[0, 5], data[203])
+
+
+def test_read_epochs_bad_window(lfp_arrays):
+    lfp = LazyLFP(*lfp_arrays)
+    with pytest.raises(ValueError, match="stop > start"):
+        lfp.read_epochs([1.0], (0.5, 0.5))
+
+
+def test_coalesce_epochs():
+    starts = np.array([50, 0, 12, 30, 200, 7, 210])
+    stops = starts + 10
+    stops[4] = 200  # empty
+
+    groups = coalesce_epochs(starts, stops, max_gap=2, max_rows=35)
+    assert [(start, stop) for start, stop, _ in groups] == \
+        [(0, 22), (30, 40), (50, 60), (210, 220)]
+    assert [members.tolist() for _, _, members in groups] == \
+        [[1, 5, 2], [3], [0], [6]]
+
+    groups = coalesce_epochs(starts, stops, max_gap=100, max_rows=45)
+    assert [(start, stop) for start, stop, _ in groups] == \
+        [(0, 40), (50, 60), (210, 220)]
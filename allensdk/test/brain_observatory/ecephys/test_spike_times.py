@@ -0,0 +1,298 @@
+import datetime
+
+import pytest
+import numpy as np
+import pynwb
+
+from allensdk.brain_observatory.ecephys.spike_times import (
+    PRESENTATIONWISE_SPIKE_TIMES_DTYPE,
+    SpikeTimeStore,
+    build_spike_histogram_csr,
+    concatenate_spike_times,
+    iter_spike_histogram_blocks,
+    presentationwise_spike_table,
+    unit_indices_from_offsets,
+    unsorted_units,
+)
+
+
+def reference_histogram(time_domain, spike_times, unit_ids):
+    """ The per-unit implementation that build_spike_histogram_csr
+    replaces
+    """
+    time_domain = np.array(time_domain)
+    starts = time_domain[:, :-1]
+    ends = time_domain[:, 1:]
+
+    out = np.zeros((time_domain.shape[0], time_domain.shape[1] - 1,
+                    len(unit_ids)), dtype=np.int64)
+    for ii, unit_id in enumerate(unit_ids):
+        data = np.array(spike_times[unit_id])
+        start_positions = np.searchsorted(data, starts.flat)
+        end_positions = np.searchsorted(data, ends.flat, side="right")
+        out[:, :, ii].flat = end_positions - start_positions
+    return out
+
+
+@pytest.fixture
+def random_session():
+    rng = np.random.default_rng(42)
+    spike_times = {
+        unit_id: np.sort(rng.uniform(0, 100, rng.integers(0, 500)))
+        for unit_id in range(40)
+    }
+    # include spikes that fall exactly on bin edges
+    spike_times[3] = np.sort(np.concatenate([spike_times[3],
+                                             [10.0, 10.01, 20.02]]))
+    spike_times[7] = np.array([])
+
+    onsets = np.sort(rng.choice(np.arange(0, 99, 0.25), 200, replace=False))
+    bin_edges = np.linspace(0, 0.25, 26)
+    time_domain = onsets[:, None] + bin_edges[None, :]
+    return spike_times, time_domain
+
+
+def test_concatenate_spike_times():
+    spike_times = {4: np.array([1., 2.]), 2: np.array([]),
+                   9: np.array([3., 4., 5.])}
+    data, offsets = concatenate_spike_times(spike_times, [9, 2, 4])
+
+    assert np.allclose(data, [3, 4, 5, 1, 2])
+    assert np.array_equal(offsets, [0, 3, 3, 5])
+    assert np.array_equal(unit_indices_from_offsets(offsets),
+                          [0, 0, 0, 2, 2])
+
+
+def test_concatenate_spike_times_no_units():
+    data, offsets = concatenate_spike_times({}, [])
+    assert data.size == 0
+    assert np.array_equal(offsets, [0])
+
+
+@pytest.mark.parametrize("max_workers,use_processes", [
+    (None, False),
+    (3, False),
+    (100, False),
+    (2, True),
+])
+def test_build_spike_histogram_csr(random_session, max_workers,
+                                   use_processes):
+    spike_times, time_domain = random_session
+    unit_ids = list(spike_times.keys())
+
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+    obtained = build_spike_histogram_csr(time_domain, data, offsets,
+                                         max_workers=max_workers,
+                                         use_processes=use_processes)
+
+    expected = reference_histogram(time_domain, spike_times, unit_ids)
+    assert obtained.dtype == np.uint16
+    assert np.array_equal(expected, obtained)
+
+
+def test_build_spike_histogram_csr_overlapping(random_session):
+    """ Rows which overlap (or are out of order) take the per-unit path
+    """
+    spike_times, time_domain = random_session
+    time_domain = time_domain[::-1].copy()
+    time_domain[:, 1:] += 0.3
+    unit_ids = list(spike_times.keys())
+
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+    obtained = build_spike_histogram_csr(time_domain, data, offsets,
+                                         dtype=np.int32, max_workers=2)
+
+    expected = reference_histogram(time_domain, spike_times, unit_ids)
+    assert obtained.dtype == np.int32
+    assert np.array_equal(expected, obtained)
+
+
+def test_build_spike_histogram_csr_binarize(random_session):
+    spike_times, time_domain = random_session
+    unit_ids = list(spike_times.keys())
+
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+    obtained = build_spike_histogram_csr(time_domain, data, offsets,
+                                         binarize=True)
+
+    expected = reference_histogram(time_domain, spike_times, unit_ids) > 0
+    assert obtained.dtype == np.uint8
+    assert np.array_equal(expected, obtained)
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("rows_per_block", [1, 7, 1000])
+def test_iter_spike_histogram_blocks(random_session, rows_per_block,
+                                     reverse):
+    spike_times, time_domain = random_session
+    if reverse:
+        time_domain = time_domain[::-1].copy()
+    unit_ids = list(spike_times.keys())
+
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+    expected = build_spike_histogram_csr(time_domain, data, offsets)
+
+    obtained = np.zeros_like(expected)
+    n_blocks = 0
+    for rows, counts in iter_spike_histogram_blocks(
+            time_domain, data, offsets, rows_per_block=rows_per_block):
+        assert counts.shape[0] <= rows_per_block
+        obtained[rows] = counts
+        n_blocks += 1
+
+    assert n_blocks == int(np.ceil(time_domain.shape[0] / rows_per_block))
+    assert np.array_equal(expected, obtained)
+
+
+def test_iter_spike_histogram_blocks_bad_block_size(random_session):
+    spike_times, time_domain = random_session
+    data, offsets = concatenate_spike_times(spike_times, [0])
+    with pytest.raises(ValueError, match="rows_per_block must be positive"):
+        next(iter_spike_histogram_blocks(time_domain, data, offsets, 0))
+
+
+def test_unsorted_units():
+    data = np.array([3., 1., 2., 0., 5., 9., 6., 4.])
+    offsets = np.array([0, 3, 3, 6, 8])
+    assert np.array_equal(unsorted_units(data, offsets), [0, 3])
+
+
+@pytest.mark.parametrize("rows_per_block", [None, 2])
+def test_histogram_unsorted_unit_matches_per_unit_search(rows_per_block):
+    """ Units whose spike times are not sorted get exactly the result
+    of searching their spike times, as they always have
+    """
+    spike_times = {0: np.array([1.01, 1.03, 1.02]),
+                   1: np.array([1.005, 1.025])}
+    time_domain = np.array([[1.0, 1.01, 1.02, 1.03],
+                            [1.04, 1.05, 1.06, 1.07]])
+    unit_ids = [0, 1]
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+
+    if rows_per_block is None:
+        obtained = build_spike_histogram_csr(time_domain, data, offsets)
+    else:
+        obtained = np.concatenate([
+            counts for _, counts in iter_spike_histogram_blocks(
+                time_domain, data, offsets, rows_per_block)])
+
+    expected = reference_histogram(time_domain, spike_times, unit_ids)
+    assert np.array_equal(expected, obtained)
+
+
+def test_presentationwise_spike_table():
+    spike_times = {10: np.array([0.5, 1.0, 1.5, 2.0, 3.5]),
+                   20: np.array([]),
+                   30: np.array([1.2, 3.0, 3.2, 9.0])}
+    unit_ids = np.array([10, 20, 30])
+    data, offsets = concatenate_spike_times(spike_times, unit_ids)
+
+    # spikes on a presentation's start are excluded, spikes on its stop
+    # are included
+    table = presentationwise_spike_table(
+        data, offsets, unit_ids,
+        presentation_ids=np.array([7, 8]),
+        start_times=np.array([1.0, 3.0]),
+        stop_times=np.array([2.0, 4.0]))
+
+    assert table.dtype == PRESENTATIONWISE_SPIKE_TIMES_DTYPE
+    assert np.allclose(table['spike_time'], [1.2, 1.5, 2.0, 3.2, 3.5])
+    assert np.array_equal(table['unit_id'], [30, 10, 10, 30, 10])
+    assert np.array_equal(table['stimulus_presentation_id'],
+                          [7, 7, 7, 8, 8])
+    assert np.allclose(table['time_since_stimulus_presentation_onset'],
+                       [0.2, 0.5, 1.0, 0.2, 0.5])
+
+
+def test_presentationwise_spike_table_empty():
+    data, offsets = concatenate_spike_times({1: np.array([5.0])}, [1])
+    table = presentationwise_spike_table(
+        data, offsets, np.array([1]), np.array([0]), np.array([0.0]),
+        np.array([1.0]))
+    assert table.size == 0
+
+
+@pytest.fixture
+def spike_time_store():
+    return SpikeTimeStore.from_dict({
+        4: np.array([1., 2.]),
+        2: np.array([]),
+        9: np.array([3., 4., 5.]),
+        7: np.array([0.5])
+    })
+
+
+def test_spike_time_store_mapping(spike_time_store):
+    assert len(spike_time_store) == 4
+    assert list(spike_time_store) == [4, 2, 9, 7]
+    assert 9 in spike_time_store
+    assert 3 not in spike_time_store
+    assert np.allclose(spike_time_store[9], [3, 4, 5])
+    assert spike_time_store[2].size == 0
+    assert np.allclose(spike_time_store.get(np.int64(7)), [0.5])
+    assert spike_time_store.get(3) is None
+
+    with pytest.raises(KeyError):
+        spike_time_store[3]
+
+    # lookups are views of the shared array
+    assert np.shares_memory(spike_time_store[9],
+                            spike_time_store.spike_times)
+
+
+@pytest.mark.parametrize("unit_ids,expected,offsets,is_view", [
+    (None, [1, 2, 3, 4, 5, 0.5], [0, 2, 2, 5, 6], True),
+    ([2, 9], [3, 4, 5], [0, 0, 3], True),
+    ([7, 4], [0.5, 1, 2], [0, 1, 3], False),
+    ([9, 9], [3, 4, 5, 3, 4, 5], [0, 3, 6], False),
+    ([], [], [0], False),
+])
+def test_spike_time_store_csr(spike_time_store, unit_ids, expected, offsets,
+                              is_view):
+    data, obtained_offsets = spike_time_store.csr(unit_ids)
+    assert np.allclose(data, expected)
+    assert np.array_equal(obtained_offsets, offsets)
+    assert np.shares_memory(data, spike_time_store.spike_times) == is_view
+
+    if unit_ids is not None:
+        expected_data, expected_offsets = concatenate_spike_times(
+            dict(spike_time_store), unit_ids)
+        obtained_data, obtained_offsets = concatenate_spike_times(
+            spike_time_store, unit_ids)
+        assert np.allclose(expected_data, obtained_data)
+        assert np.array_equal(expected_offsets, obtained_offsets)
+
+
+def test_spike_time_store_select(spike_time_store):
+    selected = spike_time_store.select([9, 4])
+    assert list(selected) == [9, 4]
+    assert np.allclose(selected[4], [1, 2])
+    assert np.allclose(selected[9], [3, 4, 5])
+
+
+@pytest.mark.parametrize("offsets,unit_ids,match", [
+    ([0, 2], [1, 2], "expected 3 offsets"),
+    ([0, 3, 2], [1, 2], "offsets must increase"),
+    ([1, 2, 3], [1, 2], "offsets must increase"),
+    ([0, 1, 2], [1, 2], "offsets must increase"),
+])
+def test_spike_time_store_bad_offsets(offsets, unit_ids, match):
+    with pytest.raises(ValueError, match=match):
+        SpikeTimeStore(np.arange(3.), offsets, unit_ids)
+
+
+def test_spike_time_store_from_nwb_units():
+    nwbfile = pynwb.NWBFile(
+        session_description="EcephysSession",
+        identifier="1",
+        session_start_time=datetime.datetime.now(datetime.timezone.utc))
+    nwbfile.add_unit(spike_times=[1., 2., 3.], id=5)
+    nwbfile.add_unit(spike_times=[], id=9)
+    nwbfile.add_unit(spike_times=[4., 0.5], id=2)
+
+    store = SpikeTimeStore.from_nwb_units(nwbfile.units)
+    assert list(store) == [5, 9, 2]
+    assert np.allclose(store[5], [1, 2, 3])
+    assert store[9].size == 0
+    assert np.allclose(store[2], [4, 0.5])
+    assert store.spike_times.dtype == np.float64
@@ -4,6 +4,7 @@ import scipy.sparse as sparse
 import logging
 
 import allensdk.brain_observatory.demixer as dmx
+from allensdk.brain_observatory.roi_masks import SparseMask
 
 
 @pytest.mark.parametrize(
@@ -107,6 +108,13 @@ def test_demix_time_dep_masks(raw_traces, stack, masks, max_block_size, expected
     np.testing.assert_equal(result[0], expected[0])
     assert result[1] == expected[1]
 
+    # the same masks as a list of SparseMask
+    sparse_masks = [SparseMask.from_dense(m) for m in masks]
+    result = dmx.demix_time_dep_masks(raw_traces, stack, sparse_masks,
+                                      max_block_size)
+    np.testing.assert_equal(result[0], expected[0])
+    assert result[1] == expected[1]
+
 
 @pytest.mark.parametrize(
     "raw_traces,stack,masks,max_block_size",
@@ -123,3 +131,65 @@ def test_demix_invalid_max_block_size(raw_traces, stack, masks, max_block_size):
     with pytest.raises(ValueError, match="Invalid maximum block size*"):
         dmx.demix_time_dep_masks(raw_traces, stack, masks, max_block_size)
 
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+@pytest.mark.parametrize("max_block_size", [4, 1000])
+def test_demix_time_dep_masks_matches_demix_point(n_workers, max_block_size):
+    """Demixing components of overlapping masks in batches gives the same
+    traces as demixing all masks frame by frame"""
+    rng = np.random.default_rng(0)
+    n_masks, n_frames = 12, 10
+    # sums of uint16 frames over uint8 masks overflow either type
+    stack = rng.integers(30000, 60000, size=(n_frames, 16, 16),
+                         dtype=np.uint16)
+    masks = np.zeros((n_masks, 16, 16), dtype=np.uint8)
+    for mask in masks:
+        y, x = rng.integers(0, 13, size=2)
+        h, w = rng.integers(1, 4, size=2)
+        mask[y:y + h, x:x + w] = 1
+    # one component of three masks, and one mask overlapping nothing
+    masks[0:3] = 0
+    masks[0, 0:3, 0:3] = 1
+    masks[1, 2:5, 2:5] = 1
+    masks[2, 4:6, 0:5] = 1
+    masks[3] = 0
+    masks[3, 15, 15] = 1
+    raw_traces = rng.random((n_masks, n_frames)) + 0.5
+    raw_traces[5, 3] = 0
+
+    flat_masks = sparse.csr_matrix(masks.reshape(n_masks, -1), dtype=float)
+    pixels_per_mask = masks.sum(axis=(1, 2))
+    expected = np.zeros((n_masks, n_frames))
+    expected_drop_frames = []
+    for t in range(n_frames):
+        demixed = dmx._demix_point(stack[t].ravel(), raw_traces[:, t],
+                                   flat_masks, pixels_per_mask)
+        expected_drop_frames.append(demixed is None)
+        if demixed is not None:
+            expected[:, t] = demixed
+
+    demixed, drop_frames = dmx.demix_time_dep_masks(
+        raw_traces, stack, masks, max_block_size, n_workers=n_workers)
+    np.testing.assert_allclose(demixed, expected)
+    assert drop_frames == expected_drop_frames
+    assert drop_frames[3]
+
+
+def test_demix_time_dep_masks_singular_components():
+    """Components whose systems are singular (a mask over zero pixels, or
+    duplicate masks) are solved by least squares"""
+    masks = np.zeros((5, 6, 6), dtype=bool)
+    masks[0, :2, :2] = True
+    masks[1, 3:5, 3:5] = True
+    masks[2, 4:6, 4:6] = True
+    masks[3:5, :2, 4:6] = True
+    stack = np.full((2, 6, 6), 2.)
+    stack[:, :2, :2] = 0
+    raw_traces = np.ones((5, 2))
+
+    demixed, drop_frames = dmx.demix_time_dep_masks(raw_traces, stack, masks)
+
+    # for duplicate masks, the least norm solution splits the trace
+    np.testing.assert_allclose(demixed, [[0, 0], [0.4, 0.4], [0.4, 0.4],
+                                         [0.25, 0.25], [0.25, 0.25]])
+    assert drop_frames == [False, False]
@@ -79,6 +79,44 @@ def test_movingmode_fast():
     assert np.all(x == y)
 
 
+@pytest.mark.parametrize('max_histogram_bytes', [
+    dff.MOVINGMODE_HISTOGRAM_BYTES,
+    # the two rows with fewer bins together, the other on its own
+    2 * 5 * np.dtype(np.intp).itemsize,
+    # every row on its own
+    1])
+def test_movingmode_rows(max_histogram_bytes):
+    # rows are independent of each other, despite sharing a histogram
+    # array, and ties keep the previous mode
+    x = np.array([[0, 0, 1, 1, 2, 2, 3, 3],
+                  [3, 3, 1, 1, 1, 0, 0, 0],
+                  [-2, 7, 7, -2, -2, 5, 5, 5]])
+    kernelsize = 4
+    y = np.zeros(x.shape)
+
+    dff.movingmode_rows(x, kernelsize, y, max_histogram_bytes)
+
+    assert np.all(y == [[0, 0, 1, 1, 2, 2, 3, 3],
+                        [3, 3, 1, 1, 1, 0, 0, 0],
+                        [7, 7, 7, -2, -2, 5, 5, 5]])
+    for row, expected in zip(x, y):
+        y_row = np.zeros(x.shape[1])
+        dff.movingmode_fast(row, kernelsize, y_row)
+        assert np.all(y_row == expected)
+
+
+def test_movingaverage_rows():
+    x = np.random.default_rng(0).normal(size=(3, 50))
+    y = np.zeros(x.shape)
+
+    dff.movingaverage_rows(x, 9, y)
+
+    for row, expected in zip(x, y):
+        y_row = np.zeros(x.shape[1])
+        dff.movingaverage(row, 9, y_row)
+        np.testing.assert_array_equal(y_row, expected)
+
+
 def test_compute_dff_windowed_mode():
     x = np.array([[1, 5, -2, 3, 1, 10, 1, -2, 30, 5]])
 
@@ -91,6 +129,23 @@ def test_compute_dff_windowed_mode():
 
     assert(y.shape == x.shape)
 
+    x = np.random.default_rng(0).normal(100, 10, size=(5, 200))
+    x[1, 10] = np.nan
+    y = dff.compute_dff_windowed_mode(x, mode_kernelsize=40,
+                                      mean_kernelsize=20)
+    assert np.all(np.isnan(y[1]))
+    for n in (0, 2, 3, 4):
+        modeline = np.zeros(x.shape[1])
+        modelineLP = np.zeros(x.shape[1])
+        dff.movingmode_fast(x[n], 40, modeline)
+        dff.movingaverage(modeline, 20, modelineLP)
+        np.testing.assert_array_equal(y[n], (x[n] - modelineLP) / modelineLP)
+
+    # traces split among processes
+    np.testing.assert_array_equal(
+        dff.compute_dff_windowed_mode(x, mode_kernelsize=40,
+                                      mean_kernelsize=20, n_workers=2), y)
+
 
 def test_compute_dff_windowed_median():
     x = np.array([[1, 5, -2, 3, 1, 10, 1, -2, 30, 5]], dtype=float)
@@ -123,6 +178,27 @@ def test_compute_dff_windowed_median():
     assert len(noise_stds) == 1
     assert len(small_frames) == 1
 
+    # traces split among processes
+    x = np.sin(np.arange(0, 200)) * np.arange(1, 4)[:, None]
+    noise_stds = []
+    small_frames = []
+    y = dff.compute_dff_windowed_median(x, median_kernel_long=101,
+                                        median_kernel_short=11,
+                                        noise_stds=noise_stds,
+                                        n_small_baseline_frames=small_frames,
+                                        noise_kernel_length=5)
+    split_noise_stds = []
+    split_small_frames = []
+    split_y = dff.compute_dff_windowed_median(
+        x, median_kernel_long=101, median_kernel_short=11,
+        noise_stds=split_noise_stds,
+        n_small_baseline_frames=split_small_frames, noise_kernel_length=5,
+        n_workers=2)
+    np.testing.assert_array_equal(split_y, y)
+    np.testing.assert_array_equal(split_noise_stds, noise_stds)
+    np.testing.assert_array_equal(split_small_frames, small_frames)
+    assert len(noise_stds) == 3
+
 
 def test_calculate_dff():
     x = np.array([[1, 5, -2, 3, 1, 10, 1, -2, 30, 5]], dtype=float)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import allensdk.brain_observatory.r_neuropil as r_neuropil
+
+
+@pytest.fixture
+def traces():
+    np.random.seed(0)
+    af1 = r_neuropil.alpha_filter()
+    af2 = r_neuropil.alpha_filter(alpha=0.1, beta=0.5)
+    F_M, F_N = [], []
+    for _ in range(5):
+        F_M_i, F_N_i, _, _ = r_neuropil.synthesize_F(1000, af1, af2)
+        F_M.append(F_M_i + 1.0)
+        F_N.append(F_N_i + 0.5)
+    return np.array(F_M), np.array(F_N)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_estimate_contamination_ratios_many(traces, n_workers,
+                                            monkeypatch):
+    """The batched fit evaluates the same r values as fitting each ROI,
+    and finds the same r, with errors equal up to rounding"""
+    monkeypatch.setattr(r_neuropil, "SOLVE_BLOCK_ROIS", 2)
+    F_M, F_N = traces
+
+    obtained = r_neuropil.estimate_contamination_ratios_many(
+        F_M, F_N, n_workers=n_workers)
+
+    assert len(obtained) == len(F_M)
+    for F_M_i, F_N_i, result in zip(F_M, F_N, obtained):
+        expected = r_neuropil.estimate_contamination_ratios(F_M_i, F_N_i)
+        assert result.keys() == expected.keys()
+        assert result["it"] == expected["it"]
+        np.testing.assert_array_equal(result["r_vals"], expected["r_vals"])
+        np.testing.assert_allclose(result["err_vals"], expected["err_vals"],
+                                   rtol=1e-9)
+        np.testing.assert_allclose(result["r"], expected["r"], rtol=1e-12)
+        np.testing.assert_allclose(result["err"], expected["err"],
+                                   rtol=1e-9)
+
+
+def test_estimate_contamination_ratios_many_negative_r(traces):
+    F_M, F_N = traces
+    # the neuropil is added to the roi trace
+    result, = r_neuropil.estimate_contamination_ratios_many(
+        F_M[:1], 1.0 - F_N[:1], r_range=[-2.0, 0.5])
+    assert result["r"] == 0
+    assert min(result["r_vals"]) < 0
+
+
+def test_estimate_contamination_ratios_many_shape(traces):
+    F_M, F_N = traces
+    with pytest.raises(Exception, match="same shape"):
+        r_neuropil.estimate_contamination_ratios_many(F_M, F_N[:, :-1])
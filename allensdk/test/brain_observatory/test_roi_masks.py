@@ -213,3 +213,90 @@ def test_validate_masks(roi_mask_list, neuropil_masks):
     })
     pd.testing.assert_frame_equal(expected_exclusions, pd.DataFrame(obtained), check_like=True)
 
+
+def test_sparse_mask():
+    dense = np.zeros((6, 8), dtype=bool)
+    dense[2, 3:6] = True
+    dense[4, 5] = True
+
+    sparse = roi_masks.SparseMask.from_dense(dense)
+    assert (sparse.x, sparse.y, sparse.width, sparse.height) == (3, 2, 3, 3)
+    assert sparse.shape == (6, 8)
+    assert sparse.area == 4
+    np.testing.assert_array_equal(sparse.to_dense(), dense)
+    np.testing.assert_array_equal(np.asarray(sparse), dense)
+    np.testing.assert_array_equal(sparse.mask, dense[2:5, 3:6])
+    np.testing.assert_array_equal(sparse.pixel_indices(),
+                                  np.flatnonzero(dense))
+    assert sparse == roi_masks.SparseMask(shape=(6, 8), x=3, y=2,
+                                          mask=dense[2:5, 3:6])
+
+    image = np.ones((6, 8), dtype=int)
+    sparse.add_to(image)
+    np.testing.assert_array_equal(image, 1 + dense)
+
+    empty = roi_masks.SparseMask.from_dense(np.zeros((6, 8)))
+    assert empty.area == 0
+    np.testing.assert_array_equal(empty.to_dense(), np.zeros((6, 8)))
+
+    with pytest.raises(ValueError, match='does not fit'):
+        roi_masks.SparseMask(shape=(6, 8), x=6, y=0,
+                             mask=np.ones((1, 3), dtype=bool))
+
+
+def test_get_sparse_mask(roi_mask_list):
+    for roi in roi_mask_list:
+        np.testing.assert_array_equal(roi.get_sparse_mask().to_dense(),
+                                      roi.get_mask_plane())
+
+
+def test_create_mask_matrix(roi_mask_list, neuropil_masks):
+    masks = roi_mask_list + neuropil_masks
+    obtained = roi_masks.create_mask_matrix(masks)
+
+    dense = np.array([m.get_mask_plane() for m in masks])
+    np.testing.assert_array_equal(
+        obtained.toarray(), dense.reshape(len(masks), -1))
+
+    assert roi_masks.create_mask_matrix([], shape=(3, 4)).shape == (0, 12)
+
+
+def test_create_combined_mask(roi_mask_list):
+    obtained = roi_masks.create_combined_mask(roi_mask_list)
+    expected = roi_masks.create_roi_mask_array(roi_mask_list).max(axis=0)
+    np.testing.assert_array_equal(obtained, expected)
+
+
+@pytest.mark.parametrize('prefetch', (True, False))
+@pytest.mark.parametrize('block_size', (1, 7, 1000))
+def test_calculate_traces_matches_per_mask_means(
+        roi_mask_list, neuropil_masks, prefetch, block_size):
+    """ROI and neuropil traces reduced together by one sparse matrix
+    equal the mean of each mask's pixels in each frame"""
+    masks = roi_mask_list + neuropil_masks
+    video = np.random.default_rng(0).integers(
+        0, 1000, size=(23, 100, 100)).astype(np.uint16)
+
+    traces, exclusions = roi_masks.calculate_traces(
+        video, masks, block_size=block_size, prefetch=prefetch)
+
+    for i, mask in enumerate(masks):
+        if roi_masks.validate_mask(mask):
+            assert np.all(np.isnan(traces[i]))
+            continue
+        expected = video[:, mask.y:mask.y + mask.height,
+                         mask.x:mask.x + mask.width][:, mask.mask > 0]
+        np.testing.assert_allclose(traces[i], expected.mean(axis=1))
+    assert len(exclusions) == 2
+
+
+def test_calculate_traces_memory_budget(video, roi_mask_list):
+    block_size = roi_masks.block_size_for_memory_budget(
+        video, memory_budget_bytes=3 * 100 * 100 * 2 * 8)
+    assert block_size == 3
+    assert roi_masks.block_size_for_memory_budget(video, 1) == 1
+
+    expected, _ = roi_masks.calculate_traces(video, roi_mask_list)
+    obtained, _ = roi_masks.calculate_traces(
+        video, roi_mask_list, memory_budget_bytes=10 ** 5)
+    np.testing.assert_array_equal(obtained, expected)
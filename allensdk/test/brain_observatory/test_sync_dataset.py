@@ -0,0 +1,98 @@
+import json
+
+import h5py
+import numpy as np
+import pytest
+
+from allensdk.brain_observatory.sync_dataset import Dataset
+from allensdk.brain_observatory.sync_line_index import SyncLineIndex
+
+
+LINE_LABELS = ['lineA', '', 'lineB', 'lineC', 'lineD']
+
+
+def write_sync_file(path, counter_bits):
+    rng = np.random.default_rng(0)
+    n_events = 2000
+
+    # event based sampling, in which the counter rolls over twice
+    counter = np.cumsum(rng.integers(1, 2 ** 23, n_events), dtype=np.int64)
+    bits = rng.integers(0, 2 ** len(LINE_LABELS), n_events)
+    # lineD never changes
+    bits &= ~np.int64(2 ** 4)
+    data = np.stack([counter % 2 ** 32, bits], axis=1).astype(np.uint32)
+
+    meta = {'ni_daq': {'counter_output_freq': 100000.0,
+                       'sample_freq': 100000.0,
+                       'counter_bits': counter_bits},
+            'line_labels': LINE_LABELS}
+    with h5py.File(path, 'w') as out_file:
+        out_file.create_dataset('data', data=data)
+        out_file.create_dataset('meta', data=json.dumps(meta).encode())
+    return counter
+
+
+@pytest.fixture(params=[32, 31])
+def sync_file(request, tmp_path):
+    path = tmp_path / 'sync.h5'
+    counter = write_sync_file(path, request.param)
+    return path, counter
+
+
+def test_process_times(sync_file):
+    path, counter = sync_file
+    with Dataset(str(path)) as dataset:
+        np.testing.assert_array_equal(dataset.times[:, 0], counter)
+
+
+@pytest.mark.parametrize('line_index_cache', [False, True])
+def test_line_index(sync_file, tmp_path, line_index_cache):
+    """Edges from the line index equal those found by unpacking the bits
+    of all events"""
+    path, _ = sync_file
+    cache_dir = tmp_path / 'cache' if line_index_cache else None
+
+    for _ in range(2):
+        with Dataset(str(path)) as expected, \
+                Dataset(str(path), line_index=True,
+                        line_index_cache_dir=cache_dir) as obtained:
+            for line in LINE_LABELS[:1] + LINE_LABELS[2:] + [1]:
+                for units in ('samples', 'seconds'):
+                    for method in ('get_rising_edges', 'get_falling_edges',
+                                   'get_events_by_line'):
+                        expected_edges = getattr(expected, method)(line,
+                                                                   units)
+                        obtained_edges = getattr(obtained, method)(line,
+                                                                   units)
+                        assert obtained_edges.dtype == expected_edges.dtype
+                        np.testing.assert_array_equal(obtained_edges,
+                                                      expected_edges)
+            assert len(obtained.get_rising_edges('lineD')) == 0
+            np.testing.assert_array_equal(
+                obtained.get_edges('all', ['missing', 'lineB']),
+                expected.get_edges('all', ['missing', 'lineB']))
+
+    if line_index_cache:
+        assert len(list(cache_dir.glob('*.sync_line_index.npz'))) == 1
+
+
+def test_line_index_cache_keyed_by_file(sync_file, tmp_path):
+    path, _ = sync_file
+    cache_dir = tmp_path / 'cache'
+    with Dataset(str(path), line_index=True,
+                 line_index_cache_dir=cache_dir) as dataset:
+        dataset.get_rising_edges('lineA')
+    index_path, = cache_dir.glob('*.sync_line_index.npz')
+
+    assert SyncLineIndex.load(index_path, 'another file') is None
+    assert SyncLineIndex.load(cache_dir / 'missing.npz', 'hash') is None
+
+    # a changed sync file gets its own index
+    with h5py.File(path, 'r+') as sync_h5:
+        sync_h5['data'][10, 1] ^= 1
+    with Dataset(str(path), line_index=True,
+                 line_index_cache_dir=cache_dir) as dataset, \
+            Dataset(str(path)) as expected:
+        np.testing.assert_array_equal(dataset.get_rising_edges('lineA'),
+                                      expected.get_rising_edges('lineA'))
+    assert len(list(cache_dir.glob('*.sync_line_index.npz'))) == 2
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from allensdk.core.experiment_volume_store import ExperimentVolumeStore
+
+
+@pytest.fixture
+def volumes():
+    rng = np.random.default_rng(0)
+    return {eid: rng.random((20, 17, 13)).astype(np.float32)
+            for eid in (5, 3, 9)}
+
+
+@pytest.fixture
+def store(tmpdir, volumes):
+    store = ExperimentVolumeStore(str(tmpdir.join('volumes.h5')),
+                                  chunks=(8, 8, 32))
+    for eid, volume in volumes.items():
+        store.add(eid, volume)
+    return store
+
+
+def test_add(store, volumes):
+
+    assert store.experiment_ids() == [5, 3, 9]
+
+    store.add(3, volumes[9])
+    assert store.experiment_ids() == [5, 3, 9]
+    np.testing.assert_array_equal(store.volumes([3])[0], volumes[9])
+
+    with pytest.raises(ValueError):
+        store.add(4, volumes[3][:10])
+
+
+@pytest.mark.parametrize('key,expected_key', [
+    [np.s_[:], np.s_[:]],
+    [np.s_[1], np.s_[1]],
+    [np.s_[:, 2:9, 0:5, 3:4], np.s_[:, 2:9, 0:5, 3:4]],
+    [(np.s_[::-1], (slice(2, 9), slice(0, 5))), np.s_[::-1, 2:9, 0:5]],
+    [np.s_[[1, 0], 3, :, 12], np.s_[[1, 0], 3, :, 12]],
+    [np.s_[[], 1:4], np.s_[[], 1:4]]])
+def test_volumes(store, volumes, key, expected_key):
+
+    lazy = store.volumes([9, 3])
+    expected = np.stack([volumes[9], volumes[3]])
+
+    assert lazy.shape == expected.shape
+    assert lazy.dtype == expected.dtype
+    np.testing.assert_array_equal(lazy[key], expected[expected_key])
+
+
+def test_volumes_missing(store):
+
+    with pytest.raises(KeyError):
+        store.volumes([3, 4])
+
+
+def test_reduce_by_label(store, volumes):
+
+    annotation = np.random.default_rng(1).choice([0, 7, 12, 40],
+                                                 size=(20, 17, 13))
+    labels, sums, counts = store.reduce_by_label([9, 5], annotation)
+
+    assert labels.tolist() == [0, 7, 12, 40]
+    assert counts.tolist() == [(annotation == label).sum()
+                               for label in labels]
+    for row, eid in enumerate([9, 5]):
+        np.testing.assert_allclose(
+            sums[row], [volumes[eid][annotation == label].sum()
+                        for label in labels], rtol=1e-5)
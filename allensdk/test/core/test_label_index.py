@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from allensdk.core.label_index import (
+    LabelIndex, label_index_path, load_or_build_label_index)
+
+
+@pytest.fixture
+def annotation():
+    rng = np.random.default_rng(0)
+    # blocky labels, so that voxels form runs
+    annotation = rng.choice([0, 3, 7, 12, 1000], size=(6, 5, 4))
+    annotation[:, 2:4] = 12
+    return annotation.astype(np.uint32)
+
+
+def test_from_annotation(annotation):
+    index = LabelIndex.from_annotation(annotation)
+
+    labels, counts = np.unique(annotation, return_counts=True)
+    assert np.array_equal(index.labels, labels)
+    assert np.array_equal(index.voxel_counts(), counts)
+
+    for label in labels:
+        starts, lengths = index.runs([label])
+        assert np.all(np.diff(starts) > 0)
+        voxels = np.concatenate([np.arange(start, start + length)
+                                 for start, length in zip(starts, lengths)])
+        assert np.array_equal(voxels,
+                              np.flatnonzero(annotation.ravel() == label))
+
+
+@pytest.mark.parametrize('label_ids', [[], [5], [0], [3, 12], [12, 3, 3],
+                                       [0, 3, 7, 12, 1000], [7, 1000, 99]])
+def test_mask(annotation, label_ids):
+    index = LabelIndex.from_annotation(annotation)
+    obtained = index.mask(label_ids)
+
+    assert obtained.dtype == np.uint8
+    assert obtained.flags['C_CONTIGUOUS']
+    assert np.array_equal(obtained, np.isin(annotation, label_ids))
+
+
+def test_save_load(annotation, tmp_path):
+    annotation_path = str(tmp_path / 'annotation.nrrd')
+    with open(annotation_path, 'wb') as annotation_file:
+        annotation_file.write(annotation.tobytes())
+
+    built = load_or_build_label_index(annotation, annotation_path)
+    index_path = label_index_path(annotation_path)
+    assert index_path == str(tmp_path / 'annotation.label_index.npz')
+
+    loaded = LabelIndex.load(index_path, 'another file')
+    assert loaded is None
+
+    loaded = load_or_build_label_index(annotation, annotation_path)
+    assert loaded.shape == annotation.shape
+    for name in ('labels', 'offsets', 'run_starts', 'run_lengths'):
+        assert np.array_equal(getattr(loaded, name), getattr(built, name))
+    assert np.array_equal(loaded.mask([3, 7]), built.mask([3, 7]))
@@ -0,0 +1,69 @@
+import pytest
+
+from allensdk.core import (
+    LazyAttribute, LazyLoader, get_unloaded, is_loaded)
+
+
+class DataClass:
+    _data = LazyAttribute()
+
+    def __init__(self, data):
+        self._data = data
+
+
+def test_loaded_once():
+    calls = []
+
+    def load():
+        calls.append(None)
+        return [1, 2, 3]
+
+    obj = DataClass(data=LazyLoader(load))
+    assert not is_loaded(obj, '_data')
+    assert isinstance(get_unloaded(obj, '_data'), LazyLoader)
+    assert calls == []
+
+    first = obj._data
+    second = obj._data
+    assert first == [1, 2, 3]
+    assert first is second
+    assert len(calls) == 1
+    assert is_loaded(obj, '_data')
+    assert get_unloaded(obj, '_data') is first
+
+
+def test_not_lazy():
+    obj = DataClass(data=None)
+    assert is_loaded(obj, '_data')
+    assert obj._data is None
+
+    obj._data = LazyLoader(lambda: 'loaded')
+    assert obj._data == 'loaded'
+
+
+def test_then():
+    obj = DataClass(data=LazyLoader(lambda: 2).then(lambda x: x * 3))
+    assert obj._data == 6
+
+
+def test_unset():
+    obj = DataClass.__new__(DataClass)
+    with pytest.raises(AttributeError, match="no attribute '_data'"):
+        obj._data
+    assert isinstance(DataClass._data, LazyAttribute)
+
+
+def test_load_error_is_not_memoized():
+    calls = []
+
+    def load():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError('failed')
+        return 'loaded'
+
+    obj = DataClass(data=LazyLoader(load))
+    with pytest.raises(RuntimeError):
+        obj._data
+    assert not is_loaded(obj, '_data')
+    assert obj._data == 'loaded'
@@ -393,6 +393,126 @@ def test_get_structure_unionizes(mcc, unionizes):
     assert obtained.shape[0] == 6
 
 
+def test_get_structure_unionizes_from_store(mcc, unionizes):
+
+    calls = []
+
+    def get_experiment_structure_unionizes(eid, **kwargs):
+        calls.append(eid)
+        return pd.DataFrame(unionizes).assign(id=lambda df: df['id'] + eid)
+
+    with mock.patch.object(mcc, "get_experiment_structure_unionizes",
+                           new=get_experiment_structure_unionizes):
+        obtained = mcc.get_structure_unionizes([3, 1], hemisphere_ids=[2])
+        assert calls == [3, 1]
+        obtained = mcc.get_structure_unionizes([1, 2, 3], structure_ids=[1])
+        assert calls == [3, 1, 2]
+
+    assert obtained['experiment_id'].tolist() == [1, 2, 3]
+    assert obtained['id'].tolist() == [169991413, 169991414, 169991415]
+    assert os.path.exists(os.path.join(os.path.dirname(mcc.manifest_path),
+                                       'structure_unionizes.h5'))
+
+
+def test_get_structure_unionizes_from_store_columns(mcc, unionizes):
+
+    def get_experiment_structure_unionizes(eid, **kwargs):
+        return pd.DataFrame(unionizes).assign(experiment_id=eid,
+                                              acronym=['root', 'MO'])
+
+    with mock.patch.object(mcc, "get_experiment_structure_unionizes",
+                           new=get_experiment_structure_unionizes):
+        obtained = mcc.get_structure_unionizes([3, 1])
+
+    expected = pd.concat([get_experiment_structure_unionizes(eid)
+                          for eid in [3, 1]], ignore_index=True, sort=True)
+    pd.testing.assert_frame_equal(obtained, expected)
+    assert obtained['max_voxel_x'].dtype == np.int64
+
+
+def test_get_projection_matrix_many(mcc):
+
+    rng = np.random.default_rng(0)
+    experiment_ids = [5, 3, 8, 1]
+    structure_ids = [2, 1]
+    unionizes = pd.DataFrame({'experiment_id': rng.choice(experiment_ids, 30),
+                              'structure_id': rng.choice(structure_ids, 30),
+                              'hemisphere_id': rng.choice([1, 2, 3], 30),
+                              'projection_volume': rng.random(30)})
+
+    with mock.patch.object(mcc, "get_structure_unionizes",
+                           new=lambda *a, **k: unionizes):
+        class FakeTree(object):
+            def value_map(*a, **k):
+                return {1: 'one', 2: 'two'}
+        with mock.patch.object(mcc, "get_structure_tree",
+                               new=lambda *a, **k: FakeTree()):
+            obtained = mcc.get_projection_matrix(experiment_ids,
+                                                 structure_ids)
+
+    expected = np.full((4, 6), np.nan)
+    for _, row in unionizes.iterrows():
+        ridx = experiment_ids.index(row['experiment_id'])
+        cidx = 2 * (int(row['hemisphere_id']) - 1) + \
+            structure_ids.index(row['structure_id'])
+        expected[ridx, cidx] = row['projection_volume']
+    np.testing.assert_array_equal(obtained['matrix'], expected)
+
+
+def test_projection_volumes(mcc):
+
+    volumes = {eid: np.full((4, 5, 6), eid, dtype=np.float32)
+               for eid in (7, 8, 9)}
+    reads = []
+
+    def get_projection_density(eid):
+        reads.append(eid)
+        return volumes[eid], {}
+
+    with mock.patch.object(mcc, "get_projection_density",
+                           new=get_projection_density):
+        obtained = mcc.projection_volumes([9, 7])
+        assert obtained.shape == (2, 4, 5, 6)
+        obtained = mcc.projection_volumes([8, 9])[:, 1:3, :, 2]
+
+    assert reads == [9, 7, 8]
+    np.testing.assert_array_equal(obtained, np.stack([volumes[8][1:3, :, 2],
+                                                      volumes[9][1:3, :, 2]]))
+    assert os.path.exists(os.path.join(os.path.dirname(mcc.manifest_path),
+                                       'volume_stores',
+                                       'projection_density_25.h5'))
+
+
+def test_get_structure_volume_reductions(mcc):
+
+    annotation = np.zeros((4, 5, 6), dtype=np.uint32)
+    annotation[0] = 1
+    annotation[1:3] = 2
+    volumes = {eid: np.arange(120, dtype=np.float32).reshape(4, 5, 6) * eid
+               for eid in (1, 2)}
+    tree = StructureTree(StructureTree.clean_structures(
+        [{'id': 1, 'structure_id_path': '/1/', 'color_hex_triplet': '000000',
+          'acronym': 'a', 'name': 'a', 'structure_sets': []},
+         {'id': 2, 'structure_id_path': '/1/2/', 'color_hex_triplet': '000000',
+          'acronym': 'b', 'name': 'b', 'structure_sets': []}]))
+
+    with mock.patch.object(mcc, "get_data_mask",
+                           new=lambda eid: (volumes[eid], {})), \
+            mock.patch.object(mcc, "get_annotation_volume",
+                              new=lambda: (annotation, {})), \
+            mock.patch.object(mcc, "get_structure_tree",
+                              new=lambda: tree):
+        means = mcc.get_structure_volume_reductions(
+            [2, 1], [1, 2], volume_type='data_mask')
+        sums = mcc.get_structure_volume_reductions(
+            [2, 1], [2], volume_type='data_mask', reduction='sum')
+
+    for eid in (2, 1):
+        assert means.loc[eid, 1] == volumes[eid][:3].mean()
+        assert means.loc[eid, 2] == volumes[eid][1:3].mean()
+        assert sums.loc[eid, 2] == volumes[eid][1:3].sum()
+
+
 def test_get_projection_matrix(mcc):
     # yup
 
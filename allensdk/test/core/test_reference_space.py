@@ -230,3 +230,52 @@ def test_write_itksnap_labels(itksnap_rsp, tmpdir_factory):
     assert os.path.exists(labels_path)
     assert os.path.exists(annot_path)
 
+
+def test_masks_and_counts_match_annotation(rsp):
+    annotation = rsp.annotation
+
+    for stid in rsp.structure_tree.node_ids():
+        exp = np.zeros(annotation.shape)
+        for dscid in rsp.structure_tree.descendant_ids([stid])[0]:
+            exp[annotation == dscid] = 1
+        obt = rsp.make_structure_mask([stid])
+        assert obt.dtype == np.uint8
+        assert np.array_equal(obt, exp)
+
+        direct = np.count_nonzero(annotation == stid)
+        assert rsp.direct_voxel_map[stid] == direct
+        assert rsp.total_voxel_map[stid] == exp.sum()
+
+
+def test_many_structure_masks_workers(rsp):
+
+    exp = list(rsp.many_structure_masks([1, 2, 3, 5, 6, 7]))
+    obt = list(rsp.many_structure_masks([1, 2, 3, 5, 6, 7], n_workers=2))
+
+    assert [ii[0] for ii in obt] == [1, 2, 3, 5, 6, 7]
+    for (_, exp_mask), (_, obt_mask) in zip(exp, obt):
+        assert np.array_equal(exp_mask, obt_mask)
+
+
+def test_label_index_saved_next_to_annotation(rsp, tmpdir_factory):
+
+    annotation_dir = tmpdir_factory.mktemp('annotation')
+    annotation_path = str(annotation_dir.join('annotation.nrrd'))
+    nrrd.write(annotation_path, rsp.annotation)
+    index_path = str(annotation_dir.join('annotation.label_index.npz'))
+
+    first = ReferenceSpace(rsp.structure_tree, rsp.annotation, [10, 10, 10],
+                           annotation_path=annotation_path)
+    exp = first.make_structure_mask([2])
+    assert os.path.exists(index_path)
+
+    with mock.patch('allensdk.core.label_index.LabelIndex.from_annotation',
+                    side_effect=AssertionError('index should be read')):
+        second = ReferenceSpace(rsp.structure_tree, rsp.annotation,
+                                [10, 10, 10],
+                                annotation_path=annotation_path)
+        assert np.array_equal(second.make_structure_mask([2]), exp)
+
+    # replacing the annotation replaces its index
+    second.annotation = np.zeros((10, 10, 10))
+    assert second.make_structure_mask([2]).sum() == 0
@@ -136,6 +136,34 @@ def test_descendant_ids(tree):
     assert( set(obtained[1]) == set([3]) )
     
     
+def test_descendant_ids_order(tree):
+
+    # depth-first, children in the order of the nodes
+    obtained = tree.descendant_ids([0, 1])
+    assert obtained == [[0, 1, 3, 4, 2, 5], [1, 3, 4]]
+
+
+def test_descends_from(tree):
+
+    obtained = tree.descends_from([5, 5, 5, 3, 0, 2], [2, 0, 1, 3, 5, 7])
+    assert obtained.tolist() == [True, True, False, True, False, False]
+
+
+def test_subtree_sums(tree):
+
+    obtained = tree.subtree_sums({0: 1, 1: 10, 3: 100, 5: 1000})
+    assert obtained == {0: 1111, 1: 110, 2: 1000, 3: 100, 4: 0, 5: 1000}
+
+
+def test_cycle():
+
+    nodes = [{'id': 0, 'parent': None}, {'id': 1, 'parent': 2},
+             {'id': 2, 'parent': 1}]
+    with pytest.raises(ValueError):
+        SimpleTree(nodes, lambda node: node['id'],
+                   lambda node: node['parent'])
+
+
 def test_nodes(tree):
     
     obtained = tree.nodes([0, 1])
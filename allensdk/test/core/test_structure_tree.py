@@ -125,6 +125,15 @@ def test_structure_descends_from(tree):
     assert( not tree.structure_descends_from(0, 1) )
     
     
+def test_structure_descends_from_many(tree):
+
+    obtained = tree.structure_descends_from([0, 1, 2, 2], [0, 0, 1, 2])
+    assert obtained.tolist() == [True, True, False, True]
+
+    obtained = tree.structure_descends_from([[1], [2]], [1, 2])
+    assert obtained.tolist() == [[True, False], [False, True]]
+
+
 def test_has_overlaps(tree):
     
     obtained = tree.has_overlaps([0, 1, 2])
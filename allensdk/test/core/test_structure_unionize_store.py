@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from allensdk.core.structure_unionize_store import StructureUnionizeStore
+
+
+def make_unionizes(experiment_id, n_records=24):
+    records = np.arange(n_records)
+    return pd.DataFrame({
+        'experiment_id': experiment_id,
+        'structure_id': records % 6 + 10,
+        'hemisphere_id': records % 3 + 1,
+        'is_injection': records % 2 == 0,
+        'id': records + 1000 * experiment_id,
+        'projection_volume': records / 10.0,
+        'max_voxel_x': records * 2,
+        'name': 'structure %d' % experiment_id})
+
+
+@pytest.fixture
+def store(tmpdir):
+    store = StructureUnionizeStore(str(tmpdir.join('unionizes.h5')))
+    store.append(pd.concat([make_unionizes(1), make_unionizes(2)]), [1, 2, 3])
+    store.append(make_unionizes(4).drop(columns=['projection_volume']), [4])
+    return store
+
+
+def test_experiment_ids(store, tmpdir):
+
+    assert store.experiment_ids() == {1, 2, 3, 4}
+    assert StructureUnionizeStore(
+        str(tmpdir.join('missing.h5'))).experiment_ids() == set()
+
+
+def test_columns(store):
+
+    obtained = store.select([4, 1])
+    expected = pd.concat([make_unionizes(4).drop(
+                              columns=['projection_volume']),
+                          make_unionizes(1)],
+                         ignore_index=True, sort=True)
+    pd.testing.assert_frame_equal(obtained, expected)
+    assert obtained['max_voxel_x'].dtype == np.int64
+    assert obtained['projection_volume'].isnull().sum() == 24
+
+
+def test_columns_widened(store):
+
+    unionizes = make_unionizes(5, n_records=2).assign(
+        max_voxel_x=[0.5, np.nan])
+    store.append(unionizes, [5])
+
+    obtained = store.select([5])
+    assert obtained['max_voxel_x'].tolist()[0] == 0.5
+    assert obtained['max_voxel_x'].dtype == np.float64
+    assert store.select([1])['max_voxel_x'].dtype == np.float64
+
+
+def test_select_empty(tmpdir):
+
+    store = StructureUnionizeStore(str(tmpdir.join('unionizes.h5')))
+    assert store.select([8]).empty
+
+    store.append(pd.DataFrame(), [8])
+    assert store.select([8]).empty
+    assert store.select([8], structure_ids=[]).empty
+
+    store.append(make_unionizes(1), [1])
+    obtained = store.select([8])
+    assert obtained.empty
+    assert list(obtained.columns) == sorted(make_unionizes(1).columns)
+    assert list(store.select([1], structure_ids=[]).columns) == \
+        sorted(make_unionizes(1).columns)
+
+
+@pytest.mark.parametrize('experiment_ids,is_injection,structure_ids,'
+                         'hemisphere_ids', [
+                             [None, None, None, None],
+                             [[2, 1], None, None, None],
+                             [[4, 2, 1], False, [10, 11, 15], [1, 3]],
+                             [[1], True, None, [2]],
+                             [list(range(50)), None, [12], None],
+                             [[1, 2], None, [], None]])
+def test_select(store, experiment_ids, is_injection, structure_ids,
+                hemisphere_ids):
+
+    order = [1, 2, 4] if experiment_ids is None else experiment_ids
+    expected = pd.concat([make_unionizes(eid) for eid in order
+                          if eid in (1, 2, 4)], ignore_index=True)
+    if is_injection is not None:
+        expected = expected[expected['is_injection'] == is_injection]
+    if structure_ids is not None:
+        expected = expected[expected['structure_id'].isin(structure_ids)]
+    if hemisphere_ids is not None:
+        expected = expected[expected['hemisphere_id'].isin(hemisphere_ids)]
+
+    obtained = store.select(experiment_ids, is_injection=is_injection,
+                            structure_ids=structure_ids,
+                            hemisphere_ids=hemisphere_ids)
+
+    assert obtained['id'].tolist() == expected['id'].tolist()
+
+
+def test_append_replaces(store):
+
+    store.append(make_unionizes(2, n_records=5), [2])
+
+    assert len(store.select([2])) == 5
+    assert len(store.select()) == 24 + 5 + 24
+
+
+def test_append_many(tmpdir):
+
+    store = StructureUnionizeStore(str(tmpdir.join('unionizes.h5')))
+    for first in (100, 200, 100):
+        experiment_ids = range(first, first + 40)
+        store.append(pd.concat([make_unionizes(eid, n_records=3)
+                                for eid in experiment_ids]), experiment_ids)
+
+    obtained = store.select(list(range(150, 250)))
+    assert obtained['experiment_id'].tolist() == \
+        np.repeat(np.arange(200, 240), 3).tolist()
+    assert len(store.select()) == 80 * 3
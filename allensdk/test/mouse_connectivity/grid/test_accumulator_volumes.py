@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from allensdk.mouse_connectivity.grid.utilities.accumulator_volumes import \
+    AccumulatorVolumes
+
+
+def test_write_plane(tmpdir):
+
+    volumes = AccumulatorVolumes(str(tmpdir), [5, 4, 3])
+    plane = np.arange(20, dtype=np.float32).reshape(5, 4)
+
+    volumes.write_plane('sum_pixels', 2, plane)
+    volumes.write_plane('sum_pixels', 0, plane[:3, :2] + 1)
+    volumes.write_plane('injection_sum_pixels', 1, plane)
+
+    assert volumes.keys() == ['injection_sum_pixels', 'sum_pixels']
+    obtained = volumes.open('sum_pixels')
+    assert obtained.shape == (3, 4, 5)
+    assert obtained.dtype == np.float32
+    np.testing.assert_array_equal(obtained[2], plane.T)
+    np.testing.assert_array_equal(obtained[1], 0)
+    np.testing.assert_array_equal(obtained[0, :2, :3], plane[:3, :2].T + 1)
+    np.testing.assert_array_equal(obtained[0, 2:], 0)
+
+
+def test_create_existing(tmpdir):
+
+    volumes = AccumulatorVolumes(str(tmpdir), [2, 2, 2])
+    volumes.write_plane('a', 0, np.ones((2, 2), dtype=np.float32))
+
+    # as when another worker created the volume first
+    volumes._create(volumes.path('a'), np.float32)
+
+    np.testing.assert_array_equal(volumes.open('a')[0], 1)
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('a.npy')]
+
+
+@pytest.mark.parametrize('dims,dtype', [([2, 2, 3], np.float32),
+                                        ([2, 2, 2], np.float64)])
+def test_write_plane_mismatched(tmpdir, dims, dtype):
+
+    AccumulatorVolumes(str(tmpdir), [2, 2, 2]).write_plane(
+        'a', 0, np.ones((2, 2), dtype=np.float32))
+
+    volumes = AccumulatorVolumes(str(tmpdir), dims)
+    with pytest.raises(ValueError, match='accumulator volume'):
+        volumes.write_plane('a', 1, np.ones((2, 2), dtype=dtype))
+
+
+def test_clear(tmpdir):
+
+    volumes = AccumulatorVolumes(str(tmpdir), [2, 2, 2])
+    for key in ('a', 'b'):
+        volumes.write_plane(key, 0, np.ones((2, 2), dtype=np.float32))
+    tmpdir.join('other.txt').write('')
+
+    volumes.clear()
+    assert volumes.keys() == []
+    assert tmpdir.listdir() == [tmpdir.join('other.txt')]
@@ -6,6 +6,8 @@ import numpy as np
 import SimpleITK as sitk
 
 from allensdk.mouse_connectivity.grid.image_series_gridder import ImageSeriesGridder
+from allensdk.mouse_connectivity.grid.utilities.accumulator_volumes import \
+    AccumulatorVolumes
 
 
 def small_gridder():
@@ -159,6 +161,76 @@ def test_build_coarse_grids():
             assert( mock.call(ii, ii) in gridder.paste_subimage.mock_calls )
         
     
+class PlaneSubImage(object):
+
+    def __init__(self, coarse_dims, value, **kwargs):
+        self.accumulators = {}
+        self.coarse_dims = coarse_dims
+        self.value = value
+
+    def setup_images(self):
+        pass
+
+    def compute_coarse_planes(self):
+        plane = np.arange(np.prod(self.coarse_dims), dtype=np.float32)
+        plane = plane.reshape(self.coarse_dims) * self.value
+        self.accumulators = {'sum_pixels': plane,
+                             'sum_projecting_pixels': plane / 2}
+
+
+def test_build_shared_coarse_grids(tmpdir):
+
+    class Dummy(object):
+
+        def __init__(self, *a, **k):
+            pass
+
+        def imap_unordered(self, fn, inputs):
+            return map(fn, inputs)
+
+        def close(self):
+            pass
+
+        def join(self):
+            pass
+
+    def make_gridder(accumulator_dir=None):
+        gridder = small_gridder()
+        gridder.coarse_dims = [6, 5, 4]
+        gridder.coarse_spacing = [10.0, 10.0, 100.0]
+        gridder.subimages = [{'specimen_tissue_index': index,
+                              'cls': PlaneSubImage, 'value': index + 1,
+                              'coarse_dims': (6, 5)}
+                             for index in (2, 0, 3)]
+        gridder.accumulator_dir = accumulator_dir
+        return gridder
+
+    with mock.patch('multiprocessing.Pool', new=Dummy):
+        expected = make_gridder()
+        expected.subimages = [dict(si) for si in expected.subimages]
+        expected.build_coarse_grids()
+
+        # left by a previous run, in which the subimage at index 1 was built
+        accumulator_dir = tmpdir.mkdir('accumulators')
+        stale = AccumulatorVolumes(str(accumulator_dir), [6, 5, 4])
+        stale.write_plane('sum_pixels', 1, np.ones((6, 5), dtype=np.float32))
+
+        obtained = make_gridder(str(accumulator_dir))
+        obtained.build_coarse_grids()
+
+    assert obtained.volumes == {}
+    for key in ('sum_pixels', 'sum_projecting_pixels'):
+        expected_volume = expected.volumes[key]
+        obtained_volume = obtained.coarse_volume(key)
+
+        assert np.array_equal(sitk.GetArrayFromImage(obtained_volume),
+                              sitk.GetArrayFromImage(expected_volume))
+        assert obtained_volume.GetSpacing() == expected_volume.GetSpacing()
+        assert obtained_volume.GetOrigin() == expected_volume.GetOrigin()
+
+    assert accumulator_dir.listdir() == []
+
+
 def test_resample_volume():
     
     def make_dfield(*a , **k):
@@ -180,3 +180,25 @@ def test_resample_volume():
     obt_arr = sitk.GetArrayFromImage(obt)
 
     assert obt_arr.sum() == 8**3
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64, np.uint8,
+                                   np.int16])
+def test_write_nrrd_in_chunks(tmpdir, dtype):
+
+    array = (np.random.rand(11, 7, 5) * 100).astype(dtype)
+    volume = sitk.GetImageFromArray(array)
+    volume.SetSpacing([10, 10, 25.5])
+
+    expected_path = str(tmpdir.join('expected.nrrd'))
+    obtained_path = str(tmpdir.join('obtained.nrrd'))
+    sitk.WriteImage(volume, expected_path, True)
+    iu.write_nrrd_in_chunks(volume, obtained_path, planes_per_chunk=4)
+
+    expected = sitk.ReadImage(expected_path)
+    obtained = sitk.ReadImage(obtained_path)
+    assert np.array_equal(sitk.GetArrayFromImage(obtained), array)
+    assert obtained.GetPixelID() == expected.GetPixelID()
+    assert obtained.GetSpacing() == expected.GetSpacing()
+    assert obtained.GetOrigin() == expected.GetOrigin()
+    assert obtained.GetDirection() == expected.GetDirection()
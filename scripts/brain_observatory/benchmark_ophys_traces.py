@@ -0,0 +1,116 @@
+""" Compare the memory use and latency of the (roi x time) array backed
+ophys trace containers against the list-of-arrays dataframes they replaced,
+on synthetic traces stored (time x roi) in an HDF5 file as they are in NWB.
+
+    python benchmark_ophys_traces.py --n_rois 500 --n_frames 140000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .dff_traces import DFFTraces
+from allensdk.brain_observatory.behavior.data_objects.cell_specimens.traces\
+    .traces_mixin import read_roi_response_series_data
+
+
+def legacy_from_nwb(data, roi_ids):
+    """ DFFTraces.from_nwb prior to the array backed container
+    """
+    dff_traces = data[:].T.copy()
+    return pd.DataFrame({'dff': [x for x in dff_traces]},
+                        index=pd.Index(data=roi_ids, name='cell_roi_id'))
+
+
+def legacy_trace_array(df):
+    """ How the (roi x time) array was recovered from the dataframe, ie by
+    to_nwb and get_dff_traces
+    """
+    return np.array([df.loc[cell_roi_id].dff
+                     for cell_roi_id in df.index.values])
+
+
+def legacy_filter_and_reorder(df, roi_ids):
+    return df.reindex(roi_ids)
+
+
+def measured(fn, *args, **kwargs):
+    """ Returns the result of fn, its run time and the peak memory
+    allocated while it ran
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(name, legacy, new):
+    _, legacy_time, legacy_peak = legacy
+    _, new_time, new_peak = new
+    print(f"{name:<22} {legacy_time:9.3f} s {legacy_peak / 1e6:10.1f} MB"
+          f" {new_time:9.3f} s {new_peak / 1e6:10.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_rois", type=int, default=500)
+    parser.add_argument("--n_frames", type=int, default=140000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    roi_ids = rng.permutation(args.n_rois) + 1000
+    order = np.sort(roi_ids)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "traces.h5")
+        with h5py.File(path, "w") as out_file:
+            dataset = out_file.create_dataset(
+                "data", shape=(args.n_frames, args.n_rois), dtype=np.float64)
+            block = 10000
+            for start in range(0, args.n_frames, block):
+                stop = min(start + block, args.n_frames)
+                dataset[start:stop] = rng.random((stop - start, args.n_rois))
+
+        print(f"{args.n_rois} rois, {args.n_frames} frames "
+              f"({args.n_rois * args.n_frames * 8 / 1e6:.1f} MB of traces)")
+        print(f"{'':<22} {'dataframe':>24} {'array':>24}")
+
+        with h5py.File(path, "r") as in_file:
+            data = in_file["data"]
+            legacy_load = measured(legacy_from_nwb, data, roi_ids)
+            new_load = measured(
+                lambda: DFFTraces(traces=read_roi_response_series_data(data),
+                                  roi_ids=roi_ids))
+        report("load from NWB", legacy_load, new_load)
+        legacy_df = legacy_load[0]
+        traces = new_load[0]
+
+        legacy_array = measured(legacy_trace_array, legacy_df)
+        new_array = measured(traces.get_trace_array)
+        np.testing.assert_array_equal(legacy_array[0], new_array[0])
+        report("(roi x time) array", legacy_array, new_array)
+        del legacy_array
+
+        report("legacy dataframe", measured(lambda: legacy_df),
+               measured(lambda: traces.value))
+
+        legacy_filter = measured(legacy_filter_and_reorder, legacy_df,
+                                 order)
+        new_filter = measured(traces.filter_and_reorder, order)
+        report("filter and reorder", legacy_filter, new_filter)
+        np.testing.assert_array_equal(
+            np.stack(legacy_filter[0]['dff'].values),
+            traces.get_trace_array())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+""" Compare EcephysSession.presentationwise_spike_times against the per-unit
+implementation it replaced, on a synthetic session.
+
+    python benchmark_presentationwise_spike_times.py --n_units 2000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from allensdk.brain_observatory.ecephys.ecephys_session_api import \
+    EcephysSessionApi
+from allensdk.brain_observatory.ecephys.ecephys_session import EcephysSession
+
+
+def synthetic_session(n_units, n_presentations, mean_rate, seed=0):
+    rng = np.random.default_rng(seed)
+
+    duration = n_presentations * 0.3
+    starts = np.arange(n_presentations) * 0.3
+    stimulus_presentations = pd.DataFrame({
+        "start_time": starts,
+        "stop_time": starts + 0.25,
+        "stimulus_name": "flashes",
+        "stimulus_block": 0,
+        "stimulus_index": 0,
+        "color": rng.choice([-1.0, 1.0], n_presentations),
+    }, index=pd.Index(np.arange(n_presentations), name="id"))
+
+    spike_times = {
+        unit_id: np.sort(rng.uniform(
+            0, duration, rng.poisson(mean_rate * duration)))
+        for unit_id in range(n_units)
+    }
+    units = pd.DataFrame({
+        "peak_channel_id": np.zeros(n_units, dtype=int),
+        "quality": "good",
+        "snr": np.ones(n_units),
+        "isi_violations": np.zeros(n_units),
+    }, index=pd.Index(np.arange(n_units), name="unit_id"))
+    channels = pd.DataFrame({
+        "probe_id": [0],
+        "probe_vertical_position": [0],
+        "probe_horizontal_position": [0],
+        "valid_data": [True],
+    }, index=pd.Index([0], name="channel_id"))
+    probes = pd.DataFrame({
+        "description": ["probeA"],
+    }, index=pd.Index([0], name="id"))
+
+    class SyntheticApi(EcephysSessionApi):
+        def get_spike_times(self):
+            return spike_times
+
+        def get_units(self):
+            return units
+
+        def get_channels(self):
+            return channels
+
+        def get_probes(self):
+            return probes
+
+        def get_stimulus_presentations(self):
+            return stimulus_presentations
+
+        def get_invalid_times(self):
+            return pd.DataFrame()
+
+    return EcephysSession(api=SyntheticApi())
+
+
+def per_unit_presentationwise_spike_times(session):
+    """ The implementation of presentationwise_spike_times prior to its
+    single-pass rewrite
+    """
+    stimulus_presentations = session.stimulus_presentations
+    presentation_times = np.zeros([stimulus_presentations.shape[0] * 2])
+    presentation_times[::2] = np.array(stimulus_presentations['start_time'])
+    presentation_times[1::2] = np.array(stimulus_presentations['stop_time'])
+    all_presentation_ids = np.array(stimulus_presentations.index.values)
+
+    presentation_ids = []
+    unit_ids = []
+    spike_times = []
+
+    for unit_id in session.units.index.values:
+        data = session.spike_times[unit_id]
+        indices = np.searchsorted(presentation_times, data) - 1
+
+        index_valid = indices % 2 == 0
+        presentations = \
+            all_presentation_ids[np.floor(indices / 2).astype(int)]
+
+        sorder = np.argsort(presentations)
+        presentations = presentations[sorder]
+        index_valid = index_valid[sorder]
+        data = data[sorder]
+
+        changes = np.where(np.ediff1d(presentations, to_begin=1, to_end=1))[0]
+        for ii, jj in zip(changes[:-1], changes[1:]):
+            values = data[ii:jj][index_valid[ii:jj]]
+            if values.size == 0:
+                continue
+
+            unit_ids.append(np.zeros([values.size]) + unit_id)
+            presentation_ids.append(np.zeros([values.size]) +
+                                    presentations[ii])
+            spike_times.append(values)
+
+    spike_df = pd.DataFrame({
+        'stimulus_presentation_id': np.concatenate(presentation_ids).astype(
+            int),
+        'unit_id': np.concatenate(unit_ids).astype(int)
+    }, index=pd.Index(np.concatenate(spike_times), name='spike_time'))
+
+    spikes_with_onset = spike_df.join(stimulus_presentations["start_time"],
+                                      on=["stimulus_presentation_id"])
+    spikes_with_onset["time_since_stimulus_presentation_onset"] = (
+        spikes_with_onset.index - spikes_with_onset["start_time"]
+    )
+    spikes_with_onset.sort_values('spike_time', axis=0, inplace=True)
+    spikes_with_onset.drop(columns=["start_time"], inplace=True)
+    return spikes_with_onset
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_units", type=int, default=2000)
+    parser.add_argument("--n_presentations", type=int, default=2000)
+    parser.add_argument("--mean_rate", type=float, default=5.0,
+                        help="mean firing rate (Hz) of each unit")
+    args = parser.parse_args()
+
+    session = synthetic_session(args.n_units, args.n_presentations,
+                                args.mean_rate)
+    # load the spike times outside of the timed sections
+    n_spikes = sum(times.size for times in session.spike_times.values())
+    print(f"{args.n_units} units, {args.n_presentations} presentations, "
+          f"{n_spikes} spikes")
+
+    expected, legacy_time = timed(per_unit_presentationwise_spike_times,
+                                  session)
+    obtained, new_time = timed(session.presentationwise_spike_times)
+    table, table_time = timed(session.presentationwise_spike_times,
+                              as_structured_array=True)
+
+    # spikes emitted at the same time by different units may be ordered
+    # differently
+    order = ["spike_time", "unit_id"]
+    pd.testing.assert_frame_equal(
+        expected.reset_index().sort_values(order).reset_index(drop=True),
+        obtained.reset_index().sort_values(order).reset_index(drop=True))
+
+    print(f"per-unit:                {legacy_time:8.3f} s")
+    print(f"single pass (DataFrame): {new_time:8.3f} s")
+    print(f"single pass (ndarray):   {table_time:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()